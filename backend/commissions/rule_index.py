@@ -0,0 +1,80 @@
+"""
+Commission rule index.
+
+Active rules of a tenant are compiled once into a lookup table keyed by
+"professional:service" ("*" = any) and stored in the cache. Resolving the
+rule for a (professional, service) pair is then at most four dict lookups,
+following the same precedence as before:
+
+1. Rule for specific professional AND service
+2. Rule for specific professional (any service)
+3. Rule for specific service (any professional)
+4. Global rule (any professional, any service)
+
+Within the same key, the rule with the highest priority wins.
+The index is invalidated after commit on every CommissionRule save/delete.
+"""
+
+from collections import namedtuple
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+
+INDEX_TIMEOUT = 24 * 3600
+WILDCARD = "*"
+
+RuleMatch = namedtuple("RuleMatch", ["rule_id", "commission_percentage"])
+
+
+def _cache_key(tenant_id):
+    return f"commission_rules:{tenant_id}"
+
+
+def _entry_key(professional_id, service_id):
+    return f"{professional_id or WILDCARD}:{service_id or WILDCARD}"
+
+
+def build_index(tenant_id):
+    """Compile the active rules of the tenant into {key: [rule_id, percentage]}."""
+    from .models import CommissionRule
+
+    rules = CommissionRule.objects.filter(tenant_id=tenant_id, is_active=True).order_by(
+        "-priority", "-created_at"
+    ).values_list("id", "professional_id", "service_id", "commission_percentage")
+
+    index = {}
+    for rule_id, professional_id, service_id, percentage in rules:
+        # Ordered by priority: the first rule of each key wins
+        index.setdefault(_entry_key(professional_id, service_id), [str(rule_id), str(percentage)])
+    return index
+
+
+def get_index(tenant_id):
+    """Return the cached index of the tenant, building it on a miss."""
+    index = cache.get(_cache_key(tenant_id))
+    if index is None:
+        index = build_index(tenant_id)
+        cache.set(_cache_key(tenant_id), index, INDEX_TIMEOUT)
+    return index
+
+
+def resolve(tenant_id, professional_id, service_id, index=None):
+    """Return the RuleMatch for the pair, or None if no rule applies."""
+    index = get_index(tenant_id) if index is None else index
+
+    for key in (
+        _entry_key(professional_id, service_id),
+        _entry_key(professional_id, None),
+        _entry_key(None, service_id),
+        _entry_key(None, None),
+    ):
+        entry = index.get(key)
+        if entry:
+            return RuleMatch(entry[0], Decimal(entry[1]))
+    return None
+
+
+def invalidate(tenant_id):
+    """Drop the cached index of the tenant once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_cache_key(tenant_id)))
@@ -4,77 +4,64 @@ Signal handlers for the commissions app.
 
 from decimal import Decimal
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
 
+from core import side_effects
 from scheduling.models import Appointment
 
+from . import rule_index
 from .models import Commission, CommissionRule
 
 
+@receiver(post_init, sender=Appointment)
+def remember_appointment_status(sender, instance, **kwargs):
+    """Keep the loaded status to detect transitions on save."""
+    # __dict__ avoids a query when the field is deferred (.only()/.defer())
+    instance._commission_status = instance.__dict__.get("status")
+
+
 @receiver(post_save, sender=Appointment)
-def create_commission_on_appointment_completion(sender, instance, created, **kwargs):
+def defer_commission_on_appointment_completion(sender, instance, created, **kwargs):
+    """
+    Schedule the commission once an appointment is marked as completed.
+    It is created after the transaction commits (see core.side_effects).
+    """
+    previous_status = getattr(instance, "_commission_status", None)
+    instance._commission_status = instance.status
+
+    # Only process appointments that just became completed
+    if instance.status != "concluido" or (not created and previous_status == instance.status):
+        return
+
+    side_effects.defer("commissions.appointment_completed", instance)
+
+
+@side_effects.register("commissions.appointment_completed")
+def create_commission_on_appointment_completion(instance):
     """
-    Create commission record when an appointment is marked as completed.
+    Create commission record for a completed appointment.
     """
-    # Only process completed appointments
     if instance.status != "concluido":
         return
 
+    # Find applicable commission rule (see rule_index for the precedence)
+    applicable_rule = rule_index.resolve(
+        instance.tenant_id, instance.professional_id, instance.service_id
+    )
+
+    # If no rule found, skip commission creation
+    if not applicable_rule:
+        return
+
     # Check if commission already exists for this appointment
     if Commission.objects.filter(
-        tenant=instance.tenant,
+        tenant_id=instance.tenant_id,
         appointment=instance,
-        service=instance.service,
+        service_id=instance.service_id,
     ).exists():
         return
 
-    # Find applicable commission rule
-    # Priority order:
-    # 1. Rule for specific professional AND service
-    # 2. Rule for specific professional (any service)
-    # 3. Rule for specific service (any professional)
-    # 4. Global rule (any professional, any service)
-    
-    rules = CommissionRule.objects.filter(
-        tenant=instance.tenant,
-        is_active=True,
-    ).order_by("-priority")
-
-    # Try to find the most specific rule
-    applicable_rule = None
-    
-    # 1. Professional + Service
-    for rule in rules:
-        if rule.professional_id == instance.professional_id and rule.service_id == instance.service_id:
-            applicable_rule = rule
-            break
-    
-    # 2. Professional only
-    if not applicable_rule:
-        for rule in rules:
-            if rule.professional_id == instance.professional_id and rule.service is None:
-                applicable_rule = rule
-                break
-    
-    # 3. Service only
-    if not applicable_rule:
-        for rule in rules:
-            if rule.service_id == instance.service_id and rule.professional is None:
-                applicable_rule = rule
-                break
-    
-    # 4. Global rule
-    if not applicable_rule:
-        for rule in rules:
-            if rule.professional is None and rule.service is None:
-                applicable_rule = rule
-                break
-    
-    # If no rule found, skip commission creation
-    if not applicable_rule:
-        return
-
     # Calculate commission
     service_price = instance.service.price
     commission_percentage = applicable_rule.commission_percentage
@@ -82,14 +69,21 @@ def create_commission_on_appointment_completion(sender, instance, created, **kwa
 
     # Create commission record
     Commission.objects.create(
-        tenant=instance.tenant,
-        professional=instance.professional,
+        tenant_id=instance.tenant_id,
+        professional_id=instance.professional_id,
         appointment=instance,
-        service=instance.service,
-        rule=applicable_rule,
+        service_id=instance.service_id,
+        rule_id=applicable_rule.rule_id,
         service_price=service_price,
         commission_percentage=commission_percentage,
         commission_amount=commission_amount,
         date=instance.start_time.date(),
         status="pending",
     )
+
+
+@receiver(post_save, sender=CommissionRule)
+@receiver(post_delete, sender=CommissionRule)
+def invalidate_commission_rule_index(sender, instance, **kwargs):
+    """Rebuild the tenant's rule index on the next lookup."""
+    rule_index.invalidate(instance.tenant_id)
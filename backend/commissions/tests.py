@@ -1,3 +1,168 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.models import Tenant, User
+from customers.models import Customer
+from scheduling.models import Appointment, Service
+
+from . import rule_index
+from .models import Commission, CommissionRule
+
+
+class CommissionRuleIndexTestCase(TestCase):
+    """Tests for the cached commission rule index."""
+
+    def setUp(self):
+        cache.clear()
+        self.tenant = Tenant.objects.create(name="Test Barbershop")
+        self.professional = User.objects.create_user(
+            email="pro@test.com", password="test123", name="Pro", tenant=self.tenant
+        )
+        self.other_professional = User.objects.create_user(
+            email="other@test.com", password="test123", name="Other", tenant=self.tenant
+        )
+        self.haircut = Service.objects.create(
+            tenant=self.tenant, name="Corte", price=Decimal("50.00"), duration_minutes=30
+        )
+        self.shave = Service.objects.create(
+            tenant=self.tenant, name="Barba", price=Decimal("30.00"), duration_minutes=20
+        )
+
+    def add_rule(self, percentage, professional=None, service=None, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return CommissionRule.objects.create(
+                tenant=self.tenant,
+                professional=professional,
+                service=service,
+                commission_percentage=Decimal(percentage),
+                **kwargs,
+            )
+
+    def resolve(self, professional, service):
+        match = rule_index.resolve(self.tenant.id, professional.id, service.id)
+        return match.commission_percentage if match else None
+
+    def test_most_specific_rule_wins(self):
+        self.add_rule("10")
+        self.add_rule("20", service=self.haircut)
+        self.add_rule("30", professional=self.professional)
+        self.add_rule("40", professional=self.professional, service=self.haircut)
+        self.add_rule("99", professional=self.other_professional, is_active=False)
+
+        self.assertEqual(self.resolve(self.professional, self.haircut), Decimal("40"))
+        self.assertEqual(self.resolve(self.professional, self.shave), Decimal("30"))
+        self.assertEqual(self.resolve(self.other_professional, self.haircut), Decimal("20"))
+        self.assertEqual(self.resolve(self.other_professional, self.shave), Decimal("10"))
+
+    def test_index_is_cached_and_invalidated_on_rule_save(self):
+        rule = self.add_rule("10")
+        self.resolve(self.professional, self.haircut)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.resolve(self.professional, self.haircut), Decimal("10"))
+        self.assertEqual(len(ctx.captured_queries), 0)
+
+        rule.commission_percentage = Decimal("15")
+        with self.captureOnCommitCallbacks(execute=True):
+            rule.save()
+
+        self.assertEqual(self.resolve(self.professional, self.haircut), Decimal("15"))
+
+    def test_commission_created_only_on_completion(self):
+        self.add_rule("10", service=self.haircut)
+        appointment = Appointment.objects.create(
+            tenant=self.tenant,
+            customer=Customer.objects.create(tenant=self.tenant, name="Cliente", phone="11999999999"),
+            customer_name="Cliente",
+            service=self.haircut,
+            professional=self.professional,
+            start_time=timezone.now() + timedelta(days=1),
+        )
+        self.assertFalse(Commission.objects.exists())
+
+        appointment.status = "concluido"
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        commission = Commission.objects.get(appointment=appointment)
+        self.assertEqual(commission.commission_amount, Decimal("5.00"))
+
+        # Saving again without a status change does not look for rules or commissions
+        appointment.notes = "Atualizado"
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertFalse(any("commission" in q["sql"] for q in ctx.captured_queries))
+
+
+class ProfessionalPerformanceTestCase(TestCase):
+    """Tests for the set-based professional_performance report."""
+
+    QUERY_BUDGET = 2
+
+    def setUp(self):
+        from rest_framework.test import APIClient
+
+        self.tenant = Tenant.objects.create(name="Test Barbershop")
+        self.admin = User.objects.create_user(
+            email="admin@test.com", password="test123", name="Admin", tenant=self.tenant, role="admin"
+        )
+        self.service = Service.objects.create(
+            tenant=self.tenant, name="Corte", price=Decimal("50.00"), duration_minutes=30
+        )
+        other_tenant = Tenant.objects.create(name="Other Barbershop")
+        self.outsider = User.objects.create_user(
+            email="outsider@test.com", password="test123", name="Outsider", tenant=other_tenant
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def add_staff(self, count, statuses):
+        start = timezone.now()
+        for i in range(count):
+            professional = User.objects.create_user(
+                email=f"pro{User.objects.count()}@test.com", password="x", name=f"Pro {i}", tenant=self.tenant
+            )
+            appointments = Appointment.objects.bulk_create([
+                Appointment(
+                    tenant=self.tenant, service=self.service, professional=professional, customer_name="Cliente",
+                    start_time=start + timedelta(hours=n), end_time=start + timedelta(hours=n, minutes=30),
+                    status="concluido",
+                )
+                for n in range(len(statuses))
+            ])
+            Commission.objects.bulk_create([
+                Commission(
+                    tenant=self.tenant, professional=professional, appointment=appointment, service=self.service,
+                    service_price=Decimal("50.00"), commission_percentage=Decimal("40"),
+                    commission_amount=Decimal("20.00"), status=commission_status, date=start.date(),
+                )
+                for appointment, commission_status in zip(appointments, statuses)
+            ])
+
+    def get_report(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/api/commissions/professional_performance/")
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+        return response.data
+
+    def test_metrics_in_constant_queries(self):
+        self.add_staff(2, ["paid", "paid", "pending", "cancelled"])
+        report = self.get_report()
+
+        self.assertEqual(len(report), 3)
+        self.assertNotIn(str(self.outsider.id), [row["professional_id"] for row in report])
+        admin = next(row for row in report if row["professional_id"] == str(self.admin.id))
+        self.assertEqual((admin["total_commissions"], admin["total_paid"], admin["completion_rate"]), (0, 0.0, 0))
+        top = report[0]
+        self.assertEqual((top["count_paid"], top["count_pending"], top["count_cancelled"]), (2, 1, 1))
+        self.assertEqual((top["total_paid"], top["total_pending"]), (40.0, 20.0))
+        self.assertEqual(top["completion_rate"], 50.0)
 
-# Create your tests here.
+        self.add_staff(20, ["paid"])
+        self.assertEqual(len(self.get_report()), 23)
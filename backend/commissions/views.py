@@ -12,7 +12,9 @@ from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from core.exports import ExportColumn, ExportMixin, choice_display, date_br
 from core.permissions import IsSameTenant
+from core.reports import professional_metrics, rate
 
 from .models import Commission, CommissionRule
 from .serializers import (
@@ -97,7 +99,7 @@ class CommissionFilter(django_filters.FilterSet):
         fields = ["status", "professional", "date_from", "date_to"]
 
 
-class CommissionViewSet(viewsets.ModelViewSet):
+class CommissionViewSet(ExportMixin, viewsets.ModelViewSet):
     """ViewSet for commissions."""
 
     queryset = Commission.objects.select_related(
@@ -114,6 +116,23 @@ class CommissionViewSet(viewsets.ModelViewSet):
     ordering_fields = ["date", "commission_amount", "created_at"]
     ordering = ["-date", "-created_at"]
 
+    export_filename = "comissoes"
+    export_sheet_title = "Comissões"
+    export_columns = [
+        ExportColumn("Data", "date", date_br),
+        ExportColumn("Profissional", "professional__name", width=25),
+        ExportColumn("Serviço", "service__name", width=25),
+        ExportColumn("Valor Base", "service_price"),
+        ExportColumn("Percentual", "commission_percentage"),
+        ExportColumn("Valor Comissão", "commission_amount"),
+        ExportColumn("Status", "status", choice_display(Commission.STATUS_CHOICES)),
+        ExportColumn("Pago em", "paid_at", date_br),
+    ]
+
+    def get_export_queryset(self):
+        # O queryset da classe não filtra por tenant: a exportação não pode vazar outros tenants
+        return super().get_export_queryset().filter(tenant=self.request.user.tenant)
+
     def get_serializer_class(self):
         """Return appropriate serializer class."""
         if self.action in ["create", "update", "partial_update"]:
@@ -224,43 +243,37 @@ class CommissionViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
         
-        # Buscar todos os profissionais do tenant
-        professionals = User.objects.filter(tenant=request.user.tenant)
+        # Métricas de todos os profissionais do tenant em uma query (core.reports)
+        zero = Decimal("0.00")
+        rows = professional_metrics(
+            queryset.filter(tenant=request.user.tenant),
+            {
+                "total_commissions": Count("id"),
+                "total_paid": Sum("commission_amount", filter=Q(status="paid"), default=zero),
+                "total_pending": Sum("commission_amount", filter=Q(status="pending"), default=zero),
+                "total_cancelled": Sum("commission_amount", filter=Q(status="cancelled"), default=zero),
+                "count_paid": Count("id", filter=Q(status="paid")),
+                "count_pending": Count("id", filter=Q(status="pending")),
+                "count_cancelled": Count("id", filter=Q(status="cancelled")),
+            },
+            User.objects.filter(tenant=request.user.tenant),
+        )
         
         result = []
-        for professional in professionals:
-            # Comissões do profissional
-            prof_commissions = queryset.filter(professional=professional)
-            
-            total_commissions = prof_commissions.count()
-            
-            # Agregar por status
-            aggregates = prof_commissions.aggregate(
-                total_paid=Sum("commission_amount", filter=Q(status="paid"), default=Decimal("0.00")),
-                total_pending=Sum("commission_amount", filter=Q(status="pending"), default=Decimal("0.00")),
-                total_cancelled=Sum("commission_amount", filter=Q(status="cancelled"), default=Decimal("0.00")),
-                count_paid=Count("id", filter=Q(status="paid")),
-                count_pending=Count("id", filter=Q(status="pending")),
-                count_cancelled=Count("id", filter=Q(status="cancelled")),
-            )
-            
-            # Taxa de conclusão (pago vs total)
-            completion_rate = 0
-            if total_commissions > 0:
-                completion_rate = (aggregates["count_paid"] / total_commissions) * 100
-            
+        for professional, aggregates in rows:
             result.append({
-                "professional_id": str(professional.id),
-                "professional_name": professional.name,
-                "professional_email": professional.email,
-                "total_commissions": total_commissions,
+                "professional_id": str(professional["id"]),
+                "professional_name": professional["name"],
+                "professional_email": professional["email"],
+                "total_commissions": aggregates["total_commissions"],
                 "count_paid": aggregates["count_paid"],
                 "count_pending": aggregates["count_pending"],
                 "count_cancelled": aggregates["count_cancelled"],
                 "total_paid": float(aggregates["total_paid"]),
                 "total_pending": float(aggregates["total_pending"]),
                 "total_cancelled": float(aggregates["total_cancelled"]),
-                "completion_rate": round(completion_rate, 2),
+                # Taxa de conclusão (pago vs total)
+                "completion_rate": rate(aggregates["count_paid"], aggregates["total_commissions"]),
                 "total_amount": float(
                     aggregates["total_paid"] 
                     + aggregates["total_pending"] 
@@ -323,86 +336,3 @@ class CommissionViewSet(viewsets.ModelViewSet):
 
         serializer = self.get_serializer(commission)
         return Response(serializer.data)
-
-    @action(detail=False, methods=['get'])
-    def export_csv(self, request):
-        """Exporta comissões para CSV"""
-        import csv
-        from django.http import HttpResponse
-        
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename="comissoes.csv"'
-        response.write('\ufeff')  # BOM para UTF-8
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Data', 'Profissional', 'Tipo', 'Serviço/Produto', 
-            'Valor Base', 'Percentual', 'Valor Comissão', 'Status', 'Pago em'
-        ])
-        
-        for commission in queryset:
-            writer.writerow([
-                commission.date.strftime('%d/%m/%Y %H:%M'),
-                commission.professional.get_full_name(),
-                commission.get_commission_type_display(),
-                commission.service.name if commission.service else 
-                (commission.product.name if commission.product else '-'),
-                float(commission.base_value),
-                float(commission.commission_percentage),
-                float(commission.commission_value),
-                commission.get_status_display(),
-                commission.paid_at.strftime('%d/%m/%Y') if commission.paid_at else '-'
-            ])
-        
-        return response
-    
-    @action(detail=False, methods=['get'])
-    def export_excel(self, request):
-        """Exporta comissões para Excel"""
-        try:
-            from openpyxl import Workbook
-            from django.http import HttpResponse
-            
-            queryset = self.filter_queryset(self.get_queryset())
-            
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Comissões"
-            
-            # Cabeçalho
-            headers = [
-                'Data', 'Profissional', 'Tipo', 'Serviço/Produto',
-                'Valor Base', 'Percentual', 'Valor Comissão', 'Status', 'Pago em'
-            ]
-            ws.append(headers)
-            
-            # Dados
-            for commission in queryset:
-                ws.append([
-                    commission.date.strftime('%d/%m/%Y %H:%M'),
-                    commission.professional.get_full_name(),
-                    commission.get_commission_type_display(),
-                    commission.service.name if commission.service else 
-                    (commission.product.name if commission.product else '-'),
-                    float(commission.base_value),
-                    float(commission.commission_percentage),
-                    float(commission.commission_value),
-                    commission.get_status_display(),
-                    commission.paid_at.strftime('%d/%m/%Y') if commission.paid_at else '-'
-                ])
-            
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = 'attachment; filename="comissoes.xlsx"'
-            wb.save(response)
-            
-            return response
-        
-        except ImportError:
-            return Response(
-                {'error': 'Biblioteca openpyxl não instalada'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
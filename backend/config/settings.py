@@ -100,6 +100,7 @@ else:
 SENTRY_AUTH_TOKEN = config('SENTRY_AUTH_TOKEN', default='')
 SENTRY_ORG_SLUG = config('SENTRY_ORG_SLUG', default='')
 SENTRY_PROJECT_SLUG = config('SENTRY_PROJECT_SLUG', default='')
+SENTRY_API_URL = config('SENTRY_API_URL', default='https://sentry.io/api/0')
 
 # RAILWAY API CREDENTIALS (para Infrastructure Monitoring)
 # =============================================================================
@@ -108,6 +109,7 @@ RAILWAY_API_TOKEN = config('RAILWAY_API_TOKEN', default='')
 # UPTIMEROBOT API CREDENTIALS (para Uptime Monitoring)
 # =============================================================================
 UPTIMEROBOT_API_KEY = config('UPTIMEROBOT_API_KEY', default='')
+UPTIMEROBOT_API_URL = config('UPTIMEROBOT_API_URL', default='https://api.uptimerobot.com/v2')
 
 # =============================================================================# Application definition
 
@@ -151,6 +153,7 @@ INSTALLED_APPS = [
 SITE_ID = 1
 
 MIDDLEWARE = [
+    "system_health.middleware.RequestMetricsMiddleware",  # Latência e volume de requisições por worker
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",  # WhiteNoise - servir arquivos estáticos
     "corsheaders.middleware.CorsMiddleware",  # CORS - deve vir antes do CommonMiddleware
@@ -158,14 +161,15 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
-    "core.cache_middleware.CacheMiddleware",  # Cache inteligente de API responses
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "allauth.account.middleware.AccountMiddleware",  # Allauth middleware
+    "core.middleware.JWTAuthenticationMiddleware",  # Resolve o JWT antes dos middlewares de tenant
     "core.middleware.TenantMiddleware",  # Middleware personalizado para Multi-Tenant
     "core.middleware.SubscriptionMiddleware",  # Trial Guard - verifica status da assinatura
     "core.sentry_middleware.SentryContextMiddleware",  # Adiciona contexto ao Sentry
     "system_health.middleware.OnlineUsersMiddleware",  # Rastreia usuários online
+    "superadmin.middleware.ApiUsageMiddleware",  # Conta chamadas de API por tenant
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -257,7 +261,7 @@ AUTH_USER_MODEL = 'core.User'
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -346,6 +350,13 @@ if UPSTASH_REDIS_REST_URL and UPSTASH_REDIS_REST_TOKEN:
             'LOCATION': UPSTASH_REDIS_REST_URL,
             'OPTIONS': {
                 'CLIENT_CLASS': 'upstash_redis.Redis',
+                'TOKEN': UPSTASH_REDIS_REST_TOKEN,
+                # L1 em memória do processo na frente do Upstash (0 desabilita); é também
+                # o atraso máximo para um worker ver invalidações feitas por outro
+                'L1_TIMEOUT': config('CACHE_L1_TIMEOUT', default=1, cast=int),
+                'L1_MAX_ENTRIES': config('CACHE_L1_MAX_ENTRIES', default=1000, cast=int),
+                # Escritas fire-and-forget enviadas em lote por uma thread em background
+                'WRITE_BEHIND': config('CACHE_WRITE_BEHIND', default=False, cast=bool),
             }
         }
     }
@@ -358,6 +369,55 @@ else:
     }
     print("⚠️ Cache: LocMemCache (fallback)")
 
+# Cache de respostas da API (core.response_cache)
+# Invalidado por versão a cada alteração, então o TTL pode ser longo
+API_CACHE_TIMEOUT = config('API_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Presença de usuários online (system_health.presence)
+# Intervalo mínimo entre heartbeats do mesmo usuário em cada processo
+PRESENCE_HEARTBEAT_INTERVAL = config('PRESENCE_HEARTBEAT_INTERVAL', default=60, cast=int)
+
+# Métricas de infraestrutura (system_health.collector): cada worker grava uma amostra
+# a cada N segundos; o endpoint mostra os últimos HEALTH_HISTORY_MINUTES minutos
+HEALTH_SAMPLE_INTERVAL = config('HEALTH_SAMPLE_INTERVAL', default=15, cast=int)
+HEALTH_HISTORY_MINUTES = config('HEALTH_HISTORY_MINUTES', default=60, cast=int)
+
+# Chamadas de API por tenant (superadmin.usage): cada processo envia o buffer ao cache
+# no máximo a cada N segundos; refresh_platform_metrics grava em TenantUsageStats
+USAGE_FLUSH_INTERVAL = config('USAGE_FLUSH_INTERVAL', default=30, cast=int)
+
+# APIs externas dos painéis (core.external_api): servidas do cache e atualizadas em background
+# TTL de cada fonte na própria fonte; o valor antigo continua servido por até EXTERNAL_API_STALE_TTL
+EXTERNAL_API_TIMEOUT = config('EXTERNAL_API_TIMEOUT', default=5, cast=int)
+EXTERNAL_API_COLD_WAIT = config('EXTERNAL_API_COLD_WAIT', default=2, cast=float)
+EXTERNAL_API_STALE_TTL = config('EXTERNAL_API_STALE_TTL', default=24 * 60 * 60, cast=int)
+EXTERNAL_API_BREAKER_THRESHOLD = config('EXTERNAL_API_BREAKER_THRESHOLD', default=3, cast=int)
+EXTERNAL_API_BREAKER_COOLDOWN = config('EXTERNAL_API_BREAKER_COOLDOWN', default=60, cast=int)
+
+# Cache do usuário + tenant autenticados pelo JWT (core.authentication)
+# Invalidado ao salvar User/Tenant; o L1 de cada processo limita a defasagem entre processos
+AUTH_USER_CACHE_TIMEOUT = config('AUTH_USER_CACHE_TIMEOUT', default=60, cast=int)
+AUTH_USER_L1_TIMEOUT = config('AUTH_USER_L1_TIMEOUT', default=5, cast=int)
+
+# Efeitos colaterais dos signals de Sale/Appointment (core.side_effects)
+# 'inline': executados logo após o commit, no próprio request
+# 'outbox': gravados em OutboxEvent e executados por uma thread worker local
+SIDE_EFFECTS_MODE = config('SIDE_EFFECTS_MODE', default='inline')
+
+# Alertas de estoque baixo/zerado (notifications.fanout): o mesmo alerta do
+# mesmo produto não se repete dentro da janela (segundos)
+STOCK_ALERT_WINDOW = config('STOCK_ALERT_WINDOW', default=6 * 60 * 60, cast=int)
+
+# Horário de funcionamento padrão para a busca de horários livres (scheduling.availability)
+SCHEDULING_OPENING_HOURS = (
+    config('SCHEDULING_OPENING_TIME', default='08:00'),
+    config('SCHEDULING_CLOSING_TIME', default='20:00'),
+)
+
+# Por quantos dias os agendamentos excluídos ficam disponíveis para a sincronização da agenda
+# Cursores mais antigos recebem o snapshot completo (scheduling.sync)
+APPOINTMENT_TOMBSTONE_RETENTION_DAYS = config('APPOINTMENT_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
 # Email Configuration
 EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = config('EMAIL_HOST', default='smtp.gmail.com')
@@ -366,6 +426,8 @@ EMAIL_USE_TLS = config('EMAIL_USE_TLS', default=True, cast=bool)
 EMAIL_HOST_USER = config('EMAIL_HOST_USER', default='')
 EMAIL_HOST_PASSWORD = config('EMAIL_HOST_PASSWORD', default='')
 DEFAULT_FROM_EMAIL = config('DEFAULT_FROM_EMAIL', default='noreply@myerp.com')
+# Fila de envio (core.emails): máximo de emails por minuto em cada processo (0 = sem limite)
+EMAIL_RATE_LIMIT = config('EMAIL_RATE_LIMIT', default=120, cast=int)
 FRONTEND_URL = config('FRONTEND_URL', default='http://localhost:3000')
 
 # Django Allauth Configuration
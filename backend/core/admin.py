@@ -3,7 +3,7 @@ Admin customizado para Multi-Tenant
 """
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import Tenant, User
+from .models import OutboxEvent, QueuedEmail, Tenant, User
 
 
 @admin.register(Tenant)
@@ -58,3 +58,23 @@ class UserAdmin(BaseUserAdmin):
     )
     
     ordering = ['-created_at']
+
+
+@admin.register(OutboxEvent)
+class OutboxEventAdmin(admin.ModelAdmin):
+    """Admin para os efeitos pendentes/falhos do outbox"""
+    list_display = ['effect', 'model', 'object_id', 'status', 'attempts', 'created_at', 'processed_at']
+    list_filter = ['status', 'effect']
+    search_fields = ['object_id']
+    readonly_fields = ['created_at', 'processed_at', 'last_error']
+
+
+@admin.register(QueuedEmail)
+class QueuedEmailAdmin(admin.ModelAdmin):
+    """Admin para a fila de envio de emails"""
+    list_display = ['template', 'to', 'subject', 'status', 'attempts', 'created_at', 'sent_at']
+    list_filter = ['status', 'template']
+    search_fields = ['to']
+    # O corpo pode conter a senha temporária do convite: nunca exibido nem editável
+    exclude = ['body_text', 'body_html']
+    readonly_fields = ['template', 'to', 'subject', 'created_at', 'sent_at', 'last_error']
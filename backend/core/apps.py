@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "core"
+
+    def ready(self):
+        """Conecta a invalidação dos caches de respostas da API e de autenticação"""
+        from core import authentication, response_cache
+        response_cache.connect_signals()
+        authentication.connect_signals()
@@ -0,0 +1,162 @@
+"""
+Autenticação JWT com cache do usuário e do tenant
+
+O JWTAuthentication do simplejwt busca o User a cada requisição e depois o tenant
+é carregado de novo (lazy) pelas permissões, viewsets e middlewares. Aqui o par
+usuário + tenant é lido com uma única query (select_related) e guardado:
+- no cache local do processo (LRU com TTL curto, AUTH_USER_L1_TIMEOUT)
+- no cache compartilhado (AUTH_USER_CACHE_TIMEOUT)
+
+O cache guarda só JSON com os campos não secretos do usuário e do tenant e a
+impressão do hash da senha (verificação de token revogado); senha e senha do
+certificado ficam adiadas e só são lidas do banco se alguém acessá-las. Nada é
+desserializado com pickle, então quem escreve no cache compartilhado não executa
+código aqui. Cada leitura monta objetos novos (from_db), então alterações em
+request.user não vazam para outras requisições. Salvar/excluir User ou Tenant
+invalida as chaves após o commit; o L1 de outros processos expira pelo TTL.
+
+A autenticação é resolvida uma vez por requisição: JWTAuthenticationMiddleware
+autentica antes dos middlewares de tenant/assinatura e a view do DRF reaproveita
+o resultado guardado na requisição.
+"""
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache_backend import LocalLRU
+
+CACHE_PREFIX = 'auth_user'
+
+# Campos que nunca vão para o cache (ficam adiados nos objetos montados)
+SECRET_FIELDS = {'password', 'certificate_password'}
+
+_local = LocalLRU(
+    getattr(settings, 'AUTH_USER_L1_MAX_ENTRIES', 1000),
+    getattr(settings, 'AUTH_USER_L1_TIMEOUT', 5),
+)
+
+
+def cache_key(user_id):
+    return f'{CACHE_PREFIX}:{user_id}'
+
+
+def _dump(instance):
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if field.attname in SECRET_FIELDS:
+            continue
+        value = getattr(instance, field.attname)
+        values[field.attname] = value.name if isinstance(value, FieldFile) else value
+    # str mantém a precisão de datas (microssegundos) e UUIDs; to_python converte de volta
+    return values
+
+
+def _build(model, values):
+    fields = [field for field in model._meta.concrete_fields if field.attname in values]
+    return model.from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in fields],
+        [field.to_python(values[field.attname]) for field in fields],
+    )
+
+
+def serialize_user(user):
+    """JSON do usuário + tenant para o cache (sem senha)"""
+    return json.dumps({
+        'user': _dump(user),
+        'tenant': _dump(user.tenant) if user.tenant_id else None,
+        'password_hash': get_md5_hash_password(user.password),
+    }, default=str)
+
+
+def deserialize_user(payload):
+    """Usuário (com tenant) montado a partir de serialize_user"""
+    data = json.loads(payload)
+    user = _build(get_user_model(), data['user'])
+    if data['tenant'] is not None:
+        user.tenant = _build(user._meta.get_field('tenant').related_model, data['tenant'])
+    user._password_hash = data['password_hash']
+    return user
+
+
+def load_user(user_id):
+    """Usuário com o tenant já carregado, ou None se não existir"""
+    key = cache_key(user_id)
+    found, payload = _local.get(key)
+    if not found:
+        payload = cache.get(key)
+        if not isinstance(payload, str):
+            user = get_user_model().objects.select_related('tenant').filter(
+                **{api_settings.USER_ID_FIELD: user_id}
+            ).first()
+            if user is None:
+                return None
+            payload = serialize_user(user)
+            cache.set(key, payload, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60))
+        _local.set(key, payload)
+    return deserialize_user(payload)
+
+
+def invalidate_users(user_ids):
+    """Remove os usuários dos caches local e compartilhado"""
+    keys = [cache_key(user_id) for user_id in user_ids]
+    if keys:
+        _local.delete(*keys)
+        cache.delete_many(keys)
+
+
+def _invalidate_user(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_users([instance.pk]))
+
+
+def _invalidate_tenant(sender, instance, **kwargs):
+    user_ids = list(get_user_model().objects.filter(tenant_id=instance.pk).values_list('pk', flat=True))
+    transaction.on_commit(lambda: invalidate_users(user_ids))
+
+
+def connect_signals():
+    """Conecta os signals de invalidação (chamado em CoreConfig.ready)"""
+    for name, signal in (('save', post_save), ('delete', post_delete)):
+        signal.connect(_invalidate_user, sender=settings.AUTH_USER_MODEL, dispatch_uid=f'auth_cache_user_{name}')
+        signal.connect(_invalidate_tenant, sender='core.Tenant', dispatch_uid=f'auth_cache_tenant_{name}')
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication com usuário + tenant em cache e resolvido uma vez por requisição"""
+
+    def authenticate(self, request):
+        # A view do DRF recebe o HttpRequest original em request._request
+        http_request = getattr(request, '_request', request)
+        if not hasattr(http_request, '_jwt_authentication'):
+            http_request._jwt_authentication = super().authenticate(request)
+        return http_request._jwt_authentication
+
+    def get_user(self, validated_token):
+        """Mesmas verificações do simplejwt, com o usuário vindo de load_user()"""
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_('Token contained no recognizable user identification')) from e
+
+        user = load_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != user._password_hash:
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
@@ -1,169 +1,467 @@
 """
 Backend de cache customizado para Upstash Redis REST API
 Funciona em ambientes serverless onde conexões TCP podem falhar
+
+Cada comando é uma ida HTTPS ao Upstash, então o backend evita round-trips:
+- get_many/set_many/delete_many usam MGET, pipeline e DEL com várias chaves
+- L1 opcional: LRU em memória do processo com TTL curto na frente do Upstash
+- Write-behind opcional: escritas fire-and-forget enfileiradas e enviadas
+  em lote (pipeline) por uma thread em background
+
+OPTIONS (settings.CACHES['default']['OPTIONS']):
+- TOKEN: token REST (padrão: env UPSTASH_REDIS_REST_TOKEN)
+- L1_TIMEOUT: segundos que uma chave fica no L1 (0 desabilita, padrão 1).
+  O L1 é local de cada processo: uma alteração feita por outro worker (ex.: a
+  troca de geração do core.response_cache) só é vista aqui depois desse prazo
+- L1_MAX_ENTRIES: tamanho máximo do L1 (padrão 1000)
+- WRITE_BEHIND: envia set/delete em background (padrão False)
+- WRITE_BEHIND_BATCH: máximo de comandos por pipeline (padrão 100)
+
+Timeouts seguem o RedisCache do Django: segundos relativos (EX), None sem
+expiração e 0 remove a chave.
 """
-from django.core.cache.backends.base import BaseCache
+from django.core import signing
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
 from upstash_redis import Redis
 from decouple import config
+from collections import OrderedDict
+import atexit
+import base64
 import json
 import logging
+import pickle
+import queue
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
+# Prefixo dos valores que não são serializáveis em JSON (JSON nunca começa com "p")
+PICKLE_PREFIX = 'p:'
+
+# O Redis é compartilhado: pickle só é desserializado com assinatura válida (SECRET_KEY)
+_pickle_signer = signing.Signer(salt='core.cache_backend.pickle')
+
+
+def encode_value(value):
+    """
+    Serializa o valor para string
+    JSON quando o valor volta idêntico (inteiros viram "42", então INCRBY funciona);
+    pickle assinado para o resto (tuplas, dicts com chaves não-string, objetos)
+    """
+    try:
+        encoded = json.dumps(value, separators=(',', ':'))
+        if json.loads(encoded) == value:
+            return encoded
+    except (TypeError, ValueError):
+        pass
+    return PICKLE_PREFIX + _pickle_signer.sign(base64.b64encode(pickle.dumps(value)).decode('ascii'))
+
+
+def decode_value(raw):
+    """
+    Desserializa valor gravado por encode_value (strings antigas são devolvidas como estão)
+    Pickle sem assinatura válida é tratado como ausente (None)
+    """
+    if raw is None or not isinstance(raw, str):
+        return raw
+    if raw.startswith(PICKLE_PREFIX):
+        try:
+            payload = _pickle_signer.unsign(raw[len(PICKLE_PREFIX):])
+        except signing.BadSignature:
+            logger.warning("Cache: valor pickle sem assinatura válida ignorado")
+            return None
+        return pickle.loads(base64.b64decode(payload))
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+class LocalLRU:
+    """
+    Cache L1 em memória do processo (LRU com TTL curto)
+    Evita idas ao Upstash para chaves lidas várias vezes na mesma janela
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Retorna (encontrado, valor)"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return False, None
+            self._data.move_to_end(key)
+            return True, value
+
+    def set(self, key, value, timeout=None, version=None):
+        ttl = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class WriteBehindQueue:
+    """
+    Fila de escritas assíncronas
+    Uma thread daemon drena a fila e envia os comandos em lote via pipeline
+    """
+
+    def __init__(self, client, batch_size=100, max_size=10000):
+        self._client = client
+        self._batch_size = batch_size
+        self._max_size = max_size
+        self._queue = queue.Queue(maxsize=max_size)
+        self._put_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='upstash-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def put_many(self, commands):
+        """
+        Enfileira todos os comandos ou nenhum; retorna False se não couberem
+        Parte enfileirada + envio síncrono do resto duplicaria comandos não
+        idempotentes (HINCRBY, LPUSH)
+        """
+        with self._put_lock:
+            # Só produtores aumentam a fila (sob o lock): o espaço verificado não diminui
+            if self._queue.qsize() + len(commands) > self._max_size:
+                return False
+            for command in commands:
+                self._queue.put_nowait(command)
+            return True
+
+    def _drain(self, first=None):
+        commands = [first] if first is not None else []
+        while len(commands) < self._batch_size:
+            try:
+                commands.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return commands
+
+    def _send(self, commands):
+        if not commands:
+            return
+        try:
+            pipeline = self._client.pipeline()
+            for command in commands:
+                pipeline.execute(command)
+            pipeline.exec()
+        except Exception as e:
+            logger.error(f"Cache write-behind error ({len(commands)} comandos perdidos): {e}")
+
+    def _run(self):
+        while True:
+            self._send(self._drain(self._queue.get()))
+
+    def flush(self):
+        """Envia tudo que estiver na fila (chamado no shutdown do processo)"""
+        while not self._queue.empty():
+            self._send(self._drain())
+
 
 class UpstashRedisCache(BaseCache):
     """
     Cache backend usando Upstash Redis REST API
     Suporta ambientes serverless sem conexões TCP persistentes
     """
-    
+
     def __init__(self, location, params):
         super().__init__(params)
-        
+        options = params.get('OPTIONS', {})
+
         # Pega a URL REST do Upstash (formato: https://xxx.upstash.io)
-        rest_url = config('UPSTASH_REDIS_REST_URL', default='')
-        rest_token = config('UPSTASH_REDIS_REST_TOKEN', default='')
-        
+        rest_url = location or config('UPSTASH_REDIS_REST_URL', default='')
+        rest_token = options.get('TOKEN') or config('UPSTASH_REDIS_REST_TOKEN', default='')
+
+        l1_timeout = options.get('L1_TIMEOUT', 1)
+        self._l1 = LocalLRU(options.get('L1_MAX_ENTRIES', 1000), l1_timeout) if l1_timeout else None
+        self._write_behind = None
+
         if not rest_url or not rest_token:
             logger.warning("Upstash Redis REST não configurado. Cache desabilitado.")
             self._client = None
             return
-        
+
         try:
             self._client = Redis(url=rest_url, token=rest_token)
             logger.info("✅ Upstash Redis REST conectado com sucesso")
         except Exception as e:
             logger.error(f"❌ Erro ao conectar Upstash Redis: {e}")
             self._client = None
-    
-    def add(self, key, value, timeout=None):
+            return
+
+        if options.get('WRITE_BEHIND'):
+            self._write_behind = WriteBehindQueue(
+                self._client,
+                batch_size=options.get('WRITE_BEHIND_BATCH', 100)
+            )
+
+    @property
+    def client(self):
+        """Cliente Upstash (None se o cache estiver desabilitado)"""
+        return self._client
+
+    def send_commands(self, commands):
+        """
+        Envia comandos Redis brutos (ex.: ['ZADD', key, score, member]) sem aguardar resposta
+        Respeita o write-behind; as chaves não recebem o prefixo do make_key
+        """
+        if not self._client or not commands:
+            return False
+
+        try:
+            self._write(commands)
+            return True
+        except Exception as e:
+            logger.error(f"Cache send_commands error: {e}")
+            return False
+
+    def get_backend_timeout(self, timeout=DEFAULT_TIMEOUT):
+        """
+        Segundos relativos para o EX (o BaseCache retorna um instante absoluto)
+        None: sem expiração; 0: expira já (a chave é removida)
+        """
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else max(0, int(timeout))
+
+    def _set_command(self, key, value, timeout):
+        if timeout == 0:
+            return ['DEL', key]
+        command = ['SET', key, encode_value(value)]
+        if timeout is not None:
+            command += ['EX', timeout]
+        return command
+
+    def _l1_set(self, key, value, timeout):
+        if timeout == 0:
+            self._l1.delete(key)
+        else:
+            self._l1.set(key, value, timeout)
+
+    def _write(self, commands):
+        """Envia comandos de escrita: fila write-behind, ou pipeline síncrono"""
+        if self._write_behind and self._write_behind.put_many(commands):
+            return
+        if len(commands) == 1:
+            self._client.execute(commands[0])
+            return
+        pipeline = self._client.pipeline()
+        for command in commands:
+            pipeline.execute(command)
+        pipeline.exec()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
         """Adiciona apenas se a chave não existir"""
         if not self._client:
             return False
-        
+
         try:
-            key = self.make_key(key)
+            key = self.make_key(key, version=version)
             timeout = self.get_backend_timeout(timeout)
-            
-            # Serializa para JSON (upstash-redis faz isso automaticamente)
+
             # ex=None significa sem expiração, mas o upstash precisa de int ou omitir
             if timeout:
-                result = self._client.set(key, value, nx=True, ex=int(timeout))
+                result = self._client.set(key, encode_value(value), nx=True, ex=timeout)
             else:
-                result = self._client.set(key, value, nx=True)
-            return result is not None
+                result = self._client.set(key, encode_value(value), nx=True)
+                if result and timeout == 0:
+                    # Como no RedisCache: adiciona e expira na hora
+                    self._client.delete(key)
+
+            if result and self._l1:
+                self._l1_set(key, value, timeout)
+            return bool(result)
         except Exception as e:
             logger.error(f"Cache add error: {e}")
             return False
-    
-    def get(self, key, default=None):
+
+    def get(self, key, default=None, version=None):
         """Recupera valor do cache"""
         if not self._client:
             return default
-        
+
         try:
-            key = self.make_key(key)
-            value = self._client.get(key)
-            
+            key = self.make_key(key, version=version)
+
+            if self._l1:
+                found, value = self._l1.get(key)
+                if found:
+                    return value
+
+            value = decode_value(self._client.get(key))
+
             if value is None:
                 return default
-            
-            # upstash-redis já desserializa do JSON automaticamente
+
+            if self._l1:
+                self._l1.set(key, value)
             return value
         except Exception as e:
             logger.error(f"Cache get error: {e}")
             return default
-    
-    def set(self, key, value, timeout=None):
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
         """Define valor no cache"""
         if not self._client:
             return False
-        
+
         try:
-            key = self.make_key(key)
+            key = self.make_key(key, version=version)
             timeout = self.get_backend_timeout(timeout)
-            
-            # upstash-redis serializa para JSON automaticamente
-            # ex=None significa sem expiração, mas o upstash precisa de int ou omitir
-            if timeout:
-                self._client.set(key, value, ex=int(timeout))
-            else:
-                self._client.set(key, value)
+
+            if self._l1:
+                self._l1_set(key, value, timeout)
+            self._write([self._set_command(key, value, timeout)])
             return True
         except Exception as e:
             logger.error(f"Cache set error: {e}")
             return False
-    
-    def delete(self, key):
+
+    def delete(self, key, version=None):
         """Remove chave do cache"""
         if not self._client:
             return False
-        
+
         try:
-            key = self.make_key(key)
-            self._client.delete(key)
+            key = self.make_key(key, version=version)
+            if self._l1:
+                self._l1.delete(key)
+            self._write([['DEL', key]])
             return True
         except Exception as e:
             logger.error(f"Cache delete error: {e}")
             return False
-    
+
     def clear(self):
         """Limpa todo o cache"""
         if not self._client:
             return False
-        
+
         try:
+            if self._l1:
+                self._l1.clear()
             self._client.flushdb()
             return True
         except Exception as e:
             logger.error(f"Cache clear error: {e}")
             return False
-    
-    def get_many(self, keys):
-        """Recupera múltiplos valores"""
+
+    def get_many(self, keys, version=None):
+        """Recupera múltiplos valores (L1 + um único MGET para o restante)"""
         if not self._client:
             return {}
-        
+
         try:
-            keys_map = {self.make_key(k): k for k in keys}
-            values = self._client.mget(list(keys_map.keys()))
-            
+            keys_map = {self.make_key(k, version=version): k for k in keys}
             result = {}
-            for i, value in enumerate(values):
-                if value is not None:
-                    original_key = keys_map[list(keys_map.keys())[i]]
-                    # upstash-redis já desserializa do JSON automaticamente
+            missing = []
+
+            for key, original_key in keys_map.items():
+                found, value = self._l1.get(key) if self._l1 else (False, None)
+                if found:
                     result[original_key] = value
-            
+                else:
+                    missing.append(key)
+
+            if missing:
+                values = self._client.mget(*missing)
+                for key, raw in zip(missing, values):
+                    value = decode_value(raw)
+                    if value is not None:
+                        result[keys_map[key]] = value
+                        if self._l1:
+                            self._l1.set(key, value)
+
             return result
         except Exception as e:
             logger.error(f"Cache get_many error: {e}")
             return {}
-    
-    def has_key(self, key):
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """Define múltiplos valores em um único pipeline"""
+        if not self._client:
+            return list(data)
+
+        try:
+            timeout = self.get_backend_timeout(timeout)
+            commands = []
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                if self._l1:
+                    self._l1_set(key, value, timeout)
+                commands.append(self._set_command(key, value, timeout))
+
+            if commands:
+                self._write(commands)
+            return []
+        except Exception as e:
+            logger.error(f"Cache set_many error: {e}")
+            return list(data)
+
+    def delete_many(self, keys, version=None):
+        """Remove múltiplas chaves com um único DEL"""
+        if not self._client:
+            return
+
+        try:
+            keys = [self.make_key(k, version=version) for k in keys]
+            if not keys:
+                return
+            if self._l1:
+                self._l1.delete(*keys)
+            self._write([['DEL', *keys]])
+        except Exception as e:
+            logger.error(f"Cache delete_many error: {e}")
+
+    def has_key(self, key, version=None):
         """Verifica se chave existe"""
         if not self._client:
             return False
-        
+
         try:
-            key = self.make_key(key)
+            key = self.make_key(key, version=version)
             return self._client.exists(key) > 0
         except Exception as e:
             logger.error(f"Cache has_key error: {e}")
             return False
-    
-    def incr(self, key, delta=1):
+
+    def incr(self, key, delta=1, version=None):
         """Incrementa valor numérico"""
         if not self._client:
             raise ValueError("Cache backend not available")
-        
+
         try:
-            key = self.make_key(key)
+            key = self.make_key(key, version=version)
+            if self._l1:
+                self._l1.delete(key)
             return self._client.incrby(key, delta)
         except Exception as e:
             logger.error(f"Cache incr error: {e}")
             raise ValueError("Key not found or not an integer")
-    
-    def decr(self, key, delta=1):
+
+    def decr(self, key, delta=1, version=None):
         """Decrementa valor numérico"""
-        return self.incr(key, -delta)
+        return self.incr(key, -delta, version=version)
@@ -1,16 +1,170 @@
 """
 Funções de envio de email
+
+Os emails não são mais enviados dentro do request: send_invite_email e
+send_appointment_confirmation_email renderizam os templates (core/templates/emails,
+compilados uma vez por processo pelo loader em cache do Django) e gravam a
+mensagem em QueuedEmail. Depois do commit, uma thread worker local envia a fila
+em lotes por uma única conexão (get_connection), respeitando EMAIL_RATE_LIMIT.
+Falhas voltam para a fila com backoff; o command send_queued_emails processa
+o que ficar pendente (ex.: processo reiniciado).
+
+O corpo renderizado só fica no banco até o email sair da fila: é apagado no envio
+e, nos templates com segredos (o convite leva a senha temporária), também na
+falha definitiva. Esses emails não podem ser reenviados com --retry-failed; o
+convite precisa ser refeito.
 """
-from django.core.mail import send_mail
+import logging
+import threading
+import time
+from datetime import timedelta
+
 from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
 from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.utils import timezone
+
+from core.workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+# Reserva de um lote enquanto ele é enviado
+LEASE_MINUTES = 10
+# Varredura periódica para emails aguardando backoff
+POLL_SECONDS = 60
+# Templates com segredos no corpo: apagado também quando o email falha de vez
+SECRET_TEMPLATES = {'invite'}
+
+
+def enqueue(template, to, subject, context):
+    """
+    Renderiza emails/<template>.txt e .html e grava na fila
+    O worker é acordado após o commit
+    """
+    from core.models import QueuedEmail
+
+    email = QueuedEmail.objects.create(
+        template=template,
+        to=to,
+        subject=subject,
+        body_text=render_to_string(f'emails/{template}.txt', context).strip(),
+        body_html=render_to_string(f'emails/{template}.html', context),
+    )
+    transaction.on_commit(worker.notify)
+    return email
+
+
+def backoff(attempts):
+    """Espera antes da próxima tentativa: 1 min, 2 min, 4 min... até 1 hora"""
+    return timedelta(seconds=min(60 * 2 ** (attempts - 1), 3600))
+
+
+class RateLimiter:
+    """Espaça os envios do processo para no máximo EMAIL_RATE_LIMIT por minuto (0 = sem limite)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_send = 0.0
+
+    def wait(self):
+        rate = settings.EMAIL_RATE_LIMIT
+        if not rate:
+            return
+        with self._lock:
+            delay = self._last_send + 60 / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._last_send = time.monotonic()
+
+
+rate_limiter = RateLimiter()
+
+
+def _claim(batch_size, now):
+    from core.models import QueuedEmail
+
+    with transaction.atomic():
+        emails = list(
+            QueuedEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=QueuedEmail.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if emails:
+            # Reserva o lote enquanto envia (outro worker não pega os mesmos)
+            QueuedEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=now + timedelta(minutes=LEASE_MINUTES)
+            )
+    return emails
+
+
+def send_queued(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+    """Envia os emails pendentes em lotes por uma única conexão; retorna o total enviado"""
+    from core.models import QueuedEmail
+
+    if settings.EMAIL_RATE_LIMIT:
+        # Com o rate limit o lote tem que caber em metade da reserva; senão outro
+        # worker pega os mesmos emails antes do fim do envio e manda de novo
+        batch_size = max(1, min(batch_size, settings.EMAIL_RATE_LIMIT * LEASE_MINUTES // 2))
+
+    sent = 0
+    connection = get_connection()
+    try:
+        while True:
+            now = timezone.now()
+            emails = _claim(batch_size, now)
+            if not emails:
+                return sent
+
+            for email in emails:
+                rate_limiter.wait()
+                message = EmailMultiAlternatives(
+                    subject=email.subject,
+                    body=email.body_text,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    to=[email.to],
+                    connection=connection,
+                )
+                message.attach_alternative(email.body_html, 'text/html')
+                email.attempts += 1
+                try:
+                    connection.open()
+                    message.send()
+                except Exception as e:
+                    logger.warning(f"Falha ao enviar email {email.id} para {email.to}: {e}")
+                    email.last_error = str(e)
+                    if email.attempts >= max_attempts:
+                        email.status = QueuedEmail.STATUS_FAILED
+                        if email.template in SECRET_TEMPLATES:
+                            email.body_text = email.body_html = ''
+                    else:
+                        email.next_attempt_at = now + backoff(email.attempts)
+                    # A conexão pode ter caído: a próxima mensagem reconecta
+                    connection.close()
+                else:
+                    email.status = QueuedEmail.STATUS_SENT
+                    email.sent_at = timezone.now()
+                    email.last_error = ''
+                    email.body_text = email.body_html = ''
+                    sent += 1
+
+            QueuedEmail.objects.bulk_update(
+                emails, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at', 'body_text', 'body_html']
+            )
+    finally:
+        connection.close()
+
+
+# Envia a fila após cada email enfileirado e a cada POLL_SECONDS (emails aguardando backoff)
+worker = BackgroundWorker('mail-queue', lambda: send_queued(), poll_seconds=POLL_SECONDS)
 
 
 def send_invite_email(user_email, user_name, temporary_password, company_name, invited_by_name):
     """
-    Envia email de convite para novo usuário
-    
+    Enfileira email de convite para novo usuário
+
     Args:
         user_email: Email do novo usuário
         user_name: Nome do novo usuário
@@ -18,9 +172,6 @@ def send_invite_email(user_email, user_name, temporary_password, company_name, i
         company_name: Nome da empresa
         invited_by_name: Nome de quem convidou
     """
-    subject = f'Você foi convidado para {company_name}'
-    
-    # Contexto para o template
     context = {
         'user_name': user_name,
         'company_name': company_name,
@@ -29,185 +180,49 @@ def send_invite_email(user_email, user_name, temporary_password, company_name, i
         'temporary_password': temporary_password,
         'login_url': f"{settings.FRONTEND_URL}/login",
     }
-    
-    # Mensagem HTML
-    html_message = f"""
-    <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #2563eb;">Bem-vindo ao {company_name}!</h2>
-                
-                <p>Olá <strong>{user_name}</strong>,</p>
-                
-                <p>{invited_by_name} convidou você para fazer parte da equipe no sistema ERP.</p>
-                
-                <div style="background-color: #f3f4f6; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h3 style="margin-top: 0;">Suas credenciais de acesso:</h3>
-                    <p style="margin: 10px 0;">
-                        <strong>Email:</strong> {user_email}<br>
-                        <strong>Senha temporária:</strong> <code style="background-color: #e5e7eb; padding: 4px 8px; border-radius: 4px;">{temporary_password}</code>
-                    </p>
-                </div>
-                
-                <p>
-                    <a href="{context['login_url']}" 
-                       style="display: inline-block; background-color: #2563eb; color: white; padding: 12px 24px; text-decoration: none; border-radius: 6px; font-weight: bold;">
-                        Acessar Sistema
-                    </a>
-                </p>
-                
-                <p style="color: #dc2626; font-size: 14px;">
-                    <strong>⚠️ Importante:</strong> Por segurança, altere sua senha no primeiro acesso.
-                </p>
-                
-                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
-                
-                <p style="color: #6b7280; font-size: 12px;">
-                    Este é um email automático. Se você não esperava este convite, pode ignorá-lo.
-                </p>
-            </div>
-        </body>
-    </html>
-    """
-    
-    # Versão texto puro
-    plain_message = f"""
-Bem-vindo ao {company_name}!
 
-Olá {user_name},
-
-{invited_by_name} convidou você para fazer parte da equipe no sistema ERP.
-
-Suas credenciais de acesso:
-- Email: {user_email}
-- Senha temporária: {temporary_password}
-
-Acesse: {context['login_url']}
-
-⚠️ Importante: Por segurança, altere sua senha no primeiro acesso.
-
----
-Este é um email automático. Se você não esperava este convite, pode ignorá-lo.
-    """
-    
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[user_email],
-            html_message=html_message,
-            fail_silently=False,
-        )
+        enqueue('invite', user_email, f'Você foi convidado para {company_name}', context)
         return True
     except Exception as e:
-        print(f"Erro ao enviar email: {str(e)}")
+        logger.error(f"Erro ao enfileirar email de convite: {e}")
         return False
 
 
 def send_appointment_confirmation_email(appointment):
     """
-    Envia email de confirmação de agendamento
-    
+    Enfileira email de confirmação de agendamento
+
     Args:
         appointment: Objeto Appointment
     """
-    from django.utils import timezone
-    from datetime import datetime
-    
     # Só envia se tiver email do cliente
     if not appointment.customer_email:
         return False
-    
-    subject = f'Agendamento Confirmado - {appointment.tenant.company_name}'
-    
+
     # Formata data e hora
     start_time = appointment.start_time
     if timezone.is_aware(start_time):
         start_time = timezone.localtime(start_time)
-    
-    date_formatted = start_time.strftime('%d/%m/%Y')
-    time_formatted = start_time.strftime('%H:%M')
-    
+
     context = {
         'customer_name': appointment.customer_name,
         'company_name': appointment.tenant.company_name,
         'service_name': appointment.service.name if appointment.service else 'Serviço',
         'professional_name': appointment.professional.name if appointment.professional else 'Profissional',
-        'date': date_formatted,
-        'time': time_formatted,
+        'date': start_time.strftime('%d/%m/%Y'),
+        'time': start_time.strftime('%H:%M'),
         'price': f'R$ {appointment.price:.2f}' if appointment.price else 'A combinar',
     }
-    
-    html_message = f"""
-    <html>
-        <body style="font-family: Arial, sans-serif; line-height: 1.6; color: #333;">
-            <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                <h2 style="color: #10b981;">✅ Agendamento Confirmado!</h2>
-                
-                <p>Olá <strong>{context['customer_name']}</strong>,</p>
-                
-                <p>Seu agendamento foi confirmado com sucesso!</p>
-                
-                <div style="background-color: #f0fdf4; padding: 20px; border-left: 4px solid #10b981; margin: 20px 0;">
-                    <h3 style="margin-top: 0; color: #059669;">Detalhes do Agendamento:</h3>
-                    <p style="margin: 8px 0;"><strong>Serviço:</strong> {context['service_name']}</p>
-                    <p style="margin: 8px 0;"><strong>Profissional:</strong> {context['professional_name']}</p>
-                    <p style="margin: 8px 0;"><strong>Data:</strong> {context['date']}</p>
-                    <p style="margin: 8px 0;"><strong>Horário:</strong> {context['time']}</p>
-                    <p style="margin: 8px 0;"><strong>Valor:</strong> {context['price']}</p>
-                </div>
-                
-                <p style="color: #6b7280; font-size: 14px;">
-                    Em caso de imprevistos, entre em contato com antecedência para reagendar.
-                </p>
-                
-                <p>Aguardamos você!</p>
-                <p><strong>{context['company_name']}</strong></p>
-                
-                <hr style="border: none; border-top: 1px solid #e5e7eb; margin: 30px 0;">
-                
-                <p style="color: #6b7280; font-size: 12px;">
-                    Este é um email automático de confirmação.
-                </p>
-            </div>
-        </body>
-    </html>
-    """
-    
-    plain_message = f"""
-✅ Agendamento Confirmado!
-
-Olá {context['customer_name']},
 
-Seu agendamento foi confirmado com sucesso!
-
-Detalhes do Agendamento:
-- Serviço: {context['service_name']}
-- Profissional: {context['professional_name']}
-- Data: {context['date']}
-- Horário: {context['time']}
-- Valor: {context['price']}
-
-Em caso de imprevistos, entre em contato com antecedência para reagendar.
-
-Aguardamos você!
-{context['company_name']}
-
----
-Este é um email automático de confirmação.
-    """
-    
     try:
-        send_mail(
-            subject=subject,
-            message=plain_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[appointment.customer_email],
-            html_message=html_message,
-            fail_silently=True,  # Não falha se email não enviar
+        enqueue(
+            'appointment_confirmation',
+            appointment.customer_email,
+            f'Agendamento Confirmado - {appointment.tenant.company_name}',
+            context
         )
         return True
     except Exception as e:
-        print(f"Erro ao enviar email de confirmação: {str(e)}")
+        logger.error(f"Erro ao enfileirar email de confirmação: {e}")
         return False
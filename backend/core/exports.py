@@ -0,0 +1,171 @@
+"""
+Exportação de listagens em CSV e Excel (XLSX) com streaming
+
+Cada ViewSet declara apenas as colunas; o mixin cria as actions export_csv e
+export_excel. As linhas vêm de .values_list().iterator(), sem instanciar models
+nem manter o queryset inteiro em memória:
+- CSV: StreamingHttpResponse, gerado enquanto é enviado
+- XLSX: openpyxl em modo write-only, gravado em arquivo temporário e enviado
+  com FileResponse
+
+Uso:
+    class ProductViewSet(ExportMixin, viewsets.ModelViewSet):
+        export_filename = 'produtos'
+        export_sheet_title = 'Produtos'
+        export_columns = [
+            ExportColumn('Nome', 'name', width=30),
+            ExportColumn('Preço', 'sale_price'),
+            ExportColumn('Ativo', 'is_active', yes_no),
+        ]
+"""
+import csv
+import tempfile
+from datetime import datetime
+from decimal import Decimal
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
+from openpyxl.utils import get_column_letter
+from rest_framework.decorators import action
+
+EXPORT_CHUNK_SIZE = 2000
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class ExportColumn:
+    """
+    Coluna da exportação
+    `fields`: um campo (ou tupla de campos) do values_list, com lookups (ex.: 'customer__name')
+    `format`: recebe os valores dos campos e retorna o valor da célula
+    """
+
+    def __init__(self, header, fields, format=None, width=None):
+        self.header = header
+        self.fields = (fields,) if isinstance(fields, str) else tuple(fields)
+        self.format = format
+        self.width = width
+
+
+# Formatadores comuns
+
+def date_br(value):
+    # Datetimes (ex.: paid_at) vêm em UTC: a data exibida é a do fuso do sistema
+    if isinstance(value, datetime):
+        value = timezone.localtime(value)
+    return value.strftime('%d/%m/%Y') if value else '-'
+
+
+def datetime_br(value):
+    # values_list traz datetimes em UTC; exibe no fuso do sistema
+    return timezone.localtime(value).strftime('%d/%m/%Y %H:%M') if value else '-'
+
+
+def currency_br(value):
+    return f'R$ {value:.2f}'
+
+
+def yes_no(value):
+    return 'Sim' if value else 'Não'
+
+
+def or_dash(value):
+    return value or '-'
+
+
+def choice_display(choices, default='-'):
+    labels = dict(choices)
+    return lambda value: labels.get(value, value) if value else default
+
+
+class Echo:
+    """Buffer que apenas devolve o que recebe (csv.writer -> generator)"""
+
+    def write(self, value):
+        return value
+
+
+class ExportMixin:
+    """
+    Mixin para ViewSets: actions export_csv e export_excel a partir de export_columns
+    Respeita os filtros da listagem (filter_queryset)
+    """
+    export_columns = ()
+    export_filename = 'exportacao'
+    export_sheet_title = 'Dados'
+    export_chunk_size = EXPORT_CHUNK_SIZE
+
+    def get_export_queryset(self):
+        # Prefetches da listagem não se aplicam ao values_list
+        return self.filter_queryset(self.get_queryset()).prefetch_related(None)
+
+    def iter_export_rows(self):
+        """Linhas já formatadas, lidas do banco em blocos de export_chunk_size"""
+        columns = self.export_columns
+        fields = [field for column in columns for field in column.fields]
+        # Posição dos campos de cada coluna dentro da tupla do values_list
+        slices = []
+        start = 0
+        for column in columns:
+            slices.append((column, start, start + len(column.fields)))
+            start += len(column.fields)
+
+        rows = self.get_export_queryset().values_list(*fields).iterator(
+            chunk_size=self.export_chunk_size
+        )
+        for row in rows:
+            yield [
+                column.format(*row[begin:end]) if column.format else row[begin]
+                for column, begin, end in slices
+            ]
+
+    @action(detail=False, methods=['get'])
+    def export_csv(self, request):
+        """Exporta a listagem em CSV (streaming)"""
+        writer = csv.writer(Echo())
+
+        def stream():
+            yield '\ufeff'  # BOM para UTF-8 (Excel)
+            yield writer.writerow([column.header for column in self.export_columns])
+            for row in self.iter_export_rows():
+                yield writer.writerow(row)
+
+        response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="{self.export_filename}.csv"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def export_excel(self, request):
+        """Exporta a listagem em Excel (openpyxl write-only)"""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(self.export_sheet_title)
+
+        for index, column in enumerate(self.export_columns, start=1):
+            if column.width:
+                ws.column_dimensions[get_column_letter(index)].width = column.width
+
+        header = []
+        for column in self.export_columns:
+            cell = WriteOnlyCell(ws, value=column.header)
+            cell.font = Font(bold=True)
+            cell.alignment = Alignment(horizontal='center')
+            header.append(cell)
+        ws.append(header)
+
+        for row in self.iter_export_rows():
+            ws.append([float(value) if isinstance(value, Decimal) else value for value in row])
+
+        # O arquivo temporário é fechado (e removido) pelo FileResponse ao fim do envio
+        output = tempfile.TemporaryFile()
+        wb.save(output)
+        output.seek(0)
+
+        return FileResponse(
+            output,
+            as_attachment=True,
+            filename=f'{self.export_filename}.xlsx',
+            content_type=XLSX_CONTENT_TYPE
+        )
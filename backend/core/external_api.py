@@ -0,0 +1,250 @@
+"""
+Gateway para APIs externas (Sentry, UptimeRobot) usadas nos painéis
+
+Os painéis nunca esperam o terceiro: cada fonte registrada guarda o último
+resultado no cache e é servida de lá (stale-while-revalidate). Quando o
+resultado passa do ttl da fonte, a atualização é disparada em background
+e a resposta usa o valor antigo, marcado como stale.
+
+- Conexões: uma requests.Session por processo com pool keep-alive
+- Concorrência: as atualizações rodam em um thread pool; dentro de uma fonte,
+  parallel() dispara as chamadas HTTP ao mesmo tempo
+- Deduplicação: uma atualização por fonte por vez no processo e um lock no
+  cache entre os workers
+- Circuit breaker (por processo): após EXTERNAL_API_BREAKER_THRESHOLD falhas
+  seguidas a fonte fica EXTERNAL_API_BREAKER_COOLDOWN segundos sem chamadas
+- Cache vazio (primeiro acesso): espera a atualização no máximo
+  EXTERNAL_API_COLD_WAIT segundos
+
+Uso:
+    @external_api.source('sentry.health', ttl=60)
+    def fetch_sentry_health():
+        issues, stats = external_api.parallel(
+            lambda: external_api.fetch_json('GET', issues_url, headers=headers),
+            lambda: external_api.fetch_json('GET', stats_url, headers=headers),
+        )
+        return {...}
+
+    snapshot = external_api.get('sentry.health')
+    # {'data': ..., 'fetched_at': ..., 'stale': bool, 'error': str | None}
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY = 'external_api:{name}'
+LOCK_KEY = 'external_api:{name}:lock'
+POOL_SIZE = 8
+
+_registry = {}
+
+
+class ExternalAPIError(Exception):
+    """Resposta inválida ou indisponível de uma API externa"""
+
+
+class Source:
+    def __init__(self, name, func, ttl):
+        self.name = name
+        self.func = func
+        self.ttl = ttl
+
+    @property
+    def cache_key(self):
+        return CACHE_KEY.format(name=self.name)
+
+    @property
+    def lock_key(self):
+        return LOCK_KEY.format(name=self.name)
+
+
+def source(name, ttl=60):
+    """Registra a função que busca os dados da fonte (sem argumentos)"""
+    def decorator(func):
+        _registry[name] = Source(name, func, ttl)
+        return func
+    return decorator
+
+
+class CircuitBreaker:
+    """Abre após `threshold` falhas seguidas; libera uma tentativa a cada `cooldown` segundos"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self, now):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if now - self.opened_at >= settings.EXTERNAL_API_BREAKER_COOLDOWN:
+                # Meio aberto: uma tentativa; as demais esperam o próximo cooldown
+                self.opened_at = now
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def failure(self, now):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= settings.EXTERNAL_API_BREAKER_THRESHOLD:
+                self.opened_at = now
+
+
+class _ProcessState:
+    """Session, executors e atualizações em andamento; recriados após fork"""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.refresh_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='external-refresh')
+        self.http_pool = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix='external-http')
+        self.inflight = {}
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, name):
+        with self.lock:
+            return self.breakers.setdefault(name, CircuitBreaker())
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def _get_state():
+    global _state
+    with _state_lock:
+        if _state is None or _state.pid != os.getpid():
+            _state = _ProcessState()
+        return _state
+
+
+def fetch_json(method, url, **kwargs):
+    """Requisição pela session compartilhada; retorna o JSON ou levanta ExternalAPIError"""
+    kwargs.setdefault('timeout', settings.EXTERNAL_API_TIMEOUT)
+    try:
+        response = _get_state().session.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+    except requests.exceptions.Timeout as e:
+        raise ExternalAPIError(f'Timeout ao conectar com {url}') from e
+    except (requests.exceptions.RequestException, ValueError) as e:
+        raise ExternalAPIError(f'Erro ao consultar {url}: {e}') from e
+
+
+def parallel(*calls):
+    """Executa as funções ao mesmo tempo e retorna os resultados na mesma ordem"""
+    futures = [_get_state().http_pool.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def refresh(name, now=None):
+    """
+    Busca a fonte agora e grava no cache
+    Retorna o snapshot; em falha mantém o último valor bom com o erro anotado
+    """
+    src = _registry[name]
+    state = _get_state()
+    breaker = state.breaker(name)
+    now = time.time() if now is None else now
+    previous = cache.get(src.cache_key)
+
+    if not breaker.allow(now):
+        return _snapshot(src, previous, now, error='Circuit breaker aberto')
+
+    try:
+        data = src.func()
+    except Exception as e:
+        breaker.failure(now)
+        logger.warning(f"Falha ao atualizar {name}: {e}")
+        if previous is None:
+            return _snapshot(src, None, now, error=str(e))
+        entry = {**previous, 'error': str(e)}
+    else:
+        breaker.success()
+        entry = {'data': data, 'fetched_at': now, 'error': None}
+    cache.set(src.cache_key, entry, settings.EXTERNAL_API_STALE_TTL)
+    return _snapshot(src, entry, now)
+
+
+def _run_refresh(name):
+    state = _get_state()
+    src = _registry[name]
+    try:
+        return refresh(name)
+    finally:
+        cache.delete(src.lock_key)
+        with state.lock:
+            state.inflight.pop(name, None)
+
+
+def _schedule(src):
+    """Dispara a atualização em background; None se já está em andamento em outro worker"""
+    state = _get_state()
+    with state.lock:
+        future = state.inflight.get(src.name)
+        if future is not None:
+            return future
+        if not cache.add(src.lock_key, os.getpid(), timeout=settings.EXTERNAL_API_TIMEOUT * 3):
+            return None
+        future = state.refresh_pool.submit(_run_refresh, src.name)
+        state.inflight[src.name] = future
+        return future
+
+
+def _snapshot(src, entry, now, error=None):
+    if entry is None:
+        return {'data': None, 'fetched_at': None, 'stale': True, 'error': error}
+    return {
+        'data': entry['data'],
+        'fetched_at': entry['fetched_at'],
+        'stale': now - entry['fetched_at'] >= src.ttl,
+        'error': error or entry.get('error'),
+    }
+
+
+def get(name):
+    """Último resultado da fonte, sem esperar a API externa (exceto no cache vazio)"""
+    src = _registry[name]
+    now = time.time()
+    entry = cache.get(src.cache_key)
+
+    if entry is not None:
+        if now - entry['fetched_at'] >= src.ttl:
+            _schedule(src)
+        return _snapshot(src, entry, now)
+
+    future = _schedule(src)
+    if future is None:
+        return _snapshot(src, None, now, error='Atualização em andamento')
+    try:
+        return future.result(timeout=settings.EXTERNAL_API_COLD_WAIT)
+    except FutureTimeout:
+        return _snapshot(src, None, now, error='Atualização em andamento')
+
+
+def reset():
+    """Limpa cache, locks e breakers das fontes (usado nos testes)"""
+    global _state
+    for src in _registry.values():
+        cache.delete_many([src.cache_key, src.lock_key])
+    with _state_lock:
+        _state = None
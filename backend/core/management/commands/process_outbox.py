@@ -0,0 +1,41 @@
+"""
+Processa os efeitos colaterais pendentes do outbox (core.side_effects)
+
+Uso:
+    python manage.py process_outbox
+    python manage.py process_outbox --retry-failed
+"""
+from django.core.management.base import BaseCommand
+
+from core import side_effects
+from core.models import OutboxEvent
+
+
+class Command(BaseCommand):
+    help = 'Processa os eventos pendentes do outbox de efeitos colaterais'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=side_effects.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=side_effects.OUTBOX_MAX_ATTEMPTS)
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Volta os eventos que falharam para pendente antes de processar'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            retried = OutboxEvent.objects.filter(status=OutboxEvent.STATUS_FAILED).update(
+                status=OutboxEvent.STATUS_PENDING, attempts=0
+            )
+            self.stdout.write(f'{retried} evento(s) com falha voltaram para pendente')
+
+        processed = side_effects.process_outbox(
+            batch_size=options['batch_size'],
+            max_attempts=options['max_attempts'],
+        )
+        failed = OutboxEvent.objects.filter(status=OutboxEvent.STATUS_FAILED).count()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {processed} evento(s) processado(s)'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'⚠️ {failed} evento(s) com falha definitiva'))
@@ -0,0 +1,43 @@
+"""
+Envia os emails pendentes da fila (core.emails)
+
+Uso:
+    python manage.py send_queued_emails
+    python manage.py send_queued_emails --retry-failed
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import emails
+from core.models import QueuedEmail
+
+
+class Command(BaseCommand):
+    help = 'Envia os emails pendentes da fila de envio'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=emails.BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=emails.MAX_ATTEMPTS)
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Volta os emails que falharam para pendente antes de enviar'
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            # Falhas de templates com segredos não guardam mais o corpo (ver core.emails)
+            retried = QueuedEmail.objects.filter(status=QueuedEmail.STATUS_FAILED).exclude(body_text='').update(
+                status=QueuedEmail.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now()
+            )
+            self.stdout.write(f'{retried} email(s) com falha voltaram para pendente')
+
+        sent = emails.send_queued(
+            batch_size=options['batch_size'],
+            max_attempts=options['max_attempts'],
+        )
+        failed = QueuedEmail.objects.filter(status=QueuedEmail.STATUS_FAILED).count()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {sent} email(s) enviado(s)'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'⚠️ {failed} email(s) com falha definitiva'))
@@ -4,6 +4,8 @@ Implementa BLOCO 3: Regras de Segurança (Isolamento de Dados)
 """
 from threading import local
 
+from django.http import JsonResponse
+
 # Thread-local storage para armazenar o tenant atual
 _thread_locals = local()
 
@@ -24,6 +26,34 @@ def clear_current_tenant():
         delattr(_thread_locals, 'tenant')
 
 
+class JWTAuthenticationMiddleware:
+    """
+    Autentica o JWT antes dos middlewares de tenant e assinatura
+    O DRF só autentica dentro da view; sem isso esses middlewares nunca veem o
+    usuário das chamadas da API. O resultado fica na requisição e é reaproveitado
+    pela view (core.authentication.CachedJWTAuthentication), então o token é
+    validado e o usuário + tenant carregados uma única vez.
+    Token inválido deixa o usuário anônimo aqui; a view retorna o 401.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from rest_framework.exceptions import AuthenticationFailed
+        from core.authentication import CachedJWTAuthentication
+
+        if not request.user.is_authenticated:
+            try:
+                result = CachedJWTAuthentication().authenticate(request)
+            except AuthenticationFailed:
+                result = None
+            if result is not None:
+                request.user = result[0]
+
+        return self.get_response(request)
+
+
 class TenantMiddleware:
     """
     Middleware que captura o tenant do usuário autenticado
@@ -111,34 +141,29 @@ class SubscriptionMiddleware:
             return self.get_response(request)
         
         elif tenant.subscription_status == 'TRIAL':
-            # Trial - verifica se não expirou
-            if tenant.is_trial_active():
+            # Trial - bloqueia só depois de trial_ends_at (sem data definida não expira)
+            if not tenant.is_trial_expired():
                 return self.get_response(request)
             else:
                 # Trial expirado
-                from rest_framework.response import Response
-                from rest_framework import status
-                return Response({
+                return JsonResponse({
                     'error': 'trial_expired',
                     'message': 'Seu período de teste acabou! Para continuar usando o sistema, assine um de nossos planos.',
                     'trial_ends_at': tenant.trial_ends_at,
                     'subscription_status': tenant.subscription_status
-                }, status=status.HTTP_402_PAYMENT_REQUIRED)
+                }, status=402)
         
         elif tenant.subscription_status in ['PAST_DUE', 'CANCELED']:
             # Pagamento atrasado ou cancelado - bloqueia acesso
-            from rest_framework.response import Response
-            from rest_framework import status
-            
             message = 'Pagamento em atraso. Atualize seus dados de pagamento para continuar.'
             if tenant.subscription_status == 'CANCELED':
                 message = 'Sua assinatura foi cancelada. Reative para continuar usando o sistema.'
             
-            return Response({
+            return JsonResponse({
                 'error': 'subscription_blocked',
                 'message': message,
                 'subscription_status': tenant.subscription_status
-            }, status=status.HTTP_402_PAYMENT_REQUIRED)
+            }, status=402)
         
         # Fallback - permite acesso se status desconhecido
         return self.get_response(request)
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0004_add_subscription_fields"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OutboxEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("effect", models.CharField(max_length=100, verbose_name="Efeito")),
+                ("model", models.CharField(max_length=100, verbose_name="Model")),
+                (
+                    "object_id",
+                    models.CharField(max_length=64, verbose_name="ID do objeto"),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("done", "Processado"),
+                            ("failed", "Falhou"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Tentativas"
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="Último erro"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Criado em"),
+                ),
+                (
+                    "processed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Processado em"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Evento do Outbox",
+                "verbose_name_plural": "Eventos do Outbox",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "id"], name="core_outbox_status_780de0_idx"
+                    )
+                ],
+            },
+        ),
+    ]
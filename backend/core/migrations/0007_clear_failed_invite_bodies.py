@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def clear_failed_invite_bodies(apps, schema_editor):
+    # Convites que já falharam guardavam a senha temporária no corpo
+    QueuedEmail = apps.get_model("core", "QueuedEmail")
+    QueuedEmail.objects.filter(status="failed", template="invite").update(body_text="", body_html="")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_queuedemail"),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_failed_invite_bodies, migrations.RunPython.noop),
+    ]
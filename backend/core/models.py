@@ -291,3 +291,78 @@ class TenantAwareModel(models.Model):
         if not self.tenant_id:
             raise ValueError('Tenant é obrigatório para este modelo')
         super().save(*args, **kwargs)
+
+
+class OutboxEvent(models.Model):
+    """
+    Efeito colateral pendente gravado na mesma transação dos dados (core.side_effects)
+    Processado pela thread worker local ou pelo command process_outbox
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_DONE, 'Processado'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    effect = models.CharField('Efeito', max_length=100)
+    model = models.CharField('Model', max_length=100)
+    object_id = models.CharField('ID do objeto', max_length=64)
+    status = models.CharField('Status', max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    last_error = models.TextField('Último erro', blank=True)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+    processed_at = models.DateTimeField('Processado em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Evento do Outbox'
+        verbose_name_plural = 'Eventos do Outbox'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.effect} ({self.model} {self.object_id}) - {self.status}"
+
+
+class QueuedEmail(models.Model):
+    """
+    Email na fila de envio (core.emails)
+    Renderizado no momento em que é enfileirado e enviado em lotes pela thread
+    worker local ou pelo command send_queued_emails
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_SENT, 'Enviado'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    template = models.CharField('Template', max_length=100)
+    to = models.EmailField('Destinatário')
+    subject = models.CharField('Assunto', max_length=255)
+    # Apagados após o envio e, no convite (senha temporária), também na falha definitiva
+    body_text = models.TextField('Texto', blank=True)
+    body_html = models.TextField('HTML', blank=True)
+    status = models.CharField('Status', max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    next_attempt_at = models.DateTimeField('Próxima tentativa', default=timezone.now)
+    last_error = models.TextField('Último erro', blank=True)
+    created_at = models.DateTimeField('Criado em', auto_now_add=True)
+    sent_at = models.DateTimeField('Enviado em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Email na Fila'
+        verbose_name_plural = 'Emails na Fila'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.template} para {self.to} - {self.status}"
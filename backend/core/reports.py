@@ -0,0 +1,57 @@
+"""
+Relatórios por profissional com uma única query agrupada
+
+Os endpoints de desempenho (agendamentos, comissões, ranking de metas) faziam
+várias count()/aggregate() por usuário do tenant. Aqui as métricas são agregados
+condicionais (Count/Sum/Avg com filter=) calculados em um GROUP BY pelo campo do
+profissional, e o resultado é combinado com a lista de usuários em Python.
+
+Uso:
+    rows = professional_metrics(
+        appointments,
+        {
+            'total': Count('id'),
+            'completed': Count('id', filter=Q(status='concluido')),
+        },
+        User.objects.filter(tenant=tenant),
+    )
+    for professional, metrics in rows:
+        ...
+"""
+from decimal import Decimal
+
+
+def empty_value(aggregate):
+    """Valor da métrica para quem não tem registros (o default do agregado ou 0)"""
+    default = getattr(aggregate, 'default', None)
+    return default if default is not None else 0
+
+
+def professional_metrics(queryset, metrics, professionals, professional_field='professional'):
+    """
+    Agrega `queryset` por profissional e retorna [(profissional, métricas)]
+    - queryset: registros já filtrados (tenant, período etc.)
+    - metrics: {nome: agregado}, ex.: Sum('total', filter=Q(status='paid'), default=Decimal('0'))
+    - professionals: queryset de User que define as linhas do relatório; quem não
+      tem registros recebe os valores vazios das métricas
+    - professional_field: FK do queryset para o profissional
+    `profissional` é um dict com id, name e email. Duas queries no total.
+    """
+    rows = queryset.order_by().prefetch_related(None).values(professional_field).annotate(**metrics)
+    grouped = {row.pop(professional_field): row for row in rows}
+    empty = {name: empty_value(aggregate) for name, aggregate in metrics.items()}
+
+    return [
+        (professional, grouped.get(professional['id'], empty))
+        for professional in professionals.order_by().values('id', 'name', 'email')
+    ]
+
+
+def rate(part, total):
+    """Percentual part/total arredondado em 2 casas (0 se não houver total)"""
+    return round(part / total * 100, 2) if total else 0
+
+
+def as_float(value):
+    """Decimal/None do agregado para float na resposta"""
+    return float(value or Decimal('0'))
@@ -0,0 +1,146 @@
+"""
+Cache de respostas da API por tenant, com invalidação por versão
+
+Substitui o antigo CacheMiddleware, que rodava antes da autenticação JWT do DRF
+(todas as chamadas autenticadas caíam na chave do usuário anônimo) e só expirava por TTL.
+
+Funcionamento:
+- Cada (tenant, recurso) tem um contador de geração no cache
+- post_save/post_delete dos models cacheados trocam a geração após o commit
+- A chave da resposta inclui as gerações dos recursos da view, então qualquer
+  alteração invalida imediatamente as listas em cache e o TTL pode ser longo
+- O corpo é guardado como JSON compacto, com ETag/If-None-Match (304)
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+# Models cujas alterações invalidam o recurso correspondente
+RESOURCE_MODELS = {
+    'products': 'inventory.Product',
+    'services': 'scheduling.Service',
+    'customers': 'customers.Customer',
+    'appointments': 'scheduling.Appointment',
+    'sales': 'pos.Sale',
+    'transactions': 'financial.Transaction',
+}
+RESOURCE_SENDERS = {label: resource for resource, label in RESOURCE_MODELS.items()}
+
+
+def _generation_key(tenant_id, resource):
+    return f'api_cache:gen:{tenant_id}:{resource}'
+
+
+def get_generations(tenant_id, resources):
+    """
+    Retorna as gerações atuais dos recursos do tenant (uma única ida ao cache).
+    Gerações ausentes são inicializadas com um timestamp, para que um contador
+    despejado do cache nunca volte a um valor já usado.
+    """
+    keys = {_generation_key(tenant_id, resource): resource for resource in resources}
+    found = cache.get_many(list(keys))
+
+    generations = {}
+    for key, resource in keys.items():
+        generation = found.get(key)
+        if generation is None:
+            generation = time.time_ns()
+            if not cache.add(key, generation, None):
+                generation = cache.get(key, generation)
+        generations[resource] = generation
+    return generations
+
+
+def invalidate(tenant_id, *resources):
+    """
+    Invalida as respostas em cache dos recursos do tenant.
+    Executado após o commit, para que nenhuma requisição concorrente
+    grave em cache dados anteriores à transação.
+    """
+    def bump():
+        cache.set_many(
+            {_generation_key(tenant_id, resource): time.time_ns() for resource in resources},
+            None
+        )
+
+    transaction.on_commit(bump)
+
+
+def _invalidate_on_change(sender, instance, **kwargs):
+    resource = RESOURCE_SENDERS.get(sender._meta.label)
+    if resource and instance.tenant_id:
+        invalidate(instance.tenant_id, resource)
+
+
+def connect_signals():
+    """Conecta os signals de invalidação (chamado em CoreConfig.ready)"""
+    for label in RESOURCE_MODELS.values():
+        post_save.connect(_invalidate_on_change, sender=label, dispatch_uid=f'response_cache_save_{label}')
+        post_delete.connect(_invalidate_on_change, sender=label, dispatch_uid=f'response_cache_delete_{label}')
+
+
+class TenantCachedResponseMixin:
+    """
+    Mixin para ViewSets: faz cache de list/retrieve por tenant.
+
+    Uso:
+        class ProductViewSet(TenantCachedResponseMixin, viewsets.ModelViewSet):
+            cache_resources = ('products',)
+    """
+    cache_resources = ()
+    cache_timeout = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_response_cache_key(self, request, tenant_id):
+        generations = get_generations(tenant_id, self.cache_resources)
+        version = '.'.join(str(generations[resource]) for resource in self.cache_resources)
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        path_hash = hashlib.md5(f'{request.path}?{query}'.encode()).hexdigest()
+        return f'api_cache:{tenant_id}:{version}:{path_hash}'
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        tenant_id = getattr(request.user, 'tenant_id', None)
+
+        # Superadmin sem tenant enxerga dados de todos os tenants - sem cache
+        if not tenant_id or request.user.is_superuser or not self.cache_resources:
+            return handler(request, *args, **kwargs)
+
+        cache_key = self.get_response_cache_key(request, tenant_id)
+        body = cache.get(cache_key)
+        cache_status = 'HIT'
+
+        if body is None:
+            response = handler(request, *args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+
+            body = JSONRenderer().render(response.data).decode('utf-8')
+            timeout = self.cache_timeout or settings.API_CACHE_TIMEOUT
+            cache.set(cache_key, body, timeout)
+            cache_status = 'MISS'
+
+        etag = f'"{hashlib.md5(body.encode()).hexdigest()}"'
+
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+
+        response['ETag'] = etag
+        response['X-Cache'] = cache_status
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -1,11 +1,14 @@
 """
 Integração com Sentry API para buscar métricas de erros
+As chamadas usam a session compartilhada do core.external_api; o resumo do
+dashboard é registrado como fonte 'sentry.summary' e servido do cache
 """
-import requests
-from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from decouple import config
 
+from core import external_api
+from core.external_api import ExternalAPIError
+
 
 class SentryIntegration:
     """
@@ -17,28 +20,27 @@ class SentryIntegration:
         self.auth_token = config('SENTRY_AUTH_TOKEN', default='')
         self.organization_slug = config('SENTRY_ORG_SLUG', default='')
         self.project_slug = config('SENTRY_PROJECT_SLUG', default='')
-        self.base_url = 'https://sentry.io/api/0'
+        self.base_url = config('SENTRY_API_URL', default='https://sentry.io/api/0')
         
         if not self.auth_token:
             print("⚠️ SENTRY_AUTH_TOKEN não configurado")
     
-    def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
-        """Faz requisição à API do Sentry"""
-        if not self.auth_token:
-            return None
-        
+    def _get(self, endpoint: str, params: Optional[Dict] = None):
+        """Faz requisição à API do Sentry; levanta ExternalAPIError em falha"""
         headers = {
             'Authorization': f'Bearer {self.auth_token}',
             'Content-Type': 'application/json',
         }
-        
-        url = f"{self.base_url}/{endpoint}"
+        return external_api.fetch_json('GET', f"{self.base_url}/{endpoint}", headers=headers, params=params)
+    
+    def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Optional[Dict]:
+        """Faz requisição à API do Sentry"""
+        if not self.auth_token:
+            return None
         
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
+            return self._get(endpoint, params)
+        except ExternalAPIError as e:
             print(f"❌ Erro ao buscar dados do Sentry: {e}")
             return None
     
@@ -56,14 +58,15 @@ class SentryIntegration:
                 'affected_users': int,
             }
         """
+        data = self._make_request(*self._stats_request())
+        return self._format_stats(data, period) if data else None
+    
+    def _stats_request(self):
         endpoint = f"projects/{self.organization_slug}/{self.project_slug}/stats/"
-        params = {'stat': 'received', 'resolution': '1h'}
-        
-        data = self._make_request(endpoint, params)
-        
-        if not data:
-            return None
-        
+        return endpoint, {'stat': 'received', 'resolution': '1h'}
+    
+    @staticmethod
+    def _format_stats(data, period: str) -> Dict:
         # Calcula totais
         total_events = sum(point[1] for point in data)
         
@@ -87,22 +90,21 @@ class SentryIntegration:
             - level (error, warning, info)
             - status (resolved, unresolved)
         """
+        issues = self._make_request(*self._issues_request(limit))
+        return self._format_issues(issues) if issues else []
+    
+    def _issues_request(self, limit: int):
         endpoint = f"projects/{self.organization_slug}/{self.project_slug}/issues/"
-        params = {
+        return endpoint, {
             'statsPeriod': '24h',
             'limit': limit,
             'sort': 'freq',  # Mais frequentes primeiro
         }
-        
-        issues = self._make_request(endpoint, params)
-        
-        if not issues:
-            return []
-        
-        # Formata dados
-        formatted = []
-        for issue in issues:
-            formatted.append({
+    
+    @staticmethod
+    def _format_issues(issues) -> List[Dict]:
+        return [
+            {
                 'id': issue.get('id'),
                 'title': issue.get('title'),
                 'culprit': issue.get('culprit'),  # Linha de código
@@ -114,9 +116,9 @@ class SentryIntegration:
                 'status': issue.get('status'),
                 'permalink': issue.get('permalink'),
                 'metadata': issue.get('metadata', {}),
-            })
-        
-        return formatted
+            }
+            for issue in issues
+        ]
     
     def get_issues_by_tag(self, tag: str, value: str, limit: int = 10) -> List[Dict]:
         """
@@ -158,8 +160,13 @@ class SentryIntegration:
                 'message': 'Sentry não configurado. Configure SENTRY_AUTH_TOKEN nas variáveis de ambiente.',
             }
         
-        stats = self.get_project_stats('24h')
-        recent_issues = self.get_recent_issues(10)
+        # Estatísticas e issues em paralelo; falhas sobem para o gateway (cache + circuit breaker)
+        stats, issues = external_api.parallel(
+            lambda: self._get(*self._stats_request()),
+            lambda: self._get(*self._issues_request(10)),
+        )
+        stats = self._format_stats(stats, '24h') if stats else None
+        recent_issues = self._format_issues(issues or [])
         
         # Agrupa erros por módulo
         errors_by_module = {}
@@ -190,3 +197,8 @@ class SentryIntegration:
 
 # Instância global
 sentry_client = SentryIntegration()
+
+
+@external_api.source('sentry.summary', ttl=120)
+def fetch_dashboard_summary():
+    return sentry_client.get_dashboard_summary()
@@ -19,11 +19,11 @@ class SentryContextMiddleware:
             set_user({
                 'id': str(request.user.id),
                 'email': request.user.email,
-                'username': request.user.username,
+                'username': request.user.name,
             })
             
             # Tenant do usuário
-            if hasattr(request.user, 'tenant'):
+            if getattr(request.user, 'tenant', None):
                 set_tag('tenant_id', str(request.user.tenant.id))
                 set_tag('tenant_name', request.user.tenant.name)
                 
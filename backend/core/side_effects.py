@@ -0,0 +1,169 @@
+"""
+Efeitos colaterais executados após o commit
+
+Os signals de Sale e Appointment não fazem mais o trabalho pesado dentro do
+request (transação financeira, metas, comissões, notificações): apenas agendam
+efeitos nomeados com defer(). Em cada transação os efeitos são deduplicados por
+(efeito, objeto) e só rodam depois do commit; se a transação for desfeita
+(inclusive um savepoint), os efeitos agendados nela são descartados.
+
+Modos (settings.SIDE_EFFECTS_MODE):
+- 'inline' (padrão): executados em sequência logo após o commit, no mesmo request
+- 'outbox': gravados em OutboxEvent na mesma transação dos dados e executados por
+  uma thread worker local, então o request retorna assim que o commit termina.
+  Eventos que ficarem pendentes (ex.: processo reiniciado) são processados pelo
+  command process_outbox
+
+Uso:
+    @side_effects.register('pos.sale_transaction')
+    def create_sale_transaction(sale):
+        ...
+
+    side_effects.defer('pos.sale_transaction', sale)
+"""
+import logging
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from core.workers import BackgroundWorker
+
+logger = logging.getLogger(__name__)
+
+MODE_INLINE = 'inline'
+MODE_OUTBOX = 'outbox'
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+
+_registry = {}
+
+
+def register(name):
+    """Registra a função do efeito; ela recebe a instância do objeto"""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_mode():
+    return getattr(settings, 'SIDE_EFFECTS_MODE', MODE_INLINE)
+
+
+class _Deferred:
+    """Callback de on_commit de um efeito, identificado por (efeito, model, pk)"""
+
+    def __init__(self, key, instance):
+        self.key = key
+        self.instance = instance
+
+    def __call__(self):
+        if get_mode() == MODE_OUTBOX:
+            worker.notify()
+        else:
+            run(self.key[0], self.instance)
+
+
+def defer(name, instance, using=None):
+    """
+    Agenda o efeito para depois do commit da transação atual
+    Fora de transação, executa imediatamente (comportamento do on_commit)
+    """
+    if name not in _registry:
+        raise ValueError(f'Efeito não registrado: {name}')
+
+    using = using or instance._state.db or DEFAULT_DB_ALIAS
+    key = (name, instance._meta.label, str(instance.pk))
+
+    # Já agendado nesta transação: mantém só a versão mais recente do objeto
+    for _, callback, _ in connections[using].run_on_commit:
+        if getattr(callback, 'key', None) == key:
+            callback.instance = instance
+            return
+
+    if get_mode() == MODE_OUTBOX:
+        from core.models import OutboxEvent
+        OutboxEvent.objects.using(using).create(effect=name, model=key[1], object_id=key[2])
+
+    transaction.on_commit(_Deferred(key, instance), using=using)
+
+
+def run(name, instance):
+    """Executa o efeito isolado em um savepoint; falhas são registradas e não propagam"""
+    try:
+        with transaction.atomic(using=instance._state.db or DEFAULT_DB_ALIAS):
+            _registry[name](instance)
+    except Exception as e:
+        logger.exception(f"Erro no efeito {name} ({instance._meta.label} {instance.pk}): {e}")
+        return e
+    return None
+
+
+def process_outbox(batch_size=OUTBOX_BATCH_SIZE, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    """
+    Processa os eventos pendentes do outbox em lotes
+    Eventos repetidos do mesmo (efeito, objeto) no lote rodam uma única vez e os
+    objetos de cada model são carregados com uma query. Retorna o total processado.
+    """
+    from core.models import OutboxEvent
+
+    processed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            events = list(
+                OutboxEvent.objects.select_for_update(skip_locked=True)
+                .filter(status=OutboxEvent.STATUS_PENDING, id__gt=last_id)
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                return processed
+            last_id = events[-1].id
+
+            groups = defaultdict(list)
+            ids_by_model = defaultdict(set)
+            for event in events:
+                groups[(event.effect, event.model, event.object_id)].append(event)
+                ids_by_model[event.model].add(event.object_id)
+
+            objects = {
+                label: {
+                    str(pk): obj
+                    for pk, obj in apps.get_model(label)._default_manager.in_bulk(list(ids)).items()
+                }
+                for label, ids in ids_by_model.items()
+            }
+
+            now = timezone.now()
+            for (name, label, object_id), group in groups.items():
+                instance = objects[label].get(object_id)
+                if name not in _registry:
+                    error = f'Efeito não registrado: {name}'
+                elif instance is None:
+                    error = None  # Objeto removido depois do evento: nada a fazer
+                else:
+                    error = run(name, instance)
+
+                for event in group:
+                    event.attempts += 1
+                    if error is None:
+                        event.status = OutboxEvent.STATUS_DONE
+                        event.processed_at = now
+                        event.last_error = ''
+                    else:
+                        event.last_error = str(error)
+                        if event.attempts >= max_attempts:
+                            event.status = OutboxEvent.STATUS_FAILED
+
+            OutboxEvent.objects.bulk_update(
+                events, ['status', 'attempts', 'last_error', 'processed_at']
+            )
+            processed += len(events)
+
+
+# Drena o outbox quando notificada após um commit
+worker = BackgroundWorker('side-effects-outbox', lambda: process_outbox())
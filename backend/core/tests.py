@@ -1,11 +1,22 @@
 """
 Testes completos do módulo Core (Autenticação, Usuários, Tenants)
 """
-from django.test import TestCase
+import json
+import threading
+import time
+from io import StringIO
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import StreamRequestHandler, ThreadingTCPServer
+from unittest import mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APIClient, APITestCase
 from rest_framework import status
-from core.models import User, Tenant
+from core import emails, external_api
+from core.models import QueuedEmail, User, Tenant
 
 class AuthenticationTestCase(APITestCase):
     """Testa sistema de autenticação"""
@@ -206,3 +217,816 @@ class UserManagementTestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
         self.assertEqual(response.data[0]['email'], 'other@test.com')
+
+
+class ResponseCacheTestCase(APITestCase):
+    """Testa o cache de respostas da API por tenant"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        
+        self.tenant = Tenant.objects.create(name="Test Barbershop", subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email="testuser@test.com",
+            password="testpass123",
+            name="Test User",
+            tenant=self.tenant,
+            role="admin"
+        )
+        self.other_tenant = Tenant.objects.create(name="Other Barbershop", subscription_status='ACTIVE')
+        self.other_user = User.objects.create_user(
+            email="other@test.com",
+            password="other123",
+            name="Other User",
+            tenant=self.other_tenant,
+            role="admin"
+        )
+        self.client.force_authenticate(self.user)
+        self.url = '/api/inventory/products/'
+    
+    def create_product(self, tenant, name):
+        from inventory.models import Product
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(
+                tenant=tenant, name=name, category='pomada',
+                cost_price='10.00', sale_price='20.00'
+            )
+    
+    def test_second_request_is_served_from_cache(self):
+        self.create_product(self.tenant, 'Pomada')
+        
+        first = self.client.get(self.url)
+        second = self.client.get(self.url)
+        
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(first['ETag'], second['ETag'])
+    
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+        
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+    
+    def test_save_invalidates_tenant_cache(self):
+        self.client.get(self.url)
+        self.create_product(self.tenant, 'Nova Pomada')
+        
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Nova Pomada')
+    
+    def test_cache_is_isolated_per_tenant(self):
+        self.create_product(self.tenant, 'Pomada do Tenant')
+        self.client.get(self.url)
+        
+        self.client.force_authenticate(self.other_user)
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertNotContains(response, 'Pomada do Tenant')
+
+
+class UpstashSerializationTestCase(TestCase):
+    """Testa a serialização de valores do UpstashRedisCache"""
+    
+    def test_values_round_trip(self):
+        from core.cache_backend import encode_value, decode_value
+        
+        for value in [42, 'texto', {'user_id': 1, 'path': '/api/'}, [1, 2], (1, 2), {1: 'a'}, None, 1.5]:
+            self.assertEqual(decode_value(encode_value(value)), value)
+    
+    def test_integers_are_stored_as_plain_numbers(self):
+        from core.cache_backend import encode_value
+        
+        # INCRBY do Redis só funciona sobre números puros
+        self.assertEqual(encode_value(42), '42')
+    
+    def test_legacy_raw_strings_are_returned_as_is(self):
+        from core.cache_backend import decode_value
+        
+        self.assertEqual(decode_value('valor antigo'), 'valor antigo')
+    
+    def test_unsigned_or_forged_pickle_is_ignored(self):
+        import base64
+        import pickle
+        from core.cache_backend import PICKLE_PREFIX, decode_value, encode_value
+        
+        forged = base64.b64encode(pickle.dumps((1, 2))).decode('ascii')
+        self.assertIsNone(decode_value(PICKLE_PREFIX + forged))
+        
+        signed = encode_value((1, 2))
+        self.assertIsNone(decode_value(signed.replace(signed[-1], 'x' if signed[-1] != 'x' else 'y')))
+
+
+class FakeUpstash:
+    """Cliente Upstash em memória; conta as idas à rede (comandos e pipelines)"""
+    
+    def __init__(self):
+        self.store = {}
+        self.round_trips = 0
+        self.sent = []
+        self.gate = threading.Event()
+        self.gate.set()
+    
+    def _apply(self, command):
+        self.sent.append(command)
+        if command[0] == 'SET':
+            self.store[command[1]] = command[2]
+        elif command[0] == 'DEL':
+            for key in command[1:]:
+                self.store.pop(key, None)
+    
+    def execute(self, command):
+        self.round_trips += 1
+        self._apply(command)
+    
+    def pipeline(self):
+        client = self
+        
+        class Pipeline:
+            def __init__(self):
+                self.commands = []
+            
+            def execute(self, command):
+                self.commands.append(command)
+            
+            def exec(self):
+                client.gate.wait(5)
+                client.round_trips += 1
+                for command in self.commands:
+                    client._apply(command)
+        
+        return Pipeline()
+    
+    def get(self, key):
+        self.round_trips += 1
+        return self.store.get(key)
+    
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.store:
+            self.round_trips += 1
+            return False
+        self.execute(['SET', key, value] + (['EX', ex] if ex is not None else []))
+        return True
+    
+    def delete(self, *keys):
+        self.execute(['DEL', *keys])
+    
+    def mget(self, *keys):
+        self.round_trips += 1
+        return [self.store.get(key) for key in keys]
+
+
+class UpstashCacheTestCase(TestCase):
+    """Testa pipeline, L1 e write-behind do UpstashRedisCache"""
+    
+    def make_cache(self, **options):
+        from core.cache_backend import UpstashRedisCache
+        
+        cache = UpstashRedisCache('https://fake.upstash.io', {'OPTIONS': {'TOKEN': 'x', **options}})
+        cache._client = FakeUpstash()
+        return cache
+    
+    def test_many_operations_use_one_round_trip(self):
+        cache = self.make_cache(L1_TIMEOUT=0)
+        
+        cache.set_many({'a': 1, 'b': {'x': 2}, 'c': 'três'}, timeout=60)
+        self.assertEqual(cache.client.round_trips, 1)
+        
+        self.assertEqual(cache.get_many(['a', 'b', 'c', 'd']), {'a': 1, 'b': {'x': 2}, 'c': 'três'})
+        self.assertEqual(cache.client.round_trips, 2)
+        
+        cache.delete_many(['a', 'b'])
+        self.assertEqual(cache.client.round_trips, 3)
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'c': 'três'})
+    
+    def test_timeouts_are_sent_as_relative_seconds(self):
+        cache = self.make_cache(L1_TIMEOUT=0)
+        key = cache.make_key('k')
+        
+        cache.set('k', 1, 30)
+        cache.set('k', 1)
+        cache.set('k', 1, None)
+        cache.set_many({'k': 1}, timeout=45)
+        cache.add('novo', 1, timeout=90)
+        self.assertEqual(cache.client.sent, [
+            ['SET', key, '1', 'EX', 30],
+            ['SET', key, '1', 'EX', 300],
+            ['SET', key, '1'],
+            ['SET', key, '1', 'EX', 45],
+            ['SET', cache.make_key('novo'), '1', 'EX', 90],
+        ])
+        
+        # Timeout 0 expira na hora, como no RedisCache
+        cache.client.sent.clear()
+        cache.set('k', 1, 0)
+        self.assertTrue(cache.add('outro', 2, 0))
+        self.assertEqual(cache.client.sent, [
+            ['DEL', key], ['SET', cache.make_key('outro'), '2'], ['DEL', cache.make_key('outro')]
+        ])
+        self.assertEqual(cache.get_many(['k', 'outro']), {})
+    
+    def test_l1_serves_hits_until_it_expires(self):
+        cache = self.make_cache(L1_TIMEOUT=0.2)
+        cache.client.store[cache.make_key('chave')] = '"remoto"'
+        
+        self.assertEqual(cache.get('chave'), 'remoto')
+        cache.client.store[cache.make_key('chave')] = '"alterado por outro worker"'
+        self.assertEqual(cache.get('chave'), 'remoto')
+        self.assertEqual(cache.client.round_trips, 1)
+        
+        time.sleep(0.3)
+        self.assertEqual(cache.get('chave'), 'alterado por outro worker')
+        self.assertEqual(cache.client.round_trips, 2)
+    
+    def test_write_behind_overflow_sends_each_command_once(self):
+        from core.cache_backend import WriteBehindQueue
+        
+        cache = self.make_cache(L1_TIMEOUT=0)
+        fake = cache.client
+        fake.gate.clear()
+        cache._write_behind = WriteBehindQueue(fake, batch_size=1, max_size=3)
+        
+        # A thread pega o primeiro comando e fica presa no envio
+        cache.send_commands([['HINCRBY', 'uso', 't1', 1]])
+        deadline = time.monotonic() + 5
+        while cache._write_behind._queue.qsize() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        
+        cache.send_commands([['HINCRBY', 'uso', 't2', 1], ['HINCRBY', 'uso', 't3', 1]])
+        self.assertEqual(cache._write_behind._queue.qsize(), 2)
+        
+        # Não cabem: nada é enfileirado e tudo vai pelo pipeline síncrono
+        overflow = [['LPUSH', 'amostras', 'a'], ['LPUSH', 'amostras', 'b']]
+        sync = threading.Thread(target=cache.send_commands, args=(overflow,))
+        sync.start()
+        self.assertEqual(cache._write_behind._queue.qsize(), 2)
+        
+        fake.gate.set()
+        sync.join(5)
+        cache._write_behind.flush()
+        deadline = time.monotonic() + 5
+        while len(fake.sent) < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        
+        expected = [['HINCRBY', 'uso', field, 1] for field in ('t1', 't2', 't3')] + overflow
+        self.assertEqual(sorted(fake.sent), sorted(expected))
+
+
+class ExportTestCase(APITestCase):
+    """Testa a exportação em streaming (core.exports)"""
+    
+    def setUp(self):
+        from decimal import Decimal
+        from inventory.models import Product
+        
+        self.tenant = Tenant.objects.create(name='Export Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='export@test.com', password='testpass123', name='Export', tenant=self.tenant, role='admin'
+        )
+        other_tenant = Tenant.objects.create(name='Outro Tenant', subscription_status='ACTIVE')
+        for tenant, name in [(self.tenant, 'Pomada'), (self.tenant, 'Shampoo'), (other_tenant, 'Oculto')]:
+            Product.objects.create(
+                tenant=tenant, name=name, category='pomada', sku=name[:3].upper(),
+                cost_price=Decimal('10.00'), sale_price=Decimal('25.50'), stock_quantity=5, min_stock=1
+            )
+        self.client.force_authenticate(user=self.user)
+    
+    def test_csv_is_streamed_with_tenant_rows(self):
+        response = self.client.get('/api/inventory/products/export_csv/')
+        
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        lines = content.lstrip('\ufeff').splitlines()
+        
+        self.assertEqual(lines[0], 'SKU,Nome,Categoria,Preço Custo,Preço Venda,Estoque,Estoque Mínimo,Ativo')
+        self.assertEqual(len(lines), 3)
+        self.assertIn('POM,Pomada,pomada,10.00,25.50,5,1,Sim', lines)
+        self.assertNotIn('Oculto', content)
+    
+    def test_excel_is_valid_workbook(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+        
+        response = self.client.get('/api/inventory/products/export_excel/')
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook['Produtos'].values)
+        
+        self.assertEqual(rows[0][:2], ('SKU', 'Nome'))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[1][4], 25.5)
+    
+    def create_export_rows(self):
+        """Uma linha por exportação, às 22:15 de 09/03 em São Paulo (já 10/03 em UTC)"""
+        from datetime import date, datetime
+        from decimal import Decimal
+        from django.utils import timezone
+        from commissions.models import Commission
+        from customers.models import Customer
+        from financial.models import PaymentMethod, Transaction
+        from pos.models import CashRegister, Sale
+        from scheduling.models import Appointment, Service
+        
+        moment = timezone.make_aware(datetime(2026, 3, 9, 22, 15))
+        customer = Customer.objects.create(
+            tenant=self.tenant, name='João Silva', phone='11987654321', birth_date=date(1990, 5, 20),
+            gender='M', tag='VIP', address_street='Rua A', address_number='10', address_city='São Paulo',
+            address_state='SP'
+        )
+        Customer.objects.filter(pk=customer.pk).update(created_at=moment)
+        service = Service.objects.create(
+            tenant=self.tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30
+        )
+        appointment = Appointment.objects.create(
+            tenant=self.tenant, service=service, professional=self.user, customer=customer,
+            start_time=moment, status='confirmado'
+        )
+        Transaction.objects.create(
+            tenant=self.tenant, type='receita', category='servico', description='Corte, barba e "pezinho"',
+            amount=Decimal('45.00'), date=moment.date(), appointment=appointment, created_by=self.user,
+            payment_method=PaymentMethod.objects.create(tenant=self.tenant, name='PIX')
+        )
+        cash_register = CashRegister.objects.create(
+            tenant=self.tenant, user=self.user, opening_balance=Decimal('0')
+        )
+        sale = Sale.objects.create(
+            tenant=self.tenant, user=self.user, cash_register=cash_register, payment_method='pix',
+            payment_status='paid', subtotal=Decimal('50.00'), discount=Decimal('5.00'), total=Decimal('45.00')
+        )
+        Sale.objects.filter(pk=sale.pk).update(date=moment)
+        Commission.objects.create(
+            tenant=self.tenant, professional=self.user, appointment=appointment, service=service,
+            service_price=Decimal('50.00'), commission_percentage=Decimal('40.00'),
+            commission_amount=Decimal('20.00'), status='paid', date=moment.date(), paid_at=moment
+        )
+        return sale, appointment
+    
+    def test_all_exports_format_their_rows(self):
+        sale, appointment = self.create_export_rows()
+        expected = {
+            '/api/pos/sales/': (
+                f'{sale.id},09/03/2026 22:15,Cliente Avulso,Export,50.00,5.00,45.00,PIX,Pago',
+                [sale.id, '09/03/2026 22:15', 'Cliente Avulso', 'Export', 50.0, 5.0, 45.0, 'PIX', 'Pago'],
+            ),
+            '/api/financial/transactions/': (
+                f'09/03/2026,Receita,Serviço,"Corte, barba e ""pezinho""",R$ 45.00,PIX,#{appointment.id}',
+                ['09/03/2026', 'Receita', 'Serviço', 'Corte, barba e "pezinho"', 'R$ 45.00', 'PIX',
+                 f'#{appointment.id}'],
+            ),
+            '/api/customers/': (
+                'João Silva,11987654321,-,-,20/05/1990,Masculino,Cliente VIP,"Rua A, 10, São Paulo, SP",Sim,'
+                '09/03/2026 22:15',
+                ['João Silva', '11987654321', '-', '-', '20/05/1990', 'Masculino', 'Cliente VIP',
+                 'Rua A, 10, São Paulo, SP', 'Sim', '09/03/2026 22:15'],
+            ),
+            '/api/commissions/': (
+                '09/03/2026,Export,Corte,50.00,40.00,20.00,Paid,09/03/2026',
+                ['09/03/2026', 'Export', 'Corte', 50.0, 40.0, 20.0, 'Paid', '09/03/2026'],
+            ),
+            '/api/scheduling/appointments/': (
+                '09/03/2026 22:15,João Silva,11987654321,Corte,Export,Confirmado,R$ 50.00,-',
+                ['09/03/2026 22:15', 'João Silva', '11987654321', 'Corte', 'Export', 'Confirmado', 'R$ 50.00', '-'],
+            ),
+        }
+        for endpoint, (csv_line, excel_row) in expected.items():
+            with self.subTest(endpoint=endpoint, export='export_csv'):
+                response = self.client.get(f'{endpoint}export_csv/')
+                content = b''.join(response.streaming_content).decode('utf-8')
+                self.assertEqual(content.lstrip('\ufeff').split('\r\n')[1:], [csv_line, ''])
+            
+            with self.subTest(endpoint=endpoint, export='export_excel'):
+                from io import BytesIO
+                from openpyxl import load_workbook
+                
+                response = self.client.get(f'{endpoint}export_excel/')
+                workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+                rows = list(workbook.active.values)
+                self.assertEqual(rows[1:], [tuple(excel_row)])
+
+
+class SideEffectsTestCase(TestCase):
+    """Testa o dispatcher de efeitos após o commit (core.side_effects)"""
+    
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Effects Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='effects@test.com', password='testpass123', name='Effects', tenant=self.tenant, role='admin'
+        )
+    
+    def create_sale(self):
+        from decimal import Decimal
+        from pos.models import CashRegister, Sale
+        
+        cash_register, _ = CashRegister.objects.get_or_create(
+            tenant=self.tenant, user=self.user, defaults={'opening_balance': Decimal('0')}
+        )
+        return Sale.objects.create(
+            tenant=self.tenant, user=self.user, cash_register=cash_register, payment_method='pix', payment_status='paid',
+            subtotal=Decimal('50.00'), total=Decimal('50.00')
+        )
+    
+    def test_effects_run_once_after_commit(self):
+        from django.db import transaction
+        from financial.models import Transaction
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                sale = self.create_sale()
+                sale.notes = 'Atualizada'
+                sale.save()
+                self.assertFalse(Transaction.objects.exists())
+        
+        # Um callback por efeito (receita, metas e vendas por produto), apesar dos dois saves;
+        # a receita criada depois do commit agenda a notificação do pagamento
+        effects = [callback.key[0] for callback in callbacks if hasattr(callback, 'key')]
+        self.assertEqual(
+            sorted(effects),
+            ['goals.sale', 'inventory.product_sales', 'notifications.payment_received', 'pos.sale_transaction']
+        )
+        self.assertEqual(Transaction.objects.get().sale, sale)
+    
+    def test_rolled_back_savepoint_discards_effects(self):
+        from django.db import transaction
+        from financial.models import Transaction
+        
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.create_sale()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        
+        self.assertFalse(any(hasattr(callback, 'key') for callback in callbacks))
+        self.assertFalse(Transaction.objects.exists())
+    
+    def test_outbox_mode(self):
+        from unittest import mock
+        from django.test import override_settings
+        from core import side_effects
+        from core.models import OutboxEvent
+        from financial.models import Transaction
+        
+        with override_settings(SIDE_EFFECTS_MODE='outbox'), \
+                mock.patch.object(side_effects.worker, 'notify') as notify:
+            with self.captureOnCommitCallbacks(execute=True):
+                sale = self.create_sale()
+            
+            notify.assert_called()
+            self.assertEqual(
+                set(OutboxEvent.objects.values_list('effect', 'status')),
+                {('pos.sale_transaction', 'pending'), ('goals.sale', 'pending'), ('inventory.product_sales', 'pending')}
+            )
+            self.assertFalse(Transaction.objects.exists())
+            
+            # Inclui a notificação do pagamento, enfileirada pela receita criada no lote
+            self.assertEqual(side_effects.process_outbox(), 4)
+        
+        self.assertEqual(Transaction.objects.get().sale, sale)
+        self.assertFalse(OutboxEvent.objects.exclude(status=OutboxEvent.STATUS_DONE).exists())
+
+
+class CachedJWTAuthenticationTestCase(APITestCase):
+    """Testa a autenticação JWT com usuário + tenant em cache"""
+    
+    def setUp(self):
+        from django.core.cache import cache
+        from rest_framework_simplejwt.tokens import AccessToken
+        from core import authentication
+        cache.clear()
+        authentication._local.clear()
+        
+        self.tenant = Tenant.objects.create(name="Test Barbershop", subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email="testuser@test.com",
+            password="testpass123",
+            name="Test User",
+            tenant=self.tenant,
+            role="admin"
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+    
+    def get_me(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/core/users/me/')
+        auth_queries = [
+            q['sql'] for q in ctx.captured_queries
+            if 'FROM "core_user"' in q['sql'] or 'FROM "core_tenant"' in q['sql']
+        ]
+        return response, auth_queries
+    
+    def test_user_and_tenant_loaded_once_then_cached(self):
+        response, auth_queries = self.get_me()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(auth_queries), 1)
+        self.assertIn('JOIN "core_tenant"', auth_queries[0])
+        
+        response, auth_queries = self.get_me()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['email'], 'testuser@test.com')
+        self.assertEqual(auth_queries, [])
+    
+    def test_cache_holds_json_without_password(self):
+        from django.core.cache import cache
+        from core import authentication
+        
+        self.get_me()
+        payload = cache.get(authentication.cache_key(self.user.pk))
+        self.assertIsInstance(payload, str)
+        data = json.loads(payload)
+        self.assertNotIn('password', data['user'])
+        self.assertNotIn(self.user.password, payload)
+        self.assertEqual(data['user']['role'], 'admin')
+        
+        user = authentication.deserialize_user(payload)
+        self.assertEqual((user.pk, user.tenant.pk, user.email), (self.user.pk, self.tenant.pk, self.user.email))
+        self.assertEqual(user.created_at, self.user.created_at)
+        self.assertIn('password', user.get_deferred_fields())
+        # A senha adiada vem do banco se for usada
+        self.assertTrue(user.check_password('testpass123'))
+    
+    def test_tenant_save_invalidates_and_gate_uses_loaded_tenant(self):
+        self.get_me()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.subscription_status = 'CANCELED'
+            self.tenant.save()
+        
+        response, _ = self.get_me()
+        self.assertEqual(response.status_code, status.HTTP_402_PAYMENT_REQUIRED)
+        self.assertEqual(response.json()['error'], 'subscription_blocked')
+    
+    def test_trial_without_end_date_is_not_blocked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tenant.subscription_status = 'TRIAL'
+            self.tenant.save()
+        
+        response, _ = self.get_me()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+    
+    def test_inactive_user_and_invalid_token_are_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(self.client.get('/api/core/users/me/').status_code, status.HTTP_401_UNAUTHORIZED)
+        
+        from rest_framework_simplejwt.tokens import AccessToken
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/core/users/me/').status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """Responde com as rotas configuradas em server.routes: path -> (status, body, delay)"""
+
+    def _respond(self):
+        path = self.path.split('?')[0]
+        self.server.hits[path] = self.server.hits.get(path, 0) + 1
+        code, body, delay = self.server.routes.get(path, (404, {}, 0))
+        time.sleep(delay)
+        payload = json.dumps(body).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, *args):
+        pass
+
+
+class ExternalAPITestCase(TestCase):
+    """Testa o gateway das APIs externas contra um servidor HTTP local"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAPIHandler)
+        cls.server.daemon_threads = True
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.routes = {}
+        self.server.hits = {}
+        external_api.reset()
+        self.addCleanup(external_api.reset)
+        self.addCleanup(external_api._registry.pop, 'test.counter', None)
+        external_api.source('test.counter', ttl=60)(
+            lambda: external_api.fetch_json('GET', f'{self.url}/counter')
+        )
+
+    def test_parallel_calls_run_concurrently(self):
+        self.server.routes = {'/a': (200, {'v': 'a'}, 0.3), '/b': (200, {'v': 'b'}, 0.3)}
+        started = time.monotonic()
+        results = external_api.parallel(
+            lambda: external_api.fetch_json('GET', f'{self.url}/a'),
+            lambda: external_api.fetch_json('GET', f'{self.url}/b'),
+        )
+        self.assertEqual(results, [{'v': 'a'}, {'v': 'b'}])
+        self.assertLess(time.monotonic() - started, 0.55)
+
+    def test_stale_value_is_served_while_refreshing(self):
+        self.server.routes['/counter'] = (200, {'n': 1}, 0)
+        external_api.refresh('test.counter', now=time.time() - 120)
+
+        self.server.routes['/counter'] = (200, {'n': 2}, 0.5)
+        started = time.monotonic()
+        snapshot = external_api.get('test.counter')
+        self.assertLess(time.monotonic() - started, 0.3)
+        self.assertEqual((snapshot['data'], snapshot['stale']), ({'n': 1}, True))
+
+        # Uma única atualização em background, mesmo com leituras seguidas
+        external_api.get('test.counter')
+        external_api._get_state().inflight['test.counter'].result(timeout=5)
+        snapshot = external_api.get('test.counter')
+        self.assertEqual((snapshot['data'], snapshot['stale']), ({'n': 2}, False))
+        self.assertEqual(self.server.hits['/counter'], 2)
+
+    @override_settings(EXTERNAL_API_BREAKER_THRESHOLD=2)
+    def test_circuit_breaker_keeps_last_good_value(self):
+        self.server.routes['/counter'] = (200, {'n': 1}, 0)
+        external_api.refresh('test.counter')
+
+        self.server.routes['/counter'] = (500, {}, 0)
+        for _ in range(3):
+            snapshot = external_api.refresh('test.counter')
+
+        self.assertEqual(self.server.hits['/counter'], 3)
+        self.assertEqual(snapshot['data'], {'n': 1})
+        self.assertEqual(snapshot['error'], 'Circuit breaker aberto')
+
+    def test_uptime_view_reads_through_gateway(self):
+        self.server.routes['/getMonitors'] = (200, {'stat': 'ok', 'monitors': [{
+            'status': 2, 'friendly_name': 'API', 'custom_uptime_ratios': ['100', '99.9', '99.5'],
+            'response_times': [{'value': 120}],
+        }]}, 0)
+        user = User.objects.create_user(email='root@test.com', password='test123', name='Root', role='superadmin')
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        with override_settings(UPTIMEROBOT_API_KEY='key', UPTIMEROBOT_API_URL=self.url):
+            for _ in range(2):
+                response = client.get('/api/superadmin/system-health/uptime/status/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['status'], response.data['uptime_30d']), ('up', 99.5))
+        self.assertFalse(response.data['stale'])
+        self.assertEqual(self.server.hits['/getMonitors'], 1)
+
+
+class FakeSMTPHandler(StreamRequestHandler):
+    """Servidor SMTP mínimo: conta conexões e mensagens recebidas"""
+
+    def handle(self):
+        self.server.connections += 1
+        self.wfile.write(b'220 localhost\r\n')
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command == 'DATA':
+                self.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                for data in self.rfile:
+                    if data == b'.\r\n':
+                        break
+                self.server.messages += 1
+                self.wfile.write(b'250 OK\r\n')
+            elif command == 'QUIT':
+                self.wfile.write(b'221 Bye\r\n')
+                return
+            else:
+                self.wfile.write(b'250 OK\r\n')
+
+
+class BackgroundWorkerTestCase(TestCase):
+    """Testa a thread de background compartilhada (core.workers)"""
+
+    def test_notify_runs_target_and_survives_errors(self):
+        from core.workers import BackgroundWorker
+
+        calls = []
+        done = threading.Event()
+
+        def target():
+            calls.append(threading.current_thread().name)
+            if len(calls) == 1:
+                raise RuntimeError('falha')
+            done.set()
+
+        worker = BackgroundWorker('test-worker', target)
+        worker.notify()
+        deadline = time.monotonic() + 5
+        while not calls and time.monotonic() < deadline:
+            time.sleep(0.01)
+        worker.notify()
+
+        self.assertTrue(done.wait(5))
+        self.assertEqual(calls, ['test-worker', 'test-worker'])
+
+
+@override_settings(EMAIL_RATE_LIMIT=0)
+class MailQueueTestCase(TestCase):
+    """Testa a fila de envio de emails"""
+
+    def invite(self, email='novo@test.com'):
+        emails.send_invite_email(email, 'Novo', 'Temp#123', 'Barbearia', 'Admin')
+
+    def test_invite_is_queued_and_sent_by_worker(self):
+        self.invite()
+        queued = QueuedEmail.objects.get()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertIn('Temp#123', queued.body_text)
+        self.assertIn('<code', queued.body_html)
+
+        self.assertEqual(emails.send_queued(), 1)
+        self.assertEqual(mail.outbox[0].to, ['novo@test.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.body_text, queued.body_html), (QueuedEmail.STATUS_SENT, '', ''))
+
+    def test_batch_reuses_one_smtp_connection(self):
+        server = ThreadingTCPServer(('127.0.0.1', 0), FakeSMTPHandler)
+        server.daemon_threads = True
+        server.connections = server.messages = 0
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        for i in range(3):
+            self.invite(f'user{i}@test.com')
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=server.server_address[1], EMAIL_USE_TLS=False, EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD=''
+        ):
+            self.assertEqual(emails.send_queued(), 3)
+
+        self.assertEqual((server.connections, server.messages), (1, 3))
+
+    def test_rate_limited_batches_fit_in_the_lease(self):
+        for i in range(12):
+            self.invite(f'user{i}@test.com')
+
+        # 2/min: cada lote de no máximo 10 emails termina em 5 min, metade da reserva
+        with override_settings(EMAIL_RATE_LIMIT=2), \
+                mock.patch.object(emails.rate_limiter, 'wait'), \
+                mock.patch.object(emails, '_claim', wraps=emails._claim) as claim:
+            self.assertEqual(emails.send_queued(), 12)
+
+        self.assertEqual({call.args[0] for call in claim.call_args_list}, {10})
+
+    def test_failures_back_off_then_fail(self):
+        self.invite()
+        with override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend', EMAIL_HOST='127.0.0.1',
+            EMAIL_PORT=1, EMAIL_USE_TLS=False, EMAIL_TIMEOUT=1
+        ):
+            self.assertEqual(emails.send_queued(), 0)
+            queued = QueuedEmail.objects.get()
+            self.assertEqual((queued.status, queued.attempts), (QueuedEmail.STATUS_PENDING, 1))
+            self.assertEqual(emails.send_queued(), 0)
+
+            QueuedEmail.objects.update(next_attempt_at=queued.created_at)
+            emails.send_queued(max_attempts=2)
+        queued = QueuedEmail.objects.get()
+        # A senha temporária não fica guardada no convite que falhou
+        self.assertEqual((queued.status, queued.body_text, queued.body_html), (QueuedEmail.STATUS_FAILED, '', ''))
+
+        # Sem corpo, o convite não volta para a fila
+        call_command('send_queued_emails', '--retry-failed', stdout=StringIO())
+        self.assertEqual(QueuedEmail.objects.get().status, QueuedEmail.STATUS_FAILED)
+
+    def test_admin_never_shows_the_body(self):
+        from django.contrib import admin
+        from django.test import RequestFactory
+
+        self.invite()
+        request = RequestFactory().get('/')
+        request.user = User.objects.create_superuser(email='root@test.com', password='x', name='Root')
+        model_admin = admin.site._registry[QueuedEmail]
+        fields = model_admin.get_fields(request, QueuedEmail.objects.get())
+        self.assertFalse({'body_text', 'body_html'} & set(fields))
+
+    @override_settings(EMAIL_RATE_LIMIT=60)
+    def test_rate_limit_spaces_sends(self):
+        self.invite('a@test.com')
+        self.invite('b@test.com')
+        with mock.patch.object(emails.time, 'sleep') as sleep:
+            emails.rate_limiter._last_send = 0.0
+            emails.send_queued()
+        self.assertEqual(sleep.call_count, 1)
+        self.assertAlmostEqual(sleep.call_args[0][0], 1.0, places=1)
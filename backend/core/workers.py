@@ -0,0 +1,60 @@
+"""
+Threads daemon de background do processo
+
+BackgroundWorker roda uma função quando notificado (notify, ex.: após um commit)
+e, opcionalmente, a cada poll_seconds (trabalho aguardando backoff). A thread é
+iniciada sob demanda e de novo após fork do processo (gunicorn com preload).
+Falhas são registradas e não derrubam a thread; as conexões de banco abertas por
+ela são fechadas a cada rodada, já que não passam pelo ciclo de request do Django.
+
+Uso:
+    worker = BackgroundWorker('mail-queue', lambda: send_queued(), poll_seconds=60)
+    transaction.on_commit(worker.notify)
+"""
+import logging
+import os
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+    """Thread daemon local acordada por notify() e, se poll_seconds, periodicamente"""
+
+    def __init__(self, name, target, poll_seconds=None):
+        self.name = name
+        self.target = target
+        self.poll_seconds = poll_seconds
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def notify(self):
+        self.ensure_started()
+        self._wake.set()
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def run_once(self):
+        """Uma rodada do worker (também usada pela thread)"""
+        try:
+            self.target()
+        except Exception as e:
+            logger.error(f"Erro no worker {self.name}: {e}")
+        finally:
+            connections.close_all()
+
+    def _run(self):
+        while True:
+            self._wake.wait(timeout=self.poll_seconds)
+            self._wake.clear()
+            self.run_once()
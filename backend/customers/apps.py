@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CustomersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "customers"
+
+    def ready(self):
+        """Registra signals quando app está pronto"""
+        import customers.signals  # noqa
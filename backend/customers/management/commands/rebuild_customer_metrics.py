@@ -0,0 +1,24 @@
+"""
+Command para reconstruir as métricas por cliente (CustomerMetrics)
+As métricas são mantidas por delta a cada save/delete de Appointment e Sale; use
+este command após alterações feitas fora do ORM (ex.: queryset.update)
+"""
+from django.core.management.base import BaseCommand
+from customers.models import CustomerMetrics
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói as métricas dos clientes (visitas, gasto e favoritos) a partir de agendamentos e vendas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            help='ID do tenant (padrão: todos os tenants)'
+        )
+
+    def handle(self, *args, **options):
+        rows = CustomerMetrics.rebuild(tenant_id=options['tenant'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Métricas reconstruídas: {rows} clientes'
+        ))
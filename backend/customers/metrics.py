@@ -0,0 +1,126 @@
+"""
+Métricas agregadas por cliente (CustomerMetrics)
+
+Mantidas por delta a cada save/delete de Appointment e Sale (customers.signals)
+e reconstruídas pelo command rebuild_customer_metrics. Listagem, estatísticas,
+inativos e aniversariantes leem daqui em vez de carregar os agendamentos.
+
+- Agendamentos: contadores por status; os concluídos somam o preço cobrado,
+  contam como visita e para o serviço/profissional favorito
+- Vendas do PDV: as pagas somam o total e contam como visita
+"""
+from decimal import Decimal
+
+from django.db.models import Count, Max, Min, Q, Sum
+
+# Status de agendamento -> contador
+STATUS_COUNTERS = {
+    'concluido': 'completed_appointments',
+    'cancelado': 'cancelled_appointments',
+    'falta': 'no_show_appointments',
+}
+
+# Campos de Appointment e Sale que afetam as métricas
+APPOINTMENT_FIELDS = ('tenant_id', 'customer_id', 'status', 'price', 'service_id', 'professional_id', 'start_time')
+SALE_FIELDS = ('tenant_id', 'customer_id', 'payment_status', 'total', 'date')
+
+
+def appointment_contribution(values):
+    """Parte do agendamento que entra nas métricas (None sem cliente)"""
+    if not values.get('customer_id'):
+        return None
+    if values['status'] != 'concluido':
+        return {field: values[field] for field in ('tenant_id', 'customer_id', 'status')}
+    return {field: values[field] for field in APPOINTMENT_FIELDS}
+
+
+def sale_contribution(values):
+    """Parte da venda que entra nas métricas (None sem cliente ou não paga)"""
+    if not values.get('customer_id') or values['payment_status'] != 'paid':
+        return None
+    return {field: values[field] for field in ('tenant_id', 'customer_id', 'total', 'date')}
+
+
+def favorite(counts):
+    """Chave com mais ocorrências (no empate, a menor chave)"""
+    if not counts:
+        return None
+    return min(counts.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+def empty_metrics(tenant_id):
+    return {
+        'tenant_id': tenant_id,
+        'total_appointments': 0,
+        'completed_appointments': 0,
+        'cancelled_appointments': 0,
+        'no_show_appointments': 0,
+        'services_spent': Decimal('0'),
+        'sales_count': 0,
+        'sales_spent': Decimal('0'),
+        'first_visit': None,
+        'last_visit': None,
+        'service_counts': {},
+        'professional_counts': {},
+    }
+
+
+def aggregate(appointments, sales):
+    """
+    Métricas completas por cliente a partir dos querysets de Appointment e Sale
+    (models atuais ou históricos, nas migrations): {customer_id: {campo: valor}}
+    """
+    completed = Q(status='concluido')
+    zero = Decimal('0')
+    rows = {}
+
+    def row(item):
+        return rows.setdefault(item['customer_id'], empty_metrics(item['customer__tenant_id']))
+
+    def visit(metrics, first, last):
+        if first is not None and (metrics['first_visit'] is None or first < metrics['first_visit']):
+            metrics['first_visit'] = first
+        if last is not None and (metrics['last_visit'] is None or last > metrics['last_visit']):
+            metrics['last_visit'] = last
+
+    appointments = appointments.filter(customer__isnull=False).order_by()
+    for item in appointments.values('customer_id', 'customer__tenant_id').annotate(
+        total=Count('pk'),
+        completed=Count('pk', filter=completed),
+        cancelled=Count('pk', filter=Q(status='cancelado')),
+        no_show=Count('pk', filter=Q(status='falta')),
+        spent=Sum('price', filter=completed, default=zero),
+        first=Min('start_time', filter=completed),
+        last=Max('start_time', filter=completed),
+    ):
+        metrics = row(item)
+        metrics.update(
+            total_appointments=item['total'],
+            completed_appointments=item['completed'],
+            cancelled_appointments=item['cancelled'],
+            no_show_appointments=item['no_show'],
+            services_spent=item['spent'],
+        )
+        visit(metrics, item['first'], item['last'])
+
+    for field, counts in (('service_id', 'service_counts'), ('professional_id', 'professional_counts')):
+        for item in appointments.filter(completed).values('customer_id', 'customer__tenant_id', field).annotate(
+            count=Count('pk')
+        ):
+            row(item)[counts][str(item[field])] = item['count']
+
+    paid = sales.filter(customer__isnull=False, payment_status='paid').order_by()
+    for item in paid.values('customer_id', 'customer__tenant_id').annotate(
+        count=Count('pk'),
+        spent=Sum('total', default=zero),
+        first=Min('date'),
+        last=Max('date'),
+    ):
+        metrics = row(item)
+        metrics.update(sales_count=item['count'], sales_spent=item['spent'])
+        visit(metrics, item['first'], item['last'])
+
+    for metrics in rows.values():
+        metrics['favorite_service_id'] = favorite(metrics['service_counts'])
+        metrics['favorite_professional_id'] = favorite(metrics['professional_counts'])
+    return rows
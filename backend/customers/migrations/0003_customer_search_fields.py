@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_outboxevent"),
+        ("customers", "0002_alter_customer_last_visit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customer",
+            name="search_cpf",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=14
+            ),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="search_name",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=255
+            ),
+        ),
+        migrations.AddField(
+            model_name="customer",
+            name="search_phone",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=20
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["tenant", "search_name"], name="customers_c_tenant__ac8be9_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["tenant", "search_phone"], name="customers_c_tenant__b9a37d_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="customer",
+            index=models.Index(
+                fields=["tenant", "search_cpf"], name="customers_c_tenant__d63397_idx"
+            ),
+        ),
+    ]
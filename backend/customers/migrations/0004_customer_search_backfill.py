@@ -0,0 +1,54 @@
+from django.db import migrations
+
+from customers.search import normalize_text, only_digits
+
+TRIGRAM_INDEXES = {
+    "customers_search_name_trgm": "search_name",
+    "customers_search_phone_trgm": "search_phone",
+    "customers_search_cpf_trgm": "search_cpf",
+}
+
+
+def fill_search_fields(apps, schema_editor):
+    # O model histórico não passa pelo Customer.save(), então normaliza aqui
+    Customer = apps.get_model("customers", "Customer")
+    batch = []
+    for customer in Customer.objects.only("id", "name", "phone", "cpf").iterator(chunk_size=2000):
+        customer.search_name = normalize_text(customer.name)[:255]
+        customer.search_phone = only_digits(customer.phone)[:20]
+        customer.search_cpf = only_digits(customer.cpf)[:14]
+        batch.append(customer)
+        if len(batch) == 2000:
+            Customer.objects.bulk_update(batch, ["search_name", "search_phone", "search_cpf"])
+            batch = []
+    Customer.objects.bulk_update(batch, ["search_name", "search_phone", "search_cpf"])
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Índices GIN pg_trgm para LIKE '%termo%' (apenas PostgreSQL)
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "customers_customer" USING gin ("{column}" gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0003_customer_search_fields"),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_search_fields, migrations.RunPython.noop),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_outboxevent"),
+        ("customers", "0004_customer_search_backfill"),
+        ("scheduling", "0003_appointment_sync"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CustomerMetrics",
+            fields=[
+                (
+                    "customer",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="metrics",
+                        serialize=False,
+                        to="customers.customer",
+                        verbose_name="Cliente",
+                    ),
+                ),
+                (
+                    "total_appointments",
+                    models.PositiveIntegerField(default=0, verbose_name="Agendamentos"),
+                ),
+                (
+                    "completed_appointments",
+                    models.PositiveIntegerField(default=0, verbose_name="Concluídos"),
+                ),
+                (
+                    "cancelled_appointments",
+                    models.PositiveIntegerField(default=0, verbose_name="Cancelados"),
+                ),
+                (
+                    "no_show_appointments",
+                    models.PositiveIntegerField(default=0, verbose_name="Faltas"),
+                ),
+                (
+                    "services_spent",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Gasto em Serviços",
+                    ),
+                ),
+                (
+                    "sales_count",
+                    models.PositiveIntegerField(default=0, verbose_name="Compras"),
+                ),
+                (
+                    "sales_spent",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Gasto em Compras",
+                    ),
+                ),
+                (
+                    "first_visit",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Primeira Visita"
+                    ),
+                ),
+                (
+                    "last_visit",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Última Visita"
+                    ),
+                ),
+                ("service_counts", models.JSONField(blank=True, default=dict)),
+                ("professional_counts", models.JSONField(blank=True, default=dict)),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="Atualizado em"),
+                ),
+                (
+                    "favorite_professional",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="Profissional Favorito",
+                    ),
+                ),
+                (
+                    "favorite_service",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="scheduling.service",
+                        verbose_name="Serviço Favorito",
+                    ),
+                ),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="customer_metrics",
+                        to="core.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Métricas do Cliente",
+                "verbose_name_plural": "Métricas dos Clientes",
+                "indexes": [
+                    models.Index(
+                        fields=["tenant", "last_visit"],
+                        name="customers_c_tenant__2fbe81_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from customers.metrics import aggregate
+
+
+def build_customer_metrics(apps, schema_editor):
+    CustomerMetrics = apps.get_model("customers", "CustomerMetrics")
+    rows = aggregate(
+        apps.get_model("scheduling", "Appointment").objects.all(),
+        apps.get_model("pos", "Sale").objects.all(),
+    )
+    CustomerMetrics.objects.bulk_create(
+        [CustomerMetrics(customer_id=customer_id, **values) for customer_id, values in rows.items()],
+        batch_size=1000,
+    )
+
+
+def clear_customer_metrics(apps, schema_editor):
+    apps.get_model("customers", "CustomerMetrics").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0005_customermetrics"),
+        ("pos", "0003_add_performance_indexes"),
+        ("scheduling", "0003_appointment_sync"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_customer_metrics, clear_customer_metrics),
+    ]
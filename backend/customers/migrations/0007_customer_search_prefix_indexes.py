@@ -0,0 +1,35 @@
+from django.db import migrations
+
+PREFIX_INDEXES = {
+    "customers_search_name_prefix": "search_name",
+    "customers_search_phone_prefix": "search_phone",
+    "customers_search_cpf_prefix": "search_cpf",
+}
+
+
+def create_prefix_indexes(apps, schema_editor):
+    # LIKE 'termo%' só usa b-tree com varchar_pattern_ops fora da collation C (apenas PostgreSQL)
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, column in PREFIX_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS "{name}" ON "customers_customer" ("tenant_id", "{column}" varchar_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0006_customermetrics_backfill"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
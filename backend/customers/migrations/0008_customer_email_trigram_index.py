@@ -0,0 +1,31 @@
+from django.db import migrations
+
+INDEX_NAME = "customers_email_upper_trgm"
+
+
+def create_email_trigram_index(apps, schema_editor):
+    # email__icontains gera UPPER("email"::text) LIKE UPPER('%termo%') (apenas PostgreSQL)
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS "{INDEX_NAME}" ON "customers_customer" '
+        f'USING gin ((UPPER("email"::text)) gin_trgm_ops)'
+    )
+
+
+def drop_email_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS "{INDEX_NAME}"')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0007_customer_search_prefix_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_trigram_index, drop_email_trigram_index),
+    ]
@@ -2,7 +2,9 @@
 Modelo de Clientes
 Gerencia informações de clientes da barbearia/salão
 """
-from django.db import models
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
 from django.core.validators import EmailValidator, RegexValidator
 from core.models import TenantAwareModel, Tenant
 
@@ -202,6 +204,11 @@ class Customer(TenantAwareModel):
         help_text='Data da última visita (atualizado automaticamente)'
     )
     
+    # Busca (customers.search) - preenchidos no save()
+    search_name = models.CharField(max_length=255, blank=True, default='', editable=False)
+    search_phone = models.CharField(max_length=20, blank=True, default='', editable=False)
+    search_cpf = models.CharField(max_length=14, blank=True, default='', editable=False)
+    
     created_at = models.DateTimeField('Criado em', auto_now_add=True)
     updated_at = models.DateTimeField('Atualizado em', auto_now=True)
     
@@ -216,6 +223,10 @@ class Customer(TenantAwareModel):
             models.Index(fields=['tenant', 'tag']),
             models.Index(fields=['tenant', 'is_active']),
             models.Index(fields=['created_at']),
+            # Busca por prefixo; no PostgreSQL também há índices GIN pg_trgm (migration 0004)
+            models.Index(fields=['tenant', 'search_name']),
+            models.Index(fields=['tenant', 'search_phone']),
+            models.Index(fields=['tenant', 'search_cpf']),
         ]
         # CPF único por tenant (se fornecido)
         constraints = [
@@ -229,6 +240,33 @@ class Customer(TenantAwareModel):
     def __str__(self):
         return f"{self.name} - {self.phone}"
     
+    def save(self, *args, **kwargs):
+        """Atualiza as colunas de busca normalizadas"""
+        from .search import SEARCH_SOURCES
+        
+        self.update_search_fields()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {
+                SEARCH_SOURCES[field] for field in update_fields if field in SEARCH_SOURCES
+            }
+        super().save(*args, **kwargs)
+    
+    def update_search_fields(self):
+        """Preenche search_name/phone/cpf (usar antes de bulk_create/bulk_update)"""
+        from .search import normalize_text, only_digits
+        
+        self.search_name = normalize_text(self.name)[:255]
+        self.search_phone = only_digits(self.phone)[:20]
+        self.search_cpf = only_digits(self.cpf)[:14]
+    
+    def get_metrics(self):
+        """Métricas agregadas do cliente (zeradas se ainda não houver registro)"""
+        try:
+            return self.metrics
+        except CustomerMetrics.DoesNotExist:
+            return CustomerMetrics(customer=self, tenant_id=self.tenant_id)
+    
     def get_full_address(self):
         """Retorna endereço completo formatado"""
         parts = []
@@ -278,3 +316,223 @@ class Customer(TenantAwareModel):
         today = date.today()
         return self.birth_date.month == today.month
 
+
+
+class CustomerMetrics(models.Model):
+    """
+    Métricas agregadas por cliente (visitas, gasto, favoritos)
+    Mantidas por delta a cada save/delete de Appointment e Sale (customers.signals);
+    reconstruídas pelo command rebuild_customer_metrics. Ver customers.metrics.
+    """
+    customer = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='metrics',
+        verbose_name='Cliente'
+    )
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='customer_metrics'
+    )
+    
+    # Agendamentos
+    total_appointments = models.PositiveIntegerField(default=0, verbose_name='Agendamentos')
+    completed_appointments = models.PositiveIntegerField(default=0, verbose_name='Concluídos')
+    cancelled_appointments = models.PositiveIntegerField(default=0, verbose_name='Cancelados')
+    no_show_appointments = models.PositiveIntegerField(default=0, verbose_name='Faltas')
+    services_spent = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Gasto em Serviços'
+    )
+    
+    # Vendas pagas do PDV
+    sales_count = models.PositiveIntegerField(default=0, verbose_name='Compras')
+    sales_spent = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Gasto em Compras'
+    )
+    
+    # Visitas: agendamentos concluídos e vendas pagas
+    first_visit = models.DateTimeField(null=True, blank=True, verbose_name='Primeira Visita')
+    last_visit = models.DateTimeField(null=True, blank=True, verbose_name='Última Visita')
+    
+    # Concluídos por serviço/profissional ({id: quantidade}) e o mais frequente
+    service_counts = models.JSONField(default=dict, blank=True)
+    professional_counts = models.JSONField(default=dict, blank=True)
+    favorite_service = models.ForeignKey(
+        'scheduling.Service',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Serviço Favorito'
+    )
+    favorite_professional = models.ForeignKey(
+        'core.User',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Profissional Favorito'
+    )
+    
+    updated_at = models.DateTimeField('Atualizado em', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Métricas do Cliente'
+        verbose_name_plural = 'Métricas dos Clientes'
+        indexes = [
+            models.Index(fields=['tenant', 'last_visit']),
+        ]
+    
+    def __str__(self):
+        return f"Métricas - {self.customer_id}"
+    
+    @property
+    def visit_count(self):
+        return self.completed_appointments + self.sales_count
+    
+    @property
+    def total_spent(self):
+        return self.services_spent + self.sales_spent
+    
+    @property
+    def average_ticket(self):
+        visits = self.visit_count
+        return (self.total_spent / visits).quantize(Decimal('0.01')) if visits else Decimal('0')
+    
+    @classmethod
+    def apply(cls, changes):
+        """
+        Aplica deltas de agendamentos/vendas às métricas, uma linha travada por cliente
+        `changes` é uma lista de (kind, values, sign): kind 'appointment' ou 'sale',
+        values de appointment_contribution/sale_contribution (None é ignorado)
+        """
+        by_customer = {}
+        for kind, values, sign in changes:
+            if values:
+                by_customer.setdefault((values['tenant_id'], values['customer_id']), []).append((kind, values, sign))
+        
+        with transaction.atomic():
+            for (tenant_id, customer_id), items in by_customer.items():
+                metrics = cls._locked(tenant_id, customer_id, create=any(sign > 0 for _, _, sign in items))
+                # Remoção sem linha de métricas: nada a subtrair (ex.: cliente sendo excluído)
+                if metrics is None:
+                    continue
+                
+                stale_visits = False
+                for kind, values, sign in items:
+                    if kind == 'appointment':
+                        stale_visits |= metrics._apply_appointment(values, sign)
+                    else:
+                        stale_visits |= metrics._apply_sale(values, sign)
+                if stale_visits:
+                    metrics.refresh_visits()
+                metrics.save()
+    
+    @classmethod
+    def _locked(cls, tenant_id, customer_id, create):
+        metrics = cls.objects.select_for_update().filter(customer_id=customer_id).first()
+        if metrics is not None or not create:
+            return metrics
+        try:
+            with transaction.atomic():
+                return cls.objects.create(customer_id=customer_id, tenant_id=tenant_id)
+        except IntegrityError:
+            # Outra transação criou a linha ao mesmo tempo
+            return cls.objects.select_for_update().get(customer_id=customer_id)
+    
+    def _apply_appointment(self, values, sign):
+        """Retorna True se a primeira/última visita precisa ser recalculada"""
+        from .metrics import STATUS_COUNTERS
+        
+        self.total_appointments += sign
+        counter = STATUS_COUNTERS.get(values['status'])
+        if counter:
+            setattr(self, counter, getattr(self, counter) + sign)
+        if values['status'] != 'concluido':
+            return False
+        
+        self.services_spent += Decimal(values['price'] or 0) * sign
+        self.favorite_service_id = self._count('service_counts', values['service_id'], sign)
+        self.favorite_professional_id = self._count('professional_counts', values['professional_id'], sign)
+        return self._visit(values['start_time'], sign)
+    
+    def _apply_sale(self, values, sign):
+        self.sales_count += sign
+        self.sales_spent += Decimal(values['total'] or 0) * sign
+        return self._visit(values['date'], sign)
+    
+    def _count(self, field, key, sign):
+        """Atualiza o contador da chave e retorna a nova favorita"""
+        from .metrics import favorite
+        
+        counts = getattr(self, field)
+        key = str(key)
+        counts[key] = counts.get(key, 0) + sign
+        if counts[key] <= 0:
+            del counts[key]
+        return favorite(counts)
+    
+    def _visit(self, moment, sign):
+        if sign > 0:
+            if self.first_visit is None or moment < self.first_visit:
+                self.first_visit = moment
+            if self.last_visit is None or moment > self.last_visit:
+                self.last_visit = moment
+            return False
+        # Saiu uma visita das pontas: só o banco sabe qual é a próxima
+        return moment in (self.first_visit, self.last_visit)
+    
+    def refresh_visits(self):
+        """Recalcula primeira/última visita a partir dos agendamentos e vendas"""
+        from pos.models import Sale
+        from scheduling.models import Appointment
+        
+        appointments = Appointment.objects.filter(customer_id=self.customer_id, status='concluido').aggregate(
+            first=models.Min('start_time'), last=models.Max('start_time')
+        )
+        sales = Sale.objects.filter(customer_id=self.customer_id, payment_status='paid').aggregate(
+            first=models.Min('date'), last=models.Max('date')
+        )
+        firsts = [value for value in (appointments['first'], sales['first']) if value is not None]
+        lasts = [value for value in (appointments['last'], sales['last']) if value is not None]
+        self.first_visit = min(firsts, default=None)
+        self.last_visit = max(lasts, default=None)
+    
+    @classmethod
+    def rebuild(cls, tenant_id=None, customer_ids=None):
+        """
+        Reconstrói as métricas a partir de Appointment e Sale (todas ou parte)
+        Retorna a quantidade de clientes com métricas
+        """
+        from pos.models import Sale
+        from scheduling.models import Appointment
+        from .metrics import aggregate
+        
+        appointments = Appointment.objects.all()
+        sales = Sale.objects.all()
+        metrics = cls.objects.all()
+        if tenant_id:
+            appointments = appointments.filter(customer__tenant_id=tenant_id)
+            sales = sales.filter(customer__tenant_id=tenant_id)
+            metrics = metrics.filter(tenant_id=tenant_id)
+        if customer_ids is not None:
+            appointments = appointments.filter(customer_id__in=customer_ids)
+            sales = sales.filter(customer_id__in=customer_ids)
+            metrics = metrics.filter(customer_id__in=customer_ids)
+        
+        rows = aggregate(appointments, sales)
+        with transaction.atomic():
+            metrics.delete()
+            cls.objects.bulk_create(
+                [cls(customer_id=customer_id, **values) for customer_id, values in rows.items()],
+                batch_size=1000
+            )
+        return len(rows)
@@ -0,0 +1,118 @@
+"""
+Busca de clientes (typeahead da recepção e ?search= da listagem)
+
+Customer guarda colunas normalizadas, atualizadas no save():
+- search_name: nome sem acentos, minúsculo e com espaços simples
+- search_phone / search_cpf: apenas dígitos
+
+Os termos passam pela mesma normalização, então "joão" encontra "JOAO" e
+"(11) 9 8765" encontra "11987654321".
+
+O ?search= da listagem segue o SearchFilter do DRF: cada termo (palavra) precisa
+aparecer em algum campo, em qualquer posição (LIKE '%termo%'), então "silva joao"
+encontra "João da Silva". No PostgreSQL usa os índices GIN pg_trgm das migrations
+0004 e 0008 (e-mail, via UPPER do icontains).
+
+O typeahead ordena por relevância (prefixo do nome, prefixo do número e o termo
+em qualquer posição) e limita a quantidade de resultados. As colunas já são
+minúsculas, então o prefixo é um startswith (LIKE 'termo%'); no PostgreSQL ele
+usa os índices varchar_pattern_ops da migration 0007 (os b-tree comuns não
+servem para LIKE em collations diferentes de C).
+"""
+import operator
+import re
+import unicodedata
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework import filters
+
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 50
+
+# Campos de origem -> colunas de busca (save(update_fields=...) mantém as duas em sincronia)
+SEARCH_SOURCES = {'name': 'search_name', 'phone': 'search_phone', 'cpf': 'search_cpf'}
+
+_NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_text(value):
+    """Sem acentos, minúsculo e com espaços simples"""
+    decomposed = unicodedata.normalize('NFKD', value or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def only_digits(value):
+    return _NON_DIGITS.sub('', value or '')
+
+
+def _prefix(field, term):
+    return Q(**{f'{field}__startswith': term})
+
+
+def match_conditions(term):
+    """Q que encontra o termo no nome, telefone, CPF ou e-mail"""
+    text = normalize_text(term)
+    digits = only_digits(term)
+    if not text:
+        return None
+
+    condition = Q(search_name__contains=text) | Q(email__icontains=term.strip())
+    if digits:
+        condition |= Q(search_phone__contains=digits) | Q(search_cpf__contains=digits)
+    return condition
+
+
+def terms_conditions(terms):
+    """Q que exige todos os termos, cada um em qualquer campo (None se não houver termos)"""
+    conditions = [condition for condition in map(match_conditions, terms) if condition is not None]
+    if not conditions:
+        return None
+    return reduce(operator.and_, conditions)
+
+
+def search_customers(queryset, terms):
+    """Filtra o queryset pelos termos (sem ordenação)"""
+    condition = terms_conditions(terms)
+    if condition is None:
+        return queryset.none()
+    return queryset.filter(condition)
+
+
+def typeahead(queryset, term, fields, limit=TYPEAHEAD_LIMIT):
+    """
+    Clientes que casam com o termo, mais relevantes primeiro (lista de dicts)
+    Cada faixa de relevância é uma consulta com LIMIT na ordem do índice, então
+    termos curtos com milhares de resultados não ordenam todos eles:
+    1. prefixo do nome, 2. prefixo do telefone/CPF, 3. contém cada palavra do termo
+    """
+    text = normalize_text(term)
+    digits = only_digits(term)
+    if not text:
+        return []
+
+    tiers = [(_prefix('search_name', text), 'search_name')]
+    if digits:
+        tiers += [(_prefix('search_phone', digits), 'search_phone'), (_prefix('search_cpf', digits), 'search_cpf')]
+    tiers.append((terms_conditions(term.split()), 'search_name'))
+
+    results = {}
+    for condition, ordering in tiers:
+        remaining = limit - len(results)
+        if remaining <= 0:
+            break
+        rows = queryset.filter(condition).exclude(pk__in=list(results)).order_by(ordering, 'pk')
+        for row in rows.values('pk', *fields)[:remaining]:
+            results[row.pop('pk')] = row
+    return list(results.values())
+
+
+class CustomerSearchFilter(filters.SearchFilter):
+    """SearchFilter do DRF (?search=) usando as colunas normalizadas"""
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return search_customers(queryset, terms)
@@ -64,23 +64,12 @@ class CustomerSerializer(serializers.ModelSerializer):
         return obj.is_birthday_this_month()
     
     def get_total_appointments(self, obj):
-        """Conta total de agendamentos do cliente"""
-        return obj.appointments.count() if hasattr(obj, 'appointments') else 0
+        """Total de agendamentos do cliente (CustomerMetrics)"""
+        return obj.get_metrics().total_appointments
     
     def get_total_spent(self, obj):
-        """Calcula total gasto pelo cliente"""
-        if not hasattr(obj, 'appointments'):
-            return 0.0
-        
-        total = 0.0
-        for appointment in obj.appointments.filter(status='concluido'):
-            if appointment.service_details and appointment.service_details.get('price'):
-                try:
-                    total += float(appointment.service_details['price'])
-                except (ValueError, TypeError):
-                    pass
-        
-        return round(total, 2)
+        """Total gasto pelo cliente em serviços concluídos e compras pagas (CustomerMetrics)"""
+        return float(obj.get_metrics().total_spent)
     
     def validate_cpf(self, value):
         """Valida CPF único por tenant"""
@@ -148,7 +137,7 @@ class CustomerListSerializer(serializers.ModelSerializer):
         return obj.get_age()
     
     def get_total_appointments(self, obj):
-        return obj.appointments.count() if hasattr(obj, 'appointments') else 0
+        return obj.get_metrics().total_appointments
 
 
 class CustomerStatsSerializer(serializers.Serializer):
@@ -159,8 +148,10 @@ class CustomerStatsSerializer(serializers.Serializer):
     completed_appointments = serializers.IntegerField()
     cancelled_appointments = serializers.IntegerField()
     no_show_appointments = serializers.IntegerField()
-    total_spent = serializers.DecimalField(max_digits=10, decimal_places=2)
-    average_ticket = serializers.DecimalField(max_digits=10, decimal_places=2)
+    sales_count = serializers.IntegerField()
+    visit_count = serializers.IntegerField()
+    total_spent = serializers.DecimalField(max_digits=12, decimal_places=2)
+    average_ticket = serializers.DecimalField(max_digits=12, decimal_places=2)
     first_visit = serializers.DateTimeField(allow_null=True)
     last_visit = serializers.DateTimeField(allow_null=True)
     favorite_service = serializers.CharField(allow_null=True)
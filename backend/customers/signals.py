@@ -0,0 +1,67 @@
+"""
+Signals do módulo de Clientes
+Mantém CustomerMetrics a partir de agendamentos e vendas
+"""
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from pos.models import Sale
+from scheduling.models import Appointment
+
+from .metrics import APPOINTMENT_FIELDS, SALE_FIELDS, appointment_contribution, sale_contribution
+from .models import CustomerMetrics
+
+TRACKED = {
+    Appointment: ('appointment', APPOINTMENT_FIELDS, appointment_contribution),
+    Sale: ('sale', SALE_FIELDS, sale_contribution),
+}
+
+
+def _snapshot(instance, fields):
+    # __dict__ evita query quando o campo foi adiado (.only()/.defer()); incompleto -> None
+    values = instance.__dict__
+    if any(field not in values for field in fields):
+        return None
+    return {field: values[field] for field in fields}
+
+
+@receiver(post_init, sender=Appointment)
+@receiver(post_init, sender=Sale)
+def remember_metrics_values(sender, instance, **kwargs):
+    instance._customer_metrics = _snapshot(instance, TRACKED[sender][1])
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_save, sender=Sale)
+def update_customer_metrics(sender, instance, created, **kwargs):
+    """
+    Aplica a diferença entre o estado carregado e o salvo
+    Saves que não mudam a contribuição (ex.: observações, venda pendente) não consultam nada
+    """
+    kind, fields, contribution = TRACKED[sender]
+    current = {field: getattr(instance, field) for field in fields}
+    snapshot = getattr(instance, '_customer_metrics', None)
+    instance._customer_metrics = current
+
+    if not created and snapshot is None:
+        # Carregado com campos adiados: o estado anterior é desconhecido
+        if instance.customer_id:
+            CustomerMetrics.rebuild(customer_ids=[instance.customer_id])
+        return
+
+    previous = None if created else contribution(snapshot)
+    current = contribution(current)
+    if previous != current:
+        CustomerMetrics.apply([(kind, previous, -1), (kind, current, 1)])
+
+
+@receiver(post_delete, sender=Appointment)
+@receiver(post_delete, sender=Sale)
+def remove_from_customer_metrics(sender, instance, **kwargs):
+    """
+    Subtrai o agendamento/venda excluído das métricas
+    Via signal para cobrir também exclusões em lote (queryset.delete())
+    """
+    kind, fields, contribution = TRACKED[sender]
+    values = contribution({field: getattr(instance, field) for field in fields})
+    CustomerMetrics.apply([(kind, values, -1)])
@@ -1,3 +1,228 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Tenant, User
+from pos.models import CashRegister, Sale
+from scheduling.models import Appointment, Service
+
+from .models import Customer, CustomerMetrics
+from .search import normalize_text, only_digits
+
+
+class CustomerSearchTestCase(TestCase):
+    """Testa a busca de clientes pelas colunas normalizadas"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.joao = self.add('João  da SILVA', '11987654321', cpf='123.456.789-09')
+        self.maria = self.add('Maria Joana', '21912345678')
+        self.add('Pedro Joaquim', '31900000000', active=False)
+        other_tenant = Tenant.objects.create(name='Other Barbershop', subscription_status='ACTIVE')
+        Customer.objects.create(tenant=other_tenant, name='João Outro', phone='11987654000')
+
+    def add(self, name, phone, cpf=None, active=True):
+        return Customer.objects.create(tenant=self.tenant, name=name, phone=phone, cpf=cpf, is_active=active)
+
+    def search(self, term, **params):
+        response = self.client.get('/api/customers/search/', {'q': term, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in response.json()]
+
+    def test_normalization(self):
+        self.assertEqual(normalize_text('  JOÃO   da Silva '), 'joao da silva')
+        self.assertEqual(only_digits('(11) 9 8765-4321'), '11987654321')
+        self.assertEqual(
+            (self.joao.search_name, self.joao.search_phone, self.joao.search_cpf),
+            ('joao da silva', '11987654321', '12345678909'),
+        )
+
+        # save(update_fields=...) mantém a coluna de busca junto
+        self.joao.name = 'Joãozinho'
+        self.joao.save(update_fields=['name'])
+        self.assertEqual(Customer.objects.get(pk=self.joao.pk).search_name, 'joaozinho')
+
+    def test_typeahead_matches_name_phone_and_cpf(self):
+        # Prefixo do nome primeiro, depois o termo em qualquer posição
+        self.assertEqual(self.search('jo'), ['João  da SILVA', 'Maria Joana', 'Pedro Joaquim'])
+        self.assertEqual(self.search('JOÃO da'), ['João  da SILVA'])
+        self.assertEqual(self.search('(21) 9123'), ['Maria Joana'])
+        # Prefixo do CPF antes do telefone que só contém os dígitos
+        self.assertEqual(self.search('123.456'), ['João  da SILVA', 'Maria Joana'])
+        self.assertEqual(self.search('xyz'), [])
+        self.assertEqual(self.search(''), [])
+
+    def test_typeahead_ranks_prefix_first_and_limits(self):
+        for i in range(12):
+            self.add(f'Pedro {i:02d}', f'4190000{i:04d}')
+        self.assertEqual(self.search('pedro'), ['Pedro 00', 'Pedro 01', 'Pedro 02', 'Pedro 03', 'Pedro 04',
+                                                'Pedro 05', 'Pedro 06', 'Pedro 07', 'Pedro 08', 'Pedro 09'])
+        self.assertEqual(len(self.search('pedro', limit=3)), 3)
+        self.assertEqual(len(self.search('pedro', limit=500)), 13)
+
+    def test_list_search_uses_normalized_columns(self):
+        response = self.client.get('/api/customers/', {'search': 'maria'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['name'] for row in response.json()['results']], ['Maria Joana'])
+
+        # Substring, não só prefixo (como o icontains anterior)
+        response = self.client.get('/api/customers/', {'search': 'silva'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['João  da SILVA'])
+        response = self.client.get('/api/customers/', {'search': '7654'})
+        self.assertEqual([row['name'] for row in response.json()['results']], ['João  da SILVA'])
+
+    def test_each_term_must_match_some_field(self):
+        Customer.objects.filter(pk=self.joao.pk).update(email='joao.silva@gmail.com')
+
+        def names(term):
+            response = self.client.get('/api/customers/', {'search': term})
+            return [row['name'] for row in response.json()['results']]
+
+        # Termos em qualquer ordem, como no SearchFilter do DRF
+        self.assertEqual(names('silva joao'), ['João  da SILVA'])
+        self.assertEqual(names('silva 4321'), ['João  da SILVA'])
+        self.assertEqual(names('maria silva'), [])
+        self.assertEqual(self.search('silva joão'), ['João  da SILVA'])
+
+        # Trechos do e-mail em qualquer posição
+        self.assertEqual(names('gmail'), ['João  da SILVA'])
+        self.assertEqual(names('joao.silva'), ['João  da SILVA'])
+        self.assertEqual(names('SILVA@GMAIL'), ['João  da SILVA'])
+
+
+class CustomerMetricsTestCase(TestCase):
+    """Testa as métricas agregadas por cliente mantidas por delta"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.barber = User.objects.create_user(
+            email='barber@test.com', password='testpass123', name='Barbeiro', tenant=self.tenant, role='barbeiro'
+        )
+        self.corte = Service.objects.create(tenant=self.tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30)
+        self.barba = Service.objects.create(tenant=self.tenant, name='Barba', price=Decimal('30.00'), duration_minutes=20)
+        self.register = CashRegister.objects.create(tenant=self.tenant, user=self.user, opening_balance=Decimal('0'))
+        self.customer = Customer.objects.create(tenant=self.tenant, name='Cliente', phone='11987654321')
+        self.now = timezone.now()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def book(self, days_ago, status='concluido', service=None, customer=None):
+        return Appointment.objects.create(
+            tenant=self.tenant,
+            customer=customer or self.customer,
+            customer_name='Cliente',
+            service=service or self.corte,
+            professional=self.barber,
+            start_time=self.now - timedelta(days=days_ago),
+            status=status,
+        )
+
+    def sell(self, total, payment_status='paid'):
+        return Sale.objects.create(
+            tenant=self.tenant, user=self.user, cash_register=self.register, customer=self.customer,
+            payment_method='cash', payment_status=payment_status, subtotal=total, total=total
+        )
+
+    def metrics(self):
+        return CustomerMetrics.objects.get(customer=self.customer)
+
+    def assertMatchesRebuild(self):
+        incremental = CustomerMetrics.objects.filter(customer=self.customer).values().first()
+        CustomerMetrics.rebuild(tenant_id=self.tenant.id)
+        rebuilt = CustomerMetrics.objects.filter(customer=self.customer).values().first()
+        incremental.pop('updated_at')
+        rebuilt.pop('updated_at')
+        self.assertEqual(incremental, rebuilt)
+
+    def test_appointments_and_sales_update_metrics(self):
+        first = self.book(30)
+        self.book(10, service=self.barba)
+        last = self.book(5)
+        self.book(3, status='cancelado')
+        self.book(2, status='falta')
+        self.book(-1, status='marcado')
+        sale = self.sell(Decimal('25.00'))
+        self.sell(Decimal('99.00'), payment_status='pending')
+
+        metrics = self.metrics()
+        self.assertEqual(
+            (metrics.total_appointments, metrics.completed_appointments,
+             metrics.cancelled_appointments, metrics.no_show_appointments),
+            (6, 3, 1, 1)
+        )
+        self.assertEqual(metrics.services_spent, Decimal('130.00'))
+        self.assertEqual((metrics.sales_count, metrics.sales_spent), (1, Decimal('25.00')))
+        self.assertEqual(metrics.visit_count, 4)
+        self.assertEqual(metrics.first_visit, first.start_time)
+        self.assertEqual(metrics.last_visit, sale.date)
+        self.assertEqual((metrics.favorite_service, metrics.favorite_professional), (self.corte, self.barber))
+        self.assertMatchesRebuild()
+
+        # Estorno da venda, cancelamento e exclusão recalculam as pontas
+        sale.payment_status = 'cancelled'
+        sale.save()
+        last.status = 'cancelado'
+        last.save()
+        first.delete()
+        metrics = self.metrics()
+        self.assertEqual((metrics.completed_appointments, metrics.cancelled_appointments), (1, 2))
+        self.assertEqual((metrics.sales_count, metrics.services_spent), (0, Decimal('30.00')))
+        self.assertEqual(metrics.first_visit, metrics.last_visit)
+        self.assertEqual(metrics.favorite_service, self.barba)
+        self.assertMatchesRebuild()
+
+    def test_unchanged_save_skips_metrics(self):
+        appointment = self.book(1)
+        appointment = Appointment.objects.get(pk=appointment.pk)
+        appointment.notes = 'Chegou cedo'
+        with CaptureQueriesContext(connection) as ctx:
+            appointment.save()
+        self.assertFalse([q for q in ctx.captured_queries if 'customermetrics' in q['sql']])
+
+    def test_reassigned_appointment_moves_between_customers(self):
+        appointment = self.book(1)
+        other = Customer.objects.create(tenant=self.tenant, name='Outro', phone='11900000000')
+        appointment.customer = other
+        appointment.save()
+        self.assertEqual(self.metrics().total_appointments, 0)
+        self.assertIsNone(self.metrics().last_visit)
+        self.assertEqual(CustomerMetrics.objects.get(customer=other).completed_appointments, 1)
+
+    def test_endpoints_read_metrics_without_appointments(self):
+        self.book(90)
+        self.book(70, service=self.barba)
+        self.book(40, service=self.barba)
+        self.sell(Decimal('20.00'))
+        recent = Customer.objects.create(tenant=self.tenant, name='Recente', phone='11911111111')
+        self.book(1, customer=recent)
+        Customer.objects.create(tenant=self.tenant, name='Nunca Veio', phone='11922222222')
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/customers/')
+            inactive = self.client.get('/api/customers/inactive/')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([q for q in ctx.captured_queries if 'scheduling_appointment' in q['sql']])
+        totals = {row['name']: row['total_appointments'] for row in response.json()['results']}
+        self.assertEqual(totals, {'Cliente': 3, 'Recente': 1, 'Nunca Veio': 0})
+        self.assertEqual({row['name'] for row in inactive.json()}, {'Nunca Veio'})
 
-# Create your tests here.
+        response = self.client.get(f'/api/customers/{self.customer.pk}/stats/')
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertEqual((stats['visit_count'], stats['total_spent'], stats['average_ticket']), (4, '130.00', '32.50'))
+        self.assertEqual(stats['favorite_service'], 'Barba')
+        self.assertEqual(stats['favorite_professional'], 'Barbeiro')
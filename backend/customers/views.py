@@ -8,13 +8,11 @@ from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import filters
 from django.db.models import Count, Q, Sum, Avg, F
+from django.utils import timezone
 from datetime import datetime, timedelta
-from django.http import HttpResponse
-import csv
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
 
 from .models import Customer
+from .search import TYPEAHEAD_LIMIT, TYPEAHEAD_MAX_LIMIT, CustomerSearchFilter, typeahead
 from .serializers import (
     CustomerSerializer,
     CustomerListSerializer,
@@ -22,9 +20,11 @@ from .serializers import (
     CreateCustomerSerializer
 )
 from core.permissions import IsSameTenant
+from core.exports import ExportColumn, ExportMixin, choice_display, date_br, datetime_br, or_dash, yes_no
+from core.response_cache import TenantCachedResponseMixin
 
 
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(ExportMixin, TenantCachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar Clientes
     
@@ -37,30 +37,53 @@ class CustomerViewSet(viewsets.ModelViewSet):
     - DELETE /api/customers/{id}/ - Deleta cliente
     - GET /api/customers/{id}/stats/ - Estatísticas do cliente
     - GET /api/customers/{id}/appointments/ - Agendamentos do cliente
+    - GET /api/customers/search/?q= - Busca rápida (typeahead)
     - GET /api/customers/birthdays/ - Aniversariantes do mês
     - GET /api/customers/inactive/ - Clientes inativos
     - POST /api/customers/{id}/activate/ - Ativa cliente
     - POST /api/customers/{id}/deactivate/ - Desativa cliente
     """
+    cache_resources = ('customers', 'appointments', 'sales')
     permission_classes = [IsAuthenticated, IsSameTenant]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, CustomerSearchFilter, filters.OrderingFilter]
     
     # Filtros
     filterset_fields = ['tag', 'is_active', 'gender']
+    # Usados só pelo schema; a busca usa as colunas normalizadas (customers.search)
     search_fields = ['name', 'phone', 'email', 'cpf']
     ordering_fields = ['name', 'created_at', 'last_visit']
     ordering = ['-created_at']
     
+    export_filename = 'clientes'
+    export_sheet_title = 'Clientes'
+    export_columns = [
+        ExportColumn('Nome', 'name', or_dash, width=30),
+        ExportColumn('Telefone', 'phone', or_dash, width=15),
+        ExportColumn('E-mail', 'email', or_dash, width=30),
+        ExportColumn('CPF', 'cpf', or_dash, width=15),
+        ExportColumn('Data de Nascimento', 'birth_date', date_br, width=18),
+        ExportColumn('Gênero', 'gender', choice_display(Customer._meta.get_field('gender').choices), width=12),
+        ExportColumn('Tag', 'tag', choice_display(Customer.TAG_CHOICES), width=12),
+        ExportColumn(
+            'Endereço',
+            ('address_street', 'address_number', 'address_neighborhood', 'address_city', 'address_state'),
+            lambda *parts: ', '.join(part for part in parts if part) or '-',
+            width=40
+        ),
+        ExportColumn('Ativo', 'is_active', yes_no, width=10),
+        ExportColumn('Cadastrado em', 'created_at', datetime_br, width=18),
+    ]
+    
     def get_queryset(self):
-        """Filtra clientes do tenant do usuário - Otimizado"""
-        return Customer.objects.filter(
+        """Filtra clientes do tenant do usuário, com as métricas agregadas (CustomerMetrics)"""
+        queryset = Customer.objects.filter(
             tenant=self.request.user.tenant
         ).select_related(
-            'tenant'
-        ).prefetch_related(
-            'appointments__service',
-            'appointments__professional'
+            'tenant', 'metrics'
         ).order_by('-created_at')
+        if self.action == 'stats':
+            queryset = queryset.select_related('metrics__favorite_service', 'metrics__favorite_professional')
+        return queryset
     
     def get_serializer_class(self):
         """Retorna serializer apropriado para cada ação"""
@@ -103,68 +126,24 @@ class CustomerViewSet(viewsets.ModelViewSet):
     def stats(self, request, pk=None):
         """
         GET /api/customers/{id}/stats/
-        Retorna estatísticas detalhadas do cliente
+        Retorna estatísticas detalhadas do cliente (de CustomerMetrics, sem ler os agendamentos)
         """
         customer = self.get_object()
-        
-        # Busca appointments do cliente
-        from scheduling.models import Appointment
-        appointments = Appointment.objects.filter(
-            tenant=request.user.tenant,
-            customer_name=customer.name  # Assumindo que customer_name está no Appointment
-        )
-        
-        # Calcula estatísticas
-        total_appointments = appointments.count()
-        completed = appointments.filter(status='concluido').count()
-        cancelled = appointments.filter(status='cancelado').count()
-        no_show = appointments.filter(status='falta').count()
-        
-        # Calcula gastos
-        total_spent = 0.0
-        service_count = {}
-        professional_count = {}
-        
-        completed_apps = appointments.filter(status='concluido')
-        for app in completed_apps:
-            # Total gasto
-            if hasattr(app, 'service_details') and app.service_details:
-                price = app.service_details.get('price', 0)
-                try:
-                    total_spent += float(price)
-                except (ValueError, TypeError):
-                    pass
-            
-            # Serviço favorito
-            service_name = app.service_details.get('name') if hasattr(app, 'service_details') and app.service_details else 'Desconhecido'
-            service_count[service_name] = service_count.get(service_name, 0) + 1
-            
-            # Profissional favorito
-            prof_name = app.professional_details.get('name') if hasattr(app, 'professional_details') and app.professional_details else 'Desconhecido'
-            professional_count[prof_name] = professional_count.get(prof_name, 0) + 1
-        
-        # Favoritos
-        favorite_service = max(service_count.items(), key=lambda x: x[1])[0] if service_count else None
-        favorite_professional = max(professional_count.items(), key=lambda x: x[1])[0] if professional_count else None
-        
-        # Ticket médio
-        average_ticket = total_spent / completed if completed > 0 else 0.0
-        
-        # Primeira e última visita
-        first_visit = appointments.order_by('start_time').first()
-        last_visit = appointments.order_by('-start_time').first()
+        metrics = customer.get_metrics()
         
         stats = {
-            'total_appointments': total_appointments,
-            'completed_appointments': completed,
-            'cancelled_appointments': cancelled,
-            'no_show_appointments': no_show,
-            'total_spent': round(total_spent, 2),
-            'average_ticket': round(average_ticket, 2),
-            'first_visit': first_visit.start_time if first_visit else None,
-            'last_visit': last_visit.start_time if last_visit else None,
-            'favorite_service': favorite_service,
-            'favorite_professional': favorite_professional,
+            'total_appointments': metrics.total_appointments,
+            'completed_appointments': metrics.completed_appointments,
+            'cancelled_appointments': metrics.cancelled_appointments,
+            'no_show_appointments': metrics.no_show_appointments,
+            'sales_count': metrics.sales_count,
+            'visit_count': metrics.visit_count,
+            'total_spent': metrics.total_spent,
+            'average_ticket': metrics.average_ticket,
+            'first_visit': metrics.first_visit,
+            'last_visit': metrics.last_visit,
+            'favorite_service': getattr(metrics.favorite_service, 'name', None),
+            'favorite_professional': getattr(metrics.favorite_professional, 'name', None),
         }
         
         serializer = CustomerStatsSerializer(stats)
@@ -189,6 +168,29 @@ class CustomerViewSet(viewsets.ModelViewSet):
         serializer = AppointmentSerializer(appointments, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        GET /api/customers/search/?q=<termo>&limit=10
+        Busca rápida por nome, telefone, CPF ou e-mail, mais relevantes primeiro
+        """
+        term = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', TYPEAHEAD_LIMIT)), TYPEAHEAD_MAX_LIMIT)
+        except ValueError:
+            limit = TYPEAHEAD_LIMIT
+        
+        if not term or limit < 1:
+            return Response([])
+        
+        customers = typeahead(
+            Customer.objects.filter(tenant=request.user.tenant),
+            term,
+            ('id', 'name', 'phone', 'email', 'cpf', 'tag', 'is_active', 'last_visit'),
+            limit
+        )
+        return Response(customers)
+    
     @action(detail=False, methods=['get'])
     def birthdays(self, request):
         """
@@ -209,14 +211,14 @@ class CustomerViewSet(viewsets.ModelViewSet):
     def inactive(self, request):
         """
         GET /api/customers/inactive/
-        Lista clientes que não vêm há mais de 60 dias
+        Lista clientes que não vêm há mais de 60 dias (ou que nunca vieram)
         """
-        sixty_days_ago = datetime.now() - timedelta(days=60)
+        sixty_days_ago = timezone.now() - timedelta(days=60)
         
         customers = self.get_queryset().filter(
-            Q(last_visit__lt=sixty_days_ago) | Q(last_visit__isnull=True),
+            Q(metrics__last_visit__lt=sixty_days_ago) | Q(metrics__last_visit__isnull=True),
             is_active=True
-        ).order_by('last_visit')
+        ).order_by('metrics__last_visit')
         
         serializer = CustomerListSerializer(customers, many=True)
         return Response(serializer.data)
@@ -269,128 +271,3 @@ class CustomerViewSet(viewsets.ModelViewSet):
         }
         
         return Response(summary)
-
-    @action(detail=False, methods=['get'])
-    def export_csv(self, request):
-        """Exporta clientes em formato CSV"""
-        try:
-            queryset = self.filter_queryset(self.get_queryset())
-            
-            # Criar resposta CSV
-            response = HttpResponse(content_type='text/csv; charset=utf-8')
-            response['Content-Disposition'] = 'attachment; filename="clientes.csv"'
-            response.write('\ufeff')  # BOM para UTF-8
-            
-            writer = csv.writer(response)
-            writer.writerow([
-                'Nome',
-                'Telefone',
-                'E-mail',
-                'CPF',
-                'Data de Nascimento',
-                'Gênero',
-                'Tag',
-                'Endereço',
-                'Ativo',
-                'Cadastrado em'
-            ])
-            
-            for customer in queryset:
-                try:
-                    writer.writerow([
-                        customer.name or '-',
-                        customer.phone or '-',
-                        customer.email or '-',
-                        customer.cpf or '-',
-                        customer.birth_date.strftime('%d/%m/%Y') if customer.birth_date else '-',
-                        customer.get_gender_display() if customer.gender else '-',
-                        customer.get_tag_display() if hasattr(customer, 'get_tag_display') else '-',
-                        customer.address or '-',
-                        'Sim' if customer.is_active else 'Não',
-                        customer.created_at.strftime('%d/%m/%Y %H:%M') if customer.created_at else '-'
-                    ])
-                except Exception as row_error:
-                    # Log do erro mas continua processando outros clientes
-                    import logging
-                    logger = logging.getLogger(__name__)
-                    logger.error(f"Erro ao exportar cliente {customer.id}: {str(row_error)}")
-                    continue
-            
-            return response
-            
-        except Exception as e:
-            # Log do erro completo
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Erro ao exportar CSV de clientes: {str(e)}", exc_info=True)
-            
-            return Response({
-                'error': f'Erro ao exportar CSV: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-    @action(detail=False, methods=['get'])
-    def export_excel(self, request):
-        """Exporta clientes em formato Excel"""
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Criar workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Clientes"
-        
-        # Estilizar cabeçalho
-        header_font = Font(bold=True)
-        header_alignment = Alignment(horizontal='center')
-        
-        headers = [
-            'Nome',
-            'Telefone',
-            'E-mail',
-            'CPF',
-            'Data de Nascimento',
-            'Gênero',
-            'Tag',
-            'Endereço',
-            'Ativo',
-            'Cadastrado em'
-        ]
-        
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.alignment = header_alignment
-        
-        # Adicionar dados
-        for row, customer in enumerate(queryset, start=2):
-            ws.cell(row=row, column=1, value=customer.name)
-            ws.cell(row=row, column=2, value=customer.phone)
-            ws.cell(row=row, column=3, value=customer.email or '-')
-            ws.cell(row=row, column=4, value=customer.cpf or '-')
-            ws.cell(row=row, column=5, value=customer.birth_date.strftime('%d/%m/%Y') if customer.birth_date else '-')
-            ws.cell(row=row, column=6, value=customer.get_gender_display() if customer.gender else '-')
-            ws.cell(row=row, column=7, value=customer.get_tag_display())
-            ws.cell(row=row, column=8, value=customer.address or '-')
-            ws.cell(row=row, column=9, value='Sim' if customer.is_active else 'Não')
-            ws.cell(row=row, column=10, value=customer.created_at.strftime('%d/%m/%Y %H:%M'))
-        
-        # Ajustar largura das colunas
-        ws.column_dimensions['A'].width = 30
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 30
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 18
-        ws.column_dimensions['F'].width = 12
-        ws.column_dimensions['G'].width = 12
-        ws.column_dimensions['H'].width = 40
-        ws.column_dimensions['I'].width = 10
-        ws.column_dimensions['J'].width = 18
-        
-        # Criar resposta
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="clientes.xlsx"'
-        wb.save(response)
-        
-        return response
-
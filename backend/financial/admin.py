@@ -24,7 +24,10 @@ class TransactionAdmin(admin.ModelAdmin):
 
 @admin.register(CashFlow)
 class CashFlowAdmin(admin.ModelAdmin):
-    list_display = ['date', 'tenant', 'total_revenue', 'total_expenses', 'balance']
-    list_filter = ['date', 'tenant']
-    readonly_fields = ['total_revenue', 'total_expenses', 'balance', 'created_at', 'updated_at']
+    list_display = ['date', 'tenant', 'payment_method', 'category', 'total_revenue', 'total_expenses', 'balance']
+    list_filter = ['date', 'category', 'tenant']
+    readonly_fields = [
+        'total_revenue', 'total_expenses', 'balance',
+        'revenue_count', 'expense_count', 'created_at', 'updated_at'
+    ]
     date_hierarchy = 'date'
@@ -0,0 +1,36 @@
+"""
+Command para reconstruir o rollup de fluxo de caixa (CashFlow) a partir das transações
+O rollup é mantido por delta a cada save/delete de Transaction; use este command
+para o backfill inicial ou após alterações feitas fora do ORM (ex.: queryset.update)
+"""
+from django.core.management.base import BaseCommand
+from financial.models import CashFlow
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o CashFlow (rollup por dia, método de pagamento e categoria) a partir das transações'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            help='ID do tenant (padrão: todos os tenants)'
+        )
+        parser.add_argument(
+            '--start-date',
+            help='Data inicial (YYYY-MM-DD)'
+        )
+        parser.add_argument(
+            '--end-date',
+            help='Data final (YYYY-MM-DD)'
+        )
+
+    def handle(self, *args, **options):
+        rows = CashFlow.rebuild(
+            tenant_id=options['tenant'],
+            start_date=options['start_date'],
+            end_date=options['end_date']
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Fluxo de caixa reconstruído: {rows} linhas'
+        ))
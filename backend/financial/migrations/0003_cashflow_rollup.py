@@ -0,0 +1,112 @@
+# Generated by Django 5.2.7 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def clear_cash_flow(apps, schema_editor):
+    # Os registros antigos são por dia, sem método/categoria: serão reconstruídos
+    apps.get_model("financial", "CashFlow").objects.all().delete()
+
+
+def build_cash_flow(apps, schema_editor):
+    CashFlow = apps.get_model("financial", "CashFlow")
+    Transaction = apps.get_model("financial", "Transaction")
+
+    revenue = Q(type="receita")
+    expense = Q(type="despesa")
+    rows = Transaction.objects.order_by().values(
+        "tenant_id", "date", "payment_method_id", "category"
+    ).annotate(
+        total_revenue=Sum("amount", filter=revenue, default=Decimal("0")),
+        total_expenses=Sum("amount", filter=expense, default=Decimal("0")),
+        revenue_count=Count("id", filter=revenue),
+        expense_count=Count("id", filter=expense),
+    )
+    CashFlow.objects.bulk_create(
+        [CashFlow(balance=row["total_revenue"] - row["total_expenses"], **row) for row in rows],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("financial", "0002_transaction_category"),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_cash_flow, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name="cashflow",
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name="cashflow",
+            name="payment_method",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="cash_flows",
+                to="financial.paymentmethod",
+                verbose_name="Método de Pagamento",
+            ),
+        ),
+        migrations.AddField(
+            model_name="cashflow",
+            name="category",
+            field=models.CharField(
+                choices=[
+                    ("servico", "Serviço"),
+                    ("produto", "Produto"),
+                    ("salario", "Salário"),
+                    ("aluguel", "Aluguel"),
+                    ("fornecedor", "Fornecedor"),
+                    ("imposto", "Imposto"),
+                    ("outro", "Outro"),
+                ],
+                default="outro",
+                max_length=20,
+                verbose_name="Categoria",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="cashflow",
+            name="revenue_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="Qtd. de Receitas"),
+        ),
+        migrations.AddField(
+            model_name="cashflow",
+            name="expense_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="Qtd. de Despesas"),
+        ),
+        migrations.AlterField(
+            model_name="cashflow",
+            name="total_revenue",
+            field=models.DecimalField(
+                decimal_places=2, default=0, max_digits=12, verbose_name="Total de Receitas"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="cashflow",
+            name="total_expenses",
+            field=models.DecimalField(
+                decimal_places=2, default=0, max_digits=12, verbose_name="Total de Despesas"
+            ),
+        ),
+        migrations.AlterField(
+            model_name="cashflow",
+            name="balance",
+            field=models.DecimalField(
+                decimal_places=2, default=0, max_digits=12, verbose_name="Saldo"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="cashflow",
+            unique_together={("tenant", "date", "payment_method", "category")},
+        ),
+        migrations.RunPython(build_cash_flow, clear_cash_flow),
+    ]
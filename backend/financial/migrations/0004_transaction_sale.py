@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def link_sale_transactions(apps, schema_editor):
+    # Transações geradas antes do vínculo só traziam "Venda #<id> - ..." na descrição
+    Sale = apps.get_model("pos", "Sale")
+    Transaction = apps.get_model("financial", "Transaction")
+
+    linked = set()
+    rows = Transaction.objects.filter(description__startswith="Venda #").order_by("created_at")
+    for transaction_id, tenant_id, description in rows.values_list("id", "tenant_id", "description"):
+        sale_id = description[len("Venda #"):].split(" ", 1)[0]
+        if not sale_id.isdigit() or sale_id in linked:
+            continue
+        if Sale.objects.filter(pk=sale_id, tenant_id=tenant_id).exists():
+            Transaction.objects.filter(pk=transaction_id).update(sale_id=sale_id)
+            linked.add(sale_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("financial", "0003_cashflow_rollup"),
+        ("pos", "0003_add_performance_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="sale",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="transactions",
+                to="pos.sale",
+                verbose_name="Venda",
+            ),
+        ),
+        migrations.RunPython(link_sale_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("financial", "0004_transaction_sale"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="transaction",
+            constraint=models.UniqueConstraint(
+                fields=("sale",), name="unique_transaction_per_sale"
+            ),
+        ),
+    ]
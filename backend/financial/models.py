@@ -2,7 +2,9 @@
 Modelos do Módulo Financeiro
 Sistema de controle de receitas, despesas e fluxo de caixa
 """
-from django.db import models
+from django.db import IntegrityError, models, transaction as db_transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 import uuid
@@ -98,6 +100,14 @@ class Transaction(models.Model):
         related_name='transactions',
         verbose_name="Agendamento"
     )
+    sale = models.ForeignKey(
+        'pos.Sale',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='transactions',
+        verbose_name="Venda"
+    )
     
     # Observações
     notes = models.TextField(blank=True, verbose_name="Observações")
@@ -122,6 +132,10 @@ class Transaction(models.Model):
             models.Index(fields=['tenant', 'type']),
             models.Index(fields=['tenant', 'payment_method']),
         ]
+        constraints = [
+            # Uma receita por venda (gerada pelo efeito pos.sale_transaction)
+            models.UniqueConstraint(fields=['sale'], name='unique_transaction_per_sale'),
+        ]
 
     def __str__(self):
         symbol = '+' if self.type == 'receita' else '-'
@@ -142,17 +156,45 @@ class Transaction(models.Model):
             raise ValidationError({
                 'appointment': 'O agendamento não pertence à sua empresa.'
             })
+        
+        # Valida que a venda pertence ao mesmo tenant (se fornecida)
+        if self.sale and self.sale.tenant_id != self.tenant_id:
+            raise ValidationError({
+                'sale': 'A venda não pertence à sua empresa.'
+            })
 
     def save(self, *args, **kwargs):
+        """
+        Salva e atualiza o CashFlow por delta
+        Em edições, o valor antigo sai da chave antiga e o novo entra na chave nova
+        """
         self.full_clean()
-        super().save(*args, **kwargs)
+        
+        with db_transaction.atomic():
+            previous = None
+            if not self._state.adding:
+                previous = Transaction.objects.select_for_update().filter(pk=self.pk).values(
+                    *CashFlow.ROLLUP_SOURCE_FIELDS
+                ).first()
+            
+            super().save(*args, **kwargs)
+            
+            if previous:
+                CashFlow.apply_transaction(previous, sign=-1)
+            CashFlow.apply_transaction(
+                {field: getattr(self, field) for field in CashFlow.ROLLUP_SOURCE_FIELDS}
+            )
 
 
 class CashFlow(models.Model):
     """
-    Resumo do fluxo de caixa por período
-    Gerado automaticamente via signals ou tarefa agendada
+    Rollup diário das transações por (tenant, data, método de pagamento, categoria)
+    Mantido por delta a cada save/delete de Transaction; reconstruído pelo
+    command rebuild_cash_flow. Resumos e gráficos leem daqui em vez de Transaction.
     """
+    # Campos de Transaction que definem a chave e o delta do rollup
+    ROLLUP_SOURCE_FIELDS = ('tenant_id', 'date', 'payment_method_id', 'category', 'type', 'amount')
+    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     tenant = models.ForeignKey(
         'core.Tenant',
@@ -160,28 +202,41 @@ class CashFlow(models.Model):
         related_name='cash_flows'
     )
     
-    # Período
+    # Chave do rollup
     date = models.DateField(verbose_name="Data", unique=False)
+    payment_method = models.ForeignKey(
+        PaymentMethod,
+        on_delete=models.CASCADE,
+        related_name='cash_flows',
+        verbose_name="Método de Pagamento"
+    )
+    category = models.CharField(
+        max_length=20,
+        choices=Transaction.CATEGORY_CHOICES,
+        verbose_name="Categoria"
+    )
     
     # Valores calculados
     total_revenue = models.DecimalField(
-        max_digits=10,
+        max_digits=12,
         decimal_places=2,
         default=0,
         verbose_name="Total de Receitas"
     )
     total_expenses = models.DecimalField(
-        max_digits=10,
+        max_digits=12,
         decimal_places=2,
         default=0,
         verbose_name="Total de Despesas"
     )
     balance = models.DecimalField(
-        max_digits=10,
+        max_digits=12,
         decimal_places=2,
         default=0,
         verbose_name="Saldo"
     )
+    revenue_count = models.PositiveIntegerField(default=0, verbose_name="Qtd. de Receitas")
+    expense_count = models.PositiveIntegerField(default=0, verbose_name="Qtd. de Despesas")
     
     # Auditoria
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
@@ -190,7 +245,7 @@ class CashFlow(models.Model):
     class Meta:
         verbose_name = "Fluxo de Caixa"
         verbose_name_plural = "Fluxos de Caixa"
-        unique_together = [['tenant', 'date']]
+        unique_together = [['tenant', 'date', 'payment_method', 'category']]
         ordering = ['-date']
         indexes = [
             models.Index(fields=['tenant', 'date']),
@@ -199,29 +254,85 @@ class CashFlow(models.Model):
     def __str__(self):
         return f"Fluxo de Caixa - {self.date} - Saldo: R$ {self.balance}"
 
-    def calculate(self):
-        """Calcula os totais baseado nas transações do dia"""
-        from django.db.models import Sum, Q
+    @classmethod
+    def apply_transaction(cls, values, sign=1):
+        """
+        Soma (sign=1) ou subtrai (sign=-1) uma transação do rollup
+        `values` é um dict com ROLLUP_SOURCE_FIELDS
+        """
+        amount = Decimal(values['amount']) * sign
+        count = sign
+        is_revenue = values['type'] == 'receita'
         
-        transactions = Transaction.objects.filter(
-            tenant=self.tenant,
-            date=self.date
+        key = {
+            'tenant_id': values['tenant_id'],
+            'date': values['date'],
+            'payment_method_id': values['payment_method_id'],
+            'category': values['category'],
+        }
+        revenue, expenses = (amount, Decimal('0')) if is_revenue else (Decimal('0'), amount)
+        
+        updated = cls.objects.filter(**key).update(
+            total_revenue=F('total_revenue') + revenue,
+            total_expenses=F('total_expenses') + expenses,
+            balance=F('balance') + revenue - expenses,
+            revenue_count=F('revenue_count') + (count if is_revenue else 0),
+            expense_count=F('expense_count') + (0 if is_revenue else count),
+            updated_at=timezone.now()
         )
         
-        # Calcula receitas
-        revenue = transactions.filter(type='receita').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        # Remoção sem linha no rollup: nada a subtrair (ex.: tenant sendo excluído)
+        if updated or sign < 0:
+            return
         
-        # Calcula despesas
-        expenses = transactions.filter(type='despesa').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        try:
+            with db_transaction.atomic():
+                cls.objects.create(
+                    **key,
+                    total_revenue=revenue,
+                    total_expenses=expenses,
+                    balance=revenue - expenses,
+                    revenue_count=1 if is_revenue else 0,
+                    expense_count=0 if is_revenue else 1
+                )
+        except IntegrityError:
+            # Outra transação criou a linha ao mesmo tempo: aplica o delta nela
+            cls.apply_transaction(values, sign)
+
+    @classmethod
+    def rebuild(cls, tenant_id=None, start_date=None, end_date=None):
+        """
+        Reconstrói o rollup a partir de Transaction (todo ou parte)
+        Retorna a quantidade de linhas geradas
+        """
+        transactions = Transaction.objects.all()
+        rollup = cls.objects.all()
+        if tenant_id:
+            transactions = transactions.filter(tenant_id=tenant_id)
+            rollup = rollup.filter(tenant_id=tenant_id)
+        if start_date:
+            transactions = transactions.filter(date__gte=start_date)
+            rollup = rollup.filter(date__gte=start_date)
+        if end_date:
+            transactions = transactions.filter(date__lte=end_date)
+            rollup = rollup.filter(date__lte=end_date)
         
-        # Atualiza valores
-        self.total_revenue = revenue
-        self.total_expenses = expenses
-        self.balance = revenue - expenses
-        self.save()
+        revenue = Q(type='receita')
+        expense = Q(type='despesa')
+        zero = Decimal('0')
+        rows = transactions.order_by().values(
+            'tenant_id', 'date', 'payment_method_id', 'category'
+        ).annotate(
+            total_revenue=Sum('amount', filter=revenue, default=zero),
+            total_expenses=Sum('amount', filter=expense, default=zero),
+            revenue_count=Count('id', filter=revenue),
+            expense_count=Count('id', filter=expense),
+        )
         
-        return self
+        with db_transaction.atomic():
+            rollup.delete()
+            cls.objects.bulk_create(
+                [cls(balance=row['total_revenue'] - row['total_expenses'], **row) for row in rows],
+                batch_size=1000
+            )
+        return len(rows)
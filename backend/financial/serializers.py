@@ -164,10 +164,14 @@ class CreateTransactionSerializer(serializers.Serializer):
 class CashFlowSerializer(serializers.ModelSerializer):
     """Serializer para CashFlow"""
     
+    payment_method_name = serializers.CharField(source='payment_method.name', read_only=True)
+    category_display = serializers.CharField(source='get_category_display', read_only=True)
+    
     class Meta:
         model = CashFlow
         fields = [
-            'id', 'date', 'total_revenue', 'total_expenses',
-            'balance', 'created_at', 'updated_at'
+            'id', 'date', 'payment_method', 'payment_method_name',
+            'category', 'category_display', 'total_revenue', 'total_expenses',
+            'balance', 'revenue_count', 'expense_count', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'total_revenue', 'total_expenses', 'balance', 'created_at', 'updated_at']
+        read_only_fields = fields
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import CashFlow, Transaction
+
+
+@receiver(post_delete, sender=Transaction)
+def remove_transaction_from_cash_flow(sender, instance, **kwargs):
+    """
+    Subtrai a transação excluída do rollup de fluxo de caixa
+    Via signal para cobrir também exclusões em lote (queryset.delete())
+    """
+    CashFlow.apply_transaction(
+        {field: getattr(instance, field) for field in CashFlow.ROLLUP_SOURCE_FIELDS},
+        sign=-1
+    )
@@ -1,3 +1,108 @@
+from datetime import date, datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Tenant, User
+from .models import CashFlow, PaymentMethod, Transaction
+
+
+class CashFlowRollupTestCase(TestCase):
+    """Testa o rollup incremental de fluxo de caixa"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.cash = PaymentMethod.objects.create(tenant=self.tenant, name='Dinheiro')
+        self.pix = PaymentMethod.objects.create(tenant=self.tenant, name='PIX')
+
+    def create_transaction(self, type='receita', amount='10.00', day=date(2026, 1, 5), payment_method=None, category='servico'):
+        return Transaction.objects.create(
+            tenant=self.tenant,
+            type=type,
+            category=category,
+            description='Teste',
+            amount=Decimal(amount),
+            date=day,
+            payment_method=payment_method or self.cash,
+            created_by=self.user
+        )
+
+    def snapshot(self):
+        # Linhas zeradas por exclusões não existem após o rebuild
+        return sorted(
+            CashFlow.objects.exclude(revenue_count=0, expense_count=0).values_list(
+                'date', 'payment_method_id', 'category', 'total_revenue',
+                'total_expenses', 'revenue_count', 'expense_count'
+            )
+        )
+
+    def test_rollup_tracks_create_update_and_delete(self):
+        first = self.create_transaction(amount='30.00')
+        self.create_transaction(amount='20.00')
+        self.create_transaction(type='despesa', amount='5.00', category='fornecedor')
+        moved = self.create_transaction(amount='7.00', payment_method=self.pix)
+
+        row = CashFlow.objects.get(payment_method=self.cash, category='servico')
+        self.assertEqual((row.total_revenue, row.revenue_count), (Decimal('50.00'), 2))
+
+        # Edição muda valor, data e método: sai de uma chave e entra em outra
+        first.amount = Decimal('35.00')
+        first.save()
+        moved.date = date(2026, 1, 6)
+        moved.payment_method = self.cash
+        moved.save()
+        Transaction.objects.filter(category='fornecedor').delete()
+
+        incremental = self.snapshot()
+        call_command('rebuild_cash_flow', stdout=StringIO())
+
+        self.assertEqual(incremental, self.snapshot())
+        row = CashFlow.objects.get(date=date(2026, 1, 5), payment_method=self.cash, category='servico')
+        self.assertEqual(row.total_revenue, Decimal('55.00'))
+
+    def test_charts_and_summary_read_from_rollup(self):
+        for day in (5, 5, 20):
+            self.create_transaction(amount='10.00', day=date(2026, 1, day))
+        self.create_transaction(amount='25.00', day=date(2026, 2, 1), payment_method=self.pix)
+        self.create_transaction(type='despesa', amount='4.00', day=date(2026, 2, 1))
+
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        params = {'start_date': '2026-01-01', 'end_date': '2026-02-28'}
+
+        chart = client.get('/api/financial/transactions/revenue_chart/', {**params, 'period': 'month'})
+        self.assertEqual(
+            [(row['total'], row['count']) for row in chart.data['data']],
+            [(Decimal('30.00'), 3), (Decimal('25.00'), 1)]
+        )
+
+        summary = client.get('/api/financial/transactions/summary/', params)
+        self.assertEqual(summary.data['total_revenue'], Decimal('55.00'))
+        self.assertEqual(summary.data['total_expenses'], Decimal('4.00'))
+        self.assertEqual(summary.data['transaction_count'], 5)
+
+        by_method = client.get('/api/financial/transactions/by_payment_method/', params)
+        totals = {row['payment_method']['name']: row['balance'] for row in by_method.data}
+        self.assertEqual(totals, {'Dinheiro': Decimal('26.00'), 'PIX': Decimal('25.00')})
+
+    def test_today_follows_project_timezone(self):
+        self.create_transaction(amount='10.00', day=date(2026, 1, 5))
+        self.create_transaction(amount='99.00', day=date(2026, 1, 6))
+        client = APIClient()
+        client.force_authenticate(user=self.user)
 
-# Create your tests here.
+        # 05/01 23:30 em São Paulo já é 06/01 em UTC
+        late_night = timezone.make_aware(datetime(2026, 1, 5, 23, 30))
+        with mock.patch('django.utils.timezone.now', return_value=late_night):
+            today = client.get('/api/financial/transactions/today/')
+            chart = client.get('/api/financial/transactions/revenue_chart/', {'period': 'month'})
+        self.assertEqual([row['amount'] for row in today.data], ['10.00'])
+        self.assertEqual([row['total'] for row in chart.data['data']], [Decimal('10.00')])
@@ -10,12 +10,10 @@ from django.db.models import Sum, Q
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
-from django.http import HttpResponse
-import csv
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
 
 from core.permissions import IsSameTenant
+from core.exports import ExportColumn, ExportMixin, choice_display, currency_br, date_br
+from core.response_cache import TenantCachedResponseMixin
 from .models import PaymentMethod, Transaction, CashFlow
 from .serializers import (
     PaymentMethodSerializer,
@@ -46,9 +44,21 @@ class PaymentMethodViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ExportMixin, TenantCachedResponseMixin, viewsets.ModelViewSet):
     """ViewSet para gerenciamento de Transações Financeiras"""
     serializer_class = TransactionSerializer
+    cache_resources = ('transactions',)
+    export_filename = 'transacoes'
+    export_sheet_title = 'Transações'
+    export_columns = [
+        ExportColumn('Data', 'date', date_br, width=12),
+        ExportColumn('Tipo', 'type', choice_display(Transaction.TRANSACTION_TYPES), width=10),
+        ExportColumn('Categoria', 'category', choice_display(Transaction.CATEGORY_CHOICES), width=15),
+        ExportColumn('Descrição', 'description', width=30),
+        ExportColumn('Valor', 'amount', currency_br, width=12),
+        ExportColumn('Método de Pagamento', 'payment_method__name', width=20),
+        ExportColumn('Agendamento', 'appointment_id', lambda pk: f'#{pk}' if pk else '-', width=15),
+    ]
     permission_classes = [IsAuthenticated, IsSameTenant]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['type', 'payment_method', 'appointment']
@@ -99,15 +109,19 @@ class TransactionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def today(self, request):
         """Retorna transações de hoje"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         transactions = self.get_queryset().filter(date=today)
         serializer = self.get_serializer(transactions, many=True)
         return Response(serializer.data)
 
+    def get_cash_flow(self):
+        """Rollup diário (CashFlow) do tenant: resumos e gráficos leem daqui"""
+        return CashFlow.objects.filter(tenant=self.request.user.tenant).order_by()
+
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Retorna resumo financeiro do período"""
-        queryset = self.get_queryset()
+        queryset = self.get_cash_flow()
         
         # Aplica filtros de data se fornecidos
         start_date = request.query_params.get('start_date')
@@ -117,18 +131,19 @@ class TransactionViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(date__gte=start_date, date__lte=end_date)
         else:
             # Padrão: últimos 30 dias
-            today = timezone.now().date()
+            today = timezone.localdate()
             start_date = today - timedelta(days=30)
             queryset = queryset.filter(date__gte=start_date)
         
         # Calcula totais
-        revenue = queryset.filter(type='receita').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
-        
-        expenses = queryset.filter(type='despesa').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        totals = queryset.aggregate(
+            revenue=Sum('total_revenue', default=Decimal('0.00')),
+            expenses=Sum('total_expenses', default=Decimal('0.00')),
+            revenue_count=Sum('revenue_count', default=0),
+            expense_count=Sum('expense_count', default=0)
+        )
+        revenue = totals['revenue']
+        expenses = totals['expenses']
         
         balance = revenue - expenses
         
@@ -138,13 +153,13 @@ class TransactionViewSet(viewsets.ModelViewSet):
             'total_revenue': revenue,
             'total_expenses': expenses,
             'balance': balance,
-            'transaction_count': queryset.count()
+            'transaction_count': totals['revenue_count'] + totals['expense_count']
         })
 
     @action(detail=False, methods=['get'])
     def by_payment_method(self, request):
         """Retorna resumo por método de pagamento"""
-        queryset = self.get_queryset()
+        queryset = self.get_cash_flow()
         
         # Aplica filtros de data
         start_date = request.query_params.get('start_date')
@@ -153,38 +168,36 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if start_date and end_date:
             queryset = queryset.filter(date__gte=start_date, date__lte=end_date)
         
-        # Agrupa por método de pagamento
+        # Agrupa por método de pagamento em uma única query
+        totals = {
+            row['payment_method_id']: row
+            for row in queryset.values('payment_method_id').annotate(
+                revenue=Sum('total_revenue'),
+                expenses=Sum('total_expenses'),
+                count=Sum('revenue_count') + Sum('expense_count')
+            )
+        }
+        
         payment_methods = PaymentMethod.objects.filter(tenant=request.user.tenant)
         results = []
         
         for pm in payment_methods:
-            pm_transactions = queryset.filter(payment_method=pm)
-            revenue = pm_transactions.filter(type='receita').aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00')
-            
-            expenses = pm_transactions.filter(type='despesa').aggregate(
-                total=Sum('amount')
-            )['total'] or Decimal('0.00')
+            row = totals.get(pm.id, {})
+            revenue = row.get('revenue') or Decimal('0.00')
+            expenses = row.get('expenses') or Decimal('0.00')
             
             results.append({
                 'payment_method': PaymentMethodSerializer(pm).data,
                 'total_revenue': revenue,
                 'total_expenses': expenses,
                 'balance': revenue - expenses,
-                'transaction_count': pm_transactions.count()
+                'transaction_count': row.get('count') or 0
             })
         
         return Response(results)
 
-    @action(detail=False, methods=['get'])
-    def revenue_chart(self, request):
-        """
-        Retorna dados para gráfico de receita ao longo do tempo
-        Query params: start_date, end_date, period (day|week|month)
-        """
-        from datetime import datetime, timedelta
-        from django.db.models import Count
+    def _chart(self, request, total_field, count_field):
+        """Agrupa o rollup por dia, semana ou mês para os gráficos"""
         from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
         
         # Obter parâmetros
@@ -194,38 +207,21 @@ class TransactionViewSet(viewsets.ModelViewSet):
         
         # Padrão: últimos 30 dias
         if not start_date or not end_date:
-            end_date = timezone.now().date()
+            end_date = timezone.localdate()
             start_date = end_date - timedelta(days=30)
         
-        # Filtrar transações de receita
-        queryset = self.get_queryset().filter(
-            type='receita',
+        trunc = {'month': TruncMonth, 'week': TruncWeek}.get(period, TruncDate)
+        
+        # Uma linha do rollup por dia/método/categoria, não por transação
+        data = self.get_cash_flow().filter(
             date__gte=start_date,
             date__lte=end_date
-        )
-        
-        # Agrupar por período
-        if period == 'month':
-            data = queryset.annotate(
-                period=TruncMonth('date')
-            ).values('period').annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            ).order_by('period')
-        elif period == 'week':
-            data = queryset.annotate(
-                period=TruncWeek('date')
-            ).values('period').annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            ).order_by('period')
-        else:  # day
-            data = queryset.annotate(
-                period=TruncDate('date')
-            ).values('period').annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            ).order_by('period')
+        ).annotate(
+            period=trunc('date')
+        ).values('period').annotate(
+            total=Sum(total_field),
+            count=Sum(count_field)
+        ).filter(count__gt=0).order_by('period')
         
         return Response({
             'start_date': start_date,
@@ -235,153 +231,20 @@ class TransactionViewSet(viewsets.ModelViewSet):
         })
 
     @action(detail=False, methods=['get'])
-    def expense_chart(self, request):
+    def revenue_chart(self, request):
         """
-        Retorna dados para gráfico de despesas ao longo do tempo
+        Retorna dados para gráfico de receita ao longo do tempo
         Query params: start_date, end_date, period (day|week|month)
         """
-        from datetime import datetime, timedelta
-        from django.db.models import Count
-        from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
-        
-        # Obter parâmetros
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        period = request.query_params.get('period', 'day')
-        
-        # Padrão: últimos 30 dias
-        if not start_date or not end_date:
-            end_date = timezone.now().date()
-            start_date = end_date - timedelta(days=30)
-        
-        # Filtrar transações de despesa
-        queryset = self.get_queryset().filter(
-            type='despesa',
-            date__gte=start_date,
-            date__lte=end_date
-        )
-        
-        # Agrupar por período
-        if period == 'month':
-            data = queryset.annotate(
-                period=TruncMonth('date')
-            ).values('period').annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            ).order_by('period')
-        elif period == 'week':
-            data = queryset.annotate(
-                period=TruncWeek('date')
-            ).values('period').annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            ).order_by('period')
-        else:  # day
-            data = queryset.annotate(
-                period=TruncDate('date')
-            ).values('period').annotate(
-                total=Sum('amount'),
-                count=Count('id')
-            ).order_by('period')
-        
-        return Response({
-            'start_date': start_date,
-            'end_date': end_date,
-            'period': period,
-            'data': list(data)
-        })
+        return self._chart(request, 'total_revenue', 'revenue_count')
 
     @action(detail=False, methods=['get'])
-    def export_csv(self, request):
-        """Exporta transações em formato CSV"""
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Criar resposta CSV
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename="transacoes.csv"'
-        response.write('\ufeff')  # BOM para UTF-8
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Data',
-            'Tipo',
-            'Categoria',
-            'Descrição',
-            'Valor',
-            'Método de Pagamento',
-            'Agendamento'
-        ])
-        
-        for transaction in queryset:
-            writer.writerow([
-                transaction.date.strftime('%d/%m/%Y'),
-                transaction.get_type_display(),
-                transaction.get_category_display(),
-                transaction.description,
-                f'R$ {transaction.amount:.2f}',
-                transaction.payment_method.name if transaction.payment_method else '-',
-                f'#{transaction.appointment.id}' if transaction.appointment else '-'
-            ])
-        
-        return response
-
-    @action(detail=False, methods=['get'])
-    def export_excel(self, request):
-        """Exporta transações em formato Excel"""
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Criar workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Transações"
-        
-        # Estilizar cabeçalho
-        header_font = Font(bold=True)
-        header_alignment = Alignment(horizontal='center')
-        
-        headers = [
-            'Data',
-            'Tipo',
-            'Categoria',
-            'Descrição',
-            'Valor',
-            'Método de Pagamento',
-            'Agendamento'
-        ]
-        
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.alignment = header_alignment
-        
-        # Adicionar dados
-        for row, transaction in enumerate(queryset, start=2):
-            ws.cell(row=row, column=1, value=transaction.date.strftime('%d/%m/%Y'))
-            ws.cell(row=row, column=2, value=transaction.get_type_display())
-            ws.cell(row=row, column=3, value=transaction.get_category_display())
-            ws.cell(row=row, column=4, value=transaction.description)
-            ws.cell(row=row, column=5, value=f'R$ {transaction.amount:.2f}')
-            ws.cell(row=row, column=6, value=transaction.payment_method.name if transaction.payment_method else '-')
-            ws.cell(row=row, column=7, value=f'#{transaction.appointment.id}' if transaction.appointment else '-')
-        
-        # Ajustar largura das colunas
-        ws.column_dimensions['A'].width = 12
-        ws.column_dimensions['B'].width = 10
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 30
-        ws.column_dimensions['E'].width = 12
-        ws.column_dimensions['F'].width = 20
-        ws.column_dimensions['G'].width = 15
-        
-        # Criar resposta
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="transacoes.xlsx"'
-        wb.save(response)
-        
-        return response
-
+    def expense_chart(self, request):
+        """
+        Retorna dados para gráfico de despesas ao longo do tempo
+        Query params: start_date, end_date, period (day|week|month)
+        """
+        return self._chart(request, 'total_expenses', 'expense_count')
 
 class CashFlowViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet para visualização de Fluxo de Caixa"""
@@ -391,7 +254,9 @@ class CashFlowViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """Retorna fluxo de caixa do tenant com filtros opcionais"""
         if self.request.user.is_authenticated:
-            queryset = CashFlow.objects.filter(tenant=self.request.user.tenant)
+            queryset = CashFlow.objects.filter(
+                tenant=self.request.user.tenant
+            ).select_related('payment_method')
             
             # Filtro por intervalo de datas
             start_date = self.request.query_params.get('start_date', None)
@@ -407,7 +272,10 @@ class CashFlowViewSet(viewsets.ReadOnlyModelViewSet):
 
     @action(detail=False, methods=['post'])
     def calculate(self, request):
-        """Calcula ou recalcula o fluxo de caixa para uma data"""
+        """
+        Reconstrói o fluxo de caixa de uma data a partir das transações
+        (o rollup já é mantido automaticamente; útil após correções manuais)
+        """
         date = request.data.get('date')
         if not date:
             return Response(
@@ -415,14 +283,18 @@ class CashFlowViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Busca ou cria o registro de fluxo de caixa
-        cash_flow, created = CashFlow.objects.get_or_create(
-            tenant=request.user.tenant,
-            date=date
-        )
+        CashFlow.rebuild(tenant_id=request.user.tenant_id, start_date=date, end_date=date)
         
-        # Calcula os valores
-        cash_flow.calculate()
+        cash_flows = self.get_queryset().filter(date=date).select_related('payment_method')
+        totals = cash_flows.aggregate(
+            total_revenue=Sum('total_revenue', default=Decimal('0.00')),
+            total_expenses=Sum('total_expenses', default=Decimal('0.00'))
+        )
         
-        serializer = self.get_serializer(cash_flow)
-        return Response(serializer.data)
+        return Response({
+            'date': date,
+            'total_revenue': totals['total_revenue'],
+            'total_expenses': totals['total_expenses'],
+            'balance': totals['total_revenue'] - totals['total_expenses'],
+            'entries': self.get_serializer(cash_flows, many=True).data
+        })
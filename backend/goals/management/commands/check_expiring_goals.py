@@ -34,8 +34,7 @@ class Command(BaseCommand):
                 goal,
                 'goal_expiring',
                 f'⏰ Meta "{goal.name}" vence em {days_left} dia(s). '
-                f'Progresso atual: {goal.percentage:.1f}%',
-                'warning' if goal.percentage < 50 else 'info'
+                f'Progresso atual: {goal.percentage():.1f}%'
             )
             notifications_sent += 1
         
@@ -0,0 +1,35 @@
+"""
+Command para reconciliar o progresso das metas ativas
+Os deltas dos eventos (goals.progress) mantêm current_value atualizado; este
+command recalcula o período inteiro para corrigir desvios (vendas editadas,
+registros excluídos, falhas de efeitos). Deve ser executado diariamente via cron
+job ou scheduler
+"""
+from django.core.management.base import BaseCommand
+
+from goals.models import Goal
+from goals.progress import recalculate
+
+
+class Command(BaseCommand):
+    help = 'Recalcula o valor atual das metas ativas a partir das vendas, agendamentos e clientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            help='ID do tenant (padrão: todos os tenants)'
+        )
+        parser.add_argument(
+            '--snapshot',
+            action='store_true',
+            help='Registra o progresso de cada meta no histórico (GoalProgress)'
+        )
+
+    def handle(self, *args, **options):
+        goals = Goal.objects.filter(status='active')
+        if options['tenant']:
+            goals = goals.filter(tenant_id=options['tenant'])
+
+        count = recalculate(goals, notes='Reconciliação periódica' if options['snapshot'] else None)
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {count} metas reconciliadas'))
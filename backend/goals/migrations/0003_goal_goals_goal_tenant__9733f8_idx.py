@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_outboxevent"),
+        ("goals", "0002_goalprogress_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                fields=["tenant", "status", "target_type", "end_date"],
+                name="goals_goal_tenant__9733f8_idx",
+            ),
+        ),
+    ]
@@ -107,6 +107,8 @@ class Goal(TenantAwareModel):
             models.Index(fields=['tenant', 'status']),
             models.Index(fields=['tenant', 'user']),
             models.Index(fields=['start_date', 'end_date']),
+            # Busca das metas afetadas por um evento (goals.progress.apply_delta)
+            models.Index(fields=['tenant', 'status', 'target_type', 'end_date']),
         ]
     
     def __str__(self):
@@ -136,78 +138,10 @@ class Goal(TenantAwareModel):
             self.status = 'failed'
     
     def calculate_current_value(self):
-        """Calcula valor atual baseado em vendas/serviços"""
-        from pos.models import Sale
-        from scheduling.models import Appointment
-        from customers.models import Customer
-        
-        filters = {
-            'tenant': self.tenant,
-            'date__gte': self.start_date,
-            'date__lte': self.end_date,
-        }
-        
-        if self.user:
-            filters['user'] = self.user
-        
-        if self.target_type == 'revenue':
-            # Somatório de vendas pagas
-            total = Sale.objects.filter(
-                payment_status='paid',
-                **filters
-            ).aggregate(total=models.Sum('total'))['total'] or Decimal('0')
-            self.current_value = total
-        
-        elif self.target_type == 'sales_count':
-            # Contagem de vendas
-            count = Sale.objects.filter(
-                payment_status='paid',
-                **filters
-            ).count()
-            self.current_value = Decimal(count)
-        
-        elif self.target_type == 'services_count':
-            # Contagem de serviços concluídos
-            appointment_filters = {
-                'tenant': self.tenant,
-                'start_time__date__gte': self.start_date,
-                'start_time__date__lte': self.end_date,
-                'status': 'completed',
-            }
-            if self.user:
-                appointment_filters['professional'] = self.user
-            
-            count = Appointment.objects.filter(**appointment_filters).count()
-            self.current_value = Decimal(count)
-        
-        elif self.target_type == 'products_sold':
-            # Quantidade de produtos vendidos
-            from pos.models import SaleItem
-            sale_filters = {
-                'sale__tenant': self.tenant,
-                'sale__date__gte': self.start_date,
-                'sale__date__lte': self.end_date,
-                'sale__payment_status': 'paid',
-                'product__isnull': False,
-            }
-            if self.user:
-                sale_filters['sale__user'] = self.user
-            
-            total = SaleItem.objects.filter(**sale_filters).aggregate(
-                total=models.Sum('quantity')
-            )['total'] or Decimal('0')
-            self.current_value = total
-        
-        elif self.target_type == 'new_customers':
-            # Novos clientes cadastrados
-            customer_filters = {
-                'tenant': self.tenant,
-                'created_at__date__gte': self.start_date,
-                'created_at__date__lte': self.end_date,
-            }
-            count = Customer.objects.filter(**customer_filters).count()
-            self.current_value = Decimal(count)
+        """Recalcula o valor atual sobre o período inteiro (ver goals.progress)"""
+        from .progress import current_value
         
+        self.current_value = current_value(self)
         self.check_completion()
         self.save()
 
@@ -0,0 +1,164 @@
+"""
+Progresso incremental das metas
+
+Cada evento (venda paga ou estornada, agendamento concluído, cliente novo) aplica
+um delta com um UPDATE nas metas ativas que o cobrem: mesmo tenant e tipo, período
+contendo a data do evento e meta do profissional do evento ou sem profissional
+(equipe). Não há mais recálculo do período inteiro a cada venda.
+
+O valor de cada tipo de meta é definido uma única vez em SOURCES e usado tanto no
+cálculo de uma meta (current_value) quanto na reconciliação em lote
+(recalculate), que corrige eventuais desvios dos deltas com um UPDATE por tipo de
+meta. A reconciliação roda no recalculate_all e no command reconcile_goals.
+"""
+from decimal import Decimal
+
+from django.apps import apps
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Goal, GoalProgress
+
+VALUE_FIELD = DecimalField(max_digits=10, decimal_places=2)
+ZERO = Value(Decimal('0'), output_field=VALUE_FIELD)
+RECALCULATE_BATCH_SIZE = 500
+
+# target_type: (model, filtros, data do registro, profissional, agregado)
+SOURCES = {
+    'revenue': ('pos.Sale', {'payment_status': 'paid'}, 'date__date', 'user', Sum('total')),
+    'sales_count': ('pos.Sale', {'payment_status': 'paid'}, 'date__date', 'user', Count('id')),
+    'products_sold': (
+        'pos.SaleItem', {'sale__payment_status': 'paid', 'product__isnull': False},
+        'sale__date__date', 'sale__user', Sum('quantity'),
+    ),
+    'services_count': (
+        'scheduling.Appointment', {'status': 'concluido'}, 'start_time__date', 'professional', Count('id'),
+    ),
+    # Clientes não têm profissional: contam para todas as metas do tipo
+    'new_customers': ('customers.Customer', {}, 'created_at__date', None, Count('id')),
+}
+
+
+def _records(target_type, tenant, start_date, end_date, user=None):
+    """Registros que contam para a meta e o agregado do valor"""
+    model, filters, date_field, user_field, aggregate = SOURCES[target_type]
+    queryset = apps.get_model(model).objects.filter(
+        tenant=tenant,
+        **{f'{date_field}__gte': start_date, f'{date_field}__lte': end_date},
+        **filters,
+    )
+    if user is not None and user_field:
+        queryset = queryset.filter(**{user_field: user})
+    return queryset.order_by(), aggregate
+
+
+def current_value(goal):
+    """Valor atual de uma meta calculado sobre o período inteiro"""
+    records, aggregate = _records(goal.target_type, goal.tenant_id, goal.start_date, goal.end_date, goal.user_id)
+    return Decimal(records.aggregate(value=aggregate)['value'] or 0)
+
+
+def matching_goals(tenant_id, day):
+    """Metas ativas do tenant cujo período contém `day` (índice tenant/status/tipo)"""
+    return Goal.objects.filter(tenant_id=tenant_id, status='active', start_date__lte=day, end_date__gte=day)
+
+
+def apply_delta(tenant_id, day, deltas, user_id=None):
+    """
+    Soma os deltas ({target_type: valor}) nas metas que cobrem o evento
+    Um UPDATE por tipo; depois conclui as metas que atingiram o alvo.
+    """
+    goals = matching_goals(tenant_id, day)
+    now = timezone.now()
+    changed = 0
+    for target_type, delta in deltas.items():
+        if not delta:
+            continue
+        queryset = goals.filter(target_type=target_type)
+        if SOURCES[target_type][3]:
+            # Metas do profissional do evento ou de equipe
+            queryset = queryset.filter(Q(user__isnull=True) | Q(user_id=user_id))
+        changed += queryset.update(current_value=F('current_value') + Decimal(delta), updated_at=now)
+    if changed:
+        settle(goals)
+
+
+def settle(goals):
+    """
+    check_completion() em lote para as metas ativas de `goals`
+    As transições geram as mesmas notificações do save() (signals), em um único INSERT.
+    """
+    from .signals import create_goal_notifications, status_notification
+
+    today = timezone.localdate()
+    active = goals.filter(status='active')
+    transitions = [
+        ('completed', active.filter(current_value__gte=F('target_value'))),
+        ('failed', active.filter(end_date__lt=today, current_value__lt=F('target_value'))),
+    ]
+    notifications = []
+    for new_status, queryset in transitions:
+        reached = list(queryset.select_related('tenant', 'user'))
+        if not reached:
+            continue
+        Goal.objects.filter(pk__in=[goal.pk for goal in reached]).update(
+            status=new_status, updated_at=timezone.now()
+        )
+        for goal in reached:
+            goal.status = new_status
+            notifications.append(status_notification(goal))
+    if notifications:
+        create_goal_notifications(notifications)
+
+
+def recalculate(goals, notes=None):
+    """
+    Recalcula as metas de `goals` com um UPDATE por tipo de meta
+    Com `notes`, registra um GoalProgress de cada meta (bulk_create).
+    Retorna a quantidade de metas recalculadas.
+    """
+    ids = list(goals.order_by().values_list('pk', flat=True))
+    for start in range(0, len(ids), RECALCULATE_BATCH_SIZE):
+        with transaction.atomic():
+            _recalculate_batch(ids[start:start + RECALCULATE_BATCH_SIZE], notes)
+    return len(ids)
+
+
+def _recalculate_batch(ids, notes):
+    goals = Goal.objects.filter(pk__in=ids)
+    now = timezone.now()
+
+    for target_type, source in SOURCES.items():
+        # Metas com profissional contam só os registros dele (como current_value)
+        scopes = [(True, OuterRef('user')), (False, None)] if source[3] else [(None, None)]
+        for has_user, user in scopes:
+            records, aggregate = _records(
+                target_type, OuterRef('tenant'), OuterRef('start_date'), OuterRef('end_date'), user
+            )
+            value = records.values('tenant').annotate(value=aggregate).values('value')
+            queryset = goals.filter(target_type=target_type)
+            if has_user is not None:
+                queryset = queryset.filter(user__isnull=not has_user)
+            queryset.update(
+                current_value=Coalesce(Subquery(value, output_field=VALUE_FIELD), ZERO),
+                updated_at=now,
+            )
+
+    settle(goals)
+
+    if notes is not None:
+        today = timezone.localdate()
+        GoalProgress.objects.bulk_create([
+            GoalProgress(
+                tenant_id=goal['tenant_id'],
+                goal_id=goal['id'],
+                date=today,
+                value=goal['current_value'],
+                # bulk_create não passa pelo save(), que calcula a porcentagem
+                percentage=float(goal['current_value'] / goal['target_value'] * 100) if goal['target_value'] else 0,
+                notes=notes,
+            )
+            for goal in goals.values('id', 'tenant_id', 'current_value', 'target_value')
+        ])
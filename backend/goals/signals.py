@@ -1,109 +1,143 @@
-from django.db.models.signals import post_save, pre_save
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_init, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from decimal import Decimal
 from datetime import timedelta
 
+from core import side_effects
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_init, sender='pos.Sale')
+def remember_sale_payment_status(sender, instance, **kwargs):
+    """Guarda o status de pagamento carregado para detectar a transição no save"""
+    # __dict__ evita query quando o campo foi adiado (.only()/.defer())
+    instance._goals_payment_status = instance.__dict__.get('payment_status')
+
 
 @receiver(post_save, sender='pos.Sale')
-def update_goals_on_sale(sender, instance, created, **kwargs):
-    """Atualiza metas quando uma venda é concluída"""
-    from .models import Goal
-    
-    if instance.payment_status != 'paid':
-        return
-    
-    # Busca metas ativas que devem ser atualizadas
-    today = timezone.now().date()
-    
-    # Metas do vendedor
-    if instance.user:
-        user_goals = Goal.objects.filter(
-            tenant=instance.tenant,
-            user=instance.user,
-            status='active',
-            start_date__lte=today,
-            end_date__gte=today
-        )
-        
-        for goal in user_goals:
-            if goal.target_type in ['revenue', 'sales_count', 'products_sold']:
-                goal.calculate_current_value()
-    
-    # Metas de equipe
-    team_goals = Goal.objects.filter(
-        tenant=instance.tenant,
-        type='team',
-        status='active',
-        start_date__lte=today,
-        end_date__gte=today
-    )
-    
-    for goal in team_goals:
-        if goal.target_type in ['revenue', 'sales_count', 'products_sold']:
-            goal.calculate_current_value()
+def defer_goals_on_sale(sender, instance, created, **kwargs):
+    """Agenda o delta das metas quando a venda passa a paga ou deixa de ser paga"""
+    previous_status = None if created else getattr(instance, '_goals_payment_status', None)
+    instance._goals_payment_status = instance.payment_status
+
+    if instance.payment_status == 'paid' and previous_status != 'paid':
+        side_effects.defer('goals.sale', instance)
+    elif previous_status == 'paid' and instance.payment_status != 'paid':
+        side_effects.defer('goals.sale_reversed', instance)
+
+
+@receiver(post_init, sender='scheduling.Appointment')
+def remember_appointment_status(sender, instance, **kwargs):
+    """Guarda o status carregado para detectar a transição no save"""
+    instance._goals_status = instance.__dict__.get('status')
 
 
 @receiver(post_save, sender='scheduling.Appointment')
-def update_goals_on_appointment(sender, instance, created, **kwargs):
-    """Atualiza metas quando um agendamento é concluído"""
-    from .models import Goal
-    
-    if instance.status != 'completed':
-        return
-    
-    today = timezone.now().date()
-    
-    # Metas do profissional
-    if instance.professional:
-        user_goals = Goal.objects.filter(
-            tenant=instance.tenant,
-            user=instance.professional,
-            status='active',
-            start_date__lte=today,
-            end_date__gte=today,
-            target_type='services_count'
-        )
-        
-        for goal in user_goals:
-            goal.calculate_current_value()
-    
-    # Metas de equipe
-    team_goals = Goal.objects.filter(
-        tenant=instance.tenant,
-        type='team',
-        status='active',
-        start_date__lte=today,
-        end_date__gte=today,
-        target_type='services_count'
-    )
-    
-    for goal in team_goals:
-        goal.calculate_current_value()
+def defer_goals_on_appointment(sender, instance, created, **kwargs):
+    """Agenda o delta das metas quando o agendamento é concluído ou reaberto"""
+    previous_status = None if created else getattr(instance, '_goals_status', None)
+    instance._goals_status = instance.status
+
+    if instance.status == 'concluido' and previous_status != 'concluido':
+        side_effects.defer('goals.appointment', instance)
+    elif previous_status == 'concluido' and instance.status != 'concluido':
+        side_effects.defer('goals.appointment_reversed', instance)
 
 
 @receiver(post_save, sender='customers.Customer')
-def update_goals_on_new_customer(sender, instance, created, **kwargs):
-    """Atualiza metas quando um novo cliente é cadastrado"""
-    from .models import Goal
-    
-    if not created:
-        return
-    
-    today = timezone.now().date()
-    
-    # Metas de novos clientes (apenas equipe, pois não tem profissional específico)
-    team_goals = Goal.objects.filter(
-        tenant=instance.tenant,
-        type='team',
-        status='active',
-        start_date__lte=today,
-        end_date__gte=today,
-        target_type='new_customers'
+def defer_goals_on_new_customer(sender, instance, created, **kwargs):
+    """Agenda o delta das metas de novos clientes"""
+    if created:
+        side_effects.defer('goals.new_customer', instance)
+
+
+def apply_sale(sale, sign):
+    """Delta da venda em faturamento, quantidade de vendas e produtos vendidos"""
+    from django.db.models import Sum
+    from pos.models import SaleItem
+    from .progress import apply_delta
+
+    products = SaleItem.objects.filter(sale=sale, product__isnull=False).aggregate(
+        total=Sum('quantity')
+    )['total'] or Decimal('0')
+
+    apply_delta(
+        sale.tenant_id,
+        timezone.localdate(sale.date),
+        {'revenue': sign * sale.total, 'sales_count': sign, 'products_sold': sign * products},
+        user_id=sale.user_id,
     )
-    
-    for goal in team_goals:
-        goal.calculate_current_value()
+
+
+def apply_appointment(appointment, sign):
+    """Delta do agendamento na quantidade de serviços"""
+    from .progress import apply_delta
+
+    apply_delta(
+        appointment.tenant_id,
+        timezone.localdate(appointment.start_time),
+        {'services_count': sign},
+        user_id=appointment.professional_id,
+    )
+
+
+@side_effects.register('goals.sale')
+def update_goals_on_sale(instance):
+    """Soma a venda paga nas metas do vendedor e de equipe"""
+    apply_sale(instance, 1)
+
+
+@side_effects.register('goals.sale_reversed')
+def revert_goals_on_sale(instance):
+    """Desconta a venda que deixou de ser paga (cancelamento)"""
+    apply_sale(instance, -1)
+
+
+@side_effects.register('goals.appointment')
+def update_goals_on_appointment(instance):
+    """Soma o agendamento concluído nas metas do profissional e de equipe"""
+    apply_appointment(instance, 1)
+
+
+@side_effects.register('goals.appointment_reversed')
+def revert_goals_on_appointment(instance):
+    """Desconta o agendamento que deixou de estar concluído"""
+    apply_appointment(instance, -1)
+
+
+@side_effects.register('goals.new_customer')
+def update_goals_on_new_customer(instance):
+    """Soma o cliente novo nas metas de novos clientes"""
+    from .progress import apply_delta
+
+    apply_delta(instance.tenant_id, timezone.localdate(instance.created_at), {'new_customers': 1})
+
+
+# Notificação de cada mudança de status: (tipo, mensagem)
+STATUS_NOTIFICATIONS = {
+    'completed': ('goal_completed', '🎉 Meta "{name}" foi concluída com sucesso!'),
+    'failed': ('goal_failed', '❌ Meta "{name}" não foi atingida.'),
+}
+
+
+def status_notification(goal):
+    """(meta, tipo, mensagem) da mudança para concluída ou falhada; None nos outros status"""
+    if goal.status not in STATUS_NOTIFICATIONS:
+        return None
+    notification_type, message = STATUS_NOTIFICATIONS[goal.status]
+    return goal, notification_type, message.format(name=goal.name)
+
+
+def notify_status_change(goal):
+    """Notifica a meta que acabou de mudar para concluída ou falhada"""
+    entry = status_notification(goal)
+    if entry:
+        create_goal_notifications([entry])
 
 
 @receiver(pre_save, sender='goals.Goal')
@@ -112,28 +146,9 @@ def check_goal_status_change(sender, instance, **kwargs):
     if not instance.pk:
         return
     
-    try:
-        old_goal = sender.objects.get(pk=instance.pk)
-        
-        # Meta foi concluída
-        if old_goal.status != 'completed' and instance.status == 'completed':
-            create_goal_notification(
-                instance,
-                'goal_completed',
-                f'🎉 Meta "{instance.name}" foi concluída com sucesso!',
-                'success'
-            )
-        
-        # Meta falhou
-        elif old_goal.status != 'failed' and instance.status == 'failed':
-            create_goal_notification(
-                instance,
-                'goal_failed',
-                f'❌ Meta "{instance.name}" não foi atingida.',
-                'warning'
-            )
-    except sender.DoesNotExist:
-        pass
+    old_status = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    if old_status is not None and old_status != instance.status:
+        notify_status_change(instance)
 
 
 @receiver(post_save, sender='goals.Goal')
@@ -150,43 +165,37 @@ def check_goal_expiring_soon(sender, instance, created, **kwargs):
         create_goal_notification(
             instance,
             'goal_expiring',
-            f'⏰ Meta "{instance.name}" vence em {days_until_end} dia(s). Progresso: {instance.percentage:.1f}%',
-            'info'
+            f'⏰ Meta "{instance.name}" vence em {days_until_end} dia(s). Progresso: {instance.percentage():.1f}%'
         )
 
 
-def create_goal_notification(goal, notification_type, message, level='info'):
+def create_goal_notification(goal, notification_type, message):
     """Helper para criar notificações de metas"""
+    create_goal_notifications([(goal, notification_type, message)])
+
+
+def create_goal_notifications(entries):
+    """
+    Notifica cada meta de `entries` (meta, tipo, mensagem) em um único INSERT
+    (notifications.fanout): o dono da meta ou, nas metas de equipe, os usuários
+    ativos do tenant
+    """
+    from notifications.fanout import active_user_ids, notify_batch
+
     try:
-        from core.models import Notification
-        
-        # Para metas individuais, notifica o usuário
-        if goal.user:
-            Notification.objects.create(
-                tenant=goal.tenant,
-                user=goal.user,
-                title=f'Meta: {goal.name}',
-                message=message,
-                type=notification_type,
-                level=level,
-                related_object_type='goal',
-                related_object_id=goal.id
-            )
-        # Para metas de equipe, notifica todos os usuários do tenant
-        else:
-            from core.models import User
-            users = User.objects.filter(tenant=goal.tenant, is_active=True)
-            for user in users:
-                Notification.objects.create(
-                    tenant=goal.tenant,
-                    user=user,
-                    title=f'Meta de Equipe: {goal.name}',
-                    message=message,
-                    type=notification_type,
-                    level=level,
-                    related_object_type='goal',
-                    related_object_id=goal.id
-                )
+        # Savepoint: uma falha aqui não invalida a transação do save da meta
+        with transaction.atomic():
+            team_users = {}
+            items = []
+            for goal, notification_type, message in entries:
+                if goal.user_id:
+                    user_ids, title = [goal.user_id], f'Meta: {goal.name}'
+                else:
+                    if goal.tenant_id not in team_users:
+                        team_users[goal.tenant_id] = active_user_ids(goal.tenant_id)
+                    user_ids, title = team_users[goal.tenant_id], f'Meta de Equipe: {goal.name}'
+                items.append((goal.tenant_id, user_ids, notification_type, title, message, 'goal', str(goal.id)))
+            notify_batch(items)
     except Exception as e:
-        # Silenciosamente ignora erros de notificação para não quebrar o fluxo
-        pass
+        # Notificação não deve quebrar o fluxo da meta
+        logger.error(f"Erro ao notificar metas {[goal.id for goal, _, _ in entries]}: {e}")
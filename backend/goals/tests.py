@@ -1,3 +1,187 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Tenant, User
+
+from .models import Goal, GoalProgress
+
+
+class GoalRankingTestCase(TestCase):
+    """Testa o ranking de metas por profissional (core.reports)"""
+
+    QUERY_BUDGET = 2
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.admin = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def add_barber(self, goals):
+        barber = User.objects.create_user(
+            email=f'barber{User.objects.count()}@test.com', password='x', name='Barbeiro',
+            tenant=self.tenant, role='barbeiro'
+        )
+        today = timezone.now().date()
+        Goal.objects.bulk_create([
+            Goal(
+                tenant=self.tenant, user=barber, name='Meta', target_type='revenue', period='monthly',
+                start_date=today, end_date=today + timedelta(days=30), status=goal_status,
+                target_value=Decimal(target), current_value=Decimal(current),
+            )
+            for goal_status, target, current in goals
+        ])
+        return barber
+
+    def get_ranking(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/goals/ranking/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+        return response.data
+
+    def test_ranking_in_constant_queries(self):
+        barber = self.add_barber([
+            ('completed', '100', '100'),
+            ('active', '200', '50'),
+            ('active', '0', '0'),
+            ('cancelled', '100', '10'),
+        ])
+        ranking = self.get_ranking()
+
+        # Admin sem metas fica fora do ranking
+        self.assertEqual(len(ranking), 1)
+        self.assertEqual(ranking[0]['user_id'], barber.id)
+        self.assertEqual(ranking[0]['name'], 'Barbeiro')
+        self.assertEqual((ranking[0]['total_goals'], ranking[0]['completed'], ranking[0]['active']), (3, 1, 2))
+        self.assertEqual(ranking[0]['avg_progress'], 12.5)
+        self.assertEqual(ranking[0]['success_rate'], 33.33)
+
+        for _ in range(10):
+            self.add_barber([('active', '100', '10')])
+        self.assertEqual(len(self.get_ranking()), 11)
+
+
+class GoalProgressTestCase(TestCase):
+    """Testa os deltas de progresso por evento e a reconciliação em lote"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.admin = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.barber = User.objects.create_user(
+            email='barber@test.com', password='testpass123', name='Barbeiro', tenant=self.tenant, role='barbeiro'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.admin)
+
+    def add_goal(self, target_type, target, user=None):
+        today = timezone.localdate()
+        return Goal.objects.create(
+            tenant=self.tenant, user=user, type='individual' if user else 'team', name='Meta',
+            target_type=target_type, period='monthly', target_value=Decimal(target),
+            start_date=today - timedelta(days=10), end_date=today + timedelta(days=10),
+        )
+
+    def add_sale(self, user, total, payment_status='paid'):
+        from pos.models import CashRegister, Sale
+
+        cash_register, _ = CashRegister.objects.get_or_create(
+            tenant=self.tenant, user=user, defaults={'opening_balance': Decimal('0')}
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            return Sale.objects.create(
+                tenant=self.tenant, user=user, cash_register=cash_register, payment_method='pix',
+                payment_status=payment_status, subtotal=Decimal(total), total=Decimal(total)
+            )
+
+    def values(self, *goals):
+        return [Goal.objects.get(pk=goal.pk).current_value for goal in goals]
+
+    def test_sale_deltas_follow_payment_status(self):
+        mine = self.add_goal('revenue', '1000', user=self.barber)
+        other = self.add_goal('revenue', '1000', user=self.admin)
+        team = self.add_goal('sales_count', '10')
+
+        sale = self.add_sale(self.barber, '50.00')
+        self.add_sale(self.barber, '30.00', payment_status='pending')
+        self.assertEqual(self.values(mine, other, team), [Decimal('50'), Decimal('0'), Decimal('1')])
+
+        # Salvar a venda paga de novo não soma outra vez; o cancelamento desconta
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.notes = 'Editada'
+            sale.save()
+        self.assertEqual(self.values(mine), [Decimal('50')])
+        with self.captureOnCommitCallbacks(execute=True):
+            sale.payment_status = 'cancelled'
+            sale.save()
+        self.assertEqual(self.values(mine, team), [Decimal('0'), Decimal('0')])
+
+    def test_completion_notifies_owner_or_whole_team(self):
+        from notifications.models import Notification
+
+        mine = self.add_goal('revenue', '40', user=self.barber)
+        team = self.add_goal('sales_count', '1')
+        self.add_sale(self.barber, '50.00')
+
+        notifications = Notification.objects.filter(notification_type='goal_completed')
+        self.assertEqual(
+            sorted(notifications.values_list('reference_id', 'user__name')),
+            sorted([(str(mine.id), 'Barbeiro'), (str(team.id), 'Admin'), (str(team.id), 'Barbeiro')])
+        )
+
+    def test_appointment_and_customer_deltas_complete_goal(self):
+        from customers.models import Customer
+        from scheduling.models import Appointment, Service
+
+        service = Service.objects.create(tenant=self.tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30)
+        services = self.add_goal('services_count', '1', user=self.barber)
+        customers = self.add_goal('new_customers', '5')
+
+        start = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.create(
+                tenant=self.tenant, service=service, professional=self.barber, customer_name='Cliente',
+                start_time=start, end_time=start + timedelta(minutes=30), status='marcado'
+            )
+            Customer.objects.create(tenant=self.tenant, name='Cliente', phone='11999990000')
+        self.assertEqual(self.values(services, customers), [Decimal('0'), Decimal('1')])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'concluido'
+            appointment.save()
+        services.refresh_from_db()
+        self.assertEqual((services.current_value, services.status), (Decimal('1'), 'completed'))
+
+    def test_recalculate_all_corrects_drift_in_bulk(self):
+        goals = [self.add_goal('revenue', '100', user=self.barber) for _ in range(3)]
+        goals.append(self.add_goal('sales_count', '10'))
+        self.add_sale(self.barber, '120.00')
+        self.add_sale(self.admin, '10.00')
+        Goal.objects.update(current_value=Decimal('7'), status='active')
+
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/goals/recalculate_all/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 4)
+        self.assertLessEqual(len(ctx.captured_queries), 20)
+
+        self.assertEqual(self.values(*goals), [Decimal('120')] * 3 + [Decimal('2')])
+        self.assertEqual(Goal.objects.get(pk=goals[0].pk).status, 'completed')
+        self.assertEqual(GoalProgress.objects.filter(notes='Recalculado em lote').count(), 4)
 
-# Create your tests here.
+        # A reconciliação de uma meta usa a mesma definição de valor
+        goals[3].calculate_current_value()
+        self.assertEqual(goals[3].current_value, Decimal('2'))
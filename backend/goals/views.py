@@ -2,16 +2,19 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db.models import Sum, Count, Q, Avg
+from django.db.models import Sum, Count, Q, Avg, Case, DecimalField, F, Value, When
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
 
 from .models import Goal, GoalProgress
+from .progress import recalculate
 from .serializers import (
     GoalSerializer, GoalCreateSerializer, GoalUpdateSerializer,
     GoalProgressSerializer
 )
 from core.permissions import IsTenantUser
+from core.reports import professional_metrics, rate
 
 
 class GoalViewSet(viewsets.ModelViewSet):
@@ -222,42 +225,47 @@ class GoalViewSet(viewsets.ModelViewSet):
             user__isnull=False
         )
         
-        # Agrupa por profissional
-        users = User.objects.filter(
-            tenant=request.user.tenant,
-            role__in=['admin', 'profissional']
+        # Métricas de todos os profissionais em uma query (core.reports)
+        active = Q(status='active')
+        rows = professional_metrics(
+            goals,
+            {
+                'total_goals': Count('id'),
+                'completed': Count('id', filter=Q(status='completed')),
+                'active': Count('id', filter=active),
+                # Média de progresso das metas ativas (Goal.percentage() em SQL)
+                'avg_progress': Avg(Case(
+                    When(active & Q(target_value=0), then=Value(Decimal('0'))),
+                    When(active, then=F('current_value') * Decimal('100') / F('target_value')),
+                    output_field=DecimalField(),
+                )),
+            },
+            User.objects.filter(
+                tenant=request.user.tenant,
+                role__in=['admin', 'barbeiro']
+            ),
+            professional_field='user',
         )
         
         ranking_data = []
-        for user in users:
-            user_goals = goals.filter(user=user)
-            
-            if not user_goals.exists():
+        for user, metrics in rows:
+            if not metrics['total_goals']:
                 continue
             
-            total_goals = user_goals.count()
-            completed = user_goals.filter(status='completed').count()
-            active = user_goals.filter(status='active').count()
-            
-            # Média de progresso das metas ativas
-            active_goals_list = user_goals.filter(status='active')
-            avg_progress = 0
-            if active_goals_list.exists():
-                progress_sum = sum([g.percentage() for g in active_goals_list])
-                avg_progress = progress_sum / active_goals_list.count()
+            avg_progress = float(metrics['avg_progress'] or 0)
             
             # Taxa de sucesso
-            success_rate = (completed / total_goals * 100) if total_goals > 0 else 0
+            success_rate = rate(metrics['completed'], metrics['total_goals'])
             
             ranking_data.append({
-                'user_id': user.id,
-                'name': user.get_full_name(),
-                'email': user.email,
-                'total_goals': total_goals,
-                'completed': completed,
-                'active': active,
+                'user_id': user['id'],
+                'name': user['name'],
+                'email': user['email'],
+                'total_goals': metrics['total_goals'],
+                'completed': metrics['completed'],
+                'active': metrics['active'],
                 'avg_progress': round(avg_progress, 2),
-                'success_rate': round(success_rate, 2),
+                'success_rate': success_rate,
                 'score': round(avg_progress + success_rate, 2)  # Pontuação combinada
             })
         
@@ -279,21 +287,11 @@ class GoalViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        active_goals = self.get_queryset().filter(status='active')
-        count = 0
-        
-        for goal in active_goals:
-            goal.calculate_current_value()
-            
-            # Registra progresso
-            GoalProgress.objects.create(
-                tenant=goal.tenant,
-                goal=goal,
-                date=timezone.now().date(),
-                value=goal.current_value,
-                notes='Recalculado em lote'
-            )
-            count += 1
+        # UPDATE por tipo de meta e GoalProgress em bulk_create (goals.progress)
+        count = recalculate(
+            self.get_queryset().filter(status='active'),
+            notes='Recalculado em lote'
+        )
         
         return Response({
             'message': f'{count} metas foram recalculadas com sucesso.',
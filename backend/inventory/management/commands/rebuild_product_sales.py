@@ -0,0 +1,24 @@
+"""
+Command para reconstruir as vendas por produto e dia (ProductSalesDaily)
+O rollup é recalculado a cada mudança de venda/item pelo ORM; use este command
+após alterações feitas fora dele (ex.: queryset.update, bulk_create de itens em venda já paga)
+"""
+from django.core.management.base import BaseCommand
+from inventory.models import ProductSalesDaily
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói as vendas por produto e dia (relatório de mais vendidos) a partir dos itens das vendas pagas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            help='ID do tenant (padrão: todos os tenants)'
+        )
+
+    def handle(self, *args, **options):
+        rows = ProductSalesDaily.rebuild(tenant_id=options['tenant'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Vendas por produto reconstruídas: {rows} linhas (produto x dia)'
+        ))
@@ -0,0 +1,84 @@
+"""
+Command para reconstruir o estoque dos produtos a partir do ledger de movimentações
+Estoque esperado = estoque anterior à primeira movimentação + entradas - saídas
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from core.response_cache import invalidate
+from inventory.models import Product, StockMovement
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói Product.stock_quantity a partir das movimentações de estoque'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tenant',
+            help='ID do tenant (padrão: todos os tenants)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Apenas lista as divergências, sem corrigir'
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.filter(stock_movements__isnull=False).distinct()
+        if options['tenant']:
+            products = products.filter(tenant_id=options['tenant'])
+
+        with transaction.atomic():
+            # Trava os produtos para que nenhuma venda altere o estoque durante a reconciliação
+            product_ids = list(
+                Product.objects.select_for_update().filter(
+                    pk__in=products.values('pk')
+                ).values_list('pk', flat=True)
+            )
+
+            first_movement = StockMovement.objects.filter(
+                product=OuterRef('pk')
+            ).order_by('created_at')
+
+            ledger = Product.objects.filter(pk__in=product_ids).annotate(
+                opening_stock=Subquery(first_movement.values('stock_before')[:1]),
+                entries=Coalesce(
+                    Sum('stock_movements__quantity', filter=Q(stock_movements__movement_type='entrada')),
+                    0,
+                    output_field=IntegerField()
+                ),
+                exits=Coalesce(
+                    Sum('stock_movements__quantity', filter=Q(stock_movements__movement_type='saida')),
+                    0,
+                    output_field=IntegerField()
+                ),
+            )
+
+            divergent = []
+            for product in ledger:
+                expected = product.opening_stock + product.entries - product.exits
+                if product.stock_quantity != expected:
+                    self.stdout.write(
+                        f'  ✗ {product.name}: estoque {product.stock_quantity}, ledger {expected}'
+                    )
+                    product.stock_quantity = expected
+                    divergent.append(product)
+
+            if divergent and not options['dry_run']:
+                Product.objects.bulk_update(divergent, ['stock_quantity'], batch_size=500)
+                for tenant_id in {product.tenant_id for product in divergent}:
+                    invalidate(tenant_id, 'products')
+
+        if not divergent:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {len(product_ids)} produtos conferidos, nenhuma divergência'
+            ))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(
+                f'⚠️ {len(divergent)} de {len(product_ids)} produtos divergentes (dry-run, nada alterado)'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {len(divergent)} de {len(product_ids)} produtos corrigidos a partir do ledger'
+            ))
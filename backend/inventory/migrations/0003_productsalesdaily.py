@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0006_queuedemail"),
+        ("inventory", "0002_stockmovement_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSalesDaily",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField(verbose_name="Data")),
+                (
+                    "quantity",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Quantidade",
+                    ),
+                ),
+                (
+                    "revenue",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Receita",
+                    ),
+                ),
+                (
+                    "items_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Itens vendidos"
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="sales_daily",
+                        to="inventory.product",
+                        verbose_name="Produto",
+                    ),
+                ),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="product_sales_daily",
+                        to="core.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Vendas do Produto por Dia",
+                "verbose_name_plural": "Vendas dos Produtos por Dia",
+                "indexes": [
+                    models.Index(
+                        fields=["tenant", "date"], name="inventory_p_tenant__f1732a_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("tenant", "product", "date"),
+                        name="unique_product_sales_day",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from inventory.sales import rows
+
+
+def build_product_sales(apps, schema_editor):
+    ProductSalesDaily = apps.get_model("inventory", "ProductSalesDaily")
+    ProductSalesDaily.objects.bulk_create(
+        [ProductSalesDaily(**row) for row in rows(apps.get_model("pos", "SaleItem").objects.all())],
+        batch_size=1000,
+    )
+
+
+def clear_product_sales(apps, schema_editor):
+    apps.get_model("inventory", "ProductSalesDaily").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0003_productsalesdaily"),
+        ("pos", "0003_add_performance_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(build_product_sales, clear_product_sales),
+    ]
@@ -3,9 +3,11 @@ Modelos do Módulo de Inventário
 Gestão de Produtos e Controle de Estoque
 """
 import uuid
-from django.db import models
+from django.db import connection, models, transaction
 from django.core.validators import MinValueValidator
-from core.models import TenantAwareModel
+from django.utils import timezone
+from core.models import Tenant, TenantAwareModel
+from core.response_cache import invalidate
 
 
 class Product(TenantAwareModel):
@@ -112,6 +114,37 @@ class Product(TenantAwareModel):
         elif self.is_low_stock:
             return 'low'
         return 'ok'
+    
+    @classmethod
+    def apply_stock_delta(cls, product_id, delta):
+        """
+        Aplica um delta ao estoque direto no banco, de forma atômica.
+        
+        Executa UPDATE ... SET stock_quantity = stock_quantity + delta
+        WHERE stock_quantity + delta >= 0 RETURNING stock_quantity,
+        então vendas simultâneas do mesmo produto nunca sobrescrevem
+        o estoque uma da outra e o estoque nunca fica negativo.
+        
+        Retorna o estoque após a atualização, ou None se o estoque
+        for insuficiente (nenhuma linha atualizada).
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        pk = cls._meta.pk.get_db_prep_value(product_id, connection)
+        updated_at = cls._meta.get_field('updated_at').get_db_prep_value(
+            timezone.now(), connection
+        )
+        
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} '
+                f'SET stock_quantity = stock_quantity + %s, updated_at = %s '
+                f'WHERE id = %s AND stock_quantity + %s >= 0 '
+                f'RETURNING stock_quantity',
+                [delta, updated_at, pk, delta]
+            )
+            row = cursor.fetchone()
+        
+        return row[0] if row else None
 
 
 class StockMovement(TenantAwareModel):
@@ -201,35 +234,137 @@ class StockMovement(TenantAwareModel):
     def save(self, *args, **kwargs):
         """
         Atualiza o estoque do produto automaticamente
+        
+        O estoque é alterado com um UPDATE condicional no banco
+        (ver Product.apply_stock_delta) e stock_before/stock_after são
+        derivados da linha retornada, e não do valor lido em memória.
         """
         # Verifica se é criação (ainda não foi salvo no banco)
         is_new = self._state.adding
         
-        if is_new:
-            # Registra estoque anterior
-            self.stock_before = self.product.stock_quantity
+        if not is_new:
+            super().save(*args, **kwargs)
+            return
+        
+        delta = self.quantity if self.movement_type == 'entrada' else -self.quantity
+        
+        with transaction.atomic():
+            stock_after = Product.apply_stock_delta(self.product_id, delta)
             
-            # Atualiza estoque do produto
-            if self.movement_type == 'entrada':
-                new_stock = self.product.stock_quantity + self.quantity
-            else:  # saída
-                new_stock = self.product.stock_quantity - self.quantity
-                
-                # Validação: não permite estoque negativo
-                if new_stock < 0:
-                    raise ValueError(
-                        f'Estoque insuficiente. Disponível: {self.stock_before}, '
-                        f'Solicitado: {self.quantity}'
-                    )
+            # Validação: não permite estoque negativo
+            if stock_after is None:
+                available = Product.objects.filter(
+                    pk=self.product_id
+                ).values_list('stock_quantity', flat=True).first()
+                raise ValueError(
+                    f'Estoque insuficiente. Disponível: {available}, '
+                    f'Solicitado: {self.quantity}'
+                )
             
-            # Registra estoque após
-            self.stock_after = new_stock
+            # Registra estoque anterior e após
+            self.stock_after = stock_after
+            self.stock_before = stock_after - delta
             
             # Salva a movimentação
             super().save(*args, **kwargs)
             
-            # Atualiza o produto
-            self.product.stock_quantity = new_stock
-            self.product.save()
-        else:
-            super().save(*args, **kwargs)
+            # Mantém a instância em memória sincronizada com o banco
+            self.product.stock_quantity = stock_after
+            
+            # O UPDATE direto não dispara os signals de Product
+            from notifications.fanout import notify_stock_change
+            notify_stock_change(self.product, self.stock_before)
+            invalidate(self.tenant_id, 'products')
+
+
+class ProductSalesDaily(models.Model):
+    """
+    Vendas pagas por produto e dia (rollup de pos.SaleItem)
+    Cada célula (produto, dia) é recalculada quando uma venda passa a paga ou deixa
+    de ser paga e quando um item é alterado (inventory.signals); reconstruído pelo
+    command rebuild_product_sales. Ver inventory.sales.
+    """
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name='product_sales_daily'
+    )
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='sales_daily',
+        verbose_name='Produto'
+    )
+    date = models.DateField('Data')
+    quantity = models.DecimalField('Quantidade', max_digits=12, decimal_places=2, default=0)
+    revenue = models.DecimalField('Receita', max_digits=12, decimal_places=2, default=0)
+    items_count = models.PositiveIntegerField('Itens vendidos', default=0)
+    
+    class Meta:
+        verbose_name = 'Vendas do Produto por Dia'
+        verbose_name_plural = 'Vendas dos Produtos por Dia'
+        constraints = [
+            models.UniqueConstraint(fields=['tenant', 'product', 'date'], name='unique_product_sales_day'),
+        ]
+        indexes = [
+            models.Index(fields=['tenant', 'date']),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} - {self.date}: {self.quantity}"
+    
+    @classmethod
+    def refresh(cls, tenant_id, cells):
+        """
+        Recalcula as células (product_id, data) a partir dos itens das vendas pagas
+        Idempotente: pode rodar mais de uma vez para a mesma célula
+        """
+        from pos.models import SaleItem
+        from . import sales
+        
+        cells = {(str(product_id), day) for product_id, day in cells if product_id}
+        if not cells:
+            return
+        
+        items = SaleItem.objects.filter(
+            tenant_id=tenant_id,
+            product_id__in={product_id for product_id, _ in cells},
+            sale__date__date__in={day for _, day in cells},
+        )
+        rows = [
+            cls(**row)
+            for row in sales.rows(items)
+            if (str(row['product_id']), row['date']) in cells
+        ]
+        empty = cells - {(str(row.product_id), row.date) for row in rows}
+        
+        with transaction.atomic():
+            if empty:
+                stale = models.Q()
+                for product_id, day in empty:
+                    stale |= models.Q(product_id=product_id, date=day)
+                cls.objects.filter(stale, tenant_id=tenant_id).delete()
+            cls.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=['tenant', 'product', 'date'],
+                update_fields=['quantity', 'revenue', 'items_count'],
+            )
+    
+    @classmethod
+    def rebuild(cls, tenant_id=None):
+        """Reconstrói o rollup a partir de SaleItem (todos os tenants ou um); retorna o total de linhas"""
+        from pos.models import SaleItem
+        from . import sales
+        
+        items = SaleItem.objects.all()
+        rollup = cls.objects.all()
+        if tenant_id:
+            items = items.filter(tenant_id=tenant_id)
+            rollup = rollup.filter(tenant_id=tenant_id)
+        
+        rows = [cls(**row) for row in sales.rows(items)]
+        with transaction.atomic():
+            rollup.delete()
+            cls.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
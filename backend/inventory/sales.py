@@ -0,0 +1,90 @@
+"""
+Vendas por produto (relatório de mais vendidos)
+
+A fonte é o livro de itens do PDV (pos.SaleItem) das vendas pagas, consolidado
+por produto e dia em ProductSalesDaily (único por tenant + produto + dia, que
+também é o índice da leitura). O relatório soma só as linhas do período, sem
+varrer as vendas.
+
+- Receita: soma de SaleItem.total (já com desconto do item)
+- Margem: receita - quantidade x preço de custo atual do produto
+  (o item não guarda o custo da época da venda)
+"""
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import TruncDate
+
+ORDERINGS = {
+    'quantity': 'total_quantity_sold',
+    'revenue': 'total_revenue',
+    'margin': 'margin',
+}
+
+
+def aggregate(items):
+    """
+    Agrupa itens por tenant, produto e dia da venda (só vendas pagas)
+    Aceita o model histórico nas migrations
+    """
+    return (
+        items.filter(product__isnull=False, sale__payment_status='paid')
+        .annotate(day=TruncDate('sale__date'))
+        .values('tenant_id', 'product_id', 'day')
+        .annotate(
+            total_quantity=Sum('quantity'),
+            total_revenue=Sum('total'),
+            total_items=Count('id'),
+        )
+        .order_by()
+        .values_list('tenant_id', 'product_id', 'day', 'total_quantity', 'total_revenue', 'total_items', named=True)
+    )
+
+
+def rows(items):
+    """Linhas de aggregate() no formato de ProductSalesDaily"""
+    return [
+        {
+            'tenant_id': row.tenant_id,
+            'product_id': row.product_id,
+            'date': row.day,
+            'quantity': row.total_quantity or Decimal('0'),
+            'revenue': row.total_revenue or Decimal('0'),
+            'items_count': row.total_items,
+        }
+        for row in aggregate(items)
+    ]
+
+
+def best_selling(tenant_id, date_from=None, date_to=None, limit=10, order_by='quantity'):
+    """
+    Produtos mais vendidos no período (datas inclusivas)
+    Duas queries: o agrupamento no rollup e os produtos do resultado
+    """
+    from .models import Product, ProductSalesDaily
+
+    daily = ProductSalesDaily.objects.filter(tenant_id=tenant_id)
+    if date_from:
+        daily = daily.filter(date__gte=date_from)
+    if date_to:
+        daily = daily.filter(date__lte=date_to)
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    stats = list(
+        daily.values('product_id', 'product__cost_price')
+        .annotate(
+            total_quantity_sold=Sum('quantity'),
+            total_revenue=Sum('revenue'),
+            total_sales_count=Sum('items_count'),
+        )
+        .annotate(
+            total_cost=ExpressionWrapper(F('total_quantity_sold') * F('product__cost_price'), output_field=money),
+        )
+        .annotate(
+            margin=ExpressionWrapper(F('total_revenue') - F('total_cost'), output_field=money),
+        )
+        .order_by(f'-{ORDERINGS[order_by]}', 'product_id')[:limit]
+    )
+
+    products = Product.objects.in_bulk([stat['product_id'] for stat in stats])
+    return [(products[stat['product_id']], stat) for stat in stats]
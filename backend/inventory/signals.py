@@ -1,13 +1,15 @@
 """
 Signals do Módulo de Inventário
-Integração automática com o módulo financeiro
+Integração automática com o módulo financeiro e rollup de vendas por produto
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_init, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 from decimal import Decimal
 from datetime import date
 
-from .models import StockMovement
+from core import side_effects
+from .models import ProductSalesDaily, StockMovement
 from financial.models import Transaction, PaymentMethod
 
 
@@ -62,3 +64,54 @@ def create_financial_transaction_on_purchase(sender, instance, created, **kwargs
     instance.save(update_fields=['transaction'])
     
     print(f"✅ Transação financeira criada: Despesa de R$ {total_cost} para compra de {product.name}")
+
+
+@receiver(post_init, sender='pos.Sale')
+def remember_sale_payment_status_for_product_sales(sender, instance, **kwargs):
+    # __dict__ evita query quando o campo foi adiado (.only()/.defer())
+    instance._product_sales_status = instance.__dict__.get('payment_status')
+
+
+@receiver(post_save, sender='pos.Sale')
+def defer_product_sales_on_sale(sender, instance, created, **kwargs):
+    """Agenda o recálculo das vendas por produto quando a venda passa a paga ou deixa de ser paga"""
+    previous_status = None if created else getattr(instance, '_product_sales_status', None)
+    instance._product_sales_status = instance.payment_status
+
+    # Depois do commit: no checkout os itens são criados em lote depois da venda
+    if previous_status != instance.payment_status and 'paid' in (previous_status, instance.payment_status):
+        side_effects.defer('inventory.product_sales', instance)
+
+
+@side_effects.register('inventory.product_sales')
+def refresh_product_sales_on_sale(instance):
+    """Recalcula as células (produto, dia) dos itens da venda"""
+    day = timezone.localdate(instance.date)
+    product_ids = instance.items.filter(product__isnull=False).values_list('product_id', flat=True)
+    ProductSalesDaily.refresh(instance.tenant_id, {(product_id, day) for product_id in product_ids})
+
+
+@receiver(post_init, sender='pos.SaleItem')
+def remember_sale_item_product(sender, instance, **kwargs):
+    instance._product_sales_product = instance.__dict__.get('product_id')
+
+
+@receiver(post_save, sender='pos.SaleItem')
+@receiver(post_delete, sender='pos.SaleItem')
+def refresh_product_sales_on_item(sender, instance, **kwargs):
+    """
+    Item alterado ou excluído em venda paga: recalcula o produto atual e o anterior
+    Itens de vendas não pagas não entram no rollup (a transição da venda cuida deles)
+    """
+    product_ids = {instance.product_id, getattr(instance, '_product_sales_product', None)} - {None}
+    instance._product_sales_product = instance.product_id
+    if not product_ids:
+        return
+
+    from pos.models import Sale
+
+    sale = Sale.objects.filter(pk=instance.sale_id, payment_status='paid').values('date').first()
+    if sale is None:
+        return
+    day = timezone.localdate(sale['date'])
+    ProductSalesDaily.refresh(instance.tenant_id, {(product_id, day) for product_id in product_ids})
@@ -1,3 +1,251 @@
-from django.test import TestCase
+# Inventory Tests
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Tenant, User
+from pos.models import CashRegister, Sale, SaleItem
+from .models import Product, ProductSalesDaily, StockMovement
+from .sales import best_selling
+
+
+def create_product(tenant, stock_quantity=10):
+    return Product.objects.create(
+        tenant=tenant,
+        name='Pomada Modeladora',
+        category='pomada',
+        cost_price='10.00',
+        sale_price='25.00',
+        stock_quantity=stock_quantity,
+        min_stock=0
+    )
+
+
+class StockLedgerTestCase(TestCase):
+    """Testa o ledger atômico de estoque"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop')
+        self.product = create_product(self.tenant)
+
+    def move(self, movement_type, quantity):
+        return StockMovement.objects.create(
+            tenant=self.tenant,
+            product=self.product,
+            movement_type=movement_type,
+            reason='ajuste',
+            quantity=quantity
+        )
+
+    def test_movements_record_stock_before_and_after(self):
+        exit_movement = self.move('saida', 4)
+        entry_movement = self.move('entrada', 2)
+
+        self.assertEqual((exit_movement.stock_before, exit_movement.stock_after), (10, 6))
+        self.assertEqual((entry_movement.stock_before, entry_movement.stock_after), (6, 8))
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 8)
+
+    def test_insufficient_stock_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.move('saida', 11)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 10)
+        self.assertFalse(StockMovement.objects.exists())
+
+    def test_stale_instance_does_not_overwrite_stock(self):
+        # Outra instância altera o estoque sem que self.product saiba
+        StockMovement.objects.create(
+            tenant=self.tenant,
+            product=Product.objects.get(pk=self.product.pk),
+            movement_type='saida',
+            reason='venda',
+            quantity=3
+        )
+
+        movement = self.move('saida', 2)
+
+        self.assertEqual(movement.stock_before, 7)
+        self.assertEqual(movement.stock_after, 5)
+
+    def test_reconcile_stock_rebuilds_from_ledger(self):
+        self.move('saida', 4)
+        self.move('entrada', 1)
+        Product.objects.filter(pk=self.product.pk).update(stock_quantity=99)
+
+        call_command('reconcile_stock', stdout=StringIO())
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 7)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class StockLedgerConcurrencyTestCase(TransactionTestCase):
+    """
+    Teste de estresse: vários terminais vendendo o mesmo produto ao mesmo tempo.
+    Requer um banco com lock por linha (PostgreSQL).
+    """
+
+    WRITERS = 8
+    SALES_PER_WRITER = 10
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop')
+        self.user = User.objects.create_user(
+            email='caixa@test.com', password='testpass123', name='Caixa', tenant=self.tenant
+        )
+        self.product = create_product(
+            self.tenant, stock_quantity=self.WRITERS * self.SALES_PER_WRITER
+        )
+
+    def test_no_lost_updates(self):
+        errors = []
+        barrier = threading.Barrier(self.WRITERS)
+
+        def writer():
+            try:
+                barrier.wait()
+                for _ in range(self.SALES_PER_WRITER):
+                    StockMovement.objects.create(
+                        tenant_id=self.tenant.pk,
+                        product=Product.objects.get(pk=self.product.pk),
+                        movement_type='saida',
+                        reason='venda',
+                        quantity=1,
+                        created_by_id=self.user.pk
+                    )
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 0)
+
+        # Cada movimentação viu um estoque diferente: nenhuma leitura foi perdida
+        stock_after = list(
+            StockMovement.objects.filter(product=self.product).values_list('stock_after', flat=True)
+        )
+        self.assertEqual(sorted(stock_after), list(range(len(stock_after))))
+
+        # Uma venda a mais deve ser rejeitada, o estoque nunca fica negativo
+        with self.assertRaises(ValueError):
+            StockMovement.objects.create(
+                tenant=self.tenant,
+                product=self.product,
+                movement_type='saida',
+                reason='venda',
+                quantity=1
+            )
+
+
+class BestSellingFixtureMixin:
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.pomada = create_product(self.tenant)
+        self.shampoo = Product.objects.create(
+            tenant=self.tenant, name='Shampoo', category='shampoo', cost_price='30.00', sale_price='40.00',
+            stock_quantity=10, min_stock=0
+        )
+        self.register = CashRegister.objects.create(tenant=self.tenant, user=self.user, opening_balance=Decimal('0'))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def sell(self, *items, payment_status='paid'):
+        """Venda com itens (produto, quantidade, preço); marcada como paga depois dos itens, como no PDV"""
+        sale = Sale.objects.create(
+            tenant=self.tenant, user=self.user, cash_register=self.register, payment_method='cash'
+        )
+        for product, quantity, price in items:
+            SaleItem.objects.create(
+                tenant=self.tenant, sale=sale, product=product, quantity=quantity, unit_price=Decimal(price)
+            )
+        sale.calculate_total()
+        sale.payment_status = payment_status
+        sale.save()
+        return sale
+
+    def report(self, **params):
+        response = self.client.get('/api/inventory/products/best_selling/', params)
+        self.assertEqual(response.status_code, 200)
+        return {row['product_name']: row for row in response.data}
+
+
+class BestSellingTestCase(BestSellingFixtureMixin, TestCase):
+    """Testa o relatório de mais vendidos a partir dos itens das vendas pagas"""
+
+    def sell(self, *items, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return super().sell(*items, **kwargs)
+
+    def test_paid_sales_are_reported_with_margin(self):
+        self.sell((self.pomada, 2, '25.00'), (self.shampoo, 1, '40.00'))
+        self.sell((self.pomada, 1, '25.00'), payment_status='pending')
+
+        report = self.report()
+
+        self.assertEqual(report['Pomada Modeladora']['total_quantity_sold'], 2)
+        self.assertEqual(report['Pomada Modeladora']['total_revenue'], 50)
+        self.assertEqual(report['Pomada Modeladora']['margin'], 30)
+        self.assertEqual(report['Pomada Modeladora']['margin_percentage'], 60)
+        self.assertEqual(report['Shampoo']['margin'], 10)
+
+    def test_ordering_and_date_range(self):
+        old = self.sell((self.shampoo, 5, '40.00'))
+        self.sell((self.pomada, 3, '25.00'), (self.shampoo, 1, '40.00'))
+        Sale.objects.filter(pk=old.pk).update(date=timezone.now() - timedelta(days=10))
+        call_command('rebuild_product_sales', stdout=StringIO())
+
+        today = timezone.localdate().isoformat()
+        self.assertEqual(list(self.report(date_from=today)), ['Pomada Modeladora', 'Shampoo'])
+        self.assertEqual(list(self.report(order_by='revenue')), ['Shampoo', 'Pomada Modeladora'])
+        self.assertEqual(list(self.report(order_by='margin')), ['Shampoo', 'Pomada Modeladora'])
+        self.assertEqual(self.report(date_from=today)['Shampoo']['total_quantity_sold'], 1)
+
+    def test_report_reads_the_rollup_in_two_queries(self):
+        for product in (self.pomada, self.shampoo):
+            self.sell((product, 1, '25.00'))
+
+        with self.assertNumQueries(2):
+            rows = best_selling(self.tenant.id, order_by='margin')
+
+        self.assertEqual(len(rows), 2)
+
+    def test_invalid_params_are_rejected(self):
+        url = '/api/inventory/products/best_selling/'
+        for params in ({'limit': 'x'}, {'limit': 0}, {'date_from': '2024-13-01'}, {'order_by': 'name'}):
+            self.assertEqual(self.client.get(url, params).status_code, 400)
+
+
+class BestSellingTransitionTestCase(BestSellingFixtureMixin, TransactionTestCase):
+    """Transições de pagamento da mesma venda (cada save com seu commit)"""
+
+    def test_cancelled_sale_leaves_the_report(self):
+        sale = self.sell((self.pomada, 2, '25.00'))
+        self.assertEqual(self.report()['Pomada Modeladora']['total_sales_count'], 1)
+
+        sale.payment_status = 'cancelled'
+        sale.save()
+
+        self.assertEqual(self.report(), {})
+        self.assertFalse(ProductSalesDaily.objects.exists())
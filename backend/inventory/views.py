@@ -1,6 +1,7 @@
 """
 Views do Módulo de Inventário
 """
+from datetime import date
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
@@ -9,6 +10,8 @@ from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Sum, Q, F, DecimalField
 from django.db.models.functions import Coalesce
 from core.permissions import IsSameTenant
+from core.exports import ExportColumn, ExportMixin, yes_no
+from core.response_cache import TenantCachedResponseMixin
 from .models import Product, StockMovement
 from .serializers import (
     ProductSerializer,
@@ -19,7 +22,7 @@ from .serializers import (
 )
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ExportMixin, TenantCachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciar Produtos
     
@@ -34,10 +37,24 @@ class ProductViewSet(viewsets.ModelViewSet):
     - PUT /api/inventory/products/{id}/ - Atualizar produto
     - DELETE /api/inventory/products/{id}/ - Deletar produto
     """
+    cache_resources = ('products',)
     permission_classes = [IsAuthenticated, IsSameTenant]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['category', 'is_active']
     
+    export_filename = 'produtos'
+    export_sheet_title = 'Produtos'
+    export_columns = [
+        ExportColumn('SKU', 'sku'),
+        ExportColumn('Nome', 'name', width=30),
+        ExportColumn('Categoria', 'category'),
+        ExportColumn('Preço Custo', 'cost_price'),
+        ExportColumn('Preço Venda', 'sale_price'),
+        ExportColumn('Estoque', 'stock_quantity'),
+        ExportColumn('Estoque Mínimo', 'min_stock'),
+        ExportColumn('Ativo', 'is_active', yes_no),
+    ]
+    
     def get_queryset(self):
         """Filtra produtos do tenant do usuário"""
         return Product.objects.filter(
@@ -141,71 +158,51 @@ class ProductViewSet(viewsets.ModelViewSet):
     def best_selling(self, request):
         """
         GET /api/inventory/products/best_selling/
-        Retorna produtos mais vendidos com estatísticas
+        Retorna produtos mais vendidos com estatísticas (vendas pagas do PDV)
         Query params: 
-        - limit (default: 10)
-        - date_from, date_to (optional)
-        """
-        from financial.models import Transaction
-        from django.db.models import Sum, Count
-        
-        # Parâmetros
-        limit = int(request.query_params.get('limit', 10))
-        date_from = request.query_params.get('date_from')
-        date_to = request.query_params.get('date_to')
-        
-        # Base query de transações (apenas saídas/vendas)
-        transactions = Transaction.objects.filter(
-            tenant=request.user.tenant,
-            type='saida'
-        )
+        - limit (default: 10, máximo 100)
+        - date_from, date_to (optional, YYYY-MM-DD)
+        - order_by: quantity (default), revenue ou margin
         
-        # Filtrar por período se fornecido
-        if date_from:
-            transactions = transactions.filter(date__gte=date_from)
-        if date_to:
-            transactions = transactions.filter(date__lte=date_to)
-        
-        # Buscar movimentações de saída relacionadas às transações
-        from .models import StockMovement
-        
-        movements = StockMovement.objects.filter(
-            tenant=request.user.tenant,
-            movement_type='saida',
-            transaction__in=transactions
-        )
+        Lê o rollup diário ProductSalesDaily (ver inventory.sales)
+        """
+        from .sales import ORDERINGS, best_selling
         
-        # Filtrar por período se fornecido
-        if date_from:
-            movements = movements.filter(created_at__date__gte=date_from)
-        if date_to:
-            movements = movements.filter(created_at__date__lte=date_to)
+        params = request.query_params
+        order_by = params.get('order_by', 'quantity')
+        try:
+            limit = int(params.get('limit', 10))
+            date_from = date.fromisoformat(params['date_from']) if params.get('date_from') else None
+            date_to = date.fromisoformat(params['date_to']) if params.get('date_to') else None
+        except ValueError:
+            return Response(
+                {'error': 'Parâmetros inválidos (limit ou datas).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Agregar por produto
-        product_stats = movements.values(
-            'product__id',
-            'product__name',
-            'product__sku',
-            'product__sale_price',
-            'product__stock_quantity'
-        ).annotate(
-            total_quantity_sold=Sum('quantity'),
-            total_sales_count=Count('id'),
-            total_revenue=Sum(F('quantity') * F('product__sale_price'), output_field=DecimalField())
-        ).order_by('-total_quantity_sold')[:limit]
+        if not 1 <= limit <= 100 or order_by not in ORDERINGS or (date_from and date_to and date_to < date_from):
+            return Response(
+                {'error': 'limit entre 1 e 100, order_by em quantity/revenue/margin e date_from até date_to.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Formatar resposta
         result = []
-        for stat in product_stats:
+        for product, stat in best_selling(request.user.tenant_id, date_from, date_to, limit, order_by):
+            revenue = stat['total_revenue'] or 0
+            margin = stat['margin'] or 0
             result.append({
-                'product_id': stat['product__id'],
-                'product_name': stat['product__name'],
-                'sku': stat['product__sku'],
-                'sale_price': float(stat['product__sale_price']),
-                'current_stock': stat['product__stock_quantity'],
-                'total_quantity_sold': stat['total_quantity_sold'],
+                'product_id': product.id,
+                'product_name': product.name,
+                'sku': product.sku,
+                'sale_price': float(product.sale_price),
+                'cost_price': float(product.cost_price),
+                'current_stock': product.stock_quantity,
+                'total_quantity_sold': float(stat['total_quantity_sold'] or 0),
                 'total_sales_count': stat['total_sales_count'],
-                'total_revenue': float(stat['total_revenue'] or 0),
+                'total_revenue': float(revenue),
+                'total_cost': float(stat['total_cost'] or 0),
+                'margin': float(margin),
+                'margin_percentage': round(float(margin / revenue * 100), 2) if revenue else 0,
             })
         
         return Response(result)
@@ -257,85 +254,6 @@ class ProductViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
     
-    @action(detail=False, methods=['get'])
-    def export_csv(self, request):
-        """Exporta produtos para CSV"""
-        import csv
-        from django.http import HttpResponse
-        
-        queryset = self.get_queryset()
-        
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename="produtos.csv"'
-        response.write('\ufeff')  # BOM para UTF-8
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'SKU', 'Nome', 'Categoria', 'Preço Custo', 'Preço Venda',
-            'Estoque', 'Estoque Mínimo', 'Ativo'
-        ])
-        
-        for product in queryset:
-            writer.writerow([
-                product.sku,
-                product.name,
-                product.category,
-                float(product.cost_price),
-                float(product.sale_price),
-                product.stock_quantity,
-                product.min_stock,
-                'Sim' if product.is_active else 'Não'
-            ])
-        
-        return response
-    
-    @action(detail=False, methods=['get'])
-    def export_excel(self, request):
-        """Exporta produtos para Excel"""
-        try:
-            from openpyxl import Workbook
-            from django.http import HttpResponse
-            
-            queryset = self.get_queryset()
-            
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Produtos"
-            
-            # Cabeçalho
-            headers = [
-                'SKU', 'Nome', 'Categoria', 'Preço Custo', 'Preço Venda',
-                'Estoque', 'Estoque Mínimo', 'Ativo'
-            ]
-            ws.append(headers)
-            
-            # Dados
-            for product in queryset:
-                ws.append([
-                    product.sku,
-                    product.name,
-                    product.category,
-                    float(product.cost_price),
-                    float(product.sale_price),
-                    product.stock_quantity,
-                    product.min_stock,
-                    'Sim' if product.is_active else 'Não'
-                ])
-            
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = 'attachment; filename="produtos.xlsx"'
-            wb.save(response)
-            
-            return response
-        
-        except ImportError:
-            return Response(
-                {'error': 'Biblioteca openpyxl não instalada'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-    
     @action(detail=True, methods=['post'])
     def remove_stock(self, request, pk=None):
         """
@@ -0,0 +1,124 @@
+"""
+Envio de notificações para vários usuários de uma vez
+
+- notify_users/notify_tenant: uma notificação por destinatário em um único bulk_create
+- notify_batch: várias notificações diferentes (ex.: metas concluídas em lote) no mesmo bulk_create
+- Alertas de estoque: a passagem de nível (ok -> baixo -> sem estoque) é detectada
+  pelo estoque antes/depois da movimentação, sem reler o produto. O envio roda
+  depois do commit (efeito 'notifications.stock_alert'), fora da transação do
+  checkout, e alertas iguais do mesmo produto dentro de STOCK_ALERT_WINDOW
+  (settings, em segundos) são descartados.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core import side_effects
+from core.models import User
+from .models import Notification
+
+STOCK_ALERT_WINDOW = 6 * 60 * 60
+
+
+def notify_batch(items):
+    """
+    Cria várias notificações em um único bulk_create; retorna a quantidade
+    `items`: tuplas com os argumentos de notify_users
+    (tenant_id, user_ids, notification_type, title, message, reference_type, reference_id)
+    """
+    notifications = [
+        Notification(
+            tenant_id=tenant_id,
+            user_id=user_id,
+            notification_type=notification_type,
+            title=title,
+            message=message,
+            reference_type=reference_type,
+            reference_id=reference_id,
+        )
+        for tenant_id, user_ids, notification_type, title, message, reference_type, reference_id in items
+        for user_id in user_ids
+    ]
+    Notification.objects.bulk_create(notifications, batch_size=500)
+    return len(notifications)
+
+
+def notify_users(tenant_id, user_ids, notification_type, title, message, reference_type=None, reference_id=None):
+    """Cria a mesma notificação para cada usuário (um INSERT); retorna a quantidade"""
+    return notify_batch([(tenant_id, user_ids, notification_type, title, message, reference_type, reference_id)])
+
+
+def active_user_ids(tenant_id):
+    return list(User.objects.filter(tenant_id=tenant_id, is_active=True).values_list('id', flat=True))
+
+
+def notify_tenant(tenant_id, notification_type, title, message, reference_type=None, reference_id=None):
+    """Notifica todos os usuários ativos do tenant"""
+    return notify_users(
+        tenant_id, active_user_ids(tenant_id), notification_type, title, message, reference_type, reference_id
+    )
+
+
+def stock_level(quantity, min_stock):
+    """'stock_out', 'stock_low' ou None (estoque normal)"""
+    if quantity <= 0:
+        return 'stock_out'
+    if quantity <= min_stock:
+        return 'stock_low'
+    return None
+
+
+def crossed_stock_threshold(stock_before, stock_after, min_stock):
+    """True quando a saída levou o estoque a um nível pior (normal -> baixo -> sem estoque)"""
+    if stock_after >= stock_before:
+        return False
+    level = stock_level(stock_after, min_stock)
+    return level is not None and level != stock_level(stock_before, min_stock)
+
+
+def notify_stock_change(product, stock_before, stock_after=None):
+    """
+    Agenda o alerta de estoque se a movimentação cruzou o mínimo ou zerou o estoque
+    `stock_after` padrão é product.stock_quantity (já atualizado em memória)
+
+    Usado pelo post_save de Product e por fluxos que atualizam o estoque
+    via UPDATE direto (StockMovement.save, checkout do PDV), onde o signal não dispara.
+    """
+    if stock_after is None:
+        stock_after = product.stock_quantity
+    product._stock_snapshot = stock_after
+    if crossed_stock_threshold(stock_before, stock_after, product.min_stock):
+        side_effects.defer('notifications.stock_alert', product)
+
+
+@side_effects.register('notifications.stock_alert')
+def send_stock_alert(product):
+    """Notifica o tenant do estoque baixo/zerado (nível atual do produto)"""
+    notification_type = stock_level(product.stock_quantity, product.min_stock)
+    if notification_type is None:
+        return
+
+    # Mesmo alerta do mesmo produto há pouco tempo: não repete
+    window = timedelta(seconds=getattr(settings, 'STOCK_ALERT_WINDOW', STOCK_ALERT_WINDOW))
+    recent = Notification.objects.filter(
+        tenant_id=product.tenant_id,
+        reference_type='product',
+        reference_id=str(product.id),
+        notification_type=notification_type,
+        created_at__gte=timezone.now() - window,
+    )
+    if recent.exists():
+        return
+
+    if notification_type == 'stock_low':
+        title = 'Estoque Baixo'
+        message = (
+            f'O produto "{product.name}" está com estoque baixo: '
+            f'{product.stock_quantity} unidades (mínimo: {product.min_stock})'
+        )
+    else:
+        title = 'Produto Sem Estoque'
+        message = f'O produto "{product.name}" está sem estoque!'
+
+    notify_tenant(product.tenant_id, notification_type, title, message, 'product', str(product.id))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_outboxevent"),
+        ("notifications", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["tenant", "reference_type", "reference_id", "created_at"],
+                name="notificatio_tenant__698f2c_idx",
+            ),
+        ),
+    ]
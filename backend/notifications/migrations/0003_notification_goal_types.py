@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notifications", "0002_notification_notificatio_tenant__698f2c_idx"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="notification",
+            name="notification_type",
+            field=models.CharField(
+                choices=[
+                    ("appointment_new", "Novo Agendamento"),
+                    ("appointment_confirmed", "Agendamento Confirmado"),
+                    ("appointment_cancelled", "Agendamento Cancelado"),
+                    ("payment_received", "Pagamento Recebido"),
+                    ("commission_generated", "Comissão Gerada"),
+                    ("stock_low", "Estoque Baixo"),
+                    ("stock_out", "Produto Sem Estoque"),
+                    ("customer_new", "Novo Cliente"),
+                    ("goal_completed", "Meta Concluída"),
+                    ("goal_failed", "Meta Não Atingida"),
+                    ("goal_expiring", "Meta Vencendo"),
+                    ("system", "Sistema"),
+                ],
+                max_length=50,
+                verbose_name="Tipo de Notificação",
+            ),
+        ),
+    ]
@@ -23,6 +23,9 @@ class Notification(models.Model):
         ('stock_low', 'Estoque Baixo'),
         ('stock_out', 'Produto Sem Estoque'),
         ('customer_new', 'Novo Cliente'),
+        ('goal_completed', 'Meta Concluída'),
+        ('goal_failed', 'Meta Não Atingida'),
+        ('goal_expiring', 'Meta Vencendo'),
         ('system', 'Sistema'),
     ]
     
@@ -95,6 +98,8 @@ class Notification(models.Model):
             models.Index(fields=['tenant', 'user', 'is_read']),
             models.Index(fields=['tenant', 'created_at']),
             models.Index(fields=['user', 'is_read', 'created_at']),
+            # Janela de alertas repetidos (notifications.fanout)
+            models.Index(fields=['tenant', 'reference_type', 'reference_id', 'created_at']),
         ]
     
     def __str__(self):
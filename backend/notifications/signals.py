@@ -1,92 +1,118 @@
 """
 Signals para criar notificações automaticamente.
 """
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
-from django.db.models import F
 
+from core import side_effects
 from scheduling.models import Appointment
 from financial.models import Transaction
 from inventory.models import Product
 from commissions.models import Commission
 from customers.models import Customer
+from .fanout import notify_stock_change, notify_tenant
 from .models import Notification
 
 
 @receiver(post_save, sender=Appointment)
-def notify_new_appointment(sender, instance, created, **kwargs):
+def defer_new_appointment_notification(sender, instance, created, **kwargs):
+    """Agenda a notificação do novo agendamento para depois do commit."""
+    if created:
+        side_effects.defer('notifications.appointment_new', instance)
+
+
+@side_effects.register('notifications.appointment_new')
+def notify_new_appointment(instance):
     """
     Cria notificação quando um novo agendamento é criado.
     Notifica o profissional responsável.
     """
-    if created:
-        Notification.objects.create(
-            user=instance.professional,
-            notification_type='appointment_new',
-            title='Novo Agendamento',
-            message=f'Você tem um novo agendamento com {instance.customer.name} em {instance.start_time.strftime("%d/%m/%Y às %H:%M")}',
-            reference_type='appointment',
-            reference_id=str(instance.id),
-        )
+    Notification.objects.create(
+        tenant_id=instance.tenant_id,
+        user_id=instance.professional_id,
+        notification_type='appointment_new',
+        title='Novo Agendamento',
+        message=f'Você tem um novo agendamento com {instance.customer_name} em {instance.start_time.strftime("%d/%m/%Y às %H:%M")}',
+        reference_type='appointment',
+        reference_id=str(instance.id),
+    )
 
 
-@receiver(pre_save, sender=Appointment)
-def notify_appointment_status_change(sender, instance, **kwargs):
+@receiver(post_init, sender=Appointment)
+def remember_appointment_status(sender, instance, **kwargs):
+    # __dict__ evita query quando o campo foi adiado (.only()/.defer())
+    instance._notification_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Appointment)
+def detect_appointment_status_change(sender, instance, created, **kwargs):
     """
-    Cria notificação quando o status de um agendamento muda.
+    Agenda a notificação quando o status de um agendamento muda
+    para confirmado ou cancelado.
+    Compara com o status carregado, sem reler o agendamento.
+    """
+    previous_status = getattr(instance, '_notification_status', None)
+    instance._notification_status = instance.status
+    if created or previous_status is None:
+        return
+    if instance.status in ('confirmado', 'cancelado') and previous_status != instance.status:
+        side_effects.defer('notifications.appointment_status', instance)
+
+
+@side_effects.register('notifications.appointment_status')
+def notify_appointment_status_change(instance):
+    """
+    Cria notificação do novo status do agendamento.
     Notifica o profissional quando confirmado ou cancelado.
     """
-    if instance.pk:  # Apenas para updates, não creates
-        try:
-            old_instance = Appointment.objects.get(pk=instance.pk)
-            
-            # Se o status mudou
-            if old_instance.status != instance.status:
-                # Notificar confirmação
-                if instance.status == 'confirmado':
-                    Notification.objects.create(
-                        user=instance.professional,
-                        notification_type='appointment_confirmed',
-                        title='Agendamento Confirmado',
-                        message=f'Agendamento com {instance.customer.name} foi confirmado para {instance.start_time.strftime("%d/%m/%Y às %H:%M")}',
-                        reference_type='appointment',
-                        reference_id=str(instance.id),
-                    )
-                
-                # Notificar cancelamento
-                elif instance.status == 'cancelado':
-                    Notification.objects.create(
-                        user=instance.professional,
-                        notification_type='appointment_cancelled',
-                        title='Agendamento Cancelado',
-                        message=f'Agendamento com {instance.customer.name} em {instance.start_time.strftime("%d/%m/%Y às %H:%M")} foi cancelado',
-                        reference_type='appointment',
-                        reference_id=str(instance.id),
-                    )
-        except Appointment.DoesNotExist:
-            pass
+    when = instance.start_time.strftime("%d/%m/%Y às %H:%M")
+    
+    # Notificar confirmação
+    if instance.status == 'confirmado':
+        Notification.objects.create(
+            tenant_id=instance.tenant_id,
+            user_id=instance.professional_id,
+            notification_type='appointment_confirmed',
+            title='Agendamento Confirmado',
+            message=f'Agendamento com {instance.customer_name} foi confirmado para {when}',
+            reference_type='appointment',
+            reference_id=str(instance.id),
+        )
+    
+    # Notificar cancelamento
+    elif instance.status == 'cancelado':
+        Notification.objects.create(
+            tenant_id=instance.tenant_id,
+            user_id=instance.professional_id,
+            notification_type='appointment_cancelled',
+            title='Agendamento Cancelado',
+            message=f'Agendamento com {instance.customer_name} em {when} foi cancelado',
+            reference_type='appointment',
+            reference_id=str(instance.id),
+        )
 
 
 @receiver(post_save, sender=Transaction)
-def notify_payment_received(sender, instance, created, **kwargs):
+def defer_payment_received_notification(sender, instance, created, **kwargs):
+    """Agenda a notificação do pagamento recebido (receita) para depois do commit."""
+    if created and instance.type == 'receita':
+        side_effects.defer('notifications.payment_received', instance)
+
+
+@side_effects.register('notifications.payment_received')
+def notify_payment_received(instance):
     """
     Cria notificação quando um pagamento é recebido (receita).
     Notifica todos os usuários do tenant.
     """
-    if created and instance.type == 'receita':
-        # Buscar todos os usuários do tenant
-        from core.models import User
-        users = User.objects.filter(tenant=instance.tenant)
-        
-        for user in users:
-            Notification.objects.create(
-                user=user,
-                notification_type='payment_received',
-                title='Pagamento Recebido',
-                message=f'Pagamento de R$ {instance.amount:.2f} recebido. Descrição: {instance.description}',
-                reference_type='transaction',
-                reference_id=str(instance.id),
-            )
+    notify_tenant(
+        instance.tenant_id,
+        'payment_received',
+        'Pagamento Recebido',
+        f'Pagamento de R$ {instance.amount:.2f} recebido. Descrição: {instance.description}',
+        'transaction',
+        str(instance.id),
+    )
 
 
 @receiver(post_save, sender=Commission)
@@ -106,73 +132,43 @@ def notify_commission_generated(sender, instance, created, **kwargs):
         )
 
 
-@receiver(pre_save, sender=Product)
-def notify_low_stock(sender, instance, **kwargs):
+@receiver(post_init, sender=Product)
+def remember_stock_quantity(sender, instance, **kwargs):
+    # __dict__ evita query quando o campo foi adiado (.only()/.defer())
+    instance._stock_snapshot = instance.__dict__.get('stock_quantity')
+
+
+@receiver(post_save, sender=Product)
+def notify_low_stock(sender, instance, created, **kwargs):
     """
-    Cria notificação quando o estoque de um produto fica baixo.
-    Notifica todos os usuários do tenant.
+    Agenda o alerta quando um save do produto deixa o estoque baixo ou zerado.
+    Compara com o estoque carregado, sem reler o produto.
     """
-    if instance.pk:  # Apenas para updates
-        try:
-            old_instance = Product.objects.get(pk=instance.pk)
-            
-            # Se o estoque mudou e agora está baixo
-            if (old_instance.stock_quantity != instance.stock_quantity and
-                instance.stock_quantity <= instance.min_stock and
-                instance.stock_quantity > 0):
-                
-                # Buscar todos os usuários do tenant
-                from core.models import User
-                users = User.objects.filter(tenant=instance.tenant)
-                
-                for user in users:
-                    Notification.objects.create(
-                        user=user,
-                        notification_type='stock_low',
-                        title='Estoque Baixo',
-                        message=f'O produto "{instance.name}" está com estoque baixo: {instance.stock_quantity} unidades (mínimo: {instance.min_stock})',
-                        reference_type='product',
-                        reference_id=str(instance.id),
-                    )
-            
-            # Se o estoque zerou
-            elif (old_instance.stock_quantity != instance.stock_quantity and
-                  instance.stock_quantity == 0):
-                
-                # Buscar todos os usuários do tenant
-                from core.models import User
-                users = User.objects.filter(tenant=instance.tenant)
-                
-                for user in users:
-                    Notification.objects.create(
-                        user=user,
-                        notification_type='stock_out',
-                        title='Produto Sem Estoque',
-                        message=f'O produto "{instance.name}" está sem estoque!',
-                        reference_type='product',
-                        reference_id=str(instance.id),
-                    )
-        except Product.DoesNotExist:
-            pass
+    stock_before = instance._stock_snapshot
+    if created or stock_before is None:
+        instance._stock_snapshot = instance.stock_quantity
+        return
+    notify_stock_change(instance, stock_before)
 
 
 @receiver(post_save, sender=Customer)
-def notify_new_customer(sender, instance, created, **kwargs):
+def defer_new_customer_notification(sender, instance, created, **kwargs):
+    """Agenda a notificação do novo cliente para depois do commit."""
+    if created:
+        side_effects.defer('notifications.customer_new', instance)
+
+
+@side_effects.register('notifications.customer_new')
+def notify_new_customer(instance):
     """
     Cria notificação quando um novo cliente é cadastrado.
     Notifica todos os usuários do tenant.
     """
-    if created:
-        # Buscar todos os usuários do tenant
-        from core.models import User
-        users = User.objects.filter(tenant=instance.tenant)
-        
-        for user in users:
-            Notification.objects.create(
-                user=user,
-                notification_type='customer_new',
-                title='Novo Cliente',
-                message=f'Novo cliente cadastrado: {instance.name}',
-                reference_type='customer',
-                reference_id=str(instance.id),
-            )
+    notify_tenant(
+        instance.tenant_id,
+        'customer_new',
+        'Novo Cliente',
+        f'Novo cliente cadastrado: {instance.name}',
+        'customer',
+        str(instance.id),
+    )
@@ -1,3 +1,137 @@
-from django.test import TestCase
+from decimal import Decimal
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Tenant, User
+from customers.models import Customer
+from inventory.models import Product, StockMovement
+
+from .fanout import crossed_stock_threshold
+from .models import Notification
+
+
+class StockAlertMixin:
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.admin = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        User.objects.create_user(
+            email='caixa@test.com', password='testpass123', name='Caixa', tenant=self.tenant, role='caixa'
+        )
+        User.objects.create_user(
+            email='antigo@test.com', password='testpass123', name='Antigo', tenant=self.tenant,
+            role='caixa', is_active=False
+        )
+        self.product = Product.objects.create(
+            tenant=self.tenant, name='Pomada', category='pomada', cost_price=Decimal('10.00'), sale_price=Decimal('25.00'),
+            stock_quantity=10, min_stock=5
+        )
+
+    def move(self, movement_type, quantity):
+        StockMovement.objects.create(
+            tenant=self.tenant, product=self.product, movement_type=movement_type,
+            reason='venda' if movement_type == 'saida' else 'devolucao', quantity=quantity, created_by=self.admin
+        )
+
+    def alerts(self, notification_type):
+        return Notification.objects.filter(notification_type=notification_type, reference_id=str(self.product.id))
+
+
+class StockAlertFanoutTestCase(StockAlertMixin, TestCase):
+    """Testa os alertas de estoque enviados após o commit, em lote e sem repetição"""
+
+    def test_threshold_crossing(self):
+        self.assertTrue(crossed_stock_threshold(10, 5, 5))
+        self.assertTrue(crossed_stock_threshold(4, 0, 5))
+        self.assertFalse(crossed_stock_threshold(5, 4, 5))
+        self.assertFalse(crossed_stock_threshold(0, 3, 5))
+        self.assertFalse(crossed_stock_threshold(10, 6, 5))
+
+    def test_alert_runs_after_commit_with_one_insert(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.move('saida', 6)
+            self.assertFalse(self.alerts('stock_low').exists())
+
+        with CaptureQueriesContext(connection) as ctx:
+            for callback in callbacks:
+                callback()
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "notifications_notification"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.alerts('stock_low').count(), 2)
+
+        # Continua baixo: não é uma nova passagem de nível
+        with self.captureOnCommitCallbacks(execute=True):
+            self.move('saida', 1)
+        self.assertEqual(self.alerts('stock_low').count(), 2)
+
+    def test_product_save_uses_loaded_stock(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock_quantity = 0
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                product.save()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(self.alerts('stock_out').count(), 2)
+
+    def test_new_customer_notifies_active_users(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            customer = Customer.objects.create(tenant=self.tenant, name='Cliente', phone='11987654321')
+        recipients = Notification.objects.filter(notification_type='customer_new', reference_id=str(customer.id))
+        self.assertEqual(set(recipients.values_list('user__name', flat=True)), {'Admin', 'Caixa'})
+
+
+class AppointmentStatusNotificationTestCase(TestCase):
+    """Testa a notificação de confirmação/cancelamento pelo status carregado"""
+
+    def test_status_change_notifies_without_rereading(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from scheduling.models import Appointment, Service
+
+        tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        barber = User.objects.create_user(
+            email='barber@test.com', password='testpass123', name='Barbeiro', tenant=tenant, role='barbeiro'
+        )
+        service = Service.objects.create(tenant=tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30)
+        appointment = Appointment.objects.create(
+            tenant=tenant, service=service, professional=barber, customer_name='Cliente',
+            start_time=timezone.now() + timedelta(days=1)
+        )
+        confirmed = Notification.objects.filter(notification_type='appointment_confirmed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.get(pk=appointment.pk)
+            appointment.notes = 'Sem mudança de status'
+            appointment.save()
+        self.assertFalse(confirmed.exists())
+
+        appointment.status = 'confirmado'
+        with self.captureOnCommitCallbacks(execute=True):
+            with CaptureQueriesContext(connection) as ctx:
+                appointment.save()
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "scheduling_appointment"' in q['sql']
+                          and q['sql'].startswith('SELECT')])
+        self.assertEqual(confirmed.count(), 1)
+
+        # Salvar de novo o mesmo status não notifica outra vez
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+        self.assertEqual(confirmed.count(), 1)
+
+
+class StockAlertWindowTestCase(StockAlertMixin, TransactionTestCase):
+    """Cada movimentação na sua transação (o efeito roda no commit de cada uma)"""
+
+    def test_repeated_alert_is_collapsed_within_window(self):
+        for _ in range(2):
+            self.move('saida', 6)
+            self.move('entrada', 6)
+        self.assertEqual(self.alerts('stock_low').count(), 2)
+
+        with override_settings(STOCK_ALERT_WINDOW=0):
+            self.move('saida', 10)
+        self.assertEqual(self.alerts('stock_out').count(), 2)
@@ -1,3 +1,12 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import WebhookEvent
+
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    """Admin para a inbox de webhooks do Mercado Pago"""
+    list_display = ['topic', 'resource_id', 'status', 'attempts', 'result', 'received_at', 'processed_at']
+    list_filter = ['status', 'topic']
+    search_fields = ['resource_id']
+    readonly_fields = ['payload', 'received_at', 'processed_at', 'last_error', 'result']
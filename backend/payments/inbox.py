@@ -0,0 +1,266 @@
+"""
+Inbox de webhooks do Mercado Pago
+
+O endpoint só grava a notificação (WebhookEvent, única por tipo + data.id) e
+responde 200; reentregas da mesma notificação atualizam a mesma linha e a
+colocam de novo na fila. Um worker drena a inbox em lotes:
+
+1. Reserva o lote (select_for_update skip_locked) adiando next_attempt_at
+   por LEASE_SECONDS, então outro worker não pega os mesmos eventos
+2. Busca os detalhes no Mercado Pago em paralelo (no máximo `concurrency`
+   chamadas), com uma session HTTP keep-alive por processo
+3. Aplica o status no tenant com a linha bloqueada; só grava se mudou,
+   então processar o mesmo evento de novo não tem efeito
+4. Grava o resultado só nos eventos sem reentrega desde a reserva
+   (received_at igual ao lido); os reentregues continuam pendentes e são
+   processados de novo com o estado atual do Mercado Pago
+
+Falhas transitórias (rede, 429, 5xx) voltam para a fila com backoff
+exponencial; após `max_attempts` o evento fica como 'failed' e pode ser
+reenviado com o command replay_webhooks.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import mercadopago
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from mercadopago.config import RequestOptions
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+
+from core.models import Tenant
+from core.workers import BackgroundWorker
+
+from .models import WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+CONCURRENCY = 4
+LEASE_SECONDS = 300
+FETCH_TIMEOUT = 10
+# Varredura periódica para eventos aguardando backoff
+POLL_SECONDS = 60
+
+TOPIC_SUBSCRIPTION = 'subscription_preapproval'
+TOPIC_PAYMENT = 'subscription_authorized_payment'
+HANDLED_TOPICS = (TOPIC_SUBSCRIPTION, TOPIC_PAYMENT)
+
+# Status da assinatura no Mercado Pago -> subscription_status do tenant
+SUBSCRIPTION_STATUS = {
+    'authorized': 'ACTIVE',
+    'paused': 'PAST_DUE',
+    'cancelled': 'CANCELED',
+}
+
+
+class TransientError(Exception):
+    """Falha temporária ao consultar o Mercado Pago; o evento volta para a fila"""
+
+
+class PermanentError(Exception):
+    """Evento que não pode ser aplicado (ex.: tenant inexistente); não é repetido"""
+
+
+def backoff(attempts):
+    """Espera antes da próxima tentativa: 30 s, 1 min, 2 min... até 6 horas"""
+    return timedelta(seconds=min(30 * 2 ** (attempts - 1), 6 * 3600))
+
+
+class PooledHttpClient(HttpClient):
+    """
+    HttpClient do SDK com uma session keep-alive por processo
+    O cliente padrão abre uma session (e uma conexão TLS) por chamada
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._session = requests.Session()
+                self._session.mount('https://', HTTPAdapter(pool_maxsize=CONCURRENCY * 2))
+            return self._session
+
+    def request(self, method, url, maxretries=None, retry_on=None, backoff_factor=None, **kwargs):
+        # Retentativas ficam com a inbox (backoff entre lotes), não com o SDK
+        api_result = self.session.request(method, url, **kwargs)
+        response = {'status': api_result.status_code, 'response': None}
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response['response'] = api_result.json()
+            except ValueError:
+                pass
+        return response
+
+
+_http_client = PooledHttpClient()
+
+
+def get_sdk():
+    return mercadopago.SDK(
+        settings.MERCADOPAGO_ACCESS_TOKEN,
+        http_client=_http_client,
+        request_options=RequestOptions(connection_timeout=FETCH_TIMEOUT, max_retries=0),
+    )
+
+
+def record(topic, resource_id, payload):
+    """
+    Grava a notificação na inbox (ou recoloca na fila se já existia)
+    received_at muda a cada entrega: é a versão conferida pelo worker ao gravar o resultado
+    O worker é acordado após o commit
+    """
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(topic=topic or '', resource_id=str(resource_id), payload=payload)],
+        update_conflicts=True,
+        unique_fields=['topic', 'resource_id'],
+        update_fields=['payload', 'status', 'attempts', 'next_attempt_at', 'last_error', 'received_at'],
+    )
+    transaction.on_commit(worker.notify)
+
+
+def fetch_resource(topic, resource_id):
+    """Detalhes da assinatura ou do pagamento no Mercado Pago"""
+    sdk = get_sdk()
+    try:
+        if topic == TOPIC_SUBSCRIPTION:
+            result = sdk.subscription().get(resource_id)
+        else:
+            result = sdk.payment().get(resource_id)
+    except requests.exceptions.RequestException as e:
+        raise TransientError(f'Erro de conexão com o Mercado Pago: {e}') from e
+
+    code = result['status']
+    if code == 429 or code >= 500:
+        raise TransientError(f'Mercado Pago retornou {code}')
+    if code >= 400 or not result['response']:
+        raise PermanentError(f'Mercado Pago retornou {code} para {topic} {resource_id}')
+    return result['response']
+
+
+def apply(event, resource):
+    """Aplica o recurso no tenant (idempotente); retorna a descrição do resultado"""
+    if event.topic == TOPIC_SUBSCRIPTION:
+        reference = resource.get('external_reference')
+        new_status = SUBSCRIPTION_STATUS.get(resource.get('status'))
+    elif resource.get('status') == 'approved':
+        reference = resource.get('external_reference')
+        new_status = 'ACTIVE'
+    else:
+        return f"pagamento {resource.get('status')}"
+
+    if not reference:
+        raise PermanentError('Notificação sem external_reference')
+
+    with transaction.atomic():
+        tenant = Tenant.objects.select_for_update().filter(id=reference).first()
+        if tenant is None:
+            raise PermanentError(f'Tenant {reference} não encontrado')
+
+        fields = []
+        if new_status and tenant.subscription_status != new_status:
+            tenant.subscription_status = new_status
+            fields.append('subscription_status')
+        if event.topic == TOPIC_SUBSCRIPTION and new_status == 'ACTIVE':
+            if tenant.mp_subscription_id != event.resource_id:
+                tenant.mp_subscription_id = event.resource_id
+                fields.append('mp_subscription_id')
+            if tenant.trial_ends_at is not None:
+                tenant.trial_ends_at = None
+                fields.append('trial_ends_at')
+        if fields:
+            tenant.save(update_fields=fields)
+            logger.info(f"Webhook MP: tenant {reference} -> {tenant.subscription_status}")
+
+    return f'tenant {reference}: {tenant.subscription_status}' + ('' if fields else ' (sem alteração)')
+
+
+def _fetch(event):
+    """Roda no thread pool: só HTTP, sem acesso ao banco; (None, None) para tipos não tratados"""
+    if event.topic not in HANDLED_TOPICS:
+        return None, None
+    try:
+        return fetch_resource(event.topic, event.resource_id), None
+    except Exception as e:
+        return None, e
+
+
+def _claim(batch_size, now):
+    """Reserva um lote de eventos vencidos adiando next_attempt_at (lease)"""
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status=WebhookEvent.STATUS_PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:batch_size]
+        )
+        if events:
+            WebhookEvent.objects.filter(id__in=[event.id for event in events]).update(
+                next_attempt_at=now + timedelta(seconds=LEASE_SECONDS)
+            )
+    return events
+
+
+def process_inbox(batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS, concurrency=CONCURRENCY):
+    """Processa os eventos vencidos da inbox em lotes; retorna o total processado"""
+    processed = 0
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='webhook-fetch') as pool:
+        while True:
+            now = timezone.now()
+            events = _claim(batch_size, now)
+            if not events:
+                return processed
+
+            for event, (resource, error) in zip(events, pool.map(_fetch, events)):
+                event.attempts += 1
+                try:
+                    if error is not None:
+                        raise error
+                    if resource is None:
+                        event.status = WebhookEvent.STATUS_IGNORED
+                        event.result = 'tipo não processado'
+                    else:
+                        event.result = apply(event, resource)
+                        event.status = WebhookEvent.STATUS_DONE
+                    event.last_error = ''
+                    event.processed_at = timezone.now()
+                except TransientError as e:
+                    event.last_error = str(e)
+                    if event.attempts >= max_attempts:
+                        event.status = WebhookEvent.STATUS_FAILED
+                    else:
+                        event.next_attempt_at = now + backoff(event.attempts)
+                except Exception as e:
+                    if not isinstance(e, PermanentError):
+                        logger.exception(f"Erro ao processar webhook {event}: {e}")
+                    event.last_error = str(e)
+                    event.status = WebhookEvent.STATUS_FAILED
+
+            # Reentregas durante o processamento mudaram received_at: essas linhas
+            # não são sobrescritas e continuam pendentes para a próxima rodada
+            claimed = Q()
+            for event in events:
+                claimed |= Q(id=event.id, received_at=event.received_at)
+            updated = WebhookEvent.objects.filter(claimed).bulk_update(
+                events, ['status', 'attempts', 'next_attempt_at', 'last_error', 'result', 'processed_at']
+            )
+            if updated < len(events):
+                logger.info(f"Webhook MP: {len(events) - updated} evento(s) reentregue(s) durante o processamento")
+            processed += len(events)
+
+
+# Drena a inbox após cada notificação recebida e a cada POLL_SECONDS (eventos aguardando backoff)
+worker = BackgroundWorker('webhook-inbox', lambda: process_inbox(), poll_seconds=POLL_SECONDS)
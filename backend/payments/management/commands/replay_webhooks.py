@@ -0,0 +1,80 @@
+"""
+Processa a inbox de webhooks do Mercado Pago (payments.inbox)
+
+Sem opções, processa os eventos pendentes cuja próxima tentativa já venceu.
+
+Uso:
+    python manage.py replay_webhooks
+    python manage.py replay_webhooks --failed
+    python manage.py replay_webhooks --resource-id 2c9380848b9c0e8e018ba1b6e4b50f0d
+    python manage.py replay_webhooks --since 2025-01-01
+"""
+from datetime import datetime, time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from payments import inbox
+from payments.models import WebhookEvent
+
+
+class Command(BaseCommand):
+    help = 'Processa (e reenvia) eventos da inbox de webhooks do Mercado Pago'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=inbox.BATCH_SIZE)
+        parser.add_argument('--max-attempts', type=int, default=inbox.MAX_ATTEMPTS)
+        parser.add_argument('--concurrency', type=int, default=inbox.CONCURRENCY)
+        parser.add_argument(
+            '--failed',
+            action='store_true',
+            help='Volta os eventos que falharam para pendente'
+        )
+        parser.add_argument(
+            '--resource-id',
+            action='append',
+            default=[],
+            help='Reprocessa os eventos deste recurso (data.id), mesmo os já processados'
+        )
+        parser.add_argument(
+            '--since',
+            help='Reprocessa todos os eventos recebidos a partir desta data (AAAA-MM-DD)'
+        )
+        parser.add_argument(
+            '--now',
+            action='store_true',
+            help='Ignora o backoff dos eventos pendentes'
+        )
+
+    def handle(self, *args, **options):
+        replay = Q()
+        if options['failed']:
+            replay |= Q(status=WebhookEvent.STATUS_FAILED)
+        if options['resource_id']:
+            replay |= Q(resource_id__in=options['resource_id'])
+        if options['since']:
+            try:
+                since = datetime.strptime(options['since'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError('Data inválida para --since (use AAAA-MM-DD)')
+            replay |= Q(received_at__gte=timezone.make_aware(datetime.combine(since, time.min)))
+        if options['now']:
+            replay |= Q(status=WebhookEvent.STATUS_PENDING)
+
+        if replay:
+            requeued = WebhookEvent.objects.filter(replay).update(
+                status=WebhookEvent.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now()
+            )
+            self.stdout.write(f'{requeued} evento(s) voltaram para a fila')
+
+        processed = inbox.process_inbox(
+            batch_size=options['batch_size'],
+            max_attempts=options['max_attempts'],
+            concurrency=options['concurrency'],
+        )
+        failed = WebhookEvent.objects.filter(status=WebhookEvent.STATUS_FAILED).count()
+
+        self.stdout.write(self.style.SUCCESS(f'✅ {processed} evento(s) processado(s)'))
+        if failed:
+            self.stdout.write(self.style.WARNING(f'⚠️ {failed} evento(s) com falha definitiva'))
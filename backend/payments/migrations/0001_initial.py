@@ -0,0 +1,97 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("topic", models.CharField(max_length=60, verbose_name="Tipo")),
+                (
+                    "resource_id",
+                    models.CharField(max_length=64, verbose_name="ID do recurso"),
+                ),
+                ("payload", models.JSONField(default=dict, verbose_name="Payload")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pendente"),
+                            ("done", "Processado"),
+                            ("ignored", "Ignorado"),
+                            ("failed", "Falhou"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="Status",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveSmallIntegerField(
+                        default=0, verbose_name="Tentativas"
+                    ),
+                ),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Próxima tentativa",
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="Último erro"),
+                ),
+                (
+                    "result",
+                    models.CharField(
+                        blank=True, max_length=200, verbose_name="Resultado"
+                    ),
+                ),
+                (
+                    "received_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Recebido em"),
+                ),
+                (
+                    "processed_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Processado em"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Webhook Recebido",
+                "verbose_name_plural": "Webhooks Recebidos",
+                "ordering": ["id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at"],
+                        name="payments_we_status_a02aee_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("topic", "resource_id"), name="unique_webhook_event"
+                    )
+                ],
+            },
+        ),
+    ]
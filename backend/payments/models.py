@@ -1,3 +1,46 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class WebhookEvent(models.Model):
+    """
+    Notificação recebida do Mercado Pago (inbox de webhooks)
+    Uma linha por (tipo, data.id): reentregas atualizam a mesma linha.
+    Processada em background pelo payments.inbox ou pelo command replay_webhooks
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_DONE = 'done'
+    STATUS_IGNORED = 'ignored'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pendente'),
+        (STATUS_DONE, 'Processado'),
+        (STATUS_IGNORED, 'Ignorado'),
+        (STATUS_FAILED, 'Falhou'),
+    ]
+
+    topic = models.CharField('Tipo', max_length=60)
+    resource_id = models.CharField('ID do recurso', max_length=64)
+    payload = models.JSONField('Payload', default=dict)
+    status = models.CharField('Status', max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField('Tentativas', default=0)
+    next_attempt_at = models.DateTimeField('Próxima tentativa', default=timezone.now)
+    last_error = models.TextField('Último erro', blank=True)
+    result = models.CharField('Resultado', max_length=200, blank=True)
+    # Última entrega: reentregas atualizam (versão da linha para o payments.inbox)
+    received_at = models.DateTimeField('Recebido em', auto_now_add=True)
+    processed_at = models.DateTimeField('Processado em', null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Webhook Recebido'
+        verbose_name_plural = 'Webhooks Recebidos'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(fields=['topic', 'resource_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.topic} {self.resource_id} - {self.status}"
@@ -1,3 +1,143 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Tenant
+
+from . import inbox
+from .models import WebhookEvent
+
+
+class WebhookInboxTestCase(TestCase):
+    """Testa a inbox de webhooks do Mercado Pago"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(
+            name='Barbearia', subscription_status='TRIAL', trial_ends_at=timezone.now() + timedelta(days=7)
+        )
+        self.resources = {}
+        patcher = mock.patch.object(inbox, 'fetch_resource', side_effect=self.fetch)
+        self.fetch_resource = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, topic, resource_id):
+        resource = self.resources[(topic, resource_id)]
+        if isinstance(resource, Exception):
+            raise resource
+        return resource
+
+    def post(self, topic, resource_id):
+        return APIClient().post(
+            f'/api/webhooks/mercadopago/?type={topic}&data.id={resource_id}',
+            {'type': topic, 'data': {'id': resource_id}},
+            format='json'
+        )
+
+    def test_webhook_only_records_event(self):
+        for _ in range(3):
+            response = self.post(inbox.TOPIC_SUBSCRIPTION, 'pre-1')
+            self.assertEqual((response.status_code, response.json()['status']), (200, 'received'))
+
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.STATUS_PENDING)
+        self.fetch_resource.assert_not_called()
+
+    def test_oversized_or_malformed_notifications_are_rejected(self):
+        self.assertEqual(self.post('x' * 61, 'pre-1').status_code, 400)
+        self.assertEqual(self.post(inbox.TOPIC_SUBSCRIPTION, '9' * 65).status_code, 400)
+        response = APIClient().post(
+            '/api/webhooks/mercadopago/', {'type': inbox.TOPIC_SUBSCRIPTION, 'data': {'id': {'nested': 1}}},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_processing_applies_status_idempotently(self):
+        self.resources[(inbox.TOPIC_SUBSCRIPTION, 'pre-1')] = {
+            'status': 'authorized', 'external_reference': str(self.tenant.id)
+        }
+        self.post(inbox.TOPIC_SUBSCRIPTION, 'pre-1')
+        self.post('subscription_preapproval_plan', 'plan-1')
+
+        self.assertEqual(inbox.process_inbox(), 2)
+        self.tenant.refresh_from_db()
+        self.assertEqual(
+            (self.tenant.subscription_status, self.tenant.mp_subscription_id, self.tenant.trial_ends_at),
+            ('ACTIVE', 'pre-1', None)
+        )
+        self.assertEqual(
+            WebhookEvent.objects.get(topic='subscription_preapproval_plan').status, WebhookEvent.STATUS_IGNORED
+        )
+
+        # Reentrega da mesma notificação: volta para a fila e não altera nada
+        self.post(inbox.TOPIC_SUBSCRIPTION, 'pre-1')
+        inbox.process_inbox()
+        event = WebhookEvent.objects.get(topic=inbox.TOPIC_SUBSCRIPTION)
+        self.assertEqual(event.status, WebhookEvent.STATUS_DONE)
+        self.assertIn('sem alteração', event.result)
+
+    def test_redelivery_during_processing_is_not_lost(self):
+        self.resources[(inbox.TOPIC_SUBSCRIPTION, 'pre-1')] = {
+            'status': 'authorized', 'external_reference': str(self.tenant.id)
+        }
+        self.post(inbox.TOPIC_SUBSCRIPTION, 'pre-1')
+        apply = inbox.apply
+        redelivered = []
+
+        def apply_with_redelivery(event, resource):
+            # Cancelada enquanto o estado anterior era aplicado: nova notificação
+            if not redelivered:
+                redelivered.append(event.id)
+                self.resources[(inbox.TOPIC_SUBSCRIPTION, 'pre-1')] = {
+                    'status': 'cancelled', 'external_reference': str(self.tenant.id)
+                }
+                self.post(inbox.TOPIC_SUBSCRIPTION, 'pre-1')
+            return apply(event, resource)
+
+        with mock.patch.object(inbox, 'apply', side_effect=apply_with_redelivery):
+            self.assertEqual(inbox.process_inbox(), 2)
+
+        self.tenant.refresh_from_db()
+        self.assertEqual(self.tenant.subscription_status, 'CANCELED')
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), (WebhookEvent.STATUS_DONE, 1))
+        self.assertIn('CANCELED', event.result)
+
+    def test_transient_errors_back_off_and_replay(self):
+        self.resources[(inbox.TOPIC_PAYMENT, 'pay-1')] = inbox.TransientError('Mercado Pago retornou 503')
+        self.post(inbox.TOPIC_PAYMENT, 'pay-1')
+
+        inbox.process_inbox()
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), (WebhookEvent.STATUS_PENDING, 1))
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        self.assertEqual(inbox.process_inbox(), 0)
+
+        WebhookEvent.objects.update(next_attempt_at=timezone.now())
+        inbox.process_inbox(max_attempts=2)
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.STATUS_FAILED)
+
+        self.tenant.subscription_status = 'PAST_DUE'
+        self.tenant.save()
+        self.resources[(inbox.TOPIC_PAYMENT, 'pay-1')] = {
+            'status': 'approved', 'external_reference': str(self.tenant.id)
+        }
+        call_command('replay_webhooks', '--failed', stdout=StringIO())
+        self.assertEqual(WebhookEvent.objects.get().status, WebhookEvent.STATUS_DONE)
+        self.tenant.refresh_from_db()
+        self.assertEqual(self.tenant.subscription_status, 'ACTIVE')
+
+    def test_unknown_tenant_fails_without_retry(self):
+        self.resources[(inbox.TOPIC_SUBSCRIPTION, 'pre-2')] = {
+            'status': 'cancelled', 'external_reference': '00000000-0000-0000-0000-000000000000'
+        }
+        self.post(inbox.TOPIC_SUBSCRIPTION, 'pre-2')
+        inbox.process_inbox()
 
-# Create your tests here.
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), (WebhookEvent.STATUS_FAILED, 1))
+        self.assertIn('não encontrado', event.last_error)
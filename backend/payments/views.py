@@ -11,8 +11,9 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.utils import timezone
 
+from . import inbox
+from .models import WebhookEvent
 from .serializers import SubscribeSerializer, WebhookSerializer
-from core.models import Tenant
 
 logger = logging.getLogger(__name__)
 
@@ -169,118 +170,41 @@ class MercadoPagoWebhookView(APIView):
     - subscription_authorized_payment: Cobrança aprovada
     - subscription_preapproval_plan: Plano atualizado
     
-    Ao receber pagamento aprovado:
-    1. Atualiza subscription_status para ACTIVE
-    2. Registra mp_subscription_id
-    3. Limpa trial_ends_at
-    4. Define plan_id
-    
-    Ao receber falha de pagamento:
-    1. Atualiza subscription_status para PAST_DUE
+    A notificação só é gravada na inbox (payments.inbox) e a resposta é imediata;
+    a consulta ao Mercado Pago e a atualização do tenant rodam em background:
+    - Assinatura autorizada ou pagamento aprovado: subscription_status ACTIVE
+      (assinatura também registra mp_subscription_id e limpa trial_ends_at)
+    - Assinatura pausada: PAST_DUE
+    - Assinatura cancelada: CANCELED
     """
     permission_classes = [AllowAny]  # Webhook é público
     
     def post(self, request):
-        try:
-            # Log da notificação recebida
-            logger.info(f"Webhook MP recebido: {request.data}")
-            logger.info(f"Query params: {request.query_params}")
-            
-            # Mercado Pago envia type e data.id
-            notification_type = request.query_params.get('type')
-            data_id = request.query_params.get('data.id') or request.data.get('data', {}).get('id')
-            
-            if not data_id:
-                logger.warning("Webhook sem data.id")
-                return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
-            
-            # Inicializa SDK
-            sdk = mercadopago.SDK(settings.MERCADOPAGO_ACCESS_TOKEN)
-            
-            # Processa baseado no tipo de notificação
-            if notification_type == 'subscription_preapproval':
-                # Assinatura criada/atualizada
-                subscription_info = sdk.subscription().get(data_id)
-                subscription = subscription_info["response"]
-                
-                logger.info(f"Subscription info: {subscription}")
-                
-                # Extrai dados
-                external_reference = subscription.get('external_reference')
-                status_sub = subscription.get('status')
-                
-                if not external_reference:
-                    logger.error(f"Webhook sem external_reference")
-                    return Response({'error': 'missing_reference'}, status=status.HTTP_400_BAD_REQUEST)
-                
-                # Busca o tenant
-                try:
-                    tenant = Tenant.objects.get(id=external_reference)
-                except Tenant.DoesNotExist:
-                    logger.error(f"Tenant {external_reference} não encontrado")
-                    return Response({'error': 'tenant_not_found'}, status=status.HTTP_404_NOT_FOUND)
-                
-                # Atualiza status baseado no status da assinatura MP
-                if status_sub == 'authorized':
-                    tenant.subscription_status = 'ACTIVE'
-                    tenant.mp_subscription_id = str(data_id)
-                    tenant.trial_ends_at = None
-                    logger.info(f"✅ Assinatura ATIVADA para tenant {external_reference}")
-                elif status_sub == 'paused':
-                    tenant.subscription_status = 'PAST_DUE'
-                    logger.info(f"⚠️ Assinatura PAUSADA para tenant {external_reference}")
-                elif status_sub == 'cancelled':
-                    tenant.subscription_status = 'CANCELED'
-                    logger.info(f"❌ Assinatura CANCELADA para tenant {external_reference}")
-                
-                tenant.save(update_fields=['subscription_status', 'mp_subscription_id', 'trial_ends_at'])
-                
-                return Response({
-                    'status': 'success',
-                    'tenant_id': str(external_reference),
-                    'subscription_status': tenant.subscription_status
-                }, status=status.HTTP_200_OK)
-                
-            elif notification_type == 'subscription_authorized_payment':
-                # Cobrança recorrente aprovada
-                payment_info = sdk.payment().get(data_id)
-                payment = payment_info["response"]
-                
-                logger.info(f"Payment info: {payment}")
-                
-                # Verifica se o pagamento foi aprovado
-                if payment['status'] == 'approved':
-                    # Busca subscription_id do pagamento
-                    preapproval_id = payment.get('preapproval_id')
-                    external_reference = payment.get('external_reference')
-                    
-                    if external_reference:
-                        try:
-                            tenant = Tenant.objects.get(id=external_reference)
-                            # Garante que está ACTIVE após pagamento bem-sucedido
-                            if tenant.subscription_status != 'ACTIVE':
-                                tenant.subscription_status = 'ACTIVE'
-                                tenant.save(update_fields=['subscription_status'])
-                                logger.info(f"✅ Pagamento aprovado - tenant {external_reference} reativado")
-                        except Tenant.DoesNotExist:
-                            logger.error(f"Tenant {external_reference} não encontrado")
-                    
-                    return Response({'status': 'payment_approved'}, status=status.HTTP_200_OK)
-                else:
-                    logger.info(f"Pagamento {data_id} status: {payment['status']}")
-                    return Response({'status': 'payment_pending'}, status=status.HTTP_200_OK)
-            
-            else:
-                # Outros tipos de notificação
-                logger.info(f"Tipo de notificação não processado: {notification_type}")
-                return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            logger.error(f"Erro no webhook MP: {str(e)}", exc_info=True)
-            return Response(
-                {'error': str(e)},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        # Mercado Pago envia type e data.id
+        notification_type = request.query_params.get('type') or request.data.get('type')
+        data = request.data.get('data') if isinstance(request.data, dict) else None
+        data_id = request.query_params.get('data.id') or (data or {}).get('id')
+        
+        if not data_id:
+            logger.warning("Webhook sem data.id")
+            return Response({'status': 'ignored'}, status=status.HTTP_200_OK)
+        
+        # Endpoint público: valores fora do formato não chegam ao banco (evita 500 e reenvio)
+        topic_length = WebhookEvent._meta.get_field('topic').max_length
+        resource_length = WebhookEvent._meta.get_field('resource_id').max_length
+        if not isinstance(notification_type, (str, type(None))) or len(notification_type or '') > topic_length \
+                or not isinstance(data_id, (str, int)) or len(str(data_id)) > resource_length:
+            logger.warning(f"Webhook MP inválido: type={str(notification_type)[:80]!r} data.id={str(data_id)[:80]!r}")
+            return Response({'error': 'type ou data.id inválido'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Falha ao gravar (ex.: banco fora) responde 500 e o Mercado Pago reenvia
+        inbox.record(notification_type, data_id, {
+            'query': request.query_params.dict(),
+            'body': request.data if isinstance(request.data, dict) else {},
+        })
+        logger.info(f"Webhook MP recebido: {notification_type} {data_id}")
+        
+        return Response({'status': 'received'}, status=status.HTTP_200_OK)
     
     def get(self, request):
         """Health check para o webhook"""
@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.validators import MinValueValidator
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 from core.models import TenantAwareModel
 from customers.models import Customer
@@ -10,6 +11,34 @@ from django.contrib.auth import get_user_model
 User = get_user_model()
 
 
+def sales_totals_expressions(prefix=''):
+    """
+    Agregados das vendas de um caixa, calculados em uma única passada:
+    total pago, quantidade de vendas e total pago por forma de pagamento.
+    Use prefix='sales__' para anotar CashRegister, '' para agregar Sale.
+    """
+    paid = models.Q(**{f'{prefix}payment_status': 'paid'})
+    zero = models.Value(Decimal('0'), output_field=models.DecimalField(max_digits=12, decimal_places=2))
+    
+    expressions = {
+        'paid_total': Coalesce(models.Sum(f'{prefix}total', filter=paid), zero),
+        'sales_count': models.Count(f'{prefix}id'),
+    }
+    for method, _label in Sale.PAYMENT_METHOD_CHOICES:
+        expressions[f'paid_total_{method}'] = Coalesce(
+            models.Sum(f'{prefix}total', filter=paid & models.Q(**{f'{prefix}payment_method': method})),
+            zero
+        )
+    return expressions
+
+
+class CashRegisterQuerySet(models.QuerySet):
+    
+    def with_sales_totals(self):
+        """Anota os totais de vendas (ver sales_totals_expressions) em uma única query"""
+        return self.annotate(**sales_totals_expressions('sales__'))
+
+
 class CashRegister(TenantAwareModel):
     """Caixa - Controle de abertura e fechamento"""
     
@@ -65,6 +94,8 @@ class CashRegister(TenantAwareModel):
     )
     notes = models.TextField(blank=True, verbose_name='Observações')
     
+    objects = CashRegisterQuerySet.as_manager()
+    
     class Meta:
         db_table = 'pos_cash_register'
         verbose_name = 'Caixa'
@@ -74,6 +105,16 @@ class CashRegister(TenantAwareModel):
     def __str__(self):
         return f"Caixa {self.user.get_full_name()} - {self.opened_at.strftime('%d/%m/%Y %H:%M')}"
     
+    def get_sales_totals(self):
+        """
+        Totais de vendas do caixa
+        Usa as anotações de with_sales_totals() quando presentes; senão, um único aggregate
+        """
+        keys = sales_totals_expressions().keys()
+        if all(hasattr(self, key) for key in keys):
+            return {key: getattr(self, key) for key in keys}
+        return self.sales.aggregate(**sales_totals_expressions())
+    
     def calculate_expected_balance(self):
         """Calcula saldo esperado baseado nas vendas"""
         total_sales = self.sales.filter(payment_status='paid').aggregate(
@@ -193,42 +234,6 @@ class Sale(TenantAwareModel):
         self.total = self.subtotal - self.discount
         self.save()
         return self.total
-    
-    def generate_commissions(self):
-        """Gera comissões para os profissionais"""
-        from commissions.models import Commission, CommissionRule
-        
-        for item in self.items.all():
-            if item.professional:
-                # Busca regra de comissão
-                rule = None
-                if item.service:
-                    rule = CommissionRule.objects.filter(
-                        tenant=self.tenant,
-                        service=item.service,
-                        is_active=True
-                    ).first()
-                elif item.product:
-                    rule = CommissionRule.objects.filter(
-                        tenant=self.tenant,
-                        product=item.product,
-                        is_active=True
-                    ).first()
-                
-                if rule:
-                    commission_value = (item.total * rule.percentage) / 100
-                    
-                    Commission.objects.create(
-                        tenant=self.tenant,
-                        user=item.professional,
-                        sale=self,
-                        service=item.service,
-                        product=item.product,
-                        base_value=item.total,
-                        percentage=rule.percentage,
-                        commission_value=commission_value,
-                        payment_status='pending'
-                    )
 
 
 class SaleItem(TenantAwareModel):
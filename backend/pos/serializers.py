@@ -2,10 +2,13 @@ from rest_framework import serializers
 from .models import Sale, SaleItem, CashRegister
 from customers.serializers import CustomerSerializer
 from core.serializers import UserSerializer
+from core.response_cache import invalidate
 from inventory.models import Product, StockMovement
 from scheduling.models import Service
 from decimal import Decimal
 from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
 
 
 class SaleItemSerializer(serializers.ModelSerializer):
@@ -105,12 +108,22 @@ class SaleCreateSerializer(serializers.ModelSerializer):
         return items
     
     def create(self, validated_data):
+        """
+        Checkout em lote: o número de queries é constante,
+        independente da quantidade de itens no carrinho.
+        
+        1. Trava todos os produtos envolvidos com um único SELECT ... FOR UPDATE
+        2. Monta itens e movimentações de estoque em memória
+        3. Grava com bulk_create (itens e movimentações)
+        4. Baixa o estoque com um único UPDATE usando F()
+        """
         items_data = validated_data.pop('items')
         request = self.context.get('request')
+        tenant = request.user.tenant
         
         # Busca caixa aberto do usuário
         cash_register = CashRegister.objects.filter(
-            tenant=request.user.tenant,
+            tenant=tenant,
             user=request.user,
             status='open'
         ).first()
@@ -118,44 +131,89 @@ class SaleCreateSerializer(serializers.ModelSerializer):
         if not cash_register:
             raise serializers.ValidationError('Não há caixa aberto para este usuário.')
         
+        # Quantidade total por produto (o mesmo produto pode aparecer em várias linhas)
+        quantities = {}
+        for item_data in items_data:
+            product = item_data.get('product')
+            if product:
+                quantity = int(item_data.get('quantity', Decimal('1')))
+                quantities[product.pk] = quantities.get(product.pk, 0) + quantity
+        
         # Usa transação para garantir atomicidade
         with transaction.atomic():
-            # Cria venda
+            # Trava as linhas dos produtos uma única vez
+            products = Product.objects.select_for_update().in_bulk(list(quantities))
+            
+            # Valida estoque com os valores travados (evita venda concorrente do mesmo item)
+            for product_id, quantity in quantities.items():
+                product = products[product_id]
+                if product.stock_quantity < quantity:
+                    raise serializers.ValidationError(
+                        f'Estoque insuficiente para {product.name}. '
+                        f'Disponível: {product.stock_quantity}, Solicitado: {quantity}'
+                    )
+            
+            # Monta os itens em memória e calcula o total sem aggregate
+            items = []
+            subtotal = Decimal('0')
+            for item_data in items_data:
+                item = SaleItem(tenant=tenant, **item_data)
+                item.total = (item.unit_price * item.quantity) - item.discount
+                subtotal += item.total
+                items.append(item)
+            
+            # Cria venda já com os totais calculados
             sale = Sale.objects.create(
-                tenant=request.user.tenant,
+                tenant=tenant,
                 cash_register=cash_register,
                 user=request.user,
+                subtotal=subtotal,
+                total=subtotal - validated_data.get('discount', Decimal('0')),
                 **validated_data
             )
             
-            # Cria items e movimentações de estoque
-            for item_data in items_data:
-                item = SaleItem.objects.create(
-                    tenant=request.user.tenant,
-                    sale=sale,
-                    **item_data
-                )
+            for item in items:
+                item.sale = sale
+            SaleItem.objects.bulk_create(items)
+            
+            if quantities:
+                customer_name = sale.customer.name if sale.customer else 'Avulso'
                 
-                # Cria movimentação de estoque se for produto
-                if item.product:
-                    # StockMovement.save() irá validar e atualizar o estoque automaticamente
-                    StockMovement.objects.create(
-                        tenant=request.user.tenant,
-                        product=item.product,
+                # Movimentações de estoque com estoque anterior/posterior já resolvidos
+                movements = []
+                for product_id, quantity in quantities.items():
+                    product = products[product_id]
+                    movements.append(StockMovement(
+                        tenant=tenant,
+                        product=product,
                         movement_type='saida',
                         reason='venda',
-                        quantity=int(item.quantity),
-                        notes=f'Venda #{sale.id} - Cliente: {sale.customer.name if sale.customer else "Avulso"}',
+                        quantity=quantity,
+                        stock_before=product.stock_quantity,
+                        stock_after=product.stock_quantity - quantity,
+                        notes=f'Venda #{sale.id} - Cliente: {customer_name}',
                         created_by=request.user
-                    )
-            
-            # Recalcula total da venda
-            sale.calculate_total()
-            
-            # Gera comissões - TEMPORARIAMENTE DESABILITADO
-            # O modelo Commission precisa ser atualizado para suportar vendas
-            # if sale.payment_status == 'paid':
-            #     sale.generate_commissions()
+                    ))
+                StockMovement.objects.bulk_create(movements)
+                
+                # Baixa de estoque de todos os produtos em um único UPDATE
+                Product.objects.filter(pk__in=list(quantities)).update(
+                    stock_quantity=F('stock_quantity') - Case(
+                        *[When(pk=product_id, then=Value(quantity))
+                          for product_id, quantity in quantities.items()],
+                        output_field=IntegerField()
+                    ),
+                    updated_at=timezone.now()
+                )
+                
+                # queryset.update() não dispara os signals de Product, então
+                # os alertas de estoque baixo e a invalidação do cache são feitos aqui
+                from notifications.fanout import notify_stock_change
+                for movement in movements:
+                    product = movement.product
+                    product.stock_quantity = movement.stock_after
+                    notify_stock_change(product, movement.stock_before)
+                invalidate(tenant.id, 'products')
         
         return sale
 
@@ -183,27 +241,27 @@ class CashRegisterSerializer(serializers.ModelSerializer):
             'expected_balance', 'difference'
         ]
     
+    def _sales_totals(self, obj):
+        # Calculado uma vez por caixa (anotações do queryset ou um único aggregate)
+        if not hasattr(obj, '_sales_totals_cache'):
+            obj._sales_totals_cache = obj.get_sales_totals()
+        return obj._sales_totals_cache
+    
     def get_total_sales(self, obj):
         """Total de vendas pagas no caixa"""
-        from django.db.models import Sum
-        return obj.sales.filter(payment_status='paid').aggregate(
-            total=Sum('total')
-        )['total'] or Decimal('0')
+        return self._sales_totals(obj)['paid_total']
     
     def get_total_sales_count(self, obj):
         """Quantidade de vendas"""
-        return obj.sales.count()
+        return self._sales_totals(obj)['sales_count']
     
     def get_payment_breakdown(self, obj):
         """Breakdown por forma de pagamento"""
-        from django.db.models import Sum
+        totals = self._sales_totals(obj)
         
         breakdown = {}
         for method, label in Sale.PAYMENT_METHOD_CHOICES:
-            total = obj.sales.filter(
-                payment_method=method,
-                payment_status='paid'
-            ).aggregate(total=Sum('total'))['total'] or Decimal('0')
+            total = totals[f'paid_total_{method}']
             
             if total > 0:
                 breakdown[method] = {
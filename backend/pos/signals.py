@@ -2,33 +2,35 @@ from django.db.models.signals import post_save
 from django.dispatch import receiver
 from decimal import Decimal
 
+from core import side_effects
 from .models import Sale
 from financial.models import Transaction, PaymentMethod
 
 
 @receiver(post_save, sender=Sale)
-def create_financial_transaction_on_sale(sender, instance, created, **kwargs):
+def defer_financial_transaction_on_sale(sender, instance, created, **kwargs):
+    """Agenda a receita da venda paga para depois do commit"""
+    if instance.payment_status == 'paid':
+        side_effects.defer('pos.sale_transaction', instance)
+
+
+@side_effects.register('pos.sale_transaction')
+def create_financial_transaction_on_sale(instance):
     """
-    Cria transação financeira (receita) quando venda é criada.
+    Cria transação financeira (receita) para a venda paga.
     
     Lógica:
     - Cria receita no módulo financeiro para vendas pagas
     - Valor = total da venda
     - Usa o payment_method da venda
-    - Evita duplicação verificando transações existentes
+    - Evita duplicação pelo vínculo Transaction.sale (único por venda)
     """
     # Apenas para vendas pagas
     if instance.payment_status != 'paid':
         return
     
     # Evita duplicação - verifica se já existe transação para esta venda
-    from financial.models import Transaction
-    existing = Transaction.objects.filter(
-        tenant=instance.tenant,
-        description__contains=f'Venda #{instance.id}'
-    ).exists()
-    
-    if existing:
+    if Transaction.objects.filter(sale_id=instance.id).exists():
         return  # Já tem transação criada
     
     # Mapeia payment_method da venda para PaymentMethod do financial
@@ -61,28 +63,9 @@ def create_financial_transaction_on_sale(sender, instance, created, **kwargs):
         amount=instance.total,
         date=instance.date.date(),  # Converte datetime para date
         payment_method=payment_method,
+        sale=instance,
         notes=f'Gerado automaticamente pela venda. Items: {instance.items.count()}',
         created_by=instance.user
     )
     
     print(f"✅ Transação financeira criada: Receita de R$ {instance.total} para venda #{instance.id}")
-
-
-@receiver(post_save, sender=Sale)
-def handle_sale_payment(sender, instance, created, **kwargs):
-    """
-    Signal para gerar comissões quando venda é paga
-    
-    TEMPORARIAMENTE DESABILITADO: 
-    O modelo Commission precisa ser atualizado para suportar vendas,
-    atualmente só suporta appointments.
-    """
-    pass
-    # if not created:  # Apenas em updates
-    #     if instance.payment_status == 'paid':
-    #         # Verifica se já tem comissões geradas
-    #         from commissions.models import Commission
-    #         existing_commissions = Commission.objects.filter(sale=instance).exists()
-    #         
-    #         if not existing_commissions:
-    #             instance.generate_commissions()
@@ -1,4 +1,177 @@
 # POS Tests
+from decimal import Decimal
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.models import Tenant, User
+from inventory.models import Product, StockMovement
+from .models import CashRegister, Sale
+from .serializers import SaleCreateSerializer
+
+
+class SaleCheckoutTestCase(TestCase):
+    """Testa o checkout em lote do PDV"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='caixa@test.com',
+            password='testpass123',
+            name='Caixa',
+            tenant=self.tenant,
+            role='caixa'
+        )
+        CashRegister.objects.create(
+            tenant=self.tenant,
+            user=self.user,
+            opening_balance=Decimal('100.00')
+        )
+        self.products = [
+            Product.objects.create(
+                tenant=self.tenant,
+                name=f'Pomada {i}',
+                category='pomada',
+                cost_price=Decimal('10.00'),
+                sale_price=Decimal('25.00'),
+                stock_quantity=50,
+                min_stock=1
+            )
+            for i in range(12)
+        ]
+        request = APIRequestFactory().post('/api/pos/sales/')
+        request.user = self.user
+        self.context = {'request': request}
+
+    def _checkout(self, products, quantity=2):
+        serializer = SaleCreateSerializer(data={
+            'payment_method': 'cash',
+            'payment_status': 'pending',
+            'discount': '5.00',
+            'items': [
+                {'product': str(p.pk), 'quantity': quantity, 'unit_price': '25.00'}
+                for p in products
+            ],
+        }, context=self.context)
+        serializer.is_valid(raise_exception=True)
+
+        with CaptureQueriesContext(connection) as ctx:
+            sale = serializer.save()
+        return sale, len(ctx.captured_queries)
+
+    def test_checkout_updates_stock_and_totals(self):
+        sale, _ = self._checkout(self.products[:3])
+
+        sale.refresh_from_db()
+        self.assertEqual(sale.subtotal, Decimal('150.00'))
+        self.assertEqual(sale.total, Decimal('145.00'))
+        self.assertEqual(sale.items.count(), 3)
+
+        for product in self.products[:3]:
+            product.refresh_from_db()
+            self.assertEqual(product.stock_quantity, 48)
+
+        movement = StockMovement.objects.get(product=self.products[0])
+        self.assertEqual(movement.stock_before, 50)
+        self.assertEqual(movement.stock_after, 48)
+
+    def test_checkout_query_count_is_constant(self):
+        _, small_basket = self._checkout(self.products[:2])
+        _, large_basket = self._checkout(self.products)
+
+        self.assertEqual(small_basket, large_basket)
+
+    def test_checkout_rejects_insufficient_stock(self):
+        from rest_framework.exceptions import ValidationError
+
+        product = self.products[0]
+        Product.objects.filter(pk=product.pk).update(stock_quantity=3)
+
+        with self.assertRaises(ValidationError):
+            # Duas linhas do mesmo produto somam mais que o estoque travado
+            self._checkout([product, product], quantity=2)
+
+        self.assertFalse(Sale.objects.exists())
+
+
+class CashRegisterTotalsTestCase(TestCase):
+    """Testa os totais de vendas dos caixas calculados em uma única query"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='gerente@test.com',
+            password='testpass123',
+            name='Gerente',
+            tenant=self.tenant,
+            role='admin'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def _create_register(self, sales):
+        register = CashRegister.objects.create(
+            tenant=self.tenant,
+            user=self.user,
+            opening_balance=Decimal('50.00')
+        )
+        for payment_method, payment_status, total in sales:
+            Sale.objects.create(
+                tenant=self.tenant,
+                user=self.user,
+                cash_register=register,
+                payment_method=payment_method,
+                payment_status=payment_status,
+                subtotal=total,
+                total=total
+            )
+        return register
+
+    def _list_query_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/pos/cash-registers/')
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_totals_and_payment_breakdown(self):
+        register = self._create_register([
+            ('cash', 'paid', Decimal('30.00')),
+            ('pix', 'paid', Decimal('20.00')),
+            ('pix', 'paid', Decimal('15.00')),
+            ('credit_card', 'pending', Decimal('99.00')),
+        ])
+
+        response = self.client.get(f'/api/pos/cash-registers/{register.pk}/')
+
+        self.assertEqual(Decimal(str(response.data['total_sales'])), Decimal('65.00'))
+        self.assertEqual(response.data['total_sales_count'], 4)
+        self.assertEqual(response.data['payment_breakdown'], {
+            'cash': {'label': 'Dinheiro', 'total': 30.0},
+            'pix': {'label': 'PIX', 'total': 35.0},
+        })
+
+    def test_list_query_count_does_not_grow_with_registers(self):
+        self._create_register([('cash', 'paid', Decimal('10.00'))])
+        few = self._list_query_count()
+
+        for _ in range(20):
+            self._create_register([('cash', 'paid', Decimal('10.00')), ('pix', 'paid', Decimal('5.00'))])
+        many = self._list_query_count()
+
+        self.assertEqual(few, many)
+        self.assertLessEqual(many, 6)
+
+    def test_summary_aggregates_in_one_query(self):
+        for _ in range(3):
+            self._create_register([('cash', 'paid', Decimal('10.00')), ('pix', 'pending', Decimal('5.00'))])
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/pos/cash-registers/summary/')
 
-# Create your tests here.
+        self.assertEqual(response.data['total_registers'], 3)
+        self.assertEqual(response.data['open_registers'], 3)
+        self.assertEqual(response.data['total_sales'], 3)
+        self.assertEqual(response.data['total_amount'], 30.0)
+        self.assertLessEqual(len(ctx.captured_queries), 6)
@@ -13,12 +13,29 @@ from .serializers import (
     CashRegisterSerializer, CashRegisterCreateSerializer, CashRegisterCloseSerializer
 )
 from core.permissions import IsTenantUser
+from core.exports import ExportColumn, ExportMixin, choice_display, datetime_br
+from core.response_cache import TenantCachedResponseMixin
 from inventory.models import StockMovement
 
 
-class SaleViewSet(viewsets.ModelViewSet):
+class SaleViewSet(ExportMixin, TenantCachedResponseMixin, viewsets.ModelViewSet):
     """ViewSet para gerenciamento de vendas"""
     
+    cache_resources = ('sales', 'customers')
+    
+    export_filename = 'vendas'
+    export_sheet_title = 'Vendas'
+    export_columns = [
+        ExportColumn('ID', 'id'),
+        ExportColumn('Data', 'date', datetime_br, width=18),
+        ExportColumn('Cliente', 'customer__name', lambda name: name or 'Cliente Avulso', width=30),
+        ExportColumn('Vendedor', 'user__name', width=25),
+        ExportColumn('Subtotal', 'subtotal'),
+        ExportColumn('Desconto', 'discount'),
+        ExportColumn('Total', 'total'),
+        ExportColumn('Forma Pagamento', 'payment_method', choice_display(Sale.PAYMENT_METHOD_CHOICES), width=20),
+        ExportColumn('Status', 'payment_status', choice_display(Sale.PAYMENT_STATUS_CHOICES)),
+    ]
     permission_classes = [IsAuthenticated, IsTenantUser]
     
     def get_queryset(self):
@@ -129,86 +146,6 @@ class SaleViewSet(viewsets.ModelViewSet):
         
         return Response(receipt_data)
     
-    @action(detail=False, methods=['get'])
-    def export_csv(self, request):
-        """Exporta vendas para CSV"""
-        import csv
-        from django.http import HttpResponse
-        
-        queryset = self.get_queryset()
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="vendas.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'ID', 'Data', 'Cliente', 'Vendedor', 'Subtotal',
-            'Desconto', 'Total', 'Forma Pagamento', 'Status'
-        ])
-        
-        for sale in queryset:
-            writer.writerow([
-                sale.id,
-                sale.date.strftime('%d/%m/%Y %H:%M'),
-                sale.customer.name if sale.customer else 'Cliente Avulso',
-                sale.user.get_full_name(),
-                sale.subtotal,
-                sale.discount,
-                sale.total,
-                sale.get_payment_method_display(),
-                sale.get_payment_status_display()
-            ])
-        
-        return response
-    
-    @action(detail=False, methods=['get'])
-    def export_excel(self, request):
-        """Exporta vendas para Excel"""
-        try:
-            from openpyxl import Workbook
-            from django.http import HttpResponse
-            
-            queryset = self.get_queryset()
-            
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "Vendas"
-            
-            # Cabeçalho
-            headers = [
-                'ID', 'Data', 'Cliente', 'Vendedor', 'Subtotal',
-                'Desconto', 'Total', 'Forma Pagamento', 'Status'
-            ]
-            ws.append(headers)
-            
-            # Dados
-            for sale in queryset:
-                ws.append([
-                    sale.id,
-                    sale.date.strftime('%d/%m/%Y %H:%M'),
-                    sale.customer.name if sale.customer else 'Cliente Avulso',
-                    sale.user.get_full_name(),
-                    float(sale.subtotal),
-                    float(sale.discount),
-                    float(sale.total),
-                    sale.get_payment_method_display(),
-                    sale.get_payment_status_display()
-                ])
-            
-            response = HttpResponse(
-                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-            )
-            response['Content-Disposition'] = 'attachment; filename="vendas.xlsx"'
-            wb.save(response)
-            
-            return response
-        
-        except ImportError:
-            return Response(
-                {'error': 'Biblioteca openpyxl não instalada'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-    
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Dashboard de vendas"""
@@ -221,7 +158,7 @@ class SaleViewSet(viewsets.ModelViewSet):
         )
         
         # Por período (hoje, semana, mês)
-        today = timezone.now().date()
+        today = timezone.localdate()
         week_ago = today - timedelta(days=7)
         month_ago = today - timedelta(days=30)
         
@@ -284,7 +221,11 @@ class CashRegisterViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = CashRegister.objects.filter(
             tenant=self.request.user.tenant
-        ).select_related('user')
+        ).select_related('user__tenant')
+        
+        # Totais de vendas e breakdown por forma de pagamento na mesma query
+        if self.action in ('list', 'retrieve', 'current'):
+            queryset = queryset.with_sales_totals()
         
         # Filtros
         user_id = self.request.query_params.get('user')
@@ -331,8 +272,7 @@ class CashRegisterViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def current(self, request):
         """Retorna caixa aberto do usuário atual"""
-        cash_register = CashRegister.objects.filter(
-            tenant=request.user.tenant,
+        cash_register = self.get_queryset().filter(
             user=request.user,
             status='open'
         ).first()
@@ -346,26 +286,22 @@ class CashRegisterViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def summary(self, request):
         """Resumo de caixas do dia"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         
         registers = CashRegister.objects.filter(
             tenant=request.user.tenant,
             opened_at__date=today
         )
         
-        summary = {
-            'total_registers': registers.count(),
-            'open_registers': registers.filter(status='open').count(),
-            'closed_registers': registers.filter(status='closed').count(),
-            'total_sales': 0,
-            'total_amount': 0
-        }
-        
-        for register in registers:
-            sales = register.sales.filter(payment_status='paid')
-            summary['total_sales'] += sales.count()
-            summary['total_amount'] += float(
-                sales.aggregate(total=Sum('total'))['total'] or 0
-            )
+        # Um único aggregate: o join com vendas repete o caixa, por isso distinct
+        paid = Q(sales__payment_status='paid')
+        summary = registers.aggregate(
+            total_registers=Count('id', distinct=True),
+            open_registers=Count('id', filter=Q(status='open'), distinct=True),
+            closed_registers=Count('id', filter=Q(status='closed'), distinct=True),
+            total_sales=Count('sales', filter=paid),
+            total_amount=Sum('sales__total', filter=paid)
+        )
+        summary['total_amount'] = float(summary['total_amount'] or 0)
         
         return Response(summary)
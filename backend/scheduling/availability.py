@@ -0,0 +1,133 @@
+"""
+Motor de disponibilidade da agenda
+
+Os agendamentos que ocupam horário (todos exceto cancelado/falta) de um conjunto
+de profissionais são lidos com uma única query por intervalo de datas e guardados
+por (profissional, dia) como blocos ocupados ordenados e mesclados. Sobre essa
+estrutura:
+- conflict(): verifica sobreposição com busca binária
+- free_slots(): calcula os horários livres de um dia para uma duração
+
+Reservas sem corrida: lock_professional() trava a linha do profissional até o fim
+da transação, então duas marcações simultâneas para o mesmo profissional são
+verificadas e gravadas uma depois da outra.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+NON_BLOCKING_STATUSES = ('cancelado', 'falta')
+DEFAULT_DURATION = timedelta(minutes=60)
+
+
+def appointment_end(start_time, service=None):
+    """Término do agendamento pela duração do serviço (padrão 1h)"""
+    if service and service.duration_minutes:
+        return start_time + timedelta(minutes=service.duration_minutes)
+    return start_time + DEFAULT_DURATION
+
+
+def lock_professional(professional_id):
+    """Trava o profissional até o fim da transação atual (select_for_update)"""
+    from core.models import User
+    list(User.objects.select_for_update().filter(pk=professional_id).values_list('pk', flat=True))
+
+
+def opening_hours():
+    """Horário de funcionamento padrão (settings.SCHEDULING_OPENING_HOURS)"""
+    opening, closing = getattr(settings, 'SCHEDULING_OPENING_HOURS', ('08:00', '20:00'))
+    return time.fromisoformat(opening), time.fromisoformat(closing)
+
+
+def _local_days(start, end):
+    """Dias locais tocados pelo intervalo [start, end)"""
+    day = timezone.localtime(start).date()
+    last = timezone.localtime(end - timedelta(microseconds=1)).date()
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+class Schedule:
+    """
+    Blocos ocupados por profissional e dia, carregados com uma query
+    Cada dia guarda a lista de (início, fim) ordenada e sem sobreposições,
+    mais a lista dos inícios para a busca binária.
+    """
+
+    def __init__(self, tenant_id, professional_ids, start, end, exclude_id=None):
+        from .models import Appointment
+
+        queryset = Appointment.objects.filter(
+            tenant_id=tenant_id,
+            professional_id__in=professional_ids,
+            start_time__lt=end,
+            end_time__gt=start,
+        ).exclude(status__in=NON_BLOCKING_STATUSES)
+        if exclude_id:
+            queryset = queryset.exclude(pk=exclude_id)
+
+        intervals = defaultdict(list)
+        rows = queryset.order_by('start_time').values_list('professional_id', 'start_time', 'end_time')
+        for professional_id, block_start, block_end in rows:
+            for day in _local_days(block_start, block_end):
+                intervals[(professional_id, day)].append((block_start, block_end))
+
+        self._blocks = {}
+        for key, day_intervals in intervals.items():
+            merged = []
+            for block_start, block_end in day_intervals:
+                if merged and block_start <= merged[-1][1]:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], block_end))
+                else:
+                    merged.append((block_start, block_end))
+            self._blocks[key] = (merged, [block[0] for block in merged])
+
+    def busy(self, professional_id, day):
+        """Blocos ocupados (início, fim) do profissional no dia"""
+        return self._blocks.get((professional_id, day), ([], []))[0]
+
+    def conflict(self, professional_id, start, end):
+        """Retorna o bloco ocupado que se sobrepõe a [start, end), ou None"""
+        for day in _local_days(start, end):
+            blocks, starts = self._blocks.get((professional_id, day), ([], []))
+            # Último bloco que começa antes do fim; os anteriores terminam antes dele
+            index = bisect_left(starts, end)
+            if index and blocks[index - 1][1] > start:
+                return blocks[index - 1]
+        return None
+
+    def free_slots(self, professional_id, day, duration, opening, closing, step, not_before=None):
+        """
+        Inícios possíveis no dia para um atendimento de `duration`
+        Os horários seguem a grade de `step` a partir da abertura e, depois de
+        cada bloco ocupado, recomeçam no fim dele.
+        """
+        tz = timezone.get_current_timezone()
+        window_start = timezone.make_aware(datetime.combine(day, opening), tz)
+        window_end = timezone.make_aware(datetime.combine(day, closing), tz)
+        if not_before and not_before > window_start:
+            # Próximo horário da grade depois de not_before
+            steps = -(-(not_before - window_start) // step)
+            window_start += steps * step
+
+        slots = []
+        cursor = window_start
+        for block_start, block_end in self.busy(professional_id, day) + [(window_end, window_end)]:
+            gap_end = min(block_start, window_end)
+            while cursor + duration <= gap_end:
+                slots.append(cursor)
+                cursor += step
+            if block_start >= window_end:
+                break
+            cursor = max(cursor, block_end)
+        return slots
+
+
+def find_conflict(tenant_id, professional_id, start, end, exclude_id=None):
+    """Bloco ocupado do profissional que conflita com [start, end), ou None"""
+    schedule = Schedule(tenant_id, [professional_id], start, end, exclude_id=exclude_id)
+    return schedule.conflict(professional_id, start, end)
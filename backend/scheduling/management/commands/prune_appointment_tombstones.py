@@ -0,0 +1,20 @@
+"""
+Command para remover os registros de agendamentos excluídos antigos
+Clientes com cursor mais antigo que a retenção recebem o snapshot completo na
+próxima sincronização, então os tombstones além dela não são mais necessários
+"""
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from scheduling.models import AppointmentTombstone
+from scheduling.sync import tombstone_retention
+
+
+class Command(BaseCommand):
+    help = 'Remove os tombstones de agendamentos mais antigos que APPOINTMENT_TOMBSTONE_RETENTION_DAYS'
+
+    def handle(self, *args, **options):
+        deleted, _ = AppointmentTombstone.objects.filter(
+            deleted_at__lt=timezone.now() - tombstone_retention()
+        ).delete()
+        self.stdout.write(self.style.SUCCESS(f'✅ {deleted} tombstone(s) removido(s)'))
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:26
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0005_outboxevent"),
+        ("customers", "0002_alter_customer_last_visit"),
+        ("scheduling", "0002_appointment_customer_appointment_price_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AppointmentTombstone",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("appointment_id", models.UUIDField(verbose_name="Agendamento")),
+                (
+                    "deleted_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Excluído em"),
+                ),
+            ],
+            options={
+                "verbose_name": "Agendamento Excluído",
+                "verbose_name_plural": "Agendamentos Excluídos",
+                "ordering": ["id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="appointment",
+            index=models.Index(
+                fields=["tenant", "updated_at"], name="scheduling__tenant__bad3f9_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="appointmenttombstone",
+            name="tenant",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="appointment_tombstones",
+                to="core.tenant",
+                verbose_name="Empresa",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="appointmenttombstone",
+            index=models.Index(
+                fields=["tenant", "deleted_at"], name="scheduling__tenant__b0350b_idx"
+            ),
+        ),
+    ]
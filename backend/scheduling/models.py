@@ -5,6 +5,7 @@ Implementa BLOCO 4: Construção do Primeiro Módulo (Barbearia)
 import uuid
 from datetime import timedelta
 from django.db import models
+from django.db.models.functions import Coalesce
 from core.models import TenantAwareModel, User
 
 
@@ -33,6 +34,20 @@ class Service(TenantAwareModel):
         return f"{self.name} - R$ {self.price}"
 
 
+class AppointmentQuerySet(models.QuerySet):
+    def with_payment(self):
+        """
+        Anota is_paid (existe transação) e o preço final em SQL
+        Evita uma query por agendamento em is_paid()/get_final_price() nas listagens
+        """
+        from financial.models import Transaction
+        
+        return self.annotate(
+            paid=models.Exists(Transaction.objects.filter(appointment=models.OuterRef('pk'))),
+            final_price_value=Coalesce('price', 'service__price'),
+        )
+
+
 class Appointment(TenantAwareModel):
     """
     Agendamentos
@@ -107,6 +122,8 @@ class Appointment(TenantAwareModel):
         verbose_name='Criado por'
     )
 
+    objects = AppointmentQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Agendamento'
         verbose_name_plural = 'Agendamentos'
@@ -116,6 +133,8 @@ class Appointment(TenantAwareModel):
             models.Index(fields=['tenant', 'professional', 'start_time']),
             models.Index(fields=['tenant', 'status']),
             models.Index(fields=['tenant', 'customer']),
+            # Sincronização incremental da agenda (action sync)
+            models.Index(fields=['tenant', 'updated_at']),
         ]
 
     def __str__(self):
@@ -154,8 +173,40 @@ class Appointment(TenantAwareModel):
     
     def get_final_price(self):
         """Retorna o preço final (price ou service.price)"""
-        return self.price if self.price is not None else self.service.price
+        if self.price is not None:
+            return self.price
+        if hasattr(self, 'final_price_value'):
+            return self.final_price_value
+        return self.service.price
     
     def is_paid(self):
-        """Verifica se existe transação vinculada"""
+        """Verifica se existe transação vinculada (usa a anotação de with_payment() se houver)"""
+        if hasattr(self, 'paid'):
+            return self.paid
         return self.transactions.exists()
+
+
+class AppointmentTombstone(models.Model):
+    """
+    Registro de agendamento excluído, para a sincronização incremental da agenda
+    Criado pelo post_delete de Appointment; removido pelo command prune_appointment_tombstones
+    """
+    tenant = models.ForeignKey(
+        'core.Tenant',
+        on_delete=models.CASCADE,
+        related_name='appointment_tombstones',
+        verbose_name='Empresa'
+    )
+    appointment_id = models.UUIDField('Agendamento')
+    deleted_at = models.DateTimeField('Excluído em', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Agendamento Excluído'
+        verbose_name_plural = 'Agendamentos Excluídos'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['tenant', 'deleted_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.appointment_id} - {self.deleted_at:%d/%m/%Y %H:%M}"
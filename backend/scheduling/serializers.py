@@ -2,11 +2,32 @@
 Serializers do módulo de Agendamentos
 """
 from rest_framework import serializers
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from .availability import NON_BLOCKING_STATUSES, appointment_end, find_conflict, lock_professional
 from .models import Service, Appointment
 from core.serializers import UserSerializer
 
 
+def reserve_slot(tenant_id, professional, start_time, service=None, exclude_id=None):
+    """
+    Valida que o horário está livre para o profissional e retorna o término
+    Deve ser chamada dentro de transaction.atomic(): o profissional fica travado
+    até o commit, então reservas simultâneas não passam as duas na verificação.
+    """
+    end_time = appointment_end(start_time, service)
+    lock_professional(professional.pk)
+    
+    conflict = find_conflict(tenant_id, professional.pk, start_time, end_time, exclude_id=exclude_id)
+    if conflict:
+        conflict_start, conflict_end = (timezone.localtime(value).strftime("%H:%M") for value in conflict)
+        # Lista, como nos erros levantados em validate()
+        raise serializers.ValidationError({
+            'start_time': [f'O profissional já possui um agendamento neste horário ({conflict_start} - {conflict_end}).']
+        })
+    return end_time
+
+
 class ServiceSerializer(serializers.ModelSerializer):
     """Serializer para Service"""
     
@@ -121,50 +142,120 @@ class AppointmentSerializer(serializers.ModelSerializer):
                     'customer': 'O cliente não pertence à sua empresa.'
                 })
         
-        # Valida conflito de horário
-        if 'professional' in data and 'start_time' in data:
-            self._validate_no_conflicts(data)
-        
         return data
-    
-    def _validate_no_conflicts(self, data):
-        """Valida se não há conflito de horário para o profissional"""
-        professional = data['professional']
-        start_time = data['start_time']
-        service = data.get('service')
-        
-        # Calcula end_time baseado na duração do serviço
-        from datetime import timedelta
-        if service and service.duration_minutes:
-            end_time = start_time + timedelta(minutes=service.duration_minutes)
-        else:
-            end_time = start_time + timedelta(minutes=60)  # Padrão 1h
-        
-        # Query para verificar conflitos
-        conflicts_query = Appointment.objects.filter(
-            professional=professional,
-            start_time__lt=end_time,
-            end_time__gt=start_time,
-        ).exclude(
-            status__in=['cancelado', 'falta']  # Ignora agendamentos cancelados/falta
-        )
-        
-        # Se estamos editando, exclui o próprio agendamento
-        if self.instance:
-            conflicts_query = conflicts_query.exclude(pk=self.instance.pk)
-        
-        if conflicts_query.exists():
-            conflicting = conflicts_query.first()
-            raise serializers.ValidationError({
-                'start_time': f'O profissional já possui um agendamento neste horário ({conflicting.start_time.strftime("%H:%M")} - {conflicting.end_time.strftime("%H:%M")}).'
-            })
 
     def create(self, validated_data):
         """Adiciona o tenant e created_by automaticamente"""
         request = self.context.get('request')
         validated_data['tenant'] = request.user.tenant
         validated_data['created_by'] = request.user
-        return super().create(validated_data)
+        
+        with transaction.atomic():
+            validated_data['end_time'] = reserve_slot(
+                request.user.tenant_id,
+                validated_data['professional'],
+                validated_data['start_time'],
+                validated_data.get('service'),
+            )
+            return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        """Reserva o novo horário quando o agendamento é remarcado ou reativado"""
+        rescheduled = any(
+            field in validated_data and validated_data[field] != getattr(instance, field)
+            for field in ('professional', 'start_time', 'service')
+        )
+        status = validated_data.get('status', instance.status)
+        reactivated = instance.status in NON_BLOCKING_STATUSES and status not in NON_BLOCKING_STATUSES
+        if not (rescheduled or reactivated):
+            return super().update(instance, validated_data)
+        
+        start_time = validated_data.get('start_time', instance.start_time)
+        service = validated_data.get('service', instance.service)
+        
+        with transaction.atomic():
+            if status in NON_BLOCKING_STATUSES:
+                validated_data['end_time'] = appointment_end(start_time, service)
+            else:
+                validated_data['end_time'] = reserve_slot(
+                    instance.tenant_id,
+                    validated_data.get('professional', instance.professional),
+                    start_time,
+                    service,
+                    exclude_id=instance.pk,
+                )
+            return super().update(instance, validated_data)
+
+
+# Formata o preço do serviço como o ServiceSerializer (string com 2 casas)
+SERVICE_PRICE_FIELD = serializers.DecimalField(max_digits=10, decimal_places=2)
+
+
+class AgendaAppointmentSerializer(serializers.Serializer):
+    """
+    Serializer de leitura da agenda (listagem, today, week)
+    Recebe as linhas de queryset.with_payment().values(*AgendaAppointmentSerializer.values_fields):
+    sem instanciar models nem serializers aninhados, e sem query por agendamento.
+    Mantém o formato do AppointmentSerializer nos campos usados pela agenda.
+    """
+    values_fields = (
+        'id', 'customer', 'customer_name', 'customer_phone', 'customer_email',
+        'customer__name', 'customer__phone', 'customer__email', 'customer__tag',
+        'service', 'service__name', 'service__price', 'service__duration_minutes',
+        'professional', 'professional__name', 'professional__email',
+        'start_time', 'end_time', 'price', 'final_price_value', 'paid',
+        'status', 'notes', 'created_at', 'updated_at',
+    )
+
+    id = serializers.ReadOnlyField()
+    customer = serializers.ReadOnlyField()
+    customer_id = serializers.CharField(source='customer', allow_null=True)
+    customer_name = serializers.CharField()
+    customer_phone = serializers.CharField()
+    customer_email = serializers.CharField()
+    customer_full_info = serializers.SerializerMethodField()
+    service = serializers.ReadOnlyField()
+    service_details = serializers.SerializerMethodField()
+    professional = serializers.ReadOnlyField()
+    professional_details = serializers.SerializerMethodField()
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField(allow_null=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, allow_null=True)
+    # Número no JSON, como o SerializerMethodField do AppointmentSerializer
+    final_price = serializers.DecimalField(
+        source='final_price_value', max_digits=10, decimal_places=2, coerce_to_string=False
+    )
+    is_paid = serializers.BooleanField(source='paid')
+    status = serializers.CharField()
+    notes = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+
+    def get_customer_full_info(self, row):
+        if not row['customer']:
+            return None
+        return {
+            'id': str(row['customer']),
+            'name': row['customer__name'],
+            'phone': row['customer__phone'],
+            'email': row['customer__email'],
+            'tag': row['customer__tag'],
+        }
+
+    def get_service_details(self, row):
+        return {
+            'id': str(row['service']),
+            'name': row['service__name'],
+            'price': SERVICE_PRICE_FIELD.to_representation(row['service__price']),
+            'duration_minutes': row['service__duration_minutes'],
+        }
+
+    def get_professional_details(self, row):
+        return {
+            'id': str(row['professional']),
+            'name': row['professional__name'],
+            'email': row['professional__email'],
+        }
 
 
 class CreateAppointmentSerializer(serializers.Serializer):
@@ -244,38 +335,7 @@ class CreateAppointmentSerializer(serializers.Serializer):
                 'professional_id': 'Profissional não encontrado ou inativo.'
             })
         
-        # Valida conflito de horário
-        self._validate_no_conflicts(data)
-
         return data
-    
-    def _validate_no_conflicts(self, data):
-        """Valida se não há conflito de horário para o profissional"""
-        professional = data['professional']
-        start_time = data['start_time']
-        service = data['service']
-        
-        # Calcula end_time baseado na duração do serviço
-        from datetime import timedelta
-        if service.duration_minutes:
-            end_time = start_time + timedelta(minutes=service.duration_minutes)
-        else:
-            end_time = start_time + timedelta(minutes=60)  # Padrão 1h
-        
-        # Query para verificar conflitos
-        conflicts = Appointment.objects.filter(
-            professional=professional,
-            start_time__lt=end_time,
-            end_time__gt=start_time,
-        ).exclude(
-            status__in=['cancelado', 'falta']  # Ignora agendamentos cancelados/falta
-        )
-        
-        if conflicts.exists():
-            conflicting = conflicts.first()
-            raise serializers.ValidationError({
-                'start_time': f'O profissional já possui um agendamento neste horário ({conflicting.start_time.strftime("%H:%M")} - {conflicting.end_time.strftime("%H:%M")}).'
-            })
 
     def create(self, validated_data):
         """Cria o agendamento"""
@@ -310,7 +370,15 @@ class CreateAppointmentSerializer(serializers.Serializer):
         if 'price' in validated_data:
             appointment_data['price'] = validated_data['price']
         
-        # Cria o agendamento (save() vai preencher customer_name automaticamente se tem customer)
-        appointment = Appointment.objects.create(**appointment_data)
+        # Valida conflito de horário com o profissional travado e cria o agendamento
+        # (save() vai preencher customer_name automaticamente se tem customer)
+        with transaction.atomic():
+            appointment_data['end_time'] = reserve_slot(
+                request.user.tenant_id,
+                validated_data['professional'],
+                validated_data['start_time'],
+                validated_data['service'],
+            )
+            appointment = Appointment.objects.create(**appointment_data)
         
         return appointment
@@ -2,14 +2,29 @@
 Signals do módulo de Agendamentos
 Integração com Clientes e Financeiro
 """
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Appointment
+from core import side_effects
+from .models import Appointment, AppointmentTombstone
 
 
 @receiver(post_save, sender=Appointment)
-def update_customer_last_visit(sender, instance, created, **kwargs):
+def defer_completion_side_effects(sender, instance, created, **kwargs):
+    """
+    Agenda para depois do commit os efeitos do agendamento concluído
+    (última visita do cliente e transação financeira)
+    """
+    if instance.status == 'concluido':
+        if instance.customer_id:
+            side_effects.defer('scheduling.customer_last_visit', instance)
+        side_effects.defer('scheduling.completion_transaction', instance)
+
+
+@side_effects.register('scheduling.customer_last_visit')
+def update_customer_last_visit(instance):
     """
     Atualiza a data da última visita do cliente quando agendamento é concluído
     """
@@ -19,8 +34,8 @@ def update_customer_last_visit(sender, instance, created, **kwargs):
         instance.customer.save(update_fields=['last_visit'])
 
 
-@receiver(post_save, sender=Appointment)
-def create_transaction_on_completion(sender, instance, created, **kwargs):
+@side_effects.register('scheduling.completion_transaction')
+def create_transaction_on_completion(instance):
     """
     Cria transação financeira automaticamente quando agendamento é concluído
     """
@@ -56,3 +71,80 @@ def create_transaction_on_completion(sender, instance, created, **kwargs):
             )
             
             print(f"✅ Transação criada automaticamente: {transaction.id}")
+
+
+@receiver(post_delete, sender=Appointment)
+def record_appointment_tombstone(sender, instance, origin=None, **kwargs):
+    """
+    Registra a exclusão para a sincronização incremental da agenda
+    Ignora exclusões em cascata (ex.: tenant removido), que levam os tombstones junto
+    """
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if origin is not None and origin_model is not Appointment:
+        return
+    AppointmentTombstone.objects.create(tenant_id=instance.tenant_id, appointment_id=instance.pk)
+
+
+@receiver(post_save, sender='financial.Transaction')
+@receiver(post_delete, sender='financial.Transaction')
+def touch_appointment_on_payment(sender, instance, **kwargs):
+    """
+    Atualiza updated_at do agendamento quando uma transação vinculada muda,
+    para que o is_paid alterado apareça na sincronização da agenda
+    """
+    if instance.appointment_id:
+        Appointment.objects.filter(pk=instance.appointment_id).update(updated_at=timezone.now())
+
+
+# Campos de outros models copiados na agenda (AgendaAppointmentSerializer):
+# label do model -> (FK do agendamento, campos exibidos)
+AGENDA_RELATED_FIELDS = {
+    'customers.Customer': ('customer', ('name', 'phone', 'email', 'tag')),
+    'scheduling.Service': ('service', ('name', 'price', 'duration_minutes')),
+    settings.AUTH_USER_MODEL: ('professional', ('name', 'email')),
+}
+
+
+def _agenda_snapshot(instance):
+    # __dict__ evita query quando o campo foi adiado (.only()/.defer()); incompleto -> None
+    values = instance.__dict__
+    fields = AGENDA_RELATED_FIELDS[instance._meta.label][1]
+    if any(field not in values for field in fields):
+        return None
+    return {field: values[field] for field in fields}
+
+
+def _touch_related_appointments(instance):
+    fk = AGENDA_RELATED_FIELDS[instance._meta.label][0]
+    Appointment.objects.filter(**{fk: instance.pk}).update(updated_at=timezone.now())
+
+
+@receiver(post_init, sender='customers.Customer')
+@receiver(post_init, sender='scheduling.Service')
+@receiver(post_init, sender=settings.AUTH_USER_MODEL)
+def remember_agenda_values(sender, instance, **kwargs):
+    instance._agenda_values = _agenda_snapshot(instance)
+
+
+@receiver(post_save, sender='customers.Customer')
+@receiver(post_save, sender='scheduling.Service')
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def touch_appointments_on_related_change(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Atualiza updated_at dos agendamentos quando muda o cliente, serviço ou
+    profissional exibido neles, para que a cópia da sincronização não fique velha
+    Saves que não mexem nesses campos (ex.: last_visit, last_login) não consultam nada
+    """
+    fields = AGENDA_RELATED_FIELDS[sender._meta.label][1]
+    snapshot = getattr(instance, '_agenda_values', None)
+    instance._agenda_values = _agenda_snapshot(instance)
+    if created or (update_fields is not None and not set(update_fields) & set(fields)):
+        return
+    if snapshot is None or snapshot != instance._agenda_values:
+        _touch_related_appointments(instance)
+
+
+@receiver(pre_delete, sender='customers.Customer')
+def touch_appointments_on_customer_delete(sender, instance, **kwargs):
+    """Cliente excluído: os agendamentos perdem o vínculo (SET_NULL) e mudam na agenda"""
+    _touch_related_appointments(instance)
@@ -0,0 +1,96 @@
+"""
+Sincronização incremental da agenda (action sync de AppointmentViewSet)
+
+O cliente guarda um cursor opaco e, a cada poll, recebe apenas os agendamentos
+criados, alterados ou cancelados desde então, mais os ids excluídos (tombstones).
+
+O cursor guarda:
+- ts: instante a partir do qual updated_at/deleted_at ainda não foram vistos
+- tomb: maior id de AppointmentTombstone já entregue
+
+Para não perder alterações de transações que fazem commit depois da leitura, o
+novo `ts` é o início da requisição menos SYNC_OVERLAP. As alterações dessa janela
+voltam no poll seguinte, então o cliente aplica `changed` como upsert por id.
+Com filtro de datas, os agendamentos alterados que saíram do filtro (ex.:
+remarcados para outra semana) vêm em `deleted`, como as exclusões: o cliente
+remove ids que tem e ignora os que não conhece.
+Cursores mais antigos que a retenção dos tombstones recebem o snapshot completo
+(reset).
+"""
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Max, Q
+
+from .models import AppointmentTombstone
+
+SYNC_OVERLAP = timedelta(seconds=30)
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'APPOINTMENT_TOMBSTONE_RETENTION_DAYS', 30))
+
+
+def encode_cursor(since, tombstone_id):
+    payload = json.dumps({'ts': since.isoformat(), 'tomb': tombstone_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Retorna (since, tombstone_id); ValueError se o cursor for inválido"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        since = datetime.fromisoformat(payload['ts'])
+        tombstone_id = int(payload['tomb'])
+    except (TypeError, KeyError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Cursor inválido') from e
+    if since.tzinfo is None:
+        raise ValueError('Cursor inválido')
+    return since, tombstone_id
+
+
+def changes_since(queryset, window, tenant_id, cursor, now):
+    """
+    Calcula a resposta da sincronização
+    `queryset`: agendamentos do tenant, sem os filtros do cliente
+    `window`: Q com os filtros de data do cliente (Q() para todos)
+    Retorna dict com reset, changed (queryset), deleted (ids) e o novo cursor
+    """
+    next_since = now - SYNC_OVERLAP
+    since = None
+    if cursor:
+        since, tombstone_id = decode_cursor(cursor)
+        if since < now - tombstone_retention():
+            since = None
+
+    tombstones = AppointmentTombstone.objects.filter(tenant_id=tenant_id)
+
+    if since is None:
+        last_tombstone = tombstones.aggregate(last=Max('id'))['last'] or 0
+        return {
+            'reset': True,
+            'changed': queryset.filter(window),
+            'deleted': [],
+            'cursor': encode_cursor(next_since, last_tombstone),
+        }
+
+    deleted = list(
+        tombstones.filter(Q(id__gt=tombstone_id) | Q(deleted_at__gte=since))
+        .order_by('id').values_list('id', 'appointment_id')
+    )
+    last_tombstone = max([tombstone_id] + [pk for pk, _ in deleted])
+    deleted_ids = {appointment_id for _, appointment_id in deleted}
+
+    # Alterações de todo o tenant: as que saíram do filtro também precisam chegar ao cliente
+    updated = queryset.filter(updated_at__gte=since)
+    if window:
+        deleted_ids.update(updated.exclude(window).values_list('id', flat=True))
+
+    return {
+        'reset': False,
+        'changed': updated.filter(window).order_by('updated_at'),
+        'deleted': [str(appointment_id) for appointment_id in sorted(deleted_ids, key=str)],
+        'cursor': encode_cursor(max(since, next_since), last_tombstone),
+    }
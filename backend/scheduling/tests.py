@@ -1,3 +1,384 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Tenant, User
+from .models import Appointment, Service
+
+
+class AvailabilityTestCase(TestCase):
+    """Testa o motor de disponibilidade (conflitos e horários livres)"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.professional = User.objects.create_user(
+            email='barbeiro@test.com', password='testpass123', name='Barbeiro', tenant=self.tenant, role='barbeiro'
+        )
+        self.service = Service.objects.create(
+            tenant=self.tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30
+        )
+        self.day = timezone.localdate() + timedelta(days=1)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def at(self, hour, minute=0):
+        return timezone.make_aware(datetime.combine(self.day, datetime.min.time()).replace(hour=hour, minute=minute))
+
+    def book(self, start_time):
+        return self.client.post('/api/scheduling/appointments/', {
+            'customer_name': 'Cliente',
+            'service_id': str(self.service.id),
+            'professional_id': str(self.professional.id),
+            'start_time': start_time.isoformat(),
+        }, format='json')
+
+    def test_conflicts_are_rejected(self):
+        self.assertEqual(self.book(self.at(10)).status_code, 201)
+
+        response = self.book(self.at(10, 15))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('10:00 - 10:30', response.data['start_time'][0])
+
+        self.assertEqual(self.book(self.at(10, 30)).status_code, 201)
+
+        # Cancelados liberam o horário
+        Appointment.objects.filter(start_time=self.at(10)).update(status='cancelado')
+        self.assertEqual(self.book(self.at(10, 0)).status_code, 201)
+
+    def test_other_tenants_do_not_block(self):
+        other_tenant = Tenant.objects.create(name='Outro', subscription_status='ACTIVE')
+        other_service = Service.objects.create(
+            tenant=other_tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30
+        )
+        # Dado inconsistente de outro tenant apontando para o mesmo profissional
+        Appointment.objects.bulk_create([Appointment(
+            tenant=other_tenant, service=other_service, professional=self.professional,
+            customer_name='Outro', start_time=self.at(10), end_time=self.at(10, 30)
+        )])
+
+        self.assertEqual(self.book(self.at(10)).status_code, 201)
+
+    def test_reschedule_updates_end_time(self):
+        self.book(self.at(9))
+        appointment_id = self.book(self.at(10)).data['id']
+        url = f'/api/scheduling/appointments/{appointment_id}/'
+
+        response = self.client.patch(url, {'start_time': self.at(9, 15).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.patch(url, {'start_time': self.at(11).isoformat()}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Appointment.objects.get(pk=appointment_id).end_time, self.at(11, 30))
+
+    def test_free_slots(self):
+        self.book(self.at(10))
+
+        response = self.client.get('/api/scheduling/appointments/free_slots/', {
+            'service': str(self.service.id),
+            'professionals': str(self.professional.id),
+            'start_date': self.day.isoformat(),
+            'end_date': self.day.isoformat(),
+            'opening': '09:00',
+            'closing': '11:15',
+            'step': 30,
+        })
+
+        self.assertEqual(response.status_code, 200)
+        [result] = response.data['results']
+        self.assertEqual(result['professional_id'], str(self.professional.id))
+        self.assertEqual(result['days'], [
+            {'date': self.day.isoformat(), 'slots': ['09:00', '09:30', '10:30']}
+        ])
+
+
+class AgendaListTestCase(TestCase):
+    """Testa o fast path de leitura da agenda (AgendaAppointmentSerializer)"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.service = Service.objects.create(
+            tenant=self.tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_appointments(self, count):
+        from customers.models import Customer
+
+        customer = Customer.objects.create(tenant=self.tenant, name='Cliente', phone='11999999999')
+        # Horários fixos do dia, para não cruzar a meia-noite
+        start = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()).replace(hour=8))
+        return [
+            Appointment.objects.create(
+                tenant=self.tenant, service=self.service, professional=self.user,
+                customer=customer if i % 2 else None, customer_name='Avulso',
+                start_time=start + timedelta(hours=i),
+                price=Decimal('35.00') if i == 0 else None,
+            )
+            for i in range(count)
+        ]
+
+    def test_same_shape_as_appointment_serializer(self):
+        from financial.models import PaymentMethod, Transaction
+
+        appointments = self.create_appointments(2)
+        Transaction.objects.create(
+            tenant=self.tenant, type='receita', description='Corte', amount=Decimal('35.00'),
+            date=timezone.localdate(), appointment=appointments[0], created_by=self.user,
+            payment_method=PaymentMethod.objects.create(tenant=self.tenant, name='PIX'),
+        )
+
+        response = self.client.get('/api/scheduling/appointments/today/')
+        rows = {row['id']: row for row in response.json()}
+
+        for appointment in appointments:
+            expected = self.client.get(f'/api/scheduling/appointments/{appointment.id}/').json()
+            row = rows[str(appointment.id)]
+            for key in ('service_details', 'professional_details'):
+                expected[key] = {field: expected[key][field] for field in row[key]}
+            self.assertEqual(row, {key: expected[key] for key in row})
+
+        self.assertTrue(rows[str(appointments[0].id)]['is_paid'])
+        self.assertEqual(rows[str(appointments[0].id)]['final_price'], 35.0)
+        self.assertEqual(rows[str(appointments[1].id)]['final_price'], 50.0)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get('/api/scheduling/appointments/week/')
+            self.assertEqual(response.status_code, 200)
+            return len(ctx.captured_queries)
+
+        self.create_appointments(2)
+        baseline = count_queries()
+        self.create_appointments(8)
+        self.assertEqual(count_queries(), baseline)
+
+
+class AgendaSyncTestCase(TestCase):
+    """Testa a sincronização incremental da agenda (action sync)"""
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.service = Service.objects.create(
+            tenant=self.tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_appointment(self, hour=10, day=None):
+        day = day or timezone.localdate()
+        start = timezone.make_aware(datetime.combine(day, datetime.min.time()).replace(hour=hour))
+        return Appointment.objects.create(
+            tenant=self.tenant, service=self.service, professional=self.user,
+            customer_name='Cliente', start_time=start
+        )
+
+    def sync(self, cursor=None, at=None, **filters):
+        from unittest import mock
+
+        params = dict(filters, cursor=cursor) if cursor else filters
+        with mock.patch('django.utils.timezone.now', return_value=at or timezone.now()):
+            response = self.client.get('/api/scheduling/appointments/sync/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_delta_contains_every_change_once_settled(self):
+        self.create_appointment(9)
+        cancelled = self.create_appointment(10)
+        deleted = self.create_appointment(11)
+
+        start = timezone.now()
+        snapshot = self.sync(at=start)
+        self.assertTrue(snapshot['reset'])
+        self.assertEqual(len(snapshot['changed']), 3)
+
+        # Transação que fez commit depois da leitura, com updated_at anterior a ela
+        late = self.create_appointment(12)
+        Appointment.objects.filter(pk=late.pk).update(updated_at=start - timedelta(seconds=5))
+
+        created = self.create_appointment(13)
+        cancelled.status = 'cancelado'
+        cancelled.save()
+        deleted_id = str(deleted.id)
+        deleted.delete()
+
+        delta = self.sync(snapshot['cursor'], at=start + timedelta(minutes=2))
+        self.assertFalse(delta['reset'])
+        changed = {row['id']: row for row in delta['changed']}
+        self.assertTrue({str(late.id), str(created.id), str(cancelled.id)} <= set(changed))
+        self.assertEqual(changed[str(cancelled.id)]['status'], 'cancelado')
+        self.assertEqual(delta['deleted'], [deleted_id])
+
+        # Sem alterações depois da janela de sobreposição: resposta vazia
+        quiet = self.sync(delta['cursor'], at=start + timedelta(minutes=4))
+        self.assertEqual((quiet['changed'], quiet['deleted']), ([], []))
+
+    def test_payment_marks_appointment_as_changed(self):
+        from financial.models import PaymentMethod, Transaction
+
+        appointment = self.create_appointment()
+        start = timezone.now()
+        snapshot = self.sync(at=start - timedelta(minutes=5))
+
+        Transaction.objects.create(
+            tenant=self.tenant, type='receita', description='Corte', amount=Decimal('50.00'),
+            date=timezone.localdate(), appointment=appointment, created_by=self.user,
+            payment_method=PaymentMethod.objects.create(tenant=self.tenant, name='PIX'),
+        )
+
+        [row] = self.sync(snapshot['cursor'], at=start + timedelta(minutes=1))['changed']
+        self.assertTrue(row['is_paid'])
+
+    def test_delta_keeps_the_date_filters(self):
+        today = timezone.localdate()
+        next_week = today + timedelta(days=7)
+        week = {'start_date': today.isoformat(), 'end_date': (today + timedelta(days=6)).isoformat()}
+        self.create_appointment(day=next_week)
+
+        start = timezone.now()
+        snapshot = self.sync(at=start, **week)
+        self.assertEqual(snapshot['changed'], [])
+
+        inside = self.create_appointment(10)
+        self.create_appointment(11, day=next_week)
+        delta = self.sync(snapshot['cursor'], at=start + timedelta(minutes=2), **week)
+        self.assertEqual([row['id'] for row in delta['changed']], [str(inside.id)])
+
+    def test_appointment_leaving_the_window_is_deleted(self):
+        today = timezone.localdate()
+        week = {'start_date': today.isoformat(), 'end_date': (today + timedelta(days=6)).isoformat()}
+        moved = self.create_appointment(10)
+        kept = self.create_appointment(11)
+
+        start = timezone.now()
+        snapshot = self.sync(at=start, **week)
+        self.assertEqual(len(snapshot['changed']), 2)
+
+        # Remarcado para fora da semana sincronizada
+        moved.start_time += timedelta(days=7)
+        moved.end_time = None
+        moved.save()
+        kept.notes = 'Trazer referência'
+        kept.save()
+
+        delta = self.sync(snapshot['cursor'], at=start + timedelta(minutes=2), **week)
+        self.assertEqual([row['id'] for row in delta['changed']], [str(kept.id)])
+        self.assertEqual(delta['deleted'], [str(moved.id)])
+
+    def test_related_changes_mark_appointments_as_changed(self):
+        from customers.models import Customer
+
+        customer = Customer.objects.create(tenant=self.tenant, name='João', phone='11987654321')
+        appointment = self.create_appointment(10)
+        appointment.customer = customer
+        appointment.save()
+        Appointment.objects.filter(pk=appointment.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        start = timezone.now()
+        cursor = self.sync(at=start - timedelta(minutes=5))['cursor']
+
+        # Saves que não mudam o que a agenda exibe não alteram os agendamentos
+        customer.last_visit = timezone.localdate()
+        customer.save(update_fields=['last_visit'])
+        Customer.objects.get(pk=customer.pk).save()
+        self.assertEqual(self.sync(cursor, at=start)['changed'], [])
+
+        customer.name = 'João Silva'
+        customer.save()
+        [row] = self.sync(cursor, at=start)['changed']
+        self.assertEqual(row['customer_full_info']['name'], 'João Silva')
+
+        Appointment.objects.update(updated_at=start - timedelta(hours=1))
+        self.service.name = 'Corte Degradê'
+        self.service.save()
+        [row] = self.sync(cursor, at=start)['changed']
+        self.assertEqual(row['service_details']['name'], 'Corte Degradê')
+
+        Appointment.objects.update(updated_at=start - timedelta(hours=1))
+        customer.delete()
+        [row] = self.sync(cursor, at=start)['changed']
+        self.assertIsNone(row['customer_full_info'])
+
+    def test_invalid_and_expired_cursors(self):
+        from .sync import encode_cursor
+
+        response = self.client.get('/api/scheduling/appointments/sync/', {'cursor': 'invalido'})
+        self.assertEqual(response.status_code, 400)
+
+        self.create_appointment()
+        expired = encode_cursor(timezone.now() - timedelta(days=31), 0)
+        result = self.sync(expired)
+        self.assertTrue(result['reset'])
+        self.assertEqual(len(result['changed']), 1)
+
+
+class ProfessionalPerformanceTestCase(TestCase):
+    """Testa o relatório de desempenho por profissional (core.reports)"""
+
+    QUERY_BUDGET = 2
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Test Barbershop', subscription_status='ACTIVE')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.service = Service.objects.create(
+            tenant=self.tenant, name='Corte', price=Decimal('50.00'), duration_minutes=30
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def add_staff(self, count, statuses):
+        start = timezone.now()
+        for i in range(count):
+            professional = User.objects.create_user(
+                email=f'pro{User.objects.count()}@test.com', password='x', name=f'Pro {i}', tenant=self.tenant
+            )
+            Appointment.objects.bulk_create([
+                Appointment(
+                    tenant=self.tenant, service=self.service, professional=professional, customer_name='Cliente',
+                    start_time=start + timedelta(hours=n), end_time=start + timedelta(hours=n, minutes=30),
+                    status=status
+                )
+                for n, status in enumerate(statuses)
+            ])
+
+    def get_report(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/scheduling/appointments/professional_performance/')
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(ctx.captured_queries), self.QUERY_BUDGET)
+        return response.data
+
+    def test_metrics_in_constant_queries(self):
+        self.add_staff(2, ['concluido', 'concluido', 'cancelado', 'marcado'])
+        report = self.get_report()
+
+        self.assertEqual(len(report), 3)
+        admin = next(row for row in report if row['professional_id'] == str(self.user.id))
+        self.assertEqual((admin['total_appointments'], admin['total_revenue'], admin['completion_rate']), (0, 0.0, 0))
+        self.assertEqual(report[0]['total_appointments'], 4)
+        self.assertEqual((report[0]['completed'], report[0]['cancelled']), (2, 1))
+        self.assertEqual(report[0]['total_revenue'], 100.0)
+        self.assertEqual(report[0]['completion_rate'], 50.0)
 
-# Create your tests here.
+        self.add_staff(20, ['concluido'])
+        self.assertEqual(len(self.get_report()), 23)
@@ -8,28 +8,29 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from django.utils import timezone
+from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db.models import Q
-from datetime import timedelta
-from django.http import HttpResponse
-import csv
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
+from datetime import datetime, timedelta
 
 from .models import Service, Appointment
 from .serializers import (
     ServiceSerializer,
     AppointmentSerializer,
+    AgendaAppointmentSerializer,
     CreateAppointmentSerializer
 )
 from core.permissions import IsSameTenant, IsTenantAdmin
+from core.exports import ExportColumn, ExportMixin, choice_display, currency_br, datetime_br, or_dash
+from core.response_cache import TenantCachedResponseMixin
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(TenantCachedResponseMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciamento de Serviços
     Implementa filtros automáticos por tenant
     """
     serializer_class = ServiceSerializer
+    cache_resources = ('services',)
     permission_classes = [IsAuthenticated, IsSameTenant]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['is_active']
@@ -97,7 +98,7 @@ class ServiceViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class AppointmentViewSet(viewsets.ModelViewSet):
+class AppointmentViewSet(ExportMixin, viewsets.ModelViewSet):
     """
     ViewSet para gerenciamento de Agendamentos
     Implementa: BLOCO 4 - Workflow: Criar Novo Agendamento
@@ -106,6 +107,19 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated, IsSameTenant]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'professional', 'service']
+    
+    export_filename = 'agendamentos'
+    export_sheet_title = 'Agendamentos'
+    export_columns = [
+        ExportColumn('Data/Hora', 'start_time', datetime_br, width=18),
+        ExportColumn('Cliente', 'customer_name', width=30),
+        ExportColumn('Telefone', 'customer_phone', or_dash, width=15),
+        ExportColumn('Serviço', 'service__name', width=25),
+        ExportColumn('Profissional', 'professional__name', width=25),
+        ExportColumn('Status', 'status', choice_display(Appointment.STATUS_CHOICES), width=15),
+        ExportColumn('Valor', 'price', currency_br, width=12),
+        ExportColumn('Observações', 'notes', or_dash, width=40),
+    ]
 
     def get_queryset(self):
         """
@@ -114,32 +128,81 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         Otimizado com select_related para evitar N+1 queries
         """
         if self.request.user.is_authenticated:
-            queryset = Appointment.objects.filter(
-                tenant=self.request.user.tenant
-            ).select_related(
-                'customer',
-                'service', 
-                'professional',
-                'created_by',
-                'tenant'
-            ).order_by('-start_time')
-            
-            # Filtros opcionais via query params
-            date = self.request.query_params.get('date', None)
-            if date:
-                queryset = queryset.filter(start_time__date=date)
-            
-            start_date = self.request.query_params.get('start_date', None)
-            end_date = self.request.query_params.get('end_date', None)
-            if start_date and end_date:
-                queryset = queryset.filter(
-                    start_time__date__gte=start_date,
-                    start_time__date__lte=end_date
-                )
-            
-            return queryset
+            return self.get_tenant_queryset().filter(self.get_date_window())
         return Appointment.objects.none()
 
+    def get_tenant_queryset(self):
+        """Agendamentos do tenant, sem os filtros de data"""
+        return Appointment.objects.filter(
+            tenant=self.request.user.tenant
+        ).select_related(
+            'customer',
+            'service', 
+            'professional',
+            'created_by',
+            'tenant'
+        ).with_payment().order_by('-start_time')
+
+    def get_date_window(self):
+        """Filtros opcionais via query params (date ou start_date + end_date)"""
+        window = Q()
+        date = self.request.query_params.get('date', None)
+        if date:
+            window &= Q(start_time__date=date)
+        
+        start_date = self.request.query_params.get('start_date', None)
+        end_date = self.request.query_params.get('end_date', None)
+        if start_date and end_date:
+            window &= Q(
+                start_time__date__gte=start_date,
+                start_time__date__lte=end_date
+            )
+        
+        return window
+
+    def agenda_response(self, queryset, paginate=False):
+        """
+        Resposta das telas de agenda a partir de .values() (AgendaAppointmentSerializer)
+        Número fixo de queries, independente da quantidade de agendamentos
+        """
+        rows = queryset.values(*AgendaAppointmentSerializer.values_fields)
+        page = self.paginate_queryset(rows) if paginate else None
+        if page is not None:
+            return self.get_paginated_response(AgendaAppointmentSerializer(page, many=True).data)
+        return Response(AgendaAppointmentSerializer(rows, many=True).data)
+
+    def list(self, request, *args, **kwargs):
+        """Lista agendamentos (fast path de leitura)"""
+        return self.agenda_response(self.filter_queryset(self.get_queryset()), paginate=True)
+
+    @action(detail=False, methods=['get'])
+    def sync(self, request):
+        """
+        Sincronização incremental da agenda (scheduling.sync)
+        Sem cursor (ou cursor expirado): snapshot dos agendamentos, filtrado por
+        date/start_date/end_date, com reset=true.
+        Com ?cursor=: apenas os criados/alterados/cancelados desde o cursor
+        (changed, aplicar como upsert por id) e os excluídos ou que saíram do
+        filtro de datas (deleted).
+        """
+        from .sync import changes_since
+        
+        try:
+            result = changes_since(
+                self.get_tenant_queryset(), self.get_date_window(), request.user.tenant_id,
+                request.query_params.get('cursor'), timezone.now()
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        rows = result['changed'].values(*AgendaAppointmentSerializer.values_fields)
+        return Response({
+            'cursor': result['cursor'],
+            'reset': result['reset'],
+            'changed': AgendaAppointmentSerializer(rows, many=True).data,
+            'deleted': result['deleted'],
+        })
+
     def create(self, request, *args, **kwargs):
         """
         Cria novo agendamento
@@ -159,15 +222,14 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def today(self, request):
         """Retorna agendamentos do dia atual"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         appointments = self.get_queryset().filter(start_time__date=today)
-        serializer = self.get_serializer(appointments, many=True)
-        return Response(serializer.data)
+        return self.agenda_response(appointments)
 
     @action(detail=False, methods=['get'])
     def week(self, request):
         """Retorna agendamentos da semana atual"""
-        today = timezone.now().date()
+        today = timezone.localdate()
         week_start = today - timedelta(days=today.weekday())
         week_end = week_start + timedelta(days=6)
         
@@ -175,8 +237,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             start_time__date__gte=week_start,
             start_time__date__lte=week_end
         )
-        serializer = self.get_serializer(appointments, many=True)
-        return Response(serializer.data)
+        return self.agenda_response(appointments)
 
     @action(detail=True, methods=['post'])
     def confirm(self, request, pk=None):
@@ -214,6 +275,96 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(appointment)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def free_slots(self, request):
+        """
+        Horários livres dos profissionais para um serviço
+        Query params: service (ou duration em minutos), professionals (ids separados
+        por vírgula; padrão: todos ativos), start_date e end_date (padrão: próximos
+        7 dias, máximo 31), opening e closing (HH:MM), step (minutos, padrão 15)
+        """
+        from datetime import date, time
+        from core.models import User
+        from .availability import Schedule, opening_hours
+        
+        tenant = request.user.tenant
+        params = request.query_params
+        
+        try:
+            if params.get('service'):
+                service = Service.objects.get(tenant=tenant, pk=params['service'])
+                duration = service.duration_minutes
+            else:
+                duration = int(params.get('duration', 60))
+            step = int(params.get('step', 15))
+            
+            today = timezone.localdate()
+            start_date = date.fromisoformat(params['start_date']) if params.get('start_date') else today
+            end_date = (
+                date.fromisoformat(params['end_date']) if params.get('end_date')
+                else start_date + timedelta(days=6)
+            )
+            
+            default_opening, default_closing = opening_hours()
+            opening = time.fromisoformat(params['opening']) if params.get('opening') else default_opening
+            closing = time.fromisoformat(params['closing']) if params.get('closing') else default_closing
+        except (Service.DoesNotExist, ValueError, DjangoValidationError):
+            return Response(
+                {'error': 'Parâmetros inválidos (service, duration, step, datas ou horários).'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if duration <= 0 or step <= 0 or end_date < start_date or (end_date - start_date).days > 30 \
+                or opening >= closing:
+            return Response(
+                {'error': 'Intervalo inválido: duração e passo positivos, até 31 dias e abertura antes do fechamento.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        professionals = User.objects.filter(tenant=tenant, is_active=True).order_by('name')
+        try:
+            if params.get('professionals'):
+                professionals = professionals.filter(pk__in=params['professionals'].split(','))
+            professionals = list(professionals.values_list('id', 'name'))
+        except DjangoValidationError:
+            return Response({'error': 'professionals inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Uma query para todos os profissionais e dias do período
+        tz = timezone.get_current_timezone()
+        period_start = timezone.make_aware(datetime.combine(start_date, time.min), tz)
+        period_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min), tz)
+        schedule = Schedule(tenant.id, [pk for pk, _ in professionals], period_start, period_end)
+        
+        now = timezone.now()
+        days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+        results = []
+        for professional_id, professional_name in professionals:
+            results.append({
+                'professional_id': str(professional_id),
+                'professional_name': professional_name,
+                'days': [
+                    {
+                        'date': day.isoformat(),
+                        'slots': [
+                            timezone.localtime(slot).strftime('%H:%M')
+                            for slot in schedule.free_slots(
+                                professional_id, day, timedelta(minutes=duration),
+                                opening, closing, timedelta(minutes=step), not_before=now
+                            )
+                        ],
+                    }
+                    for day in days
+                ],
+            })
+        
+        return Response({
+            'duration_minutes': duration,
+            'step_minutes': step,
+            'start_date': start_date,
+            'end_date': end_date,
+            'results': results,
+        })
+
     @action(detail=False, methods=['get'])
     def status_distribution(self, request):
         """
@@ -304,8 +455,9 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         Retorna desempenho de cada profissional
         Query params: start_date, end_date
         """
-        from django.db.models import Count, Sum, Avg
+        from django.db.models import Count, Sum
         from core.models import User
+        from core.reports import as_float, professional_metrics, rate
         
         # Obter parâmetros
         start_date = request.query_params.get('start_date')
@@ -319,35 +471,31 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 start_time__date__lte=end_date
             )
         
-        # Buscar todos os profissionais do tenant
-        professionals = User.objects.filter(tenant=request.user.tenant)
+        # Métricas de todos os profissionais do tenant em uma query (core.reports)
+        completed = Q(status='concluido')
+        rows = professional_metrics(
+            queryset,
+            {
+                'total_appointments': Count('id'),
+                'completed': Count('id', filter=completed),
+                'cancelled': Count('id', filter=Q(status='cancelado')),
+                # Receita apenas dos concluídos
+                'total_revenue': Sum('service__price', filter=completed),
+            },
+            User.objects.filter(tenant=request.user.tenant),
+        )
         
         result = []
-        for professional in professionals:
-            # Agendamentos do profissional
-            prof_appointments = queryset.filter(professional=professional)
-            
-            total_appointments = prof_appointments.count()
-            completed = prof_appointments.filter(status='concluido').count()
-            cancelled = prof_appointments.filter(status='cancelado').count()
-            
-            # Calcular receita (apenas concluídos)
-            revenue = prof_appointments.filter(status='concluido').aggregate(
-                total=Sum('service__price')
-            )['total'] or 0
-            
-            # Taxa de conclusão
-            completion_rate = (completed / total_appointments * 100) if total_appointments > 0 else 0
-            
+        for professional, metrics in rows:
             result.append({
-                'professional_id': str(professional.id),
-                'professional_name': professional.name,
-                'professional_email': professional.email,
-                'total_appointments': total_appointments,
-                'completed': completed,
-                'cancelled': cancelled,
-                'total_revenue': float(revenue),
-                'completion_rate': round(completion_rate, 2)
+                'professional_id': str(professional['id']),
+                'professional_name': professional['name'],
+                'professional_email': professional['email'],
+                'total_appointments': metrics['total_appointments'],
+                'completed': metrics['completed'],
+                'cancelled': metrics['cancelled'],
+                'total_revenue': as_float(metrics['total_revenue']),
+                'completion_rate': rate(metrics['completed'], metrics['total_appointments'])
             })
         
         # Ordenar por receita total
@@ -371,7 +519,7 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         
         # Padrão: últimos 30 dias
         if not start_date or not end_date:
-            end_date = timezone.now().date()
+            end_date = timezone.localdate()
             start_date = end_date - timedelta(days=30)
         
         queryset = self.get_queryset().filter(
@@ -414,100 +562,3 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             'period': period,
             'data': list(data)
         })
-
-    @action(detail=False, methods=['get'])
-    def export_csv(self, request):
-        """Exporta agendamentos em formato CSV"""
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Criar resposta CSV
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = 'attachment; filename="agendamentos.csv"'
-        response.write('\ufeff')  # BOM para UTF-8
-        
-        writer = csv.writer(response)
-        writer.writerow([
-            'Data/Hora',
-            'Cliente',
-            'Telefone',
-            'Serviço',
-            'Profissional',
-            'Status',
-            'Valor',
-            'Observações'
-        ])
-        
-        for appointment in queryset:
-            writer.writerow([
-                appointment.start_time.strftime('%d/%m/%Y %H:%M'),
-                appointment.customer.name,
-                appointment.customer.phone,
-                appointment.service.name,
-                appointment.professional.get_full_name(),
-                appointment.get_status_display(),
-                f'R$ {appointment.price:.2f}',
-                appointment.notes or '-'
-            ])
-        
-        return response
-
-    @action(detail=False, methods=['get'])
-    def export_excel(self, request):
-        """Exporta agendamentos em formato Excel"""
-        queryset = self.filter_queryset(self.get_queryset())
-        
-        # Criar workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Agendamentos"
-        
-        # Estilizar cabeçalho
-        header_font = Font(bold=True)
-        header_alignment = Alignment(horizontal='center')
-        
-        headers = [
-            'Data/Hora',
-            'Cliente',
-            'Telefone',
-            'Serviço',
-            'Profissional',
-            'Status',
-            'Valor',
-            'Observações'
-        ]
-        
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.font = header_font
-            cell.alignment = header_alignment
-        
-        # Adicionar dados
-        for row, appointment in enumerate(queryset, start=2):
-            ws.cell(row=row, column=1, value=appointment.start_time.strftime('%d/%m/%Y %H:%M'))
-            ws.cell(row=row, column=2, value=appointment.customer.name)
-            ws.cell(row=row, column=3, value=appointment.customer.phone)
-            ws.cell(row=row, column=4, value=appointment.service.name)
-            ws.cell(row=row, column=5, value=appointment.professional.get_full_name())
-            ws.cell(row=row, column=6, value=appointment.get_status_display())
-            ws.cell(row=row, column=7, value=f'R$ {appointment.price:.2f}')
-            ws.cell(row=row, column=8, value=appointment.notes or '-')
-        
-        # Ajustar largura das colunas
-        ws.column_dimensions['A'].width = 18
-        ws.column_dimensions['B'].width = 30
-        ws.column_dimensions['C'].width = 15
-        ws.column_dimensions['D'].width = 25
-        ws.column_dimensions['E'].width = 25
-        ws.column_dimensions['F'].width = 15
-        ws.column_dimensions['G'].width = 12
-        ws.column_dimensions['H'].width = 40
-        
-        # Criar resposta
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="agendamentos.xlsx"'
-        wb.save(response)
-        
-        return response
-
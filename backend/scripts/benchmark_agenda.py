@@ -0,0 +1,138 @@
+"""
+Benchmark da agenda (week) contra a serialização antiga
+
+Cria um banco de teste temporário com N agendamentos na semana atual (parte deles
+pagos) e mede queries e tempo da action week com o AgendaAppointmentSerializer e
+da serialização antiga (AppointmentSerializer com is_paid() por linha).
+
+Uso:
+    python scripts/benchmark_agenda.py --appointments 500 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from core.models import Tenant, User  # noqa: E402
+from customers.models import Customer  # noqa: E402
+from financial.models import PaymentMethod, Transaction  # noqa: E402
+from scheduling.models import Appointment, Service  # noqa: E402
+from scheduling.serializers import AppointmentSerializer  # noqa: E402
+from scheduling.views import AppointmentViewSet  # noqa: E402
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            size = fn()
+            timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(ctx.captured_queries), size
+
+
+def legacy_week(tenant, week_start, week_end):
+    def run():
+        queryset = Appointment.objects.filter(
+            tenant=tenant, start_time__date__gte=week_start, start_time__date__lte=week_end
+        ).select_related('customer', 'service', 'professional', 'created_by', 'tenant').order_by('-start_time')
+        return len(JSONRenderer().render(AppointmentSerializer(queryset, many=True).data))
+    return run
+
+
+def agenda_week(user):
+    def run():
+        request = APIRequestFactory().get('/api/scheduling/appointments/week/')
+        force_authenticate(request, user=user)
+        response = AppointmentViewSet.as_view({'get': 'week'})(request)
+        response.render()
+        return len(response.content)
+    return run
+
+
+def populate(tenant, user, count, week_start):
+    services = [
+        Service.objects.create(tenant=tenant, name=f'Serviço {i}', price=Decimal('40.00') + i, duration_minutes=30)
+        for i in range(5)
+    ]
+    professionals = [user] + [
+        User.objects.create_user(
+            email=f'pro{i}@benchmark.com', password='benchmark', name=f'Profissional {i}', tenant=tenant
+        )
+        for i in range(4)
+    ]
+    customers = Customer.objects.bulk_create([
+        Customer(tenant=tenant, name=f'Cliente {i}', phone=f'1199999{i:04d}') for i in range(100)
+    ])
+    payment_method = PaymentMethod.objects.create(tenant=tenant, name='PIX')
+
+    tz = timezone.get_current_timezone()
+    appointments = []
+    for i in range(count):
+        start = timezone.make_aware(datetime.combine(week_start + timedelta(days=i % 7), datetime.min.time()), tz)
+        start += timedelta(hours=8, minutes=30 * (i // 7 % 24))
+        service = services[i % len(services)]
+        appointments.append(Appointment(
+            tenant=tenant, service=service, professional=professionals[i % len(professionals)],
+            customer=customers[i % len(customers)] if i % 3 else None, customer_name=f'Cliente {i}',
+            start_time=start, end_time=start + timedelta(minutes=30), price=service.price,
+            status='concluido' if i % 2 else 'marcado',
+        ))
+    Appointment.objects.bulk_create(appointments, batch_size=1000)
+
+    # Metade dos concluídos com transação
+    for appointment in appointments[1::4]:
+        Transaction.objects.create(
+            tenant=tenant, type='receita', category='servico', description='Agendamento',
+            amount=appointment.price, date=appointment.start_time.date(), payment_method=payment_method,
+            appointment=appointment, created_by=user
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--appointments', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        tenant = Tenant.objects.create(name='Benchmark', subscription_status='ACTIVE')
+        user = User.objects.create_user(
+            email='benchmark@test.com', password='benchmark', name='Benchmark', tenant=tenant, role='admin'
+        )
+        today = timezone.now().date()
+        week_start = today - timedelta(days=today.weekday())
+        week_end = week_start + timedelta(days=6)
+        populate(tenant, user, args.appointments, week_start)
+
+        print(f'{args.appointments} agendamentos na semana, mediana de {args.repeat} execuções')
+        print(f'{"cenário":<28} {"tempo":>9} {"queries":>8} {"tamanho":>10}')
+        for name, fn in [
+            ('AppointmentSerializer', legacy_week(tenant, week_start, week_end)),
+            ('week (agenda fast path)', agenda_week(user)),
+        ]:
+            elapsed, queries, size = measure(fn, args.repeat)
+            print(f'{name:<28} {elapsed * 1000:>7.1f}ms {queries:>8} {size / 1024:>7.1f} KB')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark das queries por requisição autenticada com JWT
+
+Cria um banco de teste temporário e mede queries e tempo de um GET autenticado
+com o JWTAuthentication do simplejwt (usuário e tenant buscados a cada
+requisição) e com o CachedJWTAuthentication, na primeira requisição (cache
+vazio) e nas seguintes.
+
+Uso:
+    python scripts/benchmark_auth.py --path /api/core/users/me/ --repeat 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import CaptureQueriesContext, setup_test_environment  # noqa: E402
+from rest_framework.views import APIView  # noqa: E402
+from rest_framework_simplejwt.authentication import JWTAuthentication  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from core import authentication  # noqa: E402
+from core.models import Tenant, User  # noqa: E402
+
+
+def measure(client, path, token, repeat):
+    """Mediana do tempo e das queries de `repeat` requisições"""
+    timings, queries = [], []
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = client.get(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+            timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.status_code
+        queries.append(len(ctx.captured_queries))
+    return statistics.median(timings), statistics.median(queries)
+
+
+@contextmanager
+def stock_authentication():
+    """Views com o JWTAuthentication do simplejwt e sem o JWTAuthenticationMiddleware"""
+    middleware = [m for m in settings.MIDDLEWARE if m != 'core.middleware.JWTAuthenticationMiddleware']
+    # authentication_classes é lido do settings quando o DRF é importado
+    with mock.patch.object(APIView, 'authentication_classes', [JWTAuthentication]):
+        with override_settings(MIDDLEWARE=middleware):
+            yield
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--path', default='/api/core/users/me/')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        tenant = Tenant.objects.create(name='Benchmark', subscription_status='ACTIVE')
+        user = User.objects.create_user(
+            email='benchmark@test.com', password='benchmark', name='Benchmark', tenant=tenant, role='admin'
+        )
+        token = AccessToken.for_user(user)
+
+        print(f'GET {args.path}, mediana de {args.repeat} requisições')
+        print(f'{"cenário":<36} {"tempo":>9} {"queries":>8}')
+
+        # Um Client por cenário: o handler carrega os middlewares na primeira requisição
+        with stock_authentication():
+            elapsed, queries = measure(Client(), args.path, token, args.repeat)
+        print(f'{"JWTAuthentication (simplejwt)":<36} {elapsed * 1000:>7.1f}ms {queries:>8}')
+
+        cache.clear()
+        authentication._local.clear()
+        client = Client()
+        elapsed, queries = measure(client, args.path, token, 1)
+        print(f'{"CachedJWTAuthentication (frio)":<36} {elapsed * 1000:>7.1f}ms {queries:>8}')
+
+        elapsed, queries = measure(client, args.path, token, args.repeat)
+        print(f'{"CachedJWTAuthentication (quente)":<36} {elapsed * 1000:>7.1f}ms {queries:>8}')
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark do typeahead de clientes contra o SearchFilter antigo
+
+Cria um banco de teste temporário com N clientes em um tenant e mede o tempo de
+cada termo no typeahead (customers.search) e no filtro antigo (icontains em
+name, phone, email e cpf), ambos com limite de 10 resultados.
+
+Uso:
+    python scripts/benchmark_customer_search.py --customers 200000 --repeat 20
+    python scripts/benchmark_customer_search.py --explain
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.db.models import Q  # noqa: E402
+
+from core.models import Tenant  # noqa: E402
+from customers.models import Customer  # noqa: E402
+from customers.search import match_conditions, typeahead  # noqa: E402
+
+FIRST_NAMES = ['João', 'José', 'Antônio', 'Francisco', 'Carlos', 'Paulo', 'Pedro', 'Lucas', 'Luíz', 'Marcos',
+               'Maria', 'Ana', 'Francisca', 'Antônia', 'Adriana', 'Juliana', 'Márcia', 'Fernanda', 'Patrícia']
+LAST_NAMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Rodrigues', 'Ferreira', 'Alves', 'Pereira', 'Lima',
+              'Gomes', 'Conceição', 'Ribeiro', 'Carvalho', 'Araújo', 'Melo', 'Barbosa', 'Cardoso', 'Rocha']
+TERMS = ['jo', 'mar', 'antonio sil', 'fernanda r', '119', '21987', 'zzz']
+
+
+def populate(tenant, count):
+    rng = random.Random(42)
+    batch = []
+    for i in range(count):
+        customer = Customer(
+            tenant=tenant,
+            name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}',
+            phone=f'{rng.choice(["11", "21", "31", "41"])}9{rng.randrange(10 ** 8):08d}',
+            cpf=f'{i:011d}',
+        )
+        customer.update_search_fields()
+        batch.append(customer)
+        if len(batch) == 5000:
+            Customer.objects.bulk_create(batch)
+            batch = []
+    Customer.objects.bulk_create(batch)
+
+
+def legacy(queryset, term):
+    """SearchFilter antigo: icontains nos quatro campos, ordenado pela listagem"""
+    return queryset.filter(
+        Q(name__icontains=term) | Q(phone__icontains=term) | Q(email__icontains=term) | Q(cpf__icontains=term)
+    ).order_by('-created_at')[:10]
+
+
+def measure(run, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--customers', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--explain', action='store_true', help='Mostra o plano de cada consulta')
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        tenant = Tenant.objects.create(name='Benchmark', subscription_status='ACTIVE')
+        Tenant.objects.create(name='Outro', subscription_status='ACTIVE')
+        populate(tenant, args.customers)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('ANALYZE')
+        queryset = Customer.objects.filter(tenant=tenant)
+
+        print(f'{args.customers} clientes ({connection.vendor}), mediana de {args.repeat} execuções')
+        print(f'{"termo":<14} {"typeahead":>10} {"antigo":>10} {"resultados":>11}')
+        for term in TERMS:
+            new, found = measure(lambda: typeahead(queryset, term, ('id', 'name')), args.repeat)
+            old, _ = measure(lambda: list(legacy(queryset, term).values('id', 'name')), args.repeat)
+            print(f'{term:<14} {new * 1000:>8.2f}ms {old * 1000:>8.2f}ms {found:>11}')
+            if args.explain:
+                print(queryset.filter(match_conditions(term)).order_by('search_name').explain())
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
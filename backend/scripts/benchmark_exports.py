@@ -0,0 +1,134 @@
+"""
+Benchmark da exportação CSV/XLSX (core.exports) contra a implementação antiga
+
+Cria um banco de teste temporário com N produtos e mede tempo e pico de memória
+(tracemalloc) de cada formato. A implementação antiga montava o arquivo inteiro
+em memória iterando instâncias do ORM.
+
+Uso:
+    python scripts/benchmark_exports.py --rows 10000 50000 100000
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+import django
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from openpyxl import Workbook  # noqa: E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa: E402
+
+from core.models import Tenant, User  # noqa: E402
+from inventory.models import Product  # noqa: E402
+from inventory.views import ProductViewSet  # noqa: E402
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), size
+
+
+def legacy_csv(tenant):
+    response = HttpResponse(content_type='text/csv')
+    writer = csv.writer(response)
+    for product in Product.objects.filter(tenant=tenant).select_related('tenant'):
+        writer.writerow([
+            product.sku, product.name, product.category, float(product.cost_price),
+            float(product.sale_price), product.stock_quantity, product.min_stock,
+            'Sim' if product.is_active else 'Não'
+        ])
+    return len(response.content)
+
+
+def legacy_excel(tenant):
+    wb = Workbook()
+    ws = wb.active
+    for product in Product.objects.filter(tenant=tenant).select_related('tenant'):
+        ws.append([
+            product.sku, product.name, product.category, float(product.cost_price),
+            float(product.sale_price), product.stock_quantity, product.min_stock,
+            'Sim' if product.is_active else 'Não'
+        ])
+    response = HttpResponse()
+    wb.save(response)
+    return len(response.content)
+
+
+def streaming(user, action):
+    def run():
+        request = APIRequestFactory().get(f'/api/inventory/products/{action}/')
+        force_authenticate(request, user=user)
+        response = ProductViewSet.as_view({'get': action})(request)
+        # Consome o corpo como o servidor faria, sem acumular
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        response.close()
+        return size
+    return run
+
+
+def populate(tenant, rows):
+    Product.objects.filter(tenant=tenant).delete()
+    Product.objects.bulk_create(
+        [
+            Product(
+                tenant=tenant, name=f'Produto {i}', category='pomada', sku=f'SKU{i:06d}',
+                cost_price=Decimal('10.00'), sale_price=Decimal('25.00'),
+                stock_quantity=i % 100, min_stock=5
+            )
+            for i in range(rows)
+        ],
+        batch_size=5000
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 50000, 100000])
+    parser.add_argument('--skip-legacy', action='store_true', help='não roda a implementação antiga')
+    args = parser.parse_args()
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0)
+    try:
+        tenant = Tenant.objects.create(name='Benchmark', subscription_status='ACTIVE')
+        user = User.objects.create_user(
+            email='benchmark@test.com', password='benchmark', name='Benchmark', tenant=tenant, role='admin'
+        )
+
+        print(f'{"linhas":>8}  {"cenário":<22} {"tempo":>9} {"pico memória":>14} {"tamanho":>10}')
+        for rows in args.rows:
+            populate(tenant, rows)
+            scenarios = [
+                ('CSV streaming', streaming(user, 'export_csv')),
+                ('XLSX write-only', streaming(user, 'export_excel')),
+            ]
+            if not args.skip_legacy:
+                scenarios = [
+                    ('CSV antigo', lambda: legacy_csv(tenant)),
+                    ('XLSX antigo', lambda: legacy_excel(tenant)),
+                ] + scenarios
+
+            for name, fn in scenarios:
+                elapsed, peak_mb, size = measure(fn)
+                print(f'{rows:>8}  {name:<22} {elapsed:>8.2f}s {peak_mb:>11.1f} MB {size / 1024 / 1024:>7.1f} MB')
+            print()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
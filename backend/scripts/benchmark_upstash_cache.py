@@ -0,0 +1,158 @@
+"""
+Benchmark do UpstashRedisCache contra um servidor REST local que imita o Upstash
+
+Compara requisições por segundo com e sem pipeline, L1 e write-behind.
+Cada "requisição" simula o que uma chamada da API faz no cache:
+1 escrita de presença, 1 get_many de gerações (3 chaves) e 1 get do corpo em cache.
+
+Uso:
+    python scripts/benchmark_upstash_cache.py --latency 20 --requests 300
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from django.conf import settings
+
+settings.configure()
+
+from django.core.cache.backends.base import BaseCache  # noqa: E402
+from core.cache_backend import UpstashRedisCache  # noqa: E402
+
+
+class FakeUpstashHandler(BaseHTTPRequestHandler):
+    """Implementa o subconjunto da API REST do Upstash usado pelo backend"""
+
+    store = {}
+    lock = threading.Lock()
+    latency = 0.0
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.latency)
+
+        with self.lock:
+            FakeUpstashHandler.requests += 1
+            if self.path.rstrip('/').endswith('pipeline'):
+                payload = [{'result': self.run(command)} for command in body]
+            else:
+                payload = {'result': self.run(body)}
+
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def encode(self, value):
+        if isinstance(value, str) and value != 'OK':
+            return base64.b64encode(value.encode()).decode()
+        if isinstance(value, list):
+            return [self.encode(v) for v in value]
+        return value
+
+    def run(self, command):
+        name, args = command[0].upper(), command[1:]
+        if name == 'SET':
+            if 'NX' in args and args[0] in self.store:
+                return None
+            self.store[args[0]] = str(args[1])
+            return 'OK'
+        if name == 'GET':
+            return self.encode(self.store.get(args[0]))
+        if name == 'MGET':
+            return self.encode([self.store.get(k) for k in args])
+        if name == 'DEL':
+            return sum(1 for k in args if self.store.pop(k, None) is not None)
+        if name == 'INCRBY':
+            self.store[args[0]] = str(int(self.store.get(args[0], 0)) + int(args[1]))
+            return int(self.store[args[0]])
+        if name == 'EXISTS':
+            return sum(1 for k in args if k in self.store)
+        if name == 'FLUSHDB':
+            self.store.clear()
+            return 'OK'
+        raise ValueError(f'Comando não suportado: {name}')
+
+
+def start_server(latency_ms):
+    FakeUpstashHandler.latency = latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeUpstashHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def make_cache(url, **options):
+    return UpstashRedisCache(url, {'OPTIONS': {'TOKEN': 'benchmark', **options}})
+
+
+def simulate_request(cache, n):
+    user_id = n % 50
+    cache.set(f'user_online:{user_id}', {'user_id': user_id, 'last_seen': '/api/'}, 300)
+    cache.get_many(['gen:products', 'gen:customers', 'gen:sales'])
+    cache.get('api_cache:body')
+
+
+def run_scenario(name, cache, total, workers):
+    cache.set_many({'gen:products': 1, 'gen:customers': 1, 'gen:sales': 1, 'api_cache:body': 'x' * 2000})
+    FakeUpstashHandler.requests = 0
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda n: simulate_request(cache, n), range(total)))
+    elapsed = time.perf_counter() - start
+
+    # Aguarda a fila write-behind esvaziar para contar as chamadas REST reais
+    time.sleep(0.5)
+    print(f'{name:<38} {total / elapsed:>8.1f} req/s   {FakeUpstashHandler.requests:>5} chamadas REST')
+
+
+def run_batch(name, fn, url, keys):
+    cache = make_cache(url, L1_TIMEOUT=0)
+    data = {f'k{i}': i for i in range(keys)}
+    FakeUpstashHandler.requests = 0
+    start = time.perf_counter()
+    fn(cache, data)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f'{name:<38} {elapsed:>8.1f} ms       {FakeUpstashHandler.requests:>5} chamadas REST')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--latency', type=float, default=20, help='latência simulada por chamada (ms)')
+    parser.add_argument('--requests', type=int, default=300, help='requisições simuladas por cenário')
+    parser.add_argument('--workers', type=int, default=4, help='threads concorrentes (workers do gunicorn)')
+    parser.add_argument('--keys', type=int, default=50, help='chaves nos testes de set_many/delete_many')
+    args = parser.parse_args()
+
+    server, url = start_server(args.latency)
+    print(f'Servidor REST falso em {url} (latência {args.latency:.0f} ms)\n')
+
+    run_scenario('sem L1, escrita síncrona', make_cache(url, L1_TIMEOUT=0), args.requests, args.workers)
+    run_scenario('L1 (1s)', make_cache(url, L1_TIMEOUT=1), args.requests, args.workers)
+    run_scenario('L1 (1s) + write-behind', make_cache(url, L1_TIMEOUT=1, WRITE_BEHIND=True), args.requests, args.workers)
+
+    print()
+    run_batch('set_many em loop (BaseCache)', lambda c, d: BaseCache.set_many(c, d), url, args.keys)
+    run_batch('set_many com pipeline', lambda c, d: c.set_many(d), url, args.keys)
+    run_batch('delete_many em loop (BaseCache)', lambda c, d: BaseCache.delete_many(c, list(d)), url, args.keys)
+    run_batch('delete_many com DEL único', lambda c, d: c.delete_many(list(d)), url, args.keys)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
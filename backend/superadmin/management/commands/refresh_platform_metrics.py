@@ -0,0 +1,20 @@
+"""
+Command para recalcular as métricas do dashboard do super admin
+Grava o snapshot PlatformMetrics e o TenantUsageStats do mês de cada tenant
+(incluindo as chamadas de API acumuladas no cache). Deve ser executado
+periodicamente via cron job ou scheduler (ex.: a cada 5 minutos)
+"""
+from django.core.management.base import BaseCommand
+from superadmin.metrics import refresh
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as métricas do dashboard do super admin e o uso mensal dos tenants'
+
+    def handle(self, *args, **options):
+        metrics = refresh()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ Métricas da plataforma recalculadas: {metrics.total_tenants} empresas '
+            f'({metrics.computed_at:%d/%m/%Y %H:%M})'
+        ))
@@ -0,0 +1,156 @@
+"""
+Métricas da plataforma (dashboard do super admin)
+
+O dashboard lê um snapshot (PlatformMetrics) em vez de rodar as contagens
+globais a cada acesso. refresh() recalcula tudo com agregações condicionais
+(uma query por tabela) e grava, no mesmo passo, o TenantUsageStats do mês de
+cada tenant com consultas agrupadas por tenant e um único upsert.
+
+Executado pelo command refresh_platform_metrics (cron, ex.: a cada 5 minutos).
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from core.models import Tenant, User
+from customers.models import Customer
+from financial.models import CashFlow
+from scheduling.models import Appointment
+
+from . import usage
+from .models import PaymentHistory, PlatformMetrics, Subscription, SystemError, TenantUsageStats
+
+OPEN_ERRORS = ['new', 'investigating']
+
+# Campos de TenantUsageStats recalculados (storage_used_mb é mantido)
+USAGE_FIELDS = [
+    'total_users', 'active_users', 'total_appointments', 'completed_appointments',
+    'total_revenue', 'total_customers', 'new_customers', 'api_calls',
+]
+
+
+def _month_bounds(month):
+    """Início do mês e do mês seguinte como datetimes no fuso atual"""
+    next_month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(month, time.min), tz),
+        timezone.make_aware(datetime.combine(next_month, time.min), tz),
+    )
+
+
+def dashboard_figures(today):
+    """Números do dashboard: uma query por tabela"""
+    first_day_month = today.replace(day=1)
+    first_day_year = today.replace(month=1, day=1)
+    month_start, _ = _month_bounds(first_day_month)
+    zero = Decimal('0')
+
+    subscriptions = Subscription.objects.aggregate(
+        active_tenants=Count('id', filter=Q(status='active')),
+        trial_tenants=Count('id', filter=Q(status='trial')),
+        suspended_tenants=Count('id', filter=Q(status='suspended')),
+    )
+    paid = Q(status='paid')
+    pending = Q(status='pending')
+    payments = PaymentHistory.objects.aggregate(
+        total_revenue_month=Sum('amount', filter=paid & Q(reference_month__gte=first_day_month), default=zero),
+        total_revenue_year=Sum('amount', filter=paid & Q(reference_month__gte=first_day_year), default=zero),
+        pending_payments=Count('id', filter=pending),
+        overdue_payments=Count('id', filter=pending & Q(reference_month__lt=today)),
+    )
+    errors = SystemError.objects.filter(status__in=OPEN_ERRORS).aggregate(
+        critical_errors=Count('id', filter=Q(severity='critical')),
+        unresolved_errors=Count('id'),
+    )
+
+    return {
+        'total_tenants': Tenant.objects.count(),
+        **subscriptions,
+        **payments,
+        **errors,
+        'total_users': User.objects.filter(is_active=True).count(),
+        'total_appointments_month': Appointment.objects.filter(start_time__gte=month_start).count(),
+    }
+
+
+def usage_rows(month):
+    """TenantUsageStats do mês para todos os tenants (não salvos)"""
+    start, end = _month_bounds(month)
+    in_month = Q(start_time__gte=start, start_time__lt=end)
+    rows = {
+        str(tenant_id): TenantUsageStats(tenant_id=tenant_id, month=month)
+        for tenant_id in Tenant.objects.values_list('id', flat=True)
+    }
+
+    def fill(queryset, **aggregates):
+        for item in queryset.order_by().values('tenant_id').annotate(**aggregates):
+            row = rows.get(str(item.pop('tenant_id')))
+            if row is not None:
+                for field, value in item.items():
+                    setattr(row, field, value)
+
+    fill(
+        User.objects.filter(tenant__isnull=False),
+        total_users=Count('id'),
+        active_users=Count('id', filter=Q(last_login__gte=start, last_login__lt=end)),
+    )
+    fill(
+        Appointment.objects.filter(in_month),
+        total_appointments=Count('id'),
+        completed_appointments=Count('id', filter=Q(status='concluido')),
+    )
+    fill(
+        CashFlow.objects.filter(date__gte=month, date__lt=end.date()),
+        total_revenue=Sum('total_revenue'),
+    )
+    fill(
+        Customer.objects.all(),
+        total_customers=Count('id'),
+        new_customers=Count('id', filter=Q(created_at__gte=start, created_at__lt=end)),
+    )
+
+    for tenant_id, count in usage.api_calls(month.strftime('%Y-%m')).items():
+        row = rows.get(tenant_id)
+        if row is not None:
+            row.api_calls = count
+    return list(rows.values())
+
+
+def close_api_calls(month):
+    """Atualiza só as chamadas de API de um mês já fechado (enviadas após o último refresh)"""
+    totals = usage.api_calls(month.strftime('%Y-%m'))
+    if not totals:
+        return
+    rows = []
+    for row in TenantUsageStats.objects.filter(month=month, tenant_id__in=list(totals)).only('tenant_id', 'api_calls'):
+        if row.api_calls != totals[str(row.tenant_id)]:
+            row.api_calls = totals[str(row.tenant_id)]
+            rows.append(row)
+    TenantUsageStats.objects.bulk_update(rows, ['api_calls'], batch_size=500)
+
+
+def refresh(now=None):
+    """Recalcula o snapshot do dashboard e o TenantUsageStats do mês; retorna o PlatformMetrics"""
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    month = today.replace(day=1)
+    previous_month = (month - timedelta(days=1)).replace(day=1)
+
+    figures = dashboard_figures(today)
+    rows = usage_rows(month)
+
+    with transaction.atomic():
+        TenantUsageStats.objects.bulk_create(
+            rows,
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['tenant', 'month'],
+            update_fields=USAGE_FIELDS + ['updated_at'],
+        )
+        close_api_calls(previous_month)
+        metrics, _ = PlatformMetrics.objects.update_or_create(pk=1, defaults={**figures, 'computed_at': now})
+    return metrics
@@ -0,0 +1,30 @@
+"""
+Middleware para contar as chamadas de API por tenant
+Os contadores ficam em memória e vão ao cache em lote (ver superadmin.usage)
+"""
+
+import logging
+
+from django.utils.deprecation import MiddlewareMixin
+
+from . import usage
+
+logger = logging.getLogger(__name__)
+
+
+class ApiUsageMiddleware(MiddlewareMixin):
+    """Conta as requisições /api/ de usuários autenticados com tenant"""
+
+    def process_response(self, request, response):
+        # Roda na resposta: o usuário do JWT já foi resolvido
+        user = getattr(request, 'user', None)
+        tenant_id = getattr(user, 'tenant_id', None)
+
+        if tenant_id and request.path.startswith('/api/'):
+            try:
+                usage.record_api_call(tenant_id)
+            except Exception as e:
+                # Contagem de uso nunca deve derrubar a requisição
+                logger.error(f"API usage counter error: {e}")
+
+        return response
@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("superadmin", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlatformMetrics",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "total_tenants",
+                    models.IntegerField(default=0, verbose_name="Total de Empresas"),
+                ),
+                (
+                    "active_tenants",
+                    models.IntegerField(default=0, verbose_name="Assinaturas Ativas"),
+                ),
+                (
+                    "trial_tenants",
+                    models.IntegerField(default=0, verbose_name="Em Teste"),
+                ),
+                (
+                    "suspended_tenants",
+                    models.IntegerField(default=0, verbose_name="Suspensas"),
+                ),
+                (
+                    "total_revenue_month",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Receita do Mês",
+                    ),
+                ),
+                (
+                    "total_revenue_year",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        max_digits=12,
+                        verbose_name="Receita do Ano",
+                    ),
+                ),
+                (
+                    "pending_payments",
+                    models.IntegerField(default=0, verbose_name="Pagamentos Pendentes"),
+                ),
+                (
+                    "overdue_payments",
+                    models.IntegerField(default=0, verbose_name="Pagamentos em Atraso"),
+                ),
+                (
+                    "critical_errors",
+                    models.IntegerField(default=0, verbose_name="Erros Críticos"),
+                ),
+                (
+                    "unresolved_errors",
+                    models.IntegerField(default=0, verbose_name="Erros Não Resolvidos"),
+                ),
+                (
+                    "total_users",
+                    models.IntegerField(default=0, verbose_name="Usuários Ativos"),
+                ),
+                (
+                    "total_appointments_month",
+                    models.IntegerField(default=0, verbose_name="Agendamentos do Mês"),
+                ),
+                ("computed_at", models.DateTimeField(verbose_name="Calculado em")),
+            ],
+            options={
+                "verbose_name": "Métricas da Plataforma",
+                "verbose_name_plural": "Métricas da Plataforma",
+            },
+        ),
+    ]
@@ -422,3 +422,36 @@ class TenantUsageStats(models.Model):
     
     def __str__(self):
         return f"{self.tenant.company_name} - {self.month.strftime('%m/%Y')}"
+
+
+class PlatformMetrics(models.Model):
+    """
+    Snapshot dos números do dashboard do super admin (uma única linha)
+    Recalculado pelo command refresh_platform_metrics (ver superadmin.metrics)
+    """
+    
+    total_tenants = models.IntegerField('Total de Empresas', default=0)
+    active_tenants = models.IntegerField('Assinaturas Ativas', default=0)
+    trial_tenants = models.IntegerField('Em Teste', default=0)
+    suspended_tenants = models.IntegerField('Suspensas', default=0)
+    
+    total_revenue_month = models.DecimalField('Receita do Mês', max_digits=12, decimal_places=2, default=0)
+    total_revenue_year = models.DecimalField('Receita do Ano', max_digits=12, decimal_places=2, default=0)
+    
+    pending_payments = models.IntegerField('Pagamentos Pendentes', default=0)
+    overdue_payments = models.IntegerField('Pagamentos em Atraso', default=0)
+    
+    critical_errors = models.IntegerField('Erros Críticos', default=0)
+    unresolved_errors = models.IntegerField('Erros Não Resolvidos', default=0)
+    
+    total_users = models.IntegerField('Usuários Ativos', default=0)
+    total_appointments_month = models.IntegerField('Agendamentos do Mês', default=0)
+    
+    computed_at = models.DateTimeField('Calculado em')
+    
+    class Meta:
+        verbose_name = 'Métricas da Plataforma'
+        verbose_name_plural = 'Métricas da Plataforma'
+    
+    def __str__(self):
+        return f"Métricas da Plataforma - {self.computed_at:%d/%m/%Y %H:%M}"
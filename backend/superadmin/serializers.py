@@ -108,6 +108,8 @@ class DashboardStatsSerializer(serializers.Serializer):
     
     total_users = serializers.IntegerField()
     total_appointments_month = serializers.IntegerField()
+    
+    computed_at = serializers.DateTimeField()
 
 
 class RevenueByPlanSerializer(serializers.Serializer):
@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import Tenant, User
+from customers.models import Customer
+
+from . import usage
+from .metrics import refresh
+from .models import PaymentHistory, PlatformMetrics, Subscription, SystemError, TenantUsageStats
+
+
+class PlatformMetricsTestCase(TestCase):
+    """Testa o snapshot do dashboard do super admin e o uso mensal por tenant"""
+
+    def setUp(self):
+        usage.reset()
+        self.addCleanup(usage.reset)
+        self.tenant = Tenant.objects.create(name='Barbearia A', subscription_status='ACTIVE')
+        self.other = Tenant.objects.create(name='Barbearia B', subscription_status='TRIAL')
+        self.user = User.objects.create_user(
+            email='admin@test.com', password='testpass123', name='Admin', tenant=self.tenant, role='admin'
+        )
+        self.superadmin = User.objects.create_user(
+            email='root@test.com', password='testpass123', name='Root', role='superadmin'
+        )
+        subscription = Subscription.objects.create(tenant=self.tenant, status='active')
+        Subscription.objects.create(tenant=self.other, status='trial')
+        today = timezone.localdate()
+        PaymentHistory.objects.create(
+            subscription=subscription, amount=Decimal('99.90'), status='paid', reference_month=today.replace(day=1)
+        )
+        PaymentHistory.objects.create(
+            subscription=subscription, amount=Decimal('99.90'), status='pending',
+            reference_month=today.replace(day=1) - timedelta(days=40)
+        )
+        SystemError.objects.create(error_type='api', severity='critical', message='Falha')
+        Customer.objects.create(tenant=self.tenant, name='Cliente', phone='11987654321')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.superadmin)
+
+    def test_refresh_computes_dashboard_and_usage(self):
+        metrics = refresh()
+        self.assertEqual(
+            (metrics.total_tenants, metrics.active_tenants, metrics.trial_tenants),
+            (2, 1, 1)
+        )
+        self.assertEqual(metrics.total_revenue_month, Decimal('99.90'))
+        self.assertEqual((metrics.pending_payments, metrics.overdue_payments), (1, 1))
+        self.assertEqual((metrics.critical_errors, metrics.unresolved_errors), (1, 1))
+
+        stats = TenantUsageStats.objects.get(tenant=self.tenant)
+        self.assertEqual((stats.total_users, stats.total_customers, stats.new_customers), (1, 1, 1))
+        self.assertEqual(TenantUsageStats.objects.get(tenant=self.other).total_users, 0)
+
+        # Novo refresh atualiza as mesmas linhas e mantém o armazenamento
+        TenantUsageStats.objects.filter(tenant=self.tenant).update(storage_used_mb=12.5)
+        Customer.objects.create(tenant=self.tenant, name='Outro', phone='11900000000')
+        refresh()
+        stats = TenantUsageStats.objects.get(tenant=self.tenant)
+        self.assertEqual((stats.total_customers, stats.storage_used_mb), (2, 12.5))
+        self.assertEqual(TenantUsageStats.objects.count(), 2)
+        self.assertEqual(PlatformMetrics.objects.count(), 1)
+
+    @override_settings(USAGE_FLUSH_INTERVAL=0)
+    def test_api_calls_are_counted_and_flushed(self):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with mock.patch.object(usage.flusher, 'notify') as notify:
+            for _ in range(3):
+                client.get('/api/customers/')
+        self.assertEqual(notify.call_count, 3)
+        refresh()
+        self.assertEqual(TenantUsageStats.objects.get(tenant=self.tenant).api_calls, 3)
+        self.assertEqual(TenantUsageStats.objects.get(tenant=self.other).api_calls, 0)
+
+    def test_buffered_calls_wait_for_the_interval(self):
+        month = usage.month_key(1030.0)
+        with override_settings(USAGE_FLUSH_INTERVAL=60), \
+                mock.patch.object(usage, 'get_store', return_value=usage._local_store) as get_store, \
+                mock.patch.object(usage.flusher, 'notify', side_effect=usage.flush) as notify:
+            usage.record_api_call(self.tenant.id, now=1000.0)
+            usage.record_api_call(self.tenant.id, now=1030.0)
+            # O envio sai da requisição: só o primeiro (intervalo vencido) acordou a thread
+            self.assertEqual(notify.call_count, 1)
+            self.assertEqual(get_store.call_count, 1)
+            usage.record_api_call(self.tenant.id, now=1061.0)
+            self.assertEqual(notify.call_count, 2)
+        self.assertEqual(usage.api_calls(month), {str(self.tenant.id): 3})
+
+    def test_month_follows_project_timezone(self):
+        # 31/10 23:30 em São Paulo já é 01/11 no UTC do container
+        late_night = timezone.make_aware(datetime(2026, 10, 31, 23, 30)).timestamp()
+        self.assertEqual(usage.month_key(late_night), '2026-10')
+
+    def test_dashboard_reads_snapshot(self):
+        response = self.client.get('/api/superadmin/dashboard/stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_tenants'], 2)
+        self.assertIsNotNone(response.json()['computed_at'])
+
+        Tenant.objects.create(name='Barbearia C', subscription_status='TRIAL')
+        self.assertEqual(self.client.get('/api/superadmin/dashboard/stats/').json()['total_tenants'], 2)
+        self.assertEqual(
+            self.client.get('/api/superadmin/dashboard/stats/', {'refresh': '1'}).json()['total_tenants'], 3
+        )
@@ -0,0 +1,131 @@
+"""
+Contadores de uso por tenant (chamadas de API)
+
+Cada processo acumula as chamadas em memória; a cada USAGE_FLUSH_INTERVAL
+segundos a requisição só acorda uma thread de background, que envia os totais
+ao cache (um HINCRBY por tenant, em um único envio), então a requisição nunca
+espera o Redis. O mês é o do fuso do projeto (TIME_ZONE), o mesmo usado na
+leitura pelo superadmin.metrics.
+
+- Upstash Redis: um hash por mês (usage:api_calls:{AAAA-MM}), tenant -> total
+- Outros backends (LocMemCache em dev/testes): memória do processo
+
+O command refresh_platform_metrics copia os totais do mês para
+TenantUsageStats.api_calls (valor absoluto, então rodar de novo não duplica).
+Chamadas ainda não enviadas quando o processo termina são perdidas.
+"""
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+from core.cache_backend import UpstashRedisCache
+from core.workers import BackgroundWorker
+
+API_CALLS_KEY = 'usage:api_calls:{month}'
+# Mantém o mês anterior disponível para o fechamento
+API_CALLS_RETENTION = 62 * 24 * 3600
+
+
+def month_key(timestamp):
+    """'AAAA-MM' do timestamp no fuso do projeto (não no fuso do processo)"""
+    return timezone.localdate(datetime.fromtimestamp(timestamp, dt_timezone.utc)).strftime('%Y-%m')
+
+
+class RedisUsageStore:
+    """Hashes no Upstash Redis"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.client = backend.client
+
+    def add(self, counts):
+        commands = []
+        for (month, tenant_id), count in counts.items():
+            key = API_CALLS_KEY.format(month=month)
+            commands.append(['HINCRBY', key, str(tenant_id), count])
+            commands.append(['EXPIRE', key, API_CALLS_RETENTION])
+        self.backend.send_commands(commands)
+
+    def totals(self, month):
+        values = self.client.hgetall(API_CALLS_KEY.format(month=month)) or {}
+        return {tenant_id: int(count) for tenant_id, count in values.items()}
+
+
+class LocalUsageStore:
+    """Equivalente em memória do processo (dev/testes)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = Counter()
+
+    def add(self, counts):
+        with self._lock:
+            self._totals.update(counts)
+
+    def totals(self, month):
+        with self._lock:
+            return {str(tenant_id): count for (key, tenant_id), count in self._totals.items() if key == month}
+
+    def clear(self):
+        with self._lock:
+            self._totals.clear()
+
+
+_local_store = LocalUsageStore()
+
+# Buffer do processo: (mês, tenant_id) -> chamadas ainda não enviadas
+_pending = Counter()
+_last_flush = [0.0]
+_pending_lock = threading.Lock()
+
+
+def get_store():
+    """Redis quando o cache padrão é o Upstash; senão, memória do processo"""
+    backend = caches['default']
+    if isinstance(backend, UpstashRedisCache) and backend.client:
+        return RedisUsageStore(backend)
+    return _local_store
+
+
+def record_api_call(tenant_id, now=None):
+    """Conta uma chamada de API do tenant; acorda o envio em background se passou o intervalo"""
+    now = time.time() if now is None else now
+    with _pending_lock:
+        _pending[(month_key(now), tenant_id)] += 1
+        due = now - _last_flush[0] >= settings.USAGE_FLUSH_INTERVAL
+        if due:
+            _last_flush[0] = now
+    if due:
+        flusher.notify()
+
+
+def flush():
+    """Envia as chamadas acumuladas no processo ao cache"""
+    with _pending_lock:
+        counts = dict(_pending)
+        _pending.clear()
+    if counts:
+        get_store().add(counts)
+
+
+flusher = BackgroundWorker('api-usage-flush', lambda: flush())
+
+
+def api_calls(month):
+    """Total de chamadas por tenant no mês ('AAAA-MM'): {tenant_id: total}"""
+    # Inclui o que este processo ainda não enviou
+    flush()
+    return get_store().totals(month)
+
+
+def reset():
+    """Limpa o estado local (usado nos testes)"""
+    with _pending_lock:
+        _pending.clear()
+        _last_flush[0] = 0.0
+    _local_store.clear()
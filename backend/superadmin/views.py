@@ -6,9 +6,9 @@ from django.db.models import Count, Sum, Q, F
 from django.utils import timezone
 from datetime import timedelta, date
 
-from .models import Subscription, PaymentHistory, SystemError, TenantUsageStats
-from core.models import Tenant, User
-from scheduling.models import Appointment
+from .metrics import refresh as refresh_platform_metrics
+from .models import Subscription, PaymentHistory, PlatformMetrics, SystemError, TenantUsageStats
+from core.models import Tenant
 from .serializers import (
     TenantSerializer,
     SubscriptionSerializer,
@@ -287,67 +287,16 @@ class DashboardViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
-        """Estatísticas gerais do dashboard"""
-        today = timezone.now().date()
-        first_day_month = today.replace(day=1)
-        first_day_year = today.replace(month=1, day=1)
-        
-        # Estatísticas de tenants
-        total_tenants = Tenant.objects.count()
-        active_subscriptions = Subscription.objects.filter(status='active').count()
-        trial_subscriptions = Subscription.objects.filter(status='trial').count()
-        suspended_subscriptions = Subscription.objects.filter(status='suspended').count()
-        
-        # Receita
-        revenue_month = PaymentHistory.objects.filter(
-            reference_month__gte=first_day_month,
-            status='paid'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        revenue_year = PaymentHistory.objects.filter(
-            reference_month__gte=first_day_year,
-            status='paid'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Pagamentos
-        pending_payments = PaymentHistory.objects.filter(status='pending').count()
-        overdue_payments = PaymentHistory.objects.filter(
-            status='pending',
-            reference_month__lt=today
-        ).count()
-        
-        # Erros
-        critical_errors = SystemError.objects.filter(
-            severity='critical',
-            status__in=['new', 'investigating']
-        ).count()
-        
-        unresolved_errors = SystemError.objects.filter(
-            status__in=['new', 'investigating']
-        ).count()
-        
-        # Usuários e agendamentos
-        total_users = User.objects.filter(is_active=True).count()
-        total_appointments_month = Appointment.objects.filter(
-            start_time__gte=first_day_month
-        ).count()
-        
-        data = {
-            'total_tenants': total_tenants,
-            'active_tenants': active_subscriptions,
-            'trial_tenants': trial_subscriptions,
-            'suspended_tenants': suspended_subscriptions,
-            'total_revenue_month': revenue_month,
-            'total_revenue_year': revenue_year,
-            'pending_payments': pending_payments,
-            'overdue_payments': overdue_payments,
-            'critical_errors': critical_errors,
-            'unresolved_errors': unresolved_errors,
-            'total_users': total_users,
-            'total_appointments_month': total_appointments_month,
-        }
+        """
+        Estatísticas gerais do dashboard
+        Lidas do snapshot PlatformMetrics (refresh_platform_metrics); computed_at indica
+        quando foram calculadas. ?refresh=1 recalcula na hora.
+        """
+        metrics = PlatformMetrics.objects.filter(pk=1).first()
+        if metrics is None or request.query_params.get('refresh') in ('1', 'true'):
+            metrics = refresh_platform_metrics()
         
-        serializer = DashboardStatsSerializer(data)
+        serializer = DashboardStatsSerializer(metrics)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
@@ -389,7 +338,17 @@ class DashboardViewSet(viewsets.ViewSet):
         Métricas do Sentry
         GET /api/superadmin/dashboard/sentry_metrics/
         """
+        from core import external_api
         from core.sentry_integration import sentry_client
         
-        summary = sentry_client.get_dashboard_summary()
-        return Response(summary)
+        if not sentry_client.auth_token:
+            return Response(sentry_client.get_dashboard_summary())
+        
+        # Servido do cache; atualizado em background quando passa do TTL
+        snapshot = external_api.get('sentry.summary')
+        if snapshot['data'] is None:
+            return Response({
+                'is_configured': True,
+                'message': snapshot['error'] or 'Dados do Sentry ainda não disponíveis',
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({**snapshot['data'], 'stale': snapshot['stale'], 'fetched_at': snapshot['fetched_at']})
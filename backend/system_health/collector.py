@@ -0,0 +1,267 @@
+"""
+Coletor de métricas de infraestrutura por worker
+
+Substitui a amostragem dentro da requisição (dois cpu_percent(interval=0.1),
+só do worker que atendeu e só quando alguém abria a página). Cada processo
+roda uma thread daemon que, a cada HEALTH_SAMPLE_INTERVAL segundos, grava uma
+amostra com CPU, RSS e threads do processo, conexões abertas no banco,
+requisições atendidas no intervalo e um histograma de latência.
+
+As amostras ficam em um ring buffer:
+- Upstash Redis: lista health:samples (LPUSH + LTRIM), compartilhada pelos workers
+- Outros backends (LocMemCache em dev/testes): deque na memória do processo
+
+O endpoint só lê o buffer e agrega os workers por intervalo: CPU, RSS, threads
+e requisições são somados; p50/p95 vêm da soma dos histogramas de latência.
+A thread é iniciada na primeira requisição de cada processo
+(RequestMetricsMiddleware), então já roda depois do fork do gunicorn.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+import psutil
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+from core.cache_backend import UpstashRedisCache
+
+logger = logging.getLogger(__name__)
+
+# Limites superiores (ms) das faixas do histograma; a última faixa é "acima de 5000"
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+SAMPLES_KEY = 'health:samples'
+# Ex.: 8 workers x 1 hora a cada 15 s = 1920 amostras
+RING_SIZE = 4000
+
+
+class RequestStats:
+    """Requisições e histograma de latência do intervalo atual (por processo)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._count = 0
+        self._histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, duration_ms):
+        index = bisect_left(LATENCY_BUCKETS_MS, duration_ms)
+        with self._lock:
+            self._count += 1
+            self._histogram[index] += 1
+
+    def drain(self):
+        """Retorna (requisições, histograma) do intervalo e zera os contadores"""
+        with self._lock:
+            count, histogram = self._count, self._histogram
+            self._count = 0
+            self._histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        return count, histogram
+
+
+class RedisSampleStore:
+    """Lista no Upstash Redis"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.client = backend.client
+
+    def add(self, sample):
+        self.backend.send_commands([
+            ['LPUSH', SAMPLES_KEY, json.dumps(sample, separators=(',', ':'))],
+            ['LTRIM', SAMPLES_KEY, 0, RING_SIZE - 1],
+        ])
+
+    def recent(self, since):
+        samples = (json.loads(raw) for raw in self.client.lrange(SAMPLES_KEY, 0, RING_SIZE - 1) or [])
+        return [sample for sample in samples if sample['ts'] >= since]
+
+
+class LocalSampleStore:
+    """Equivalente em memória do processo (dev/testes)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=RING_SIZE)
+
+    def add(self, sample):
+        with self._lock:
+            self._samples.append(sample)
+
+    def recent(self, since):
+        with self._lock:
+            return [sample for sample in self._samples if sample['ts'] >= since]
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+
+_local_store = LocalSampleStore()
+request_stats = RequestStats()
+
+
+def get_store():
+    """Redis quando o cache padrão é o Upstash; senão, memória do processo"""
+    backend = caches['default']
+    if isinstance(backend, UpstashRedisCache) and backend.client:
+        return RedisSampleStore(backend)
+    return _local_store
+
+
+def db_connections():
+    """Conexões abertas no banco (PostgreSQL); None nos demais"""
+    connection = connections['default']
+    if connection.vendor != 'postgresql':
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT count(*) FROM pg_stat_activity WHERE datname = current_database()')
+        return cursor.fetchone()[0]
+
+
+class Sampler:
+    """
+    Thread daemon que grava uma amostra do processo a cada HEALTH_SAMPLE_INTERVAL
+    Iniciada sob demanda (e de novo após fork do processo)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._process = None
+        self._last_sample = None
+
+    @property
+    def worker(self):
+        return f'{socket.gethostname()}:{os.getpid()}'
+
+    def ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # Processo novo (ou fork): cpu_percent() mede a partir daqui
+            self._pid = os.getpid()
+            self._process = psutil.Process()
+            self._process.cpu_percent(None)
+            psutil.cpu_percent(None)
+            self._last_sample = time.time()
+            self._thread = threading.Thread(target=self._run, name='health-sampler', daemon=True)
+            self._thread.start()
+
+    def sample(self, now=None, include_db=True):
+        """Amostra do processo desde a anterior (não bloqueia)"""
+        now = time.time() if now is None else now
+        if self._process is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._process = psutil.Process()
+        count, histogram = request_stats.drain()
+        elapsed = max(now - (self._last_sample or now), 1e-6)
+        self._last_sample = now
+        memory = psutil.virtual_memory()
+
+        with self._process.oneshot():
+            sample = {
+                'ts': int(now),
+                'worker': self.worker,
+                'cpu': round(self._process.cpu_percent(None), 2),
+                'rss': self._process.memory_info().rss,
+                'threads': self._process.num_threads(),
+            }
+        sample.update({
+            'system_cpu': round(psutil.cpu_percent(None), 2),
+            'memory_total': memory.total,
+            'memory_available': memory.available,
+            'cpu_cores': psutil.cpu_count(),
+            'db_connections': db_connections() if include_db else None,
+            'requests': count,
+            'rate': round(count / elapsed, 3),
+            'latency': histogram,
+        })
+        return sample
+
+    def record(self, now=None, include_db=True):
+        sample = self.sample(now, include_db)
+        get_store().add(sample)
+        return sample
+
+    def _run(self):
+        while True:
+            time.sleep(settings.HEALTH_SAMPLE_INTERVAL)
+            try:
+                self.record()
+            except Exception as e:
+                logger.error(f"Erro ao coletar métricas: {e}")
+            finally:
+                # Conexões desta thread não passam pelo ciclo de request do Django
+                connections.close_all()
+
+
+sampler = Sampler()
+
+
+def percentile(histogram, fraction):
+    """Limite superior (ms) da faixa que contém o percentil; None sem requisições"""
+    total = sum(histogram)
+    if not total:
+        return None
+    target = fraction * total
+    running = 0
+    for index, count in enumerate(histogram):
+        running += count
+        if running >= target:
+            return LATENCY_BUCKETS_MS[min(index, len(LATENCY_BUCKETS_MS) - 1)]
+    return LATENCY_BUCKETS_MS[-1]
+
+
+def aggregate(samples, interval):
+    """
+    Agrupa as amostras de todos os workers por intervalo (mais antigo primeiro)
+    Em cada intervalo vale a última amostra de cada worker
+    """
+    buckets = {}
+    for sample in sorted(samples, key=lambda sample: sample['ts']):
+        buckets.setdefault(sample['ts'] // interval * interval, {})[sample['worker']] = sample
+
+    points = []
+    for bucket, workers in sorted(buckets.items()):
+        latest = max(workers.values(), key=lambda sample: sample['ts'])
+        histogram = [sum(column) for column in zip(*(sample['latency'] for sample in workers.values()))]
+        rss = sum(sample['rss'] for sample in workers.values())
+        points.append({
+            'timestamp': bucket,
+            'workers': len(workers),
+            'cpu_percent': round(sum(sample['cpu'] for sample in workers.values()), 2),
+            'rss_bytes': rss,
+            'memory_percent': round(rss / latest['memory_total'] * 100, 2),
+            'threads': sum(sample['threads'] for sample in workers.values()),
+            'db_connections': latest['db_connections'],
+            'requests': sum(sample['requests'] for sample in workers.values()),
+            'request_rate': round(sum(sample['rate'] for sample in workers.values()), 3),
+            'latency_p50_ms': percentile(histogram, 0.5),
+            'latency_p95_ms': percentile(histogram, 0.95),
+            'system_cpu_percent': latest['system_cpu'],
+            'system_memory_total': latest['memory_total'],
+            'system_memory_available': latest['memory_available'],
+            'cpu_cores': latest['cpu_cores'],
+        })
+    return points
+
+
+def history(minutes=60, now=None):
+    """Pontos agregados dos últimos `minutes` minutos"""
+    now = time.time() if now is None else now
+    interval = settings.HEALTH_SAMPLE_INTERVAL
+    return aggregate(get_store().recent(int(now) - minutes * 60), interval)
+
+
+def reset():
+    """Limpa o estado local (usado nos testes)"""
+    request_stats.drain()
+    _local_store.clear()
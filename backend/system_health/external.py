@@ -0,0 +1,180 @@
+"""
+Fontes externas dos painéis de saúde (ver core.external_api)
+Cada função busca e calcula os dados do painel; as views só leem o cache
+"""
+
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+from core import external_api
+from core.external_api import ExternalAPIError
+
+# Status dos monitores na API v2 do UptimeRobot
+UPTIME_STATUS = {
+    0: 'paused',
+    1: 'not_checked_yet',
+    2: 'up',
+    8: 'seems_down',
+    9: 'down'
+}
+
+
+def sentry_configured():
+    return all([settings.SENTRY_AUTH_TOKEN, settings.SENTRY_ORG_SLUG, settings.SENTRY_PROJECT_SLUG])
+
+
+def _sentry_get(path, params):
+    return external_api.fetch_json(
+        'GET',
+        f'{settings.SENTRY_API_URL}/projects/{settings.SENTRY_ORG_SLUG}/{settings.SENTRY_PROJECT_SLUG}/{path}',
+        headers={'Authorization': f'Bearer {settings.SENTRY_AUTH_TOKEN}'},
+        params=params
+    )
+
+
+@external_api.source('sentry.health', ttl=120)
+def fetch_sentry_health():
+    """Issues novos/recorrentes e crash-free aproximado das últimas 24h"""
+    now = timezone.now()
+    issues, stats = external_api.parallel(
+        lambda: _sentry_get('issues/', {'statsPeriod': '24h', 'query': 'is:unresolved'}),
+        lambda: _sentry_get('stats/', {
+            'stat': 'received',
+            'since': (now - timedelta(days=1)).timestamp(),
+            'until': now.timestamp(),
+            'resolution': '1d'
+        }),
+    )
+
+    new_issues = sum(1 for issue in issues if issue.get('isNew', False))
+    recurring_issues = len(issues) - new_issues
+
+    # Aproximação: (total de issues / total de eventos); com poucos eventos o crash-free é alto
+    crash_free_percentage = 99.5
+    total_events = sum(point[1] for point in stats) if stats else 0
+    if total_events > 0:
+        crash_free_percentage = max(95.0, 100 - (new_issues + recurring_issues) / total_events * 100)
+
+    org = settings.SENTRY_ORG_SLUG
+    project = settings.SENTRY_PROJECT_SLUG
+    return {
+        'crash_free_users_percentage': round(crash_free_percentage, 2),
+        'new_issues_count': new_issues,
+        'recurring_issues_count': recurring_issues,
+        'sentry_url': f'https://sentry.io/organizations/{org}/projects/{project}/'
+    }
+
+
+def _parse_sentry_date(value):
+    try:
+        date = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    return date if timezone.is_aware(date) else timezone.make_aware(date, dt_timezone.utc)
+
+
+@external_api.source('sentry.performance', ttl=120)
+def fetch_sentry_performance():
+    """Latência por intervalo de 5 minutos e transações mais lentas da última hora"""
+    now = timezone.now()
+    events = _sentry_get('events/', {
+        'statsPeriod': '1h',
+        'query': 'event.type:transaction',
+        'sort': '-timestamp'
+    })
+
+    # Datas do Sentry em ISO 8601 UTC; eventos sem data ficam fora do histórico
+    created = [(_parse_sentry_date(e.get('dateCreated')), e) for e in events]
+
+    latency_history = []
+    for i in range(12):
+        interval_start = now - timedelta(minutes=(i + 1) * 5)
+        interval_events = [
+            e for date, e in created
+            if date is not None and interval_start <= date < (interval_start + timedelta(minutes=5))
+        ]
+        latencies = [e.get('tags', {}).get('duration', 0) for e in interval_events]
+        latency_history.insert(0, {
+            'timestamp': interval_start.isoformat(),
+            'avg_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0
+        })
+
+    # Agrupa transações por endpoint
+    transactions_data = {}
+    total_duration = 0
+    error_count = 0
+    for event in events:
+        duration = float(event.get('tags', {}).get('duration', 0))
+        transactions_data.setdefault(event.get('title', 'Unknown'), []).append(duration)
+        total_duration += duration
+        if event.get('level') == 'error':
+            error_count += 1
+    total_count = len(events)
+
+    top_slow = []
+    for endpoint, durations in sorted(transactions_data.items(), key=lambda x: sum(x[1]) / len(x[1]), reverse=True)[:5]:
+        durations.sort()
+        p95_index = min(int(len(durations) * 0.95), len(durations) - 1)
+        p99_index = min(int(len(durations) * 0.99), len(durations) - 1)
+        top_slow.append({
+            'endpoint': endpoint,
+            'avg_duration_ms': round(sum(durations) / len(durations), 2),
+            'p95_duration_ms': round(durations[p95_index], 2),
+            'p99_duration_ms': round(durations[p99_index], 2)
+        })
+
+    return {
+        'top_slow_transactions': top_slow,
+        'avg_response_time_ms': round(total_duration / total_count, 2) if total_count > 0 else 0,
+        'error_rate_percentage': round((error_count / total_count) * 100, 2) if total_count > 0 else 0,
+        'latency_history': latency_history
+    }
+
+
+@external_api.source('uptime.status', ttl=60)
+def fetch_uptime_status():
+    """Status, uptime e último tempo de resposta do primeiro monitor do UptimeRobot"""
+    data = external_api.fetch_json('POST', f'{settings.UPTIMEROBOT_API_URL}/getMonitors', data={
+        'api_key': settings.UPTIMEROBOT_API_KEY,
+        'format': 'json',
+        'response_times': '1',  # Inclui tempos de resposta
+        'response_times_limit': '1',  # Apenas o último
+        'custom_uptime_ratios': '1-7-30'  # Uptime de 1, 7 e 30 dias
+    })
+
+    if data.get('stat') != 'ok':
+        raise ExternalAPIError(f'UptimeRobot retornou erro: {data.get("error", {}).get("message", "Unknown")}')
+
+    monitors = data.get('monitors', [])
+    if not monitors:
+        return {
+            'status': 'no_monitors',
+            'uptime_percentage': 0,
+            'response_time_ms': 0,
+            'last_check': timezone.now().isoformat(),
+            'message': 'Nenhum monitor configurado no UptimeRobot'
+        }
+
+    # Pega o primeiro monitor (pode ser customizado para buscar um específico)
+    monitor = monitors[0]
+    ratios = [float(ratio) for ratio in monitor.get('custom_uptime_ratios', ['0', '0', '0'])]
+    uptime_30d = ratios[2] if len(ratios) > 2 else 0
+
+    response_times = monitor.get('response_times', [])
+    last_check_timestamp = monitor.get('last_check_datetime')
+
+    return {
+        'status': UPTIME_STATUS.get(monitor.get('status'), 'unknown'),
+        'uptime_percentage': round(uptime_30d, 2),
+        'response_time_ms': response_times[0].get('value', 0) if response_times else 0,
+        'last_check': (
+            datetime.fromtimestamp(last_check_timestamp, dt_timezone.utc) if last_check_timestamp else timezone.now()
+        ).isoformat(),
+        'monitor_name': monitor.get('friendly_name', 'Unknown'),
+        'monitor_url': monitor.get('url', ''),
+        'uptime_1d': ratios[0] if len(ratios) > 0 else 0,
+        'uptime_7d': ratios[1] if len(ratios) > 1 else 0,
+        'uptime_30d': uptime_30d
+    }
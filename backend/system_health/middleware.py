@@ -1,32 +1,53 @@
 """
-Middleware para rastrear usuários online
-Atualiza uma chave no Redis com TTL de 5 minutos para cada usuário autenticado
+Middlewares do system_health
+- RequestMetricsMiddleware: latência e volume de requisições (ver system_health.collector)
+- OnlineUsersMiddleware: heartbeat no sorted set de presença (ver system_health.presence)
 """
 
-from django.core.cache import cache
+import logging
+import time
+
 from django.utils.deprecation import MiddlewareMixin
 
+from . import collector, presence
 
-class OnlineUsersMiddleware(MiddlewareMixin):
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware(MiddlewareMixin):
     """
-    Middleware que marca usuários autenticados como online no Redis
-    A chave expira automaticamente após 5 minutos de inatividade
+    Mede a duração de cada requisição no histograma do processo
+    Também garante a thread de amostragem rodando neste worker (após o fork)
     """
-    
+
     def process_request(self, request):
-        # Só rastreia usuários autenticados
-        if request.user and request.user.is_authenticated:
-            # Cria uma chave única para o usuário
-            key = f'user_online:{request.user.id}'
-            
-            # Define a chave no Redis com TTL de 5 minutos (300 segundos)
-            # Cada requisição renova o TTL
-            cache.set(key, {
-                'user_id': request.user.id,
-                'username': request.user.username,
-                'email': request.user.email,
-                'tenant': getattr(request.user, 'tenant_id', None),
-                'last_seen': str(request.path),
-            }, timeout=300)  # 5 minutos
-        
-        return None
+        request._metrics_start = time.perf_counter()
+        collector.sampler.ensure_started()
+
+    def process_response(self, request, response):
+        start = getattr(request, '_metrics_start', None)
+        if start is not None:
+            collector.request_stats.record((time.perf_counter() - start) * 1000)
+        return response
+
+
+class OnlineUsersMiddleware(MiddlewareMixin):
+    """
+    Middleware que marca usuários autenticados como online
+    O heartbeat é limitado a um por usuário a cada PRESENCE_HEARTBEAT_INTERVAL
+    segundos em cada processo, então a maioria das requisições não toca o Redis
+    """
+
+    def process_response(self, request, response):
+        # Roda na resposta: o DRF só autentica o JWT dentro da view
+        # e então atualiza request.user da requisição original
+        user = getattr(request, 'user', None)
+
+        if user is not None and user.is_authenticated:
+            try:
+                presence.heartbeat(user.id)
+            except Exception as e:
+                # Presença nunca deve derrubar a requisição
+                logger.error(f"Presence heartbeat error: {e}")
+
+        return response
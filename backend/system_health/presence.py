@@ -0,0 +1,192 @@
+"""
+Presença de usuários online
+
+Substitui as chaves user_online:{id} (uma escrita no Upstash por requisição
+e contagem via KEYS) por um único sorted set:
+- Membro = user_id, score = timestamp do último heartbeat
+- Heartbeat no máximo a cada PRESENCE_HEARTBEAT_INTERVAL segundos por usuário e processo
+- Online = ZCOUNT na janela de 5 minutos; ZREMRANGEBYSCORE remove quem saiu
+- Snapshots a cada 5 minutos alimentam o histórico (users_history)
+
+Com o UpstashRedisCache os dados ficam no Redis; com outros backends
+(LocMemCache em dev/testes) ficam em memória do processo.
+"""
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+
+from core.cache_backend import UpstashRedisCache
+
+# Usuário é considerado online se teve heartbeat nos últimos 5 minutos
+ONLINE_WINDOW = 300
+SNAPSHOT_INTERVAL = 300
+HISTORY_RETENTION = 24 * 3600
+
+ONLINE_KEY = 'presence:online'
+HISTORY_KEY = 'presence:history'
+SNAPSHOT_LOCK_KEY = 'presence:snapshot:{bucket}'
+
+
+class RedisPresenceStore:
+    """Sorted sets no Upstash Redis"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.client = backend.client
+
+    def touch(self, user_id, timestamp):
+        # Fire-and-forget: vai para o write-behind quando habilitado
+        self.backend.send_commands([['ZADD', ONLINE_KEY, timestamp, str(user_id)]])
+
+    def count(self, since):
+        pipeline = self.client.pipeline()
+        pipeline.execute(['ZREMRANGEBYSCORE', ONLINE_KEY, '-inf', f'({since}'])
+        pipeline.execute(['ZCOUNT', ONLINE_KEY, since, '+inf'])
+        return int(pipeline.exec()[1] or 0)
+
+    def claim_snapshot(self, bucket):
+        lock_key = SNAPSHOT_LOCK_KEY.format(bucket=bucket)
+        return bool(self.client.set(lock_key, 1, nx=True, ex=SNAPSHOT_INTERVAL * 2))
+
+    def add_snapshot(self, bucket, count):
+        pipeline = self.client.pipeline()
+        pipeline.execute(['ZADD', HISTORY_KEY, bucket, f'{bucket}:{count}'])
+        pipeline.execute(['ZREMRANGEBYSCORE', HISTORY_KEY, '-inf', f'({bucket - HISTORY_RETENTION}'])
+        pipeline.exec()
+
+    def history(self, since):
+        members = self.client.zrangebyscore(HISTORY_KEY, since, '+inf') or []
+        return [tuple(int(part) for part in member.split(':')) for member in members]
+
+
+class LocalPresenceStore:
+    """Equivalente em memória do processo (dev/testes)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._online = {}
+        self._history = {}
+
+    def touch(self, user_id, timestamp):
+        with self._lock:
+            self._online[str(user_id)] = timestamp
+
+    def count(self, since):
+        with self._lock:
+            self._online = {k: ts for k, ts in self._online.items() if ts >= since}
+            return len(self._online)
+
+    def claim_snapshot(self, bucket):
+        with self._lock:
+            return bucket not in self._history
+
+    def add_snapshot(self, bucket, count):
+        with self._lock:
+            self._history[bucket] = count
+            for old in [b for b in self._history if b < bucket - HISTORY_RETENTION]:
+                del self._history[old]
+
+    def history(self, since):
+        with self._lock:
+            return sorted((b, c) for b, c in self._history.items() if b >= since)
+
+    def clear(self):
+        with self._lock:
+            self._online.clear()
+            self._history.clear()
+
+
+_local_store = LocalPresenceStore()
+
+# Throttle por processo: user_id -> último heartbeat enviado
+_last_heartbeat = {}
+_last_snapshot_bucket = [None]
+_throttle_lock = threading.Lock()
+
+
+def get_store():
+    """Redis quando o cache padrão é o Upstash; senão, memória do processo"""
+    backend = caches['default']
+    if isinstance(backend, UpstashRedisCache) and backend.client:
+        return RedisPresenceStore(backend)
+    return _local_store
+
+
+def _bucket(timestamp):
+    return int(timestamp) // SNAPSHOT_INTERVAL * SNAPSHOT_INTERVAL
+
+
+def heartbeat(user_id, now=None):
+    """
+    Marca o usuário como online
+    Retorna False se o heartbeat foi descartado pelo throttle do processo
+    """
+    now = time.time() if now is None else now
+    interval = settings.PRESENCE_HEARTBEAT_INTERVAL
+
+    with _throttle_lock:
+        last = _last_heartbeat.get(user_id)
+        if last is not None and now - last < interval:
+            return False
+        _last_heartbeat[user_id] = now
+
+        # Evita que o dicionário cresça sem limite em processos de longa duração
+        if len(_last_heartbeat) > 10000:
+            for key in [k for k, ts in _last_heartbeat.items() if now - ts >= interval]:
+                del _last_heartbeat[key]
+
+        new_bucket = _bucket(now) != _last_snapshot_bucket[0]
+        _last_snapshot_bucket[0] = _bucket(now)
+
+    store = get_store()
+    store.touch(user_id, int(now))
+
+    # Primeiro heartbeat do processo em uma nova janela de 5 min tenta gravar o snapshot
+    if new_bucket:
+        record_snapshot(now, store=store)
+    return True
+
+
+def online_count(now=None, store=None):
+    """Usuários com heartbeat nos últimos 5 minutos"""
+    now = time.time() if now is None else now
+    store = store or get_store()
+    return store.count(int(now) - ONLINE_WINDOW)
+
+
+def record_snapshot(now=None, store=None):
+    """
+    Grava o total de usuários online da janela de 5 minutos atual
+    Só um processo grava cada janela (SET NX no Redis)
+    """
+    now = time.time() if now is None else now
+    store = store or get_store()
+    bucket = _bucket(now)
+
+    if not store.claim_snapshot(bucket):
+        return False
+    store.add_snapshot(bucket, online_count(now, store=store))
+    return True
+
+
+def users_history(minutes=60, now=None):
+    """Snapshots gravados nos últimos `minutes` minutos"""
+    now = time.time() if now is None else now
+    store = get_store()
+    record_snapshot(now, store=store)
+
+    return [
+        {'timestamp': datetime.fromtimestamp(bucket).isoformat(), 'count': count}
+        for bucket, count in store.history(_bucket(now) - minutes * 60 + SNAPSHOT_INTERVAL)
+    ]
+
+
+def reset():
+    """Limpa o estado local (usado nos testes)"""
+    with _throttle_lock:
+        _last_heartbeat.clear()
+        _last_snapshot_bucket[0] = None
+    _local_store.clear()
@@ -146,3 +146,148 @@ class SystemHealthTestCase(TestCase):
         for endpoint in endpoints:
             response = self.client.get(endpoint)
             self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PresenceTestCase(TestCase):
+    """Testes para o rastreamento de usuários online"""
+    
+    def setUp(self):
+        from system_health import presence
+        self.presence = presence
+        presence.reset()
+        self.now = 1_700_000_100
+    
+    def tearDown(self):
+        self.presence.reset()
+    
+    def test_heartbeat_is_throttled_per_user(self):
+        """Requisições seguidas do mesmo usuário geram um único heartbeat"""
+        self.assertTrue(self.presence.heartbeat(1, now=self.now))
+        self.assertFalse(self.presence.heartbeat(1, now=self.now + 10))
+        self.assertTrue(self.presence.heartbeat(2, now=self.now + 10))
+        self.assertTrue(self.presence.heartbeat(1, now=self.now + 61))
+    
+    def test_online_count_expires_inactive_users(self):
+        """Usuários sem heartbeat há mais de 5 minutos saem da contagem"""
+        self.presence.heartbeat(1, now=self.now)
+        self.presence.heartbeat(2, now=self.now + 200)
+        
+        self.assertEqual(self.presence.online_count(now=self.now + 250), 2)
+        self.assertEqual(self.presence.online_count(now=self.now + 400), 1)
+    
+    def test_history_records_real_snapshots(self):
+        """Cada janela de 5 minutos grava um snapshot com a contagem real"""
+        self.presence.heartbeat(1, now=self.now)
+        self.presence.heartbeat(2, now=self.now + 300)
+        self.presence.heartbeat(3, now=self.now + 310)
+        
+        history = self.presence.users_history(now=self.now + 320)
+        
+        self.assertEqual([point['count'] for point in history], [1, 2])
+    
+    def test_middleware_tracks_jwt_users(self):
+        """Usuários autenticados via JWT (DRF) são marcados como online"""
+        from rest_framework_simplejwt.tokens import RefreshToken
+        
+        tenant = Tenant.objects.create(name='Presence Tenant')
+        user = User.objects.create_user(
+            email='online@test.com', password='test123', name='Online', tenant=tenant
+        )
+        token = RefreshToken.for_user(user).access_token
+        
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        client.get('/api/superadmin/system-health/users/online/')
+        
+        self.assertEqual(self.presence.online_count(), 1)
+
+
+class CollectorTestCase(TestCase):
+    """Testes para o coletor de métricas de infraestrutura"""
+    
+    def setUp(self):
+        from system_health import collector
+        self.collector = collector
+        collector.reset()
+        self.now = 1_700_000_100
+    
+    def tearDown(self):
+        self.collector.reset()
+    
+    def sample(self, worker, ts, cpu, rss, latencies=()):
+        histogram = [0] * (len(self.collector.LATENCY_BUCKETS_MS) + 1)
+        for ms in latencies:
+            histogram[self.collector.bisect_left(self.collector.LATENCY_BUCKETS_MS, ms)] += 1
+        return {
+            'ts': ts, 'worker': worker, 'cpu': cpu, 'rss': rss, 'threads': 4,
+            'system_cpu': 50.0, 'memory_total': 1000, 'memory_available': 400, 'cpu_cores': 2,
+            'db_connections': 3, 'requests': len(latencies), 'rate': len(latencies) / 15, 'latency': histogram,
+        }
+    
+    def test_history_aggregates_workers_per_interval(self):
+        """CPU, RSS e requisições somam os workers; p50/p95 vêm dos histogramas somados"""
+        store = self.collector.get_store()
+        store.add(self.sample('a:1', self.now, 10.0, 100, [3, 3, 3]))
+        store.add(self.sample('b:2', self.now + 2, 20.0, 200, [40, 2000]))
+        store.add(self.sample('a:1', self.now + 15, 5.0, 100))
+        
+        points = self.collector.history(minutes=5, now=self.now + 20)
+        
+        self.assertEqual([point['workers'] for point in points], [2, 1])
+        first = points[0]
+        self.assertEqual((first['cpu_percent'], first['rss_bytes'], first['memory_percent']), (30.0, 300, 30.0))
+        self.assertEqual(first['requests'], 5)
+        self.assertEqual((first['latency_p50_ms'], first['latency_p95_ms']), (5, 2500))
+        self.assertIsNone(points[1]['latency_p50_ms'])
+        
+        # Amostras fora da janela não entram
+        self.assertEqual(len(self.collector.history(minutes=5, now=self.now + 600)), 0)
+    
+    def test_middleware_records_request_latency(self):
+        """Cada requisição entra no histograma do processo"""
+        APIClient().get('/api/superadmin/system-health/users/online/')
+        
+        sample = self.collector.sampler.sample(include_db=False)
+        
+        self.assertEqual(sample['requests'], 1)
+        self.assertEqual(sum(sample['latency']), 1)
+        self.assertEqual(self.collector.sampler.sample(include_db=False)['requests'], 0)
+    
+    def test_infra_metrics_returns_only_real_samples(self):
+        """O endpoint lê o buffer e não completa o histórico com pontos repetidos"""
+        user = User.objects.create_user(email='infra@test.com', password='test123', name='Infra', role='superadmin')
+        client = APIClient()
+        client.force_authenticate(user=user)
+        
+        response = client.get('/api/superadmin/system-health/infra/metrics/')
+        
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(len(data['cpu_history']), len(self.collector.history()))
+        self.assertLess(len(data['cpu_history']), 12)
+        self.assertIn('latency_p95_ms', data['details'])
+        self.assertGreaterEqual(data['details']['workers'], 1)
+
+
+class SentryPerformanceSourceTestCase(TestCase):
+    """Testa o cálculo do painel de performance a partir dos eventos do Sentry"""
+    
+    def test_events_are_bucketed_by_aware_dates(self):
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from system_health import external
+        
+        recent = (timezone.now() - timedelta(minutes=2)).isoformat().replace('+00:00', 'Z')
+        events = [
+            {'dateCreated': recent, 'title': 'GET /api/pos/sales/', 'tags': {'duration': 120}},
+            {'dateCreated': recent, 'title': 'GET /api/pos/sales/', 'tags': {'duration': 80}, 'level': 'error'},
+            {'title': 'sem data', 'tags': {'duration': 10}},
+        ]
+        with mock.patch.object(external, '_sentry_get', return_value=events):
+            data = external.fetch_sentry_performance()
+        
+        self.assertEqual(data['latency_history'][-1]['avg_ms'], 100)
+        self.assertEqual(len(data['latency_history']), 12)
+        self.assertEqual(data['top_slow_transactions'][0]['endpoint'], 'GET /api/pos/sales/')
+        self.assertEqual(data['error_rate_percentage'], 33.33)
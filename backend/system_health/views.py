@@ -9,13 +9,54 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.core.cache import cache
 from django.conf import settings
-from datetime import datetime, timedelta
+from datetime import datetime
 import sentry_sdk
 import redis
 import json
 import os
-import requests
-import psutil
+
+from core import external_api
+
+from . import collector, external, presence
+
+
+SENTRY_HEALTH_EMPTY = {
+    'crash_free_users_percentage': 0,
+    'new_issues_count': 0,
+    'recurring_issues_count': 0,
+    'sentry_url': ''
+}
+SENTRY_PERFORMANCE_EMPTY = {
+    'top_slow_transactions': [],
+    'avg_response_time_ms': 0,
+    'error_rate_percentage': 0,
+    'latency_history': []
+}
+UPTIME_EMPTY = {
+    'status': 'unknown',
+    'uptime_percentage': 0,
+    'response_time_ms': 0,
+}
+
+
+def external_response(name, empty):
+    """
+    Resposta com o último resultado da fonte externa (ver core.external_api)
+    stale=True indica que o valor está sendo atualizado em background
+    """
+    snapshot = external_api.get(name)
+    if snapshot['data'] is None:
+        return Response({
+            'error': snapshot['error'] or 'Dados ainda não disponíveis',
+            **empty
+        }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response({
+        **snapshot['data'],
+        'fetched_at': datetime.fromtimestamp(snapshot['fetched_at']).isoformat(),
+        'stale': snapshot['stale'],
+        'last_error': snapshot['error']
+    })
 
 
 class SentryHealthView(APIView):
@@ -26,88 +67,14 @@ class SentryHealthView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            # Verifica se as credenciais estão configuradas
-            if not all([settings.SENTRY_AUTH_TOKEN, settings.SENTRY_ORG_SLUG, settings.SENTRY_PROJECT_SLUG]):
-                return Response({
-                    'error': 'Sentry API não configurado',
-                    'crash_free_users_percentage': 0,
-                    'new_issues_count': 0,
-                    'recurring_issues_count': 0,
-                    'sentry_url': ''
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-
-            headers = {
-                'Authorization': f'Bearer {settings.SENTRY_AUTH_TOKEN}'
-            }
-            
-            org = settings.SENTRY_ORG_SLUG
-            project = settings.SENTRY_PROJECT_SLUG
-            
-            # 1. Buscar issues (novos e recorrentes)
-            issues_url = f'https://sentry.io/api/0/projects/{org}/{project}/issues/'
-            issues_params = {
-                'statsPeriod': '24h',
-                'query': 'is:unresolved'
-            }
-            issues_response = requests.get(issues_url, headers=headers, params=issues_params, timeout=10)
-            
-            new_issues = 0
-            recurring_issues = 0
-            
-            if issues_response.status_code == 200:
-                issues = issues_response.json()
-                for issue in issues:
-                    if issue.get('isNew', False):
-                        new_issues += 1
-                    else:
-                        recurring_issues += 1
-            
-            # 2. Calcular crash-free rate (aproximado)
-            # Usando a fórmula: (total_users - users_with_crashes) / total_users * 100
-            stats_url = f'https://sentry.io/api/0/projects/{org}/{project}/stats/'
-            stats_params = {
-                'stat': 'received',
-                'since': (datetime.now() - timedelta(days=1)).timestamp(),
-                'until': datetime.now().timestamp(),
-                'resolution': '1d'
-            }
-            stats_response = requests.get(stats_url, headers=headers, params=stats_params, timeout=10)
-            
-            crash_free_percentage = 99.5  # Default
-            if stats_response.status_code == 200:
-                stats = stats_response.json()
-                total_events = sum([point[1] for point in stats]) if stats else 0
-                # Aproximação: se temos menos de 10 eventos, crash-free é alto
-                if total_events > 0:
-                    crash_free_percentage = max(95.0, 100 - (new_issues + recurring_issues) / max(total_events, 1) * 100)
-            
-            data = {
-                'crash_free_users_percentage': round(crash_free_percentage, 2),
-                'new_issues_count': new_issues,
-                'recurring_issues_count': recurring_issues,
-                'sentry_url': f'https://sentry.io/organizations/{org}/projects/{project}/'
-            }
-            
-            return Response(data)
-            
-        except requests.exceptions.Timeout:
-            return Response({
-                'error': 'Timeout ao conectar com Sentry API',
-                'crash_free_users_percentage': 0,
-                'new_issues_count': 0,
-                'recurring_issues_count': 0,
-                'sentry_url': ''
-            }, status=status.HTTP_504_GATEWAY_TIMEOUT)
-        except Exception as e:
-            sentry_sdk.capture_exception(e)
+        # Verifica se as credenciais estão configuradas
+        if not external.sentry_configured():
             return Response({
-                'error': str(e),
-                'crash_free_users_percentage': 0,
-                'new_issues_count': 0,
-                'recurring_issues_count': 0,
-                'sentry_url': ''
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'error': 'Sentry API não configurado',
+                **SENTRY_HEALTH_EMPTY
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return external_response('sentry.health', SENTRY_HEALTH_EMPTY)
 
 
 class SentryPerformanceView(APIView):
@@ -118,114 +85,14 @@ class SentryPerformanceView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            # Verifica se as credenciais estão configuradas
-            if not all([settings.SENTRY_AUTH_TOKEN, settings.SENTRY_ORG_SLUG, settings.SENTRY_PROJECT_SLUG]):
-                return Response({
-                    'error': 'Sentry API não configurado',
-                    'top_slow_transactions': [],
-                    'avg_response_time_ms': 0,
-                    'error_rate_percentage': 0,
-                    'latency_history': []
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-
-            headers = {
-                'Authorization': f'Bearer {settings.SENTRY_AUTH_TOKEN}'
-            }
-            
-            org = settings.SENTRY_ORG_SLUG
-            project = settings.SENTRY_PROJECT_SLUG
-            
-            # 1. Buscar eventos de performance da última hora
-            now = datetime.now()
-            one_hour_ago = now - timedelta(hours=1)
-            
-            events_url = f'https://sentry.io/api/0/projects/{org}/{project}/events/'
-            events_params = {
-                'statsPeriod': '1h',
-                'query': 'event.type:transaction',
-                'sort': '-timestamp'
-            }
-            events_response = requests.get(events_url, headers=headers, params=events_params, timeout=10)
-            
-            # 2. Processar dados de latência
-            latency_history = []
-            transactions_data = {}
-            avg_response_time = 0
-            error_count = 0
-            total_count = 0
-            
-            if events_response.status_code == 200:
-                events = events_response.json()
-                
-                # Agrupar por intervalos de 5 minutos
-                for i in range(12):
-                    interval_start = now - timedelta(minutes=(i+1)*5)
-                    interval_events = [
-                        e for e in events 
-                        if interval_start <= datetime.fromisoformat(e.get('dateCreated', '').replace('Z', '+00:00')) < (interval_start + timedelta(minutes=5))
-                    ]
-                    
-                    avg_latency = 0
-                    if interval_events:
-                        latencies = [e.get('tags', {}).get('duration', 0) for e in interval_events]
-                        avg_latency = sum(latencies) / len(latencies) if latencies else 0
-                    
-                    latency_history.insert(0, {
-                        'timestamp': interval_start.isoformat(),
-                        'avg_ms': round(avg_latency, 2)
-                    })
-                
-                # Agrupar transações por endpoint
-                for event in events:
-                    endpoint = event.get('title', 'Unknown')
-                    duration = float(event.get('tags', {}).get('duration', 0))
-                    
-                    if endpoint not in transactions_data:
-                        transactions_data[endpoint] = []
-                    transactions_data[endpoint].append(duration)
-                    
-                    total_count += 1
-                    avg_response_time += duration
-                    
-                    if event.get('level') == 'error':
-                        error_count += 1
-            
-            # 3. Calcular top slow transactions
-            top_slow = []
-            for endpoint, durations in sorted(transactions_data.items(), key=lambda x: sum(x[1])/len(x[1]) if x[1] else 0, reverse=True)[:5]:
-                if durations:
-                    durations.sort()
-                    p95_index = int(len(durations) * 0.95)
-                    p99_index = int(len(durations) * 0.99)
-                    
-                    top_slow.append({
-                        'endpoint': endpoint,
-                        'avg_duration_ms': round(sum(durations) / len(durations), 2),
-                        'p95_duration_ms': round(durations[p95_index] if p95_index < len(durations) else durations[-1], 2),
-                        'p99_duration_ms': round(durations[p99_index] if p99_index < len(durations) else durations[-1], 2)
-                    })
-            
-            data = {
-                'top_slow_transactions': top_slow,
-                'avg_response_time_ms': round(avg_response_time / total_count, 2) if total_count > 0 else 0,
-                'error_rate_percentage': round((error_count / total_count) * 100, 2) if total_count > 0 else 0,
-                'latency_history': latency_history
-            }
-            
-            return Response(data)
-            
-        except requests.exceptions.Timeout:
+        # Verifica se as credenciais estão configuradas
+        if not external.sentry_configured():
             return Response({
-                'error': 'Timeout ao conectar com Sentry API',
-                'top_slow_transactions': [],
-                'avg_response_time_ms': 0,
-                'error_rate_percentage': 0,
-                'latency_history': []
-            }, status=status.HTTP_504_GATEWAY_TIMEOUT)
-        except Exception as e:
-            sentry_sdk.capture_exception(e)
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'error': 'Sentry API não configurado',
+                **SENTRY_PERFORMANCE_EMPTY
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return external_response('sentry.performance', SENTRY_PERFORMANCE_EMPTY)
 
 
 class RedisMetricsView(APIView):
@@ -473,103 +340,57 @@ class RedisInspectKeyView(APIView):
 class InfraMetricsView(APIView):
     """
     GET /superadmin/system-health/infra/metrics/
-    Retorna métricas REAIS de CPU e RAM do processo Python usando psutil
+    Retorna métricas de CPU, RAM, requisições e banco de todos os workers
+    Lê as amostras gravadas em segundo plano (ver system_health.collector)
     """
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
         try:
-            # Obter o processo atual do Python
-            process = psutil.Process()
-            
-            # CPU do processo (percentual de uso nos últimos segundos)
-            cpu_percent = process.cpu_percent(interval=0.1)
-            
-            # Memória do processo
-            memory_info = process.memory_info()
-            memory_mb = memory_info.rss / (1024 * 1024)  # Converte bytes para MB
-            
-            # Memória do sistema (total disponível)
-            system_memory = psutil.virtual_memory()
-            memory_percent = (memory_info.rss / system_memory.total) * 100
-            
-            # CPU do sistema (todos os cores)
-            system_cpu = psutil.cpu_percent(interval=0.1)
-            
-            # Número de threads do processo
-            num_threads = process.num_threads()
-            
-            # Informações do sistema
-            cpu_count = psutil.cpu_count()
-            
-            # Cache: histórico dos últimos 60 minutos (12 pontos x 5 min)
-            cache_key_prefix = 'system_metrics_history'
-            now = datetime.now()
-            
-            # Salva métrica atual no cache
-            current_metrics = {
-                'timestamp': now.isoformat(),
-                'cpu_percent': round(cpu_percent, 2),
-                'memory_percent': round(memory_percent, 2)
-            }
-            
-            # Busca histórico do cache (ou cria novo)
-            history = cache.get(cache_key_prefix, [])
-            history.append(current_metrics)
-            
-            # Mantém apenas últimos 12 pontos (1 hora)
-            if len(history) > 12:
-                history = history[-12:]
-            
-            # Salva no cache por 5 minutos
-            cache.set(cache_key_prefix, history, 300)
-            
-            # Formata histórico de CPU
+            points = collector.history(settings.HEALTH_HISTORY_MINUTES)
+            if not points:
+                # Nenhuma amostra ainda (worker recém-iniciado): grava uma agora, sem bloquear
+                collector.sampler.record()
+                points = collector.history(settings.HEALTH_HISTORY_MINUTES)
+
+            current = points[-1]
             cpu_history = [
                 {
-                    'timestamp': point['timestamp'],
+                    'timestamp': datetime.fromtimestamp(point['timestamp']).isoformat(),
                     'percentage': point['cpu_percent']
                 }
-                for point in history
+                for point in points
             ]
-            
-            # Formata histórico de Memória
             memory_history = [
                 {
-                    'timestamp': point['timestamp'],
+                    'timestamp': datetime.fromtimestamp(point['timestamp']).isoformat(),
                     'percentage': point['memory_percent']
                 }
-                for point in history
+                for point in points
             ]
-            
-            # Se não tiver 12 pontos ainda, preenche com dados atuais
-            while len(cpu_history) < 12:
-                fake_timestamp = now - timedelta(minutes=(12 - len(cpu_history)) * 5)
-                cpu_history.insert(0, {
-                    'timestamp': fake_timestamp.isoformat(),
-                    'percentage': round(cpu_percent, 2)
-                })
-                memory_history.insert(0, {
-                    'timestamp': fake_timestamp.isoformat(),
-                    'percentage': round(memory_percent, 2)
-                })
-            
+
             data = {
-                'cpu_usage_percentage': round(cpu_percent, 2),
-                'memory_usage_percentage': round(memory_percent, 2),
+                'cpu_usage_percentage': current['cpu_percent'],
+                'memory_usage_percentage': current['memory_percent'],
                 'cpu_history': cpu_history,
                 'memory_history': memory_history,
                 'provider': 'psutil (Real Data)',
                 'details': {
-                    'process_memory_mb': round(memory_mb, 2),
-                    'system_memory_total_gb': round(system_memory.total / (1024**3), 2),
-                    'system_memory_available_gb': round(system_memory.available / (1024**3), 2),
-                    'system_cpu_percent': round(system_cpu, 2),
-                    'cpu_cores': cpu_count,
-                    'process_threads': num_threads,
+                    'process_memory_mb': round(current['rss_bytes'] / (1024 * 1024), 2),
+                    'system_memory_total_gb': round(current['system_memory_total'] / (1024**3), 2),
+                    'system_memory_available_gb': round(current['system_memory_available'] / (1024**3), 2),
+                    'system_cpu_percent': current['system_cpu_percent'],
+                    'cpu_cores': current['cpu_cores'],
+                    'process_threads': current['threads'],
+                    'workers': current['workers'],
+                    'request_rate': current['request_rate'],
+                    'latency_p50_ms': current['latency_p50_ms'],
+                    'latency_p95_ms': current['latency_p95_ms'],
+                    'db_connections': current['db_connections'],
+                    'sample_interval_seconds': settings.HEALTH_SAMPLE_INTERVAL,
                 }
             }
-            
+
             return Response(data)
                 
         except Exception as e:
@@ -592,128 +413,15 @@ class UptimeStatusView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        try:
-            # Verifica se UptimeRobot API está configurado
-            if not settings.UPTIMEROBOT_API_KEY:
-                return Response({
-                    'error': 'UptimeRobot API não configurado',
-                    'status': 'unknown',
-                    'uptime_percentage': 0,
-                    'response_time_ms': 0,
-                    'last_check': datetime.now().isoformat()
-                }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-            
-            # UptimeRobot API v2 - getMonitors
-            uptimerobot_url = 'https://api.uptimerobot.com/v2/getMonitors'
-            
-            # Formato: application/x-www-form-urlencoded
-            payload = {
-                'api_key': settings.UPTIMEROBOT_API_KEY,
-                'format': 'json',
-                'response_times': '1',  # Inclui tempos de resposta
-                'response_times_limit': '1',  # Apenas o último
-                'custom_uptime_ratios': '1-7-30'  # Uptime de 1, 7 e 30 dias
-            }
-            
-            response = requests.post(
-                uptimerobot_url,
-                data=payload,
-                timeout=10
-            )
-            
-            if response.status_code != 200:
-                return Response({
-                    'error': f'UptimeRobot API retornou status {response.status_code}',
-                    'status': 'unknown',
-                    'uptime_percentage': 0,
-                    'response_time_ms': 0,
-                    'last_check': datetime.now().isoformat()
-                }, status=status.HTTP_502_BAD_GATEWAY)
-            
-            data = response.json()
-            
-            # Verifica se a resposta foi bem-sucedida
-            if data.get('stat') != 'ok':
-                return Response({
-                    'error': f'UptimeRobot retornou erro: {data.get("error", {}).get("message", "Unknown")}',
-                    'status': 'unknown',
-                    'uptime_percentage': 0,
-                    'response_time_ms': 0,
-                    'last_check': datetime.now().isoformat()
-                }, status=status.HTTP_502_BAD_GATEWAY)
-            
-            monitors = data.get('monitors', [])
-            
-            if not monitors:
-                return Response({
-                    'status': 'no_monitors',
-                    'uptime_percentage': 0,
-                    'response_time_ms': 0,
-                    'last_check': datetime.now().isoformat(),
-                    'message': 'Nenhum monitor configurado no UptimeRobot'
-                })
-            
-            # Pega o primeiro monitor (pode ser customizado para buscar um específico)
-            monitor = monitors[0]
-            
-            # Status do monitor
-            status_map = {
-                0: 'paused',
-                1: 'not_checked_yet',
-                2: 'up',
-                8: 'seems_down',
-                9: 'down'
-            }
-            monitor_status = status_map.get(monitor.get('status'), 'unknown')
-            
-            # Uptime percentage (últimos 30 dias)
-            custom_uptime_ratios = monitor.get('custom_uptime_ratios', ['0', '0', '0'])
-            uptime_30d = float(custom_uptime_ratios[2]) if len(custom_uptime_ratios) > 2 else 0
-            
-            # Response time (último check)
-            response_times = monitor.get('response_times', [])
-            last_response_time = 0
-            if response_times:
-                last_response_time = response_times[0].get('value', 0)
-            
-            # Última verificação
-            last_check_timestamp = monitor.get('last_check_datetime')
-            if last_check_timestamp:
-                last_check = datetime.fromtimestamp(last_check_timestamp).isoformat()
-            else:
-                last_check = datetime.now().isoformat()
-            
-            result = {
-                'status': monitor_status,
-                'uptime_percentage': round(uptime_30d, 2),
-                'response_time_ms': last_response_time,
-                'last_check': last_check,
-                'monitor_name': monitor.get('friendly_name', 'Unknown'),
-                'monitor_url': monitor.get('url', ''),
-                'uptime_1d': float(custom_uptime_ratios[0]) if len(custom_uptime_ratios) > 0 else 0,
-                'uptime_7d': float(custom_uptime_ratios[1]) if len(custom_uptime_ratios) > 1 else 0,
-                'uptime_30d': uptime_30d
-            }
-            
-            return Response(result)
-            
-        except requests.exceptions.Timeout:
-            return Response({
-                'error': 'Timeout ao conectar com UptimeRobot API',
-                'status': 'unknown',
-                'uptime_percentage': 0,
-                'response_time_ms': 0,
-                'last_check': datetime.now().isoformat()
-            }, status=status.HTTP_504_GATEWAY_TIMEOUT)
-        except Exception as e:
-            sentry_sdk.capture_exception(e)
+        # Verifica se UptimeRobot API está configurado
+        if not settings.UPTIMEROBOT_API_KEY:
             return Response({
-                'error': str(e),
-                'status': 'unknown',
-                'uptime_percentage': 0,
-                'response_time_ms': 0,
+                'error': 'UptimeRobot API não configurado',
+                **UPTIME_EMPTY,
                 'last_check': datetime.now().isoformat()
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        return external_response('uptime.status', {**UPTIME_EMPTY, 'last_check': datetime.now().isoformat()})
 
 
 class OnlineUsersView(APIView):
@@ -725,42 +433,11 @@ class OnlineUsersView(APIView):
 
     def get(self, request):
         try:
-            # Conta usuários ativos baseado em chaves do Django Cache (Redis)
-            # Formato esperado: "user_online:{user_id}" com TTL de 5 minutos
+            # Usuários com heartbeat nos últimos 5 minutos (ZCOUNT no sorted set de presença)
+            active_users = presence.online_count()
             
-            from upstash_redis import Redis
-            
-            # Cria cliente Upstash Redis REST
-            redis_client = Redis(
-                url=os.getenv('UPSTASH_REDIS_REST_URL'),
-                token=os.getenv('UPSTASH_REDIS_REST_TOKEN')
-            )
-            
-            # Busca todas as chaves de usuários online
-            # Nota: Upstash REST pode não suportar KEYS (perigoso em produção)
-            # Vamos usar SCAN ou contar via cache keys conhecidas
-            try:
-                online_keys = redis_client.keys('user_online:*') or []
-                active_users = len(online_keys)
-            except:
-                # Fallback: usa Django Cache API (mais seguro)
-                active_users = 0
-                # Tenta buscar do cache local
-                cached_count = cache.get('active_users_count', 0)
-                active_users = cached_count
-            
-            # Histórico de usuários (última hora)
-            # Por enquanto mock - você pode salvar snapshots no Redis a cada 5min
-            now = datetime.now()
-            users_history = []
-            for i in range(12):
-                timestamp = now - timedelta(minutes=i*5)
-                # Mock: varia entre 15-30 usuários
-                count = active_users + (i % 5) - 2
-                users_history.insert(0, {
-                    'timestamp': timestamp.isoformat(),
-                    'count': max(0, count)
-                })
+            # Histórico da última hora: snapshots reais gravados a cada 5 minutos
+            users_history = presence.users_history(minutes=60)
             
             data = {
                 'active_users': active_users,